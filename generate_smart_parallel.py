@@ -10,6 +10,10 @@
 
 使用方法：
   python3 generate_smart_parallel.py
+
+提示：主流水线 StoryGeneratorWithRetry 已内置多角色并发
+（CHARACTER_CONCURRENCY，默认 3），新故事请优先走主流水线；
+本脚本仅保留用于杭州示例的批量生成。
 """
 
 import sys
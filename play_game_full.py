@@ -103,7 +103,8 @@ try:
         city="杭州",
         gdd_path=str(gdd_path),
         lore_path=str(lore_path),
-        save_dir="saves"
+        save_dir="saves",
+        cli=cli
     )
     print("✅ 游戏引擎初始化成功")
 except Exception as e:
@@ -1,6 +1,7 @@
 -- Ghost Story Factory - Database Schema
 -- SQLite 数据库表结构
 -- 创建日期: 2025-10-24
+-- 本文件为基础结构（迁移 v1）；之后的结构变更见 src/ghost_story_factory/database/migrations.py
 
 -- 城市表
 CREATE TABLE IF NOT EXISTS cities (
@@ -21,6 +22,7 @@ CREATE TABLE IF NOT EXISTS stories (
     total_nodes INTEGER,  -- 对话树节点总数
     max_depth INTEGER,  -- 对话树最大深度
     generation_cost_usd REAL,  -- 生成成本（美元）
+    status TEXT DEFAULT 'complete',  -- 生成状态（generating=生成中 / failed=生成中断 / complete=完成）
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (city_id) REFERENCES cities(id) ON DELETE CASCADE
 );
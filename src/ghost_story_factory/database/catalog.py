@@ -0,0 +1,84 @@
+"""
+目录汇总（物化统计）
+
+菜单浏览只读汇总列，不做 COUNT 连接、不解码对话树：
+- cities.story_count：城市下的故事数
+- stories.character_count / total_nodes / max_depth / ending_count / size_bytes：故事汇总
+- tree_stats：每棵对话树的节点数 / 结局数 / 最大深度 / 入库字节数
+
+写对话树、建故事时在同一事务内刷新（见 DatabaseManager._write_tree_row 等），
+汇总查询只涉及小表与索引，和目录规模、树大小无关。
+"""
+
+import sqlite3
+from typing import Any, Dict
+
+
+def tree_summary(tree: Dict[str, Any]) -> Dict[str, int]:
+    """对话树 → {"nodes", "endings", "max_depth"}"""
+    nodes = endings = max_depth = 0
+    for node in tree.values():
+        if not isinstance(node, dict):
+            continue
+        nodes += 1
+        if node.get("is_ending"):
+            endings += 1
+        try:
+            max_depth = max(max_depth, int(node.get("depth") or 0))
+        except (TypeError, ValueError):
+            pass
+    return {"nodes": nodes, "endings": endings, "max_depth": max_depth}
+
+
+def create_catalog_tables(cursor: sqlite3.Cursor) -> None:
+    """建 tree_stats 表（IF NOT EXISTS）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tree_stats (
+            story_id INTEGER NOT NULL,
+            character_id INTEGER NOT NULL,
+            node_count INTEGER DEFAULT 0,
+            ending_count INTEGER DEFAULT 0,
+            max_depth INTEGER DEFAULT 0,
+            size_bytes INTEGER DEFAULT 0,  -- tree_data 字节数（不含共享文本块）
+            PRIMARY KEY (story_id, character_id)
+        )
+    """)
+
+
+def upsert_tree_stats(
+    cursor: sqlite3.Cursor,
+    story_id: int,
+    character_id: int,
+    summary: Dict[str, int],
+    size_bytes: int
+) -> None:
+    """在当前事务内写入单棵树的统计"""
+    cursor.execute("""
+        INSERT OR REPLACE INTO tree_stats
+        (story_id, character_id, node_count, ending_count, max_depth, size_bytes)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (story_id, character_id, summary["nodes"], summary["endings"], summary["max_depth"], size_bytes))
+
+
+def refresh_story_summary(cursor: sqlite3.Cursor, story_id: int) -> None:
+    """在当前事务内按 characters / tree_stats 重算故事汇总列
+
+    还没有任何对话树时保留 total_nodes / max_depth 原值（来自生成元数据）
+    """
+    cursor.execute("""
+        UPDATE stories SET
+            character_count = (SELECT COUNT(*) FROM characters WHERE story_id = :id),
+            total_nodes = COALESCE((SELECT SUM(node_count) FROM tree_stats WHERE story_id = :id), total_nodes),
+            max_depth = COALESCE((SELECT MAX(max_depth) FROM tree_stats WHERE story_id = :id), max_depth),
+            ending_count = COALESCE((SELECT SUM(ending_count) FROM tree_stats WHERE story_id = :id), 0),
+            size_bytes = COALESCE((SELECT SUM(size_bytes) FROM tree_stats WHERE story_id = :id), 0)
+        WHERE id = :id
+    """, {"id": story_id})
+
+
+def refresh_city_summary(cursor: sqlite3.Cursor, city_id: int) -> None:
+    """在当前事务内重算城市故事数"""
+    cursor.execute(
+        "UPDATE cities SET story_count = (SELECT COUNT(*) FROM stories WHERE city_id = :id) WHERE id = :id",
+        {"id": city_id}
+    )
@@ -10,97 +10,266 @@
 import sqlite3
 import json
 import gzip
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict, Optional, Any
-
-from .models import City, Story, Character, DialogueTree, GenerationMetadata
+from typing import List, Dict, Optional, Any, Callable, Iterator, Tuple
+
+from .models import City, Story, Character, DialogueTree, GenerationMetadata, NodeSearchHit, TreeStats
+from .migrations import CATALOG_SUMMARY_VERSION, SEARCH_INDEX_VERSION, migrate
+from .catalog import refresh_city_summary, refresh_story_summary, tree_summary, upsert_tree_stats
+from .search_index import SEARCH_TABLE, replace_tree_rows, search, search_tokenizer, tree_search_rows
+from .text_store import BLOB_CACHE, encode_trees, hydrate_tree, tree_refs
+from .state_delta import encode_state_deltas, materialize_all
+from .flat_tree import flat_tree_path, write_flat_tree
+from ..utils.logging_utils import console
 from ..utils.slug import story_slug
 
 
+# 编码后的对话树：(tree_data, compressed, encoding, blobs, search_rows, summary)，见 _encode_trees
+EncodedTree = Tuple[Any, int, str, Dict[str, Any], Optional[List[Any]], Dict[str, int]]
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
 class DatabaseManager:
-    """SQLite 数据库管理器"""
+    """SQLite 数据库管理器
+
+    连接模型：
+    - 读：有界连接池（DB_POOL_SIZE，默认 4），每次查询借出一条连接，用完归还；
+      同一线程内的嵌套读取复用已借出的连接
+    - 写：单写线程 + 写队列，所有写操作在写线程的专用连接上串行执行，
+      调用方同步等待结果（或经 submit_write / save_story_async 拿到 Future）
+    - 日志模式默认 WAL：写事务进行中读者仍可读取已提交的数据，生成保存不阻塞浏览与游玩
+    """
 
-    def __init__(self, db_path: str = "database/ghost_stories.db"):
+    def __init__(self, db_path: str = "database/ghost_stories.db", pool_size: Optional[int] = None):
         """
         初始化数据库管理器
 
         Args:
             db_path: 数据库文件路径
+            pool_size: 读连接池大小（默认取 DB_POOL_SIZE，缺省 4）
         """
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
-        self.conn = sqlite3.connect(str(self.db_path))
-        self.conn.row_factory = sqlite3.Row  # 返回字典格式
-
-        # 启用外键约束
-        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.pool_size = max(1, pool_size or _env_int("DB_POOL_SIZE", 4))
+        self._busy_timeout_ms = max(0, _env_int("DB_BUSY_TIMEOUT_MS", 5000))
+        self._cache_kb = max(0, _env_int("DB_CACHE_KB", 16384))
+        self._mmap_mb = max(0, _env_int("DB_MMAP_MB", 64))
+
+        self._local = threading.local()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+        self._readers_created = 0
+        self._closed = False
+
+        self._write_queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+
+        # 写连接：负责建库/迁移与之后的全部写入；日志模式是库文件级的持久设置，只需在这里设置一次
+        self._write_conn = self._connect()
+        self.journal_mode = self._set_journal_mode(self._write_conn)
+        self._apply_synchronous(self._write_conn)
+        self.search_enabled = False
+        self.flat_tree_dir = Path(os.getenv("FLAT_TREE_DIR") or self.db_path.parent / "trees")
 
         self.init_db()
 
-    def init_db(self):
-        """初始化数据库表（如果不存在）"""
-        schema_path = Path(__file__).parent.parent.parent.parent / "sql" / "schema.sql"
-
-        if not schema_path.exists():
-            print(f"⚠️  Schema 文件不存在：{schema_path}")
-            return
+    # ==================== 连接管理 ====================
 
-        with open(schema_path, 'r', encoding='utf-8') as f:
-            schema_sql = f.read()
+    def _connect(self) -> sqlite3.Connection:
+        """新建一条连接并应用通用 PRAGMA
 
-        cursor = self.conn.cursor()
+        连接只会被单个线程持有（借出/归还或写线程专用），因此关闭同线程检查，
+        以便 close() 能在任意线程统一关闭
+        """
+        conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            timeout=self._busy_timeout_ms / 1000.0,
+        )
+        conn.row_factory = sqlite3.Row  # 返回字典格式
 
-        # 先处理老库迁移：如 stories 存在但无 slug 列，先补列，再创建索引，避免后续 execscript 出错
+        # 启用外键约束
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA busy_timeout = {self._busy_timeout_ms}")
+        conn.execute(f"PRAGMA cache_size = -{self._cache_kb}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if self._mmap_mb:
+            conn.execute(f"PRAGMA mmap_size = {self._mmap_mb * 1024 * 1024}")
+        if hasattr(self, "journal_mode"):
+            self._apply_synchronous(conn)
+
+        with self._pool_lock:
+            self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _set_journal_mode(conn: sqlite3.Connection) -> str:
+        """设置日志模式（DB_JOURNAL_MODE，默认 WAL），返回实际生效的模式"""
+        mode = (os.getenv("DB_JOURNAL_MODE", "WAL") or "WAL").strip().upper()
+        if mode not in ("WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"):
+            mode = "WAL"
         try:
-            exists = cursor.execute(
-                "SELECT name FROM sqlite_master WHERE type='table' AND name='stories'"
-            ).fetchone()
-            if exists:
-                cols = [row[1] for row in cursor.execute("PRAGMA table_info(stories)").fetchall()]
-                if 'slug' not in cols:
-                    try:
-                        cursor.execute("ALTER TABLE stories ADD COLUMN slug TEXT")
-                        print("🆕 迁移：stories 表新增列 slug")
-                    except Exception:
-                        pass
-                # 索引幂等创建
-                try:
-                    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stories_slug ON stories(slug)")
-                except Exception:
-                    pass
-                self.conn.commit()
-        except Exception:
-            # 忽略迁移失败，继续执行 schema（首次建库）
+            row = conn.execute(f"PRAGMA journal_mode = {mode}").fetchone()
+            return str(row[0]).lower() if row else mode.lower()
+        except sqlite3.Error as e:
+            console(f"⚠️  设置日志模式 {mode} 失败：{e}")
+            return "delete"
+
+    def _apply_synchronous(self, conn: sqlite3.Connection) -> None:
+        """同步级别：WAL 下 NORMAL 已保证一致性（只可能丢最后几个事务），其他模式用 FULL"""
+        default = "NORMAL" if getattr(self, "journal_mode", "") == "wal" else "FULL"
+        level = (os.getenv("DB_SYNCHRONOUS", default) or default).strip().upper()
+        if level not in ("OFF", "NORMAL", "FULL", "EXTRA"):
+            level = default
+        conn.execute(f"PRAGMA synchronous = {level}")
+
+    def _checkout(self) -> sqlite3.Connection:
+        """从读连接池借出一条连接（池满时等待归还）"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
             pass
+        with self._pool_lock:
+            create = self._readers_created < self.pool_size
+            if create:
+                self._readers_created += 1
+        if create:
+            return self._connect()
+        try:
+            return self._idle.get(timeout=max(1.0, self._busy_timeout_ms / 1000.0) * 6)
+        except queue.Empty:
+            raise RuntimeError(f"数据库读连接池耗尽（pool_size={self.pool_size}）")
+
+    @contextmanager
+    def _reader(self):
+        """借出读连接；同一线程已持有连接时（嵌套读取、写线程内读取）直接复用"""
+        if self._closed:
+            raise RuntimeError("数据库连接已关闭")
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            yield conn
+            return
+
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    def _writer_loop(self) -> None:
+        """写线程：按提交顺序逐个执行写任务"""
+        self._local.conn = self._write_conn
+        while True:
+            item = self._write_queue.get()
+            if item is None:
+                break
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(self._write_conn, *args, **kwargs))
+            except BaseException as e:
+                if self._write_conn.in_transaction:
+                    self._write_conn.rollback()
+                future.set_exception(e)
+
+    def submit_write(self, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        """
+        将写任务放入写队列，立即返回
+
+        Args:
+            fn: 写任务，签名 fn(conn, *args, **kwargs)，需自行提交事务
+
+        Returns:
+            Future（结果为 fn 的返回值）
+        """
+        future: Future = Future()
+        with self._writer_lock:
+            if self._closed:
+                raise RuntimeError("数据库连接已关闭")
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name="db-writer", daemon=True)
+                self._writer.start()
+            self._write_queue.put((future, fn, args, kwargs))
+        return future
+
+    def _write(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """同步执行写任务（写线程内的嵌套调用直接执行，避免自等待死锁）"""
+        if threading.current_thread() is self._writer:
+            return fn(self._write_conn, *args, **kwargs)
+        return self.submit_write(fn, *args, **kwargs).result()
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """连接池状态"""
+        return {
+            "journal_mode": self.journal_mode,
+            "pool_size": self.pool_size,
+            "readers": self._readers_created,
+            "idle_readers": self._idle.qsize(),
+            "pending_writes": self._write_queue.qsize(),
+        }
 
-        # 执行 schema（首次建库或补齐缺表/索引）
-        cursor.executescript(schema_sql)
-        self.conn.commit()
+    def init_db(self):
+        """初始化 / 升级数据库结构
+
+        快路径只读取 PRAGMA user_version；版本落后时才执行迁移（见 migrations.py）
+        """
+        try:
+            before, after = migrate(self._write_conn)
+        except FileNotFoundError as e:
+            console(f"⚠️  {e}")
+            return
+        if after != before:
+            console(f"✅ 数据库初始化完成：{self.db_path}（schema v{before} → v{after}，journal_mode={self.journal_mode}）")
 
-        print(f"✅ 数据库初始化完成：{self.db_path}")
+        # 节点全文索引：SEARCH_INDEX=0 时保存不维护索引（之后可用 rebuild_search_index 重建）
+        self.search_enabled = (
+            os.getenv("SEARCH_INDEX", "1") != "0" and search_tokenizer(self._write_conn) is not None
+        )
+        if self.search_enabled and before < SEARCH_INDEX_VERSION <= after:
+            count = self.rebuild_search_index()
+            if count:
+                console(f"🔎 已为 {count} 棵已有对话树建立节点索引")
+        if before < CATALOG_SUMMARY_VERSION <= after:
+            count = self.rebuild_catalog_summary()
+            if count:
+                console(f"📊 已为 {count} 棵已有对话树生成目录汇总")
 
     # ==================== 城市操作 ====================
 
     def get_cities(self) -> List[City]:
-        """获取所有城市（含故事数量）"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT c.id, c.name, c.description, c.created_at,
-                   COUNT(s.id) as story_count
-            FROM cities c
-            LEFT JOIN stories s ON c.id = s.city_id
-            GROUP BY c.id
-            ORDER BY c.name
-        """)
+        """获取所有城市（含故事数量，读汇总列）"""
+        with self._reader() as conn:
+            rows = conn.execute("""
+                SELECT id, name, description, created_at, story_count
+                FROM cities
+                ORDER BY name
+            """).fetchall()
 
-        return [City.from_db_row(dict(row)) for row in cursor.fetchall()]
+        return [City.from_db_row(dict(row)) for row in rows]
 
     def get_city_by_name(self, name: str) -> Optional[City]:
         """根据名称获取城市"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM cities WHERE name = ?", (name,))
-        row = cursor.fetchone()
+        with self._reader() as conn:
+            row = conn.execute("SELECT * FROM cities WHERE name = ?", (name,)).fetchone()
 
         return City.from_db_row(dict(row)) if row else None
 
@@ -111,7 +280,16 @@ class DatabaseManager:
         Returns:
             城市 ID
         """
-        cursor = self.conn.cursor()
+        def _tx(conn: sqlite3.Connection) -> int:
+            city_id = self._upsert_city(conn.cursor(), name, description)
+            conn.commit()
+            return city_id
+
+        return self._write(_tx)
+
+    @staticmethod
+    def _upsert_city(cursor: sqlite3.Cursor, name: str, description: str = None) -> int:
+        """在当前事务内插入城市（已存在则忽略），返回城市 ID"""
         cursor.execute(
             "INSERT OR IGNORE INTO cities (name, description) VALUES (?, ?)",
             (name, description)
@@ -119,38 +297,25 @@ class DatabaseManager:
 
         # 获取城市 ID
         cursor.execute("SELECT id FROM cities WHERE name = ?", (name,))
-        city_id = cursor.fetchone()['id']
-
-        self.conn.commit()
-        return city_id
+        return cursor.fetchone()['id']
 
     # ==================== 故事操作 ====================
 
     def get_stories_by_city(self, city_id: int) -> List[Story]:
-        """获取某城市的所有故事"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT s.*, COUNT(DISTINCT c.id) as character_count
-            FROM stories s
-            LEFT JOIN characters c ON s.id = c.story_id
-            WHERE s.city_id = ?
-            GROUP BY s.id
-            ORDER BY s.created_at DESC
-        """, (city_id,))
+        """获取某城市的所有故事（角色数 / 结局数等读汇总列）"""
+        with self._reader() as conn:
+            rows = conn.execute("""
+                SELECT * FROM stories
+                WHERE city_id = ?
+                ORDER BY created_at DESC, id DESC
+            """, (city_id,)).fetchall()
 
-        return [Story.from_db_row(dict(row)) for row in cursor.fetchall()]
+        return [Story.from_db_row(dict(row)) for row in rows]
 
     def get_story_by_id(self, story_id: int) -> Optional[Story]:
         """根据 ID 获取故事"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT s.*, COUNT(DISTINCT c.id) as character_count
-            FROM stories s
-            LEFT JOIN characters c ON s.id = c.story_id
-            WHERE s.id = ?
-            GROUP BY s.id
-        """, (story_id,))
-        row = cursor.fetchone()
+        with self._reader() as conn:
+            row = conn.execute("SELECT * FROM stories WHERE id = ?", (story_id,)).fetchone()
 
         return Story.from_db_row(dict(row)) if row else None
 
@@ -158,32 +323,76 @@ class DatabaseManager:
 
     def get_characters_by_story(self, story_id: int) -> List[Character]:
         """获取某故事的所有角色"""
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT * FROM characters
-            WHERE story_id = ?
-            ORDER BY is_protagonist DESC, name
-        """, (story_id,))
+        with self._reader() as conn:
+            rows = conn.execute("""
+                SELECT c.*,
+                       EXISTS(SELECT 1 FROM dialogue_trees t
+                              WHERE t.story_id = c.story_id AND t.character_id = c.id) as has_tree
+                FROM characters c
+                WHERE c.story_id = ?
+                ORDER BY c.is_protagonist DESC, c.name
+            """, (story_id,)).fetchall()
+
+        return [Character.from_db_row(dict(row)) for row in rows]
+
+    def get_tree_stats(self, story_id: int) -> List[TreeStats]:
+        """各角色对话树的统计（节点 / 结局 / 深度 / 字节数，读 tree_stats，不解码对话树）"""
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT * FROM tree_stats WHERE story_id = ? ORDER BY character_id", (story_id,)
+            ).fetchall()
+        return [TreeStats.from_db_row(dict(row)) for row in rows]
+
+    def rebuild_catalog_summary(self) -> int:
+        """从已保存的对话树重建全部目录汇总（tree_stats 与城市 / 故事汇总列）
 
-        return [Character.from_db_row(dict(row)) for row in cursor.fetchall()]
+        Returns:
+            统计的对话树数量
+        """
+        count = 0
+        for sid, cid, tree in self.iter_dialogue_trees():
+            summary = tree_summary(tree)
+
+            def _tx(conn: sqlite3.Connection, sid=sid, cid=cid, summary=summary) -> None:
+                size = conn.execute(
+                    "SELECT LENGTH(tree_data) FROM dialogue_trees WHERE story_id = ? AND character_id = ?",
+                    (sid, cid)
+                ).fetchone()[0] or 0
+                upsert_tree_stats(conn.cursor(), sid, cid, summary, size)
+                conn.commit()
+
+            self._write(_tx)
+            count += 1
+
+        def _refresh(conn: sqlite3.Connection) -> None:
+            cursor = conn.cursor()
+            for row in cursor.execute("SELECT id FROM stories").fetchall():
+                refresh_story_summary(cursor, row['id'])
+            for row in cursor.execute("SELECT id FROM cities").fetchall():
+                refresh_city_summary(cursor, row['id'])
+            conn.commit()
+
+        self._write(_refresh)
+        return count
 
     def get_character_by_id(self, character_id: int) -> Optional[Character]:
         """根据 ID 获取角色"""
-        cursor = self.conn.cursor()
-        cursor.execute("SELECT * FROM characters WHERE id = ?", (character_id,))
-        row = cursor.fetchone()
+        with self._reader() as conn:
+            row = conn.execute("SELECT * FROM characters WHERE id = ?", (character_id,)).fetchone()
 
         return Character.from_db_row(dict(row)) if row else None
 
     # ==================== 对话树操作 ====================
 
-    def load_dialogue_tree(self, story_id: int, character_id: int) -> Dict[str, Any]:
+    def load_dialogue_tree(self, story_id: int, character_id: int, lazy_state: bool = False) -> Dict[str, Any]:
         """
         加载对话树
 
         Args:
             story_id: 故事 ID
             character_id: 角色 ID
+            lazy_state: 为 True 时不还原增量编码的 game_state，由调用方在访问节点时
+                用 state_delta.resolve_state 按需还原（游玩路径只还原走过的节点）
 
         Returns:
             对话树字典
@@ -191,22 +400,232 @@ class DatabaseManager:
         Raises:
             ValueError: 如果未找到对话树
         """
-        cursor = self.conn.cursor()
-        cursor.execute("""
-            SELECT tree_data, compressed
-            FROM dialogue_trees
-            WHERE story_id = ? AND character_id = ?
-        """, (story_id, character_id))
-
-        row = cursor.fetchone()
-        if not row:
-            raise ValueError(
-                f"未找到对话树：story_id={story_id}, character_id={character_id}"
-            )
+        with self._reader() as conn:
+            row = conn.execute("""
+                SELECT tree_data, compressed, encoding
+                FROM dialogue_trees
+                WHERE story_id = ? AND character_id = ?
+            """, (story_id, character_id)).fetchone()
+
+            if not row:
+                raise ValueError(
+                    f"未找到对话树：story_id={story_id}, character_id={character_id}"
+                )
+
+            tree = self._tree_from_row(conn, row)
+        return tree if lazy_state else materialize_all(tree)
+
+    def iter_dialogue_trees(self, story_id: Optional[int] = None) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """
+        流式遍历对话树：游标逐行读取并解码，不一次性载入全部行（批量修复 / 导出用）
+
+        遍历期间占用一条读连接；WAL 模式下可同时写回，其他日志模式请遍历结束后再写。
+
+        Args:
+            story_id: 仅遍历指定故事（默认全部）
+
+        Yields:
+            (story_id, character_id, 对话树)，game_state 为完整快照
+        """
+        sql = "SELECT story_id, character_id, tree_data, compressed, encoding FROM dialogue_trees"
+        params: Tuple[Any, ...] = ()
+        if story_id is not None:
+            sql += " WHERE story_id = ?"
+            params = (story_id,)
+        with self._reader() as conn:
+            for row in conn.execute(sql + " ORDER BY story_id, character_id", params):
+                yield row['story_id'], row['character_id'], materialize_all(self._tree_from_row(conn, row))
+
+    def _tree_from_row(self, conn: sqlite3.Connection, row: sqlite3.Row) -> Dict[str, Any]:
+        """dialogue_trees 行（tree_data / compressed / encoding）→ 对话树（game_state 仍为增量）"""
+        tree = self._decode_tree(row['tree_data'], row['compressed'])
+        if row['encoding'] == 'cas':
+            tree = self._hydrate_tree(conn, tree)
+        return tree
+
+    def get_tree_revision(self, story_id: int, character_id: int) -> Optional[int]:
+        """对话树版本号（每次写入递增）；不存在时返回 None"""
+        with self._reader() as conn:
+            row = conn.execute(
+                "SELECT revision FROM dialogue_trees WHERE story_id = ? AND character_id = ?",
+                (story_id, character_id)
+            ).fetchone()
+        return int(row['revision'] or 0) if row else None
+
+    def export_flat_tree(self, story_id: int, character_id: int, directory: Optional[str] = None) -> Path:
+        """
+        导出只读平铺文件（供多个游玩进程 mmap 共享，见 flat_tree.py）
+
+        Args:
+            story_id: 故事 ID
+            character_id: 角色 ID
+            directory: 输出目录（默认取 FLAT_TREE_DIR，缺省为数据库同目录下的 trees/）
+
+        Returns:
+            文件路径
+
+        Raises:
+            ValueError: 对话树不存在
+        """
+        revision = self.get_tree_revision(story_id, character_id)
+        if revision is None:
+            raise ValueError(f"未找到对话树：story_id={story_id}, character_id={character_id}")
+        tree = self.load_dialogue_tree(story_id, character_id)
+        return write_flat_tree(tree, flat_tree_path(directory or self.flat_tree_dir, story_id, character_id), revision)
+
+    def list_dialogue_trees(self, story_id: Optional[int] = None) -> List[Tuple[int, int]]:
+        """
+        列出对话树（可限定故事）
+
+        Returns:
+            [(story_id, character_id), ...]
+        """
+        sql = "SELECT story_id, character_id FROM dialogue_trees"
+        params: Tuple = ()
+        if story_id is not None:
+            sql += " WHERE story_id = ?"
+            params = (story_id,)
+        with self._reader() as conn:
+            rows = conn.execute(sql + " ORDER BY story_id, character_id", params).fetchall()
+        return [(r['story_id'], r['character_id']) for r in rows]
+
+    def replace_dialogue_tree(self, story_id: int, character_id: int, tree: Dict[str, Any]) -> None:
+        """
+        覆盖保存已有的对话树（按当前编码策略重新编码）
+
+        Raises:
+            ValueError: 对话树不存在
+        """
+        self.replace_dialogue_trees({(story_id, character_id): tree})
+
+    def replace_dialogue_trees(self, trees: Dict[Tuple[int, int], Dict[str, Any]]) -> int:
+        """
+        批量覆盖保存已有的对话树：在调用方线程统一编码，一个写事务内写回
+
+        Args:
+            trees: {(story_id, character_id): 对话树}
+
+        Returns:
+            写回的对话树数量
+
+        Raises:
+            ValueError: 其中某棵对话树不存在（整批回滚）
+        """
+        if not trees:
+            return 0
+        encoded = self._encode_trees(trees)
+
+        def _tx(conn: sqlite3.Connection) -> int:
+            cursor = conn.cursor()
+            try:
+                # 多个修复进程并发写同一个库：先取写锁，避免读事务升级写事务时直接 BUSY
+                cursor.execute("BEGIN IMMEDIATE")
+                for (story_id, character_id), enc in encoded.items():
+                    exists = cursor.execute(
+                        "SELECT 1 FROM dialogue_trees WHERE story_id = ? AND character_id = ?",
+                        (story_id, character_id)
+                    ).fetchone()
+                    if not exists:
+                        raise ValueError(f"未找到对话树：story_id={story_id}, character_id={character_id}")
+                    self._write_tree_row(cursor, story_id, character_id, enc)
+                conn.commit()
+                return len(encoded)
+            except Exception:
+                conn.rollback()
+                raise
+
+        return self._write(_tx)
+
+    # ==================== 节点检索 ====================
+
+    def search_nodes(
+        self,
+        text: Optional[str] = None,
+        scene: Optional[str] = None,
+        flag: Optional[str] = None,
+        story_id: Optional[int] = None,
+        character_id: Optional[int] = None,
+        limit: int = 50
+    ) -> List[NodeSearchHit]:
+        """
+        按文本 / 场景 / 标志位检索节点（走 node_search 全文索引，不解压对话树）
+
+        Args:
+            text: 叙事或选项文本中包含的子串
+            scene: 场景 ID
+            flag: 为真的标志位名
+            story_id / character_id: 限定范围
+            limit: 最多返回条数
+
+        Returns:
+            命中节点列表
+
+        Raises:
+            RuntimeError: 当前 SQLite 不支持 FTS5
+        """
+        with self._reader() as conn:
+            return search(conn, text=text, scene=scene, flag=flag,
+                          story_id=story_id, character_id=character_id, limit=limit)
+
+    def rebuild_search_index(self, story_id: Optional[int] = None) -> int:
+        """
+        从已保存的对话树重建节点索引（全部或单个故事）
+
+        Returns:
+            重建索引的对话树数量
+
+        Raises:
+            RuntimeError: 当前 SQLite 不支持 FTS5
+        """
+        with self._reader() as conn:
+            if search_tokenizer(conn) is None:
+                raise RuntimeError("节点索引不可用：当前 SQLite 未编译 FTS5")
+
+        if story_id is None:
+            def _clear(conn: sqlite3.Connection) -> None:
+                conn.execute(f"DELETE FROM {SEARCH_TABLE}")
+                conn.commit()
+            self._write(_clear)
 
-        tree_data = row['tree_data']
-        compressed = row['compressed']
+        count = 0
+        for sid, cid in self.list_dialogue_trees(story_id):
+            rows = tree_search_rows(self.load_dialogue_tree(sid, cid))
+
+            def _tx(conn: sqlite3.Connection, sid=sid, cid=cid, rows=rows) -> None:
+                try:
+                    replace_tree_rows(conn.cursor(), sid, cid, rows)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+
+            self._write(_tx)
+            count += 1
+        return count
+
+    @staticmethod
+    def _hydrate_tree(conn: sqlite3.Connection, skeleton: Dict[str, Any]) -> Dict[str, Any]:
+        """引用化的树 → 普通对话树（文本块经进程级缓存解码，同一哈希只解码一次）"""
+        def _fetch(hashes: List[str]):
+            rows = []
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                rows.extend(conn.execute(
+                    f"SELECT hash, kind, data, compressed FROM text_blobs "
+                    f"WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+            return [(r['hash'], r['kind'], r['data'], r['compressed']) for r in rows]
+
+        return hydrate_tree(skeleton, BLOB_CACHE.resolve(tree_refs(skeleton), _fetch))
+
+    @staticmethod
+    def _decode_tree(tree_data: Any, compressed: Any) -> Dict[str, Any]:
+        """(tree_data, compressed) → 对话树字典
 
+        Raises:
+            ValueError: 解压或 JSON 解析失败
+        """
         # 解压缩（如果需要）
         if compressed:
             try:
@@ -222,6 +641,352 @@ class DatabaseManager:
         except json.JSONDecodeError as e:
             raise ValueError(f"解析对话树 JSON 失败：{e}")
 
+    def _encode_tree(self, tree: Dict[str, Any]) -> EncodedTree:
+        """单棵对话树 → EncodedTree，见 _encode_trees"""
+        return self._encode_trees({"": tree})[""]
+
+    def _encode_trees(self, dialogue_trees: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        对话树 → {名称: EncodedTree}（在调用方线程完成序列化/压缩、索引行与目录统计）
+
+        默认（STATE_DELTA=1）非根节点的 game_state 只存与父节点的差异（见 state_delta.py）；
+        默认（NARRATIVE_DEDUP=1）把这批树中重复出现或已入库的叙事 / 选项集合抽成内容寻址文本块，
+        树中只留引用（encoding=cas）；没有可共享内容或 NARRATIVE_DEDUP=0 时保存完整 JSON（encoding=json）。
+        树 JSON 大于 10KB 时 Gzip 压缩。
+        """
+        # 索引行与统计取自完整的树（增量编码 / 引用化之前）
+        extras = {
+            name: (tree_search_rows(tree) if self.search_enabled else None, tree_summary(tree))
+            for name, tree in dialogue_trees.items()
+        }
+
+        if os.getenv("STATE_DELTA", "1") != "0":
+            dialogue_trees = {name: encode_state_deltas(tree) for name, tree in dialogue_trees.items()}
+
+        if os.getenv("NARRATIVE_DEDUP", "1") == "0":
+            return {
+                name: self._pack_tree(tree, 'json', {}) + extras[name]
+                for name, tree in dialogue_trees.items()
+            }
+
+        skeletons, blobs = encode_trees(dialogue_trees, known=self._known_blobs)
+        return {
+            name: self._pack_tree(skeletons[name], 'cas' if blobs[name] else 'json', blobs[name])
+            + extras[name]
+            for name in dialogue_trees
+        }
+
+    @staticmethod
+    def _pack_tree(tree: Dict[str, Any], encoding: str, blobs: Dict[str, Any]) -> Tuple[Any, int, str, Dict[str, Any]]:
+        tree_json = json.dumps(tree, ensure_ascii=False, separators=(',', ':'))
+        if len(tree_json) > 10000:
+            return gzip.compress(tree_json.encode('utf-8')), 1, encoding, blobs
+        return tree_json, 0, encoding, blobs
+
+    def _known_blobs(self, hashes: List[str]) -> List[str]:
+        """hashes 中已存在于 text_blobs 的哈希"""
+        known: List[str] = []
+        with self._reader() as conn:
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i:i + 500]
+                known.extend(r['hash'] for r in conn.execute(
+                    f"SELECT hash FROM text_blobs WHERE hash IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall())
+        return known
+
+    @staticmethod
+    def _write_tree_row(
+        cursor: sqlite3.Cursor,
+        story_id: int,
+        character_id: int,
+        encoded: EncodedTree
+    ) -> bool:
+        """
+        在当前事务内写入文本块、对话树行、节点索引与目录汇总（已存在则覆盖）
+
+        Returns:
+            是否新插入了对话树行
+        """
+        tree_data, compressed, encoding, blobs, search_rows, summary = encoded
+        if search_rows is not None:
+            replace_tree_rows(cursor, story_id, character_id, search_rows)
+        size = len(tree_data) if isinstance(tree_data, bytes) else len(tree_data.encode('utf-8'))
+        upsert_tree_stats(cursor, story_id, character_id, summary, size)
+        refresh_story_summary(cursor, story_id)
+        if blobs:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO text_blobs (hash, kind, data, compressed) VALUES (?, ?, ?, ?)",
+                [(h, kind, data, comp) for h, (kind, data, comp) in blobs.items()]
+            )
+
+        existing = cursor.execute(
+            "SELECT id FROM dialogue_trees WHERE story_id = ? AND character_id = ?",
+            (story_id, character_id)
+        ).fetchone()
+        if existing:
+            cursor.execute("""
+                UPDATE dialogue_trees
+                SET tree_data = ?, compressed = ?, encoding = ?, revision = COALESCE(revision, 0) + 1
+                WHERE id = ?
+            """, (tree_data, compressed, encoding, existing['id']))
+            return False
+        cursor.execute("""
+            INSERT INTO dialogue_trees (story_id, character_id, tree_data, compressed, encoding, revision)
+            VALUES (?, ?, ?, ?, ?, 1)
+        """, (story_id, character_id, tree_data, compressed, encoding))
+        return True
+
+    def merge_dialogue_nodes(
+        self,
+        story_id: int,
+        character_id: int,
+        nodes: List[Dict[str, Any]]
+    ) -> int:
+        """
+        将运行时生成的节点合并写回对话树（读-改-写在同一事务内完成）
+
+        节点按顺序合并：已存在的节点 ID 跳过（同一分支被多个玩家补全时保留先写入者）；
+        父节点的 children 追加新节点，对应选项回填 next_node_id（已有指向不覆盖）。
+
+        Args:
+            story_id: 故事 ID
+            character_id: 角色 ID
+            nodes: 节点列表（需包含 node_id / parent_id / parent_choice_id）
+
+        Returns:
+            实际新增的节点数
+        """
+        return self._write(self._merge_nodes_tx, story_id, character_id, nodes)
+
+    def _merge_nodes_tx(
+        self,
+        conn: sqlite3.Connection,
+        story_id: int,
+        character_id: int,
+        nodes: List[Dict[str, Any]]
+    ) -> int:
+        """merge_dialogue_nodes 的写线程实现"""
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            tree = self.load_dialogue_tree(story_id, character_id)
+
+            added = 0
+            for node in nodes:
+                node_id = node.get("node_id")
+                parent = tree.get(node.get("parent_id"))
+                if not node_id or node_id in tree or parent is None:
+                    continue
+                tree[node_id] = node
+                added += 1
+
+                children = parent.get("children") or []
+                if node_id not in children:
+                    children.append(node_id)
+                parent["children"] = children
+                for ch in parent.get("choices") or []:
+                    if ch.get("choice_id") == node.get("parent_choice_id"):
+                        if not ch.get("next_node_id") or ch.get("next_node_id") not in tree:
+                            ch["next_node_id"] = node_id
+                        break
+
+            if added:
+                # 节点总数等汇总列由 _write_tree_row 刷新
+                self._write_tree_row(cursor, story_id, character_id, self._encode_tree(tree))
+            conn.commit()
+            return added
+
+        except Exception:
+            conn.rollback()
+            raise
+
+    # ==================== 流式保存（生成过程中逐角色落库） ====================
+
+    def begin_story(
+        self,
+        city_name: str,
+        title: str,
+        synopsis: str,
+        characters: List[Dict[str, Any]],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """
+        生成开始前先建立故事与角色记录（status=generating）
+
+        同城市同标题且尚未完成的故事会被复用（断点续传时继续写入同一条记录），
+        缺少的角色会补齐。
+
+        Args:
+            city_name: 城市名称
+            title: 故事标题
+            synopsis: 故事简介
+            characters: 角色列表（同 save_story）
+            metadata: 元数据（可选，同 save_story）
+
+        Returns:
+            故事 ID
+        """
+        return self._write(self._begin_story_tx, city_name, title, synopsis, characters, metadata or {})
+
+    def _begin_story_tx(
+        self,
+        conn: sqlite3.Connection,
+        city_name: str,
+        title: str,
+        synopsis: str,
+        characters: List[Dict[str, Any]],
+        metadata: Dict[str, Any]
+    ) -> int:
+        cursor = conn.cursor()
+        try:
+            city_id = self._upsert_city(cursor, city_name)
+            slug = story_slug(city_name, title)
+
+            row = cursor.execute("""
+                SELECT id FROM stories
+                WHERE city_id = ? AND slug = ? AND status != 'complete'
+                ORDER BY id DESC LIMIT 1
+            """, (city_id, slug)).fetchone()
+            if row:
+                story_id = row['id']
+                cursor.execute(
+                    "UPDATE stories SET status = 'generating', synopsis = ? WHERE id = ?",
+                    (synopsis, story_id)
+                )
+            else:
+                cursor.execute("""
+                    INSERT INTO stories
+                    (city_id, title, slug, synopsis, estimated_duration_minutes,
+                     total_nodes, max_depth, generation_cost_usd, status)
+                    VALUES (?, ?, ?, ?, ?, 0, 0, 0, 'generating')
+                """, (city_id, title, slug, synopsis, metadata.get('estimated_duration', 0)))
+                story_id = cursor.lastrowid
+
+            existing = {
+                r['name'] for r in cursor.execute(
+                    "SELECT name FROM characters WHERE story_id = ?", (story_id,)
+                ).fetchall()
+            }
+            for char in characters:
+                if char['name'] in existing:
+                    continue
+                cursor.execute("""
+                    INSERT INTO characters (story_id, name, is_protagonist, description)
+                    VALUES (?, ?, ?, ?)
+                """, (
+                    story_id,
+                    char['name'],
+                    1 if char.get('is_protagonist', False) else 0,
+                    char.get('description', '')
+                ))
+
+            refresh_story_summary(cursor, story_id)
+            refresh_city_summary(cursor, city_id)
+            conn.commit()
+            return story_id
+
+        except Exception:
+            conn.rollback()
+            raise
+
+    def save_character_tree(self, story_id: int, character_name: str, tree: Dict[str, Any]) -> int:
+        """
+        保存（或覆盖）单个角色的对话树，并刷新故事节点总数
+
+        Args:
+            story_id: 故事 ID（由 begin_story 返回）
+            character_name: 角色名
+            tree: 对话树
+
+        Returns:
+            角色 ID
+
+        Raises:
+            ValueError: 角色不属于该故事
+        """
+        return self._write(
+            self._save_character_tree_tx, story_id, character_name, self._encode_tree(tree), len(tree)
+        )
+
+    def _save_character_tree_tx(
+        self,
+        conn: sqlite3.Connection,
+        story_id: int,
+        character_name: str,
+        encoded: EncodedTree,
+        node_count: int
+    ) -> int:
+        cursor = conn.cursor()
+        try:
+            row = cursor.execute(
+                "SELECT id FROM characters WHERE story_id = ? AND name = ?",
+                (story_id, character_name)
+            ).fetchone()
+            if not row:
+                raise ValueError(f"角色不存在：story_id={story_id}, name={character_name}")
+            char_id = row['id']
+
+            # 断点续传时重复落库：覆盖树内容，节点总数等按 tree_stats 重算（不会重复计数）
+            self._write_tree_row(cursor, story_id, char_id, encoded)
+            conn.commit()
+            print(f"💾 对话树已落库：story_id={story_id}, 角色={character_name}, 节点={node_count}")
+            return char_id
+
+        except Exception:
+            conn.rollback()
+            raise
+
+    def finalize_story(self, story_id: int, metadata: Dict[str, Any]) -> None:
+        """
+        全部角色完成后写入最终元数据，并将故事标记为 complete
+
+        Args:
+            story_id: 故事 ID
+            metadata: 元数据（同 save_story）
+        """
+        def _tx(conn: sqlite3.Connection) -> None:
+            try:
+                conn.execute("""
+                    UPDATE stories
+                    SET estimated_duration_minutes = ?, total_nodes = ?, max_depth = ?,
+                        generation_cost_usd = ?, status = 'complete'
+                    WHERE id = ?
+                """, (
+                    metadata.get('estimated_duration', 0),
+                    metadata.get('total_nodes', 0),
+                    metadata.get('max_depth', 0),
+                    metadata.get('cost', 0.0),
+                    story_id
+                ))
+                conn.execute("""
+                    INSERT INTO generation_metadata
+                    (story_id, total_tokens, generation_time_seconds, model_used)
+                    VALUES (?, ?, ?, ?)
+                """, (
+                    story_id,
+                    metadata.get('total_tokens', 0),
+                    metadata.get('generation_time', 0),
+                    metadata.get('model', '')
+                ))
+                # 已落库的对话树为准：节点总数 / 最大深度按 tree_stats 重算
+                refresh_story_summary(conn.cursor(), story_id)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        self._write(_tx)
+        print(f"✅ 故事已完成：ID={story_id}")
+
+    def set_story_status(self, story_id: int, status: str) -> None:
+        """更新故事生成状态（generating / failed / complete）"""
+        def _tx(conn: sqlite3.Connection) -> None:
+            conn.execute("UPDATE stories SET status = ? WHERE id = ?", (status, story_id))
+            conn.commit()
+
+        self._write(_tx)
+
     # ==================== 保存完整故事 ====================
 
     def save_story(
@@ -247,11 +1012,43 @@ class DatabaseManager:
         Returns:
             故事 ID
         """
-        cursor = self.conn.cursor()
+        encoded = self._encode_trees(dialogue_trees)
+        return self._write(self._save_story_tx, city_name, title, synopsis, characters, encoded, metadata)
+
+    def save_story_async(
+        self,
+        city_name: str,
+        title: str,
+        synopsis: str,
+        characters: List[Dict[str, Any]],
+        dialogue_trees: Dict[str, Dict[str, Any]],
+        metadata: Dict[str, Any]
+    ) -> Future:
+        """
+        异步保存完整的故事：放入写队列后立即返回（参数同 save_story）
+
+        Returns:
+            Future（结果为故事 ID）
+        """
+        encoded = self._encode_trees(dialogue_trees)
+        return self.submit_write(self._save_story_tx, city_name, title, synopsis, characters, encoded, metadata)
+
+    def _save_story_tx(
+        self,
+        conn: sqlite3.Connection,
+        city_name: str,
+        title: str,
+        synopsis: str,
+        characters: List[Dict[str, Any]],
+        encoded_trees: Dict[str, Any],
+        metadata: Dict[str, Any]
+    ) -> int:
+        """save_story 的写线程实现（对话树已由 _encode_tree 编码）"""
+        cursor = conn.cursor()
 
         try:
             # 1. 确保城市存在
-            city_id = self.create_city(city_name)
+            city_id = self._upsert_city(cursor, city_name)
 
             # 2. 插入故事
             slug = story_slug(city_name, title)
@@ -287,29 +1084,19 @@ class DatabaseManager:
                 char_id_map[char['name']] = cursor.lastrowid
 
             # 4. 保存对话树（JSON 格式，可选压缩）
-            for char_name, tree in dialogue_trees.items():
+            for char_name, encoded in encoded_trees.items():
                 char_id = char_id_map.get(char_name)
                 if not char_id:
                     print(f"⚠️  角色 {char_name} 不存在，跳过对话树")
                     continue
 
-                # 转为 JSON
-                tree_json = json.dumps(tree, ensure_ascii=False, indent=2)
+                self._write_tree_row(cursor, story_id, char_id, encoded)
 
-                # 可选：Gzip 压缩（大于 10KB 才压缩）
-                if len(tree_json) > 10000:
-                    tree_data = gzip.compress(tree_json.encode('utf-8'))
-                    compressed = 1
-                else:
-                    tree_data = tree_json
-                    compressed = 0
+            # 5. 刷新目录汇总
+            refresh_story_summary(cursor, story_id)
+            refresh_city_summary(cursor, city_id)
 
-                cursor.execute("""
-                    INSERT INTO dialogue_trees (story_id, character_id, tree_data, compressed)
-                    VALUES (?, ?, ?, ?)
-                """, (story_id, char_id, tree_data, compressed))
-
-            # 5. 保存元数据
+            # 6. 保存元数据
             cursor.execute("""
                 INSERT INTO generation_metadata
                 (story_id, total_tokens, generation_time_seconds, model_used)
@@ -321,21 +1108,37 @@ class DatabaseManager:
                 metadata.get('model', '')
             ))
 
-            self.conn.commit()
+            conn.commit()
             print(f"✅ 故事已保存：ID={story_id}, 标题=「{title}」")
             return story_id
 
         except Exception as e:
-            self.conn.rollback()
+            conn.rollback()
             print(f"❌ 保存故事失败：{e}")
             raise
 
     # ==================== 工具方法 ====================
 
     def close(self):
-        """关闭数据库连接"""
-        self.conn.close()
-        print("✅ 数据库连接已关闭")
+        """关闭数据库连接（先等待写队列中已提交的写任务完成）"""
+        if self._closed:
+            return
+        with self._writer_lock:
+            writer = self._writer
+            self._closed = True
+            if writer is not None:
+                self._write_queue.put(None)
+        if writer is not None and writer is not threading.current_thread():
+            writer.join()
+
+        with self._pool_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        console("✅ 数据库连接已关闭")
 
     def __enter__(self):
         """上下文管理器入口"""
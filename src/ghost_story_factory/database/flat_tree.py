@@ -0,0 +1,262 @@
+"""
+只读平铺对话树文件（mmap）
+
+数据库中的对话树是整棵压缩 JSON，每个游玩进程都要完整解码出一份 Python 字典。
+这里把每个 (故事, 角色) 的树导出为一个平铺文件，进程通过 mmap 只读打开，
+多个进程共享操作系统页缓存；查找节点 = 在定长偏移表上二分 + 读出该节点的一段字节。
+
+文件布局（小端）：
+
+    header   magic "GSFT" | version u16 | reserved u16 | node_count u32 | revision u64
+             | index_offset u64 | heap_offset u64 | child_count u32 | child_index_offset u64
+    index    node_count 个定长条目，按节点 ID（UTF-8 字节序）排序：
+             key_offset u64 | key_len u32 | data_offset u64 | data_len u32
+    children child_count 个同样格式的条目，键为 "parent_id\0parent_choice_id"，
+             值为子节点 ID（多个以 \0 分隔）；按键排序。旧树缺 next_node_id 时据此解析跳转，
+             不必为了找子节点解码整棵树
+    heap     节点 ID 字符串、子节点表的键值与节点 JSON（紧凑格式，game_state 为完整快照）
+
+revision 对应 dialogue_trees.revision：树被覆盖 / 合并后版本号递增，旧文件视为过期。
+"""
+
+import json
+import mmap
+import os
+import struct
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+from .state_delta import materialize_all
+
+
+MAGIC = b"GSFT"
+FORMAT_VERSION = 2
+
+_HEADER = struct.Struct("<4sHHIQQQIQ")
+_ENTRY = struct.Struct("<QIQI")
+
+
+def flat_tree_path(directory: Union[str, Path], story_id: int, character_id: int) -> Path:
+    """平铺文件路径：{directory}/story_{story_id}_char_{character_id}.gsft"""
+    return Path(directory) / f"story_{int(story_id)}_char_{int(character_id)}.gsft"
+
+
+def _child_key(parent_id: Any, choice_id: Any) -> bytes:
+    return f"{parent_id}\0{choice_id}".encode("utf-8")
+
+
+def write_flat_tree(tree: Dict[str, Any], path: Union[str, Path], revision: int = 0) -> Path:
+    """
+    导出平铺文件（先写临时文件再原子替换，多进程并发导出同一棵树也安全）
+
+    Args:
+        tree: 对话树（增量编码的 game_state 会被还原为完整快照）
+        path: 目标文件路径
+        revision: 对应的 dialogue_trees.revision
+
+    Returns:
+        文件路径
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    materialize_all(tree)
+
+    items = sorted(
+        ((str(node_id).encode("utf-8"), node) for node_id, node in tree.items()),
+        key=lambda kv: kv[0],
+    )
+    children: Dict[bytes, List[bytes]] = {}
+    for key, node in items:
+        if isinstance(node, dict) and node.get("parent_id") and node.get("parent_choice_id"):
+            child_key = _child_key(node["parent_id"], node["parent_choice_id"])
+            children.setdefault(child_key, []).append(key)
+    child_items = sorted(children.items())
+
+    index_offset = _HEADER.size
+    child_index_offset = index_offset + _ENTRY.size * len(items)
+    heap_offset = child_index_offset + _ENTRY.size * len(child_items)
+
+    heap = bytearray()
+
+    def put(key: bytes, data: bytes) -> bytes:
+        key_offset = heap_offset + len(heap)
+        heap.extend(key)
+        data_offset = heap_offset + len(heap)
+        heap.extend(data)
+        return _ENTRY.pack(key_offset, len(key), data_offset, len(data))
+
+    entries = [
+        put(key, json.dumps(node, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        for key, node in items
+    ]
+    child_entries = [put(key, b"\0".join(ids)) for key, ids in child_items]
+
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(
+            MAGIC, FORMAT_VERSION, 0, len(items), int(revision), index_offset, heap_offset,
+            len(child_items), child_index_offset,
+        ))
+        f.write(b"".join(entries))
+        f.write(b"".join(child_entries))
+        f.write(heap)
+    os.replace(tmp, path)
+    return path
+
+
+class FlatTree(MutableMapping):
+    """
+    mmap 打开的平铺对话树，按字典方式访问
+
+    节点在首次访问时解码并留在进程内（只保留走过的节点）；写入的新节点与对已解码节点的修改
+    （如实时补全分支）只存在于本进程，不写回文件。
+
+    child_index 按 (parent_id, parent_choice_id) 查子节点，只读文件中的子节点表，不解码节点，
+    可直接传给 resolve_next_node。
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path: 平铺文件路径
+
+        Raises:
+            ValueError: 文件格式不正确
+        """
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, _, count, revision, index_offset, _heap_offset,
+             child_count, child_index_offset) = _HEADER.unpack_from(self._mm, 0)
+        except struct.error:
+            self._mm.close()
+            raise ValueError(f"平铺对话树文件损坏：{self.path}")
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise ValueError(f"不支持的平铺对话树文件：{self.path}（magic={magic!r}, version={version}）")
+
+        self.node_count = count
+        self.revision = revision
+        self._index_offset = index_offset
+        self._child_count = child_count
+        self._child_index_offset = child_index_offset
+        self._nodes: Dict[str, Any] = {}      # 已解码 / 新写入的节点
+        self._extra = 0                       # 文件中不存在的新节点数量
+        self._extra_children: Dict[Tuple[str, str], List[str]] = {}
+        self.child_index = FlatChildIndex(self)
+
+    # ---------- 文件读取 ----------
+
+    def _entry(self, i: int, table: Optional[int] = None) -> Tuple[int, int, int, int]:
+        offset = self._index_offset if table is None else table
+        return _ENTRY.unpack_from(self._mm, offset + i * _ENTRY.size)
+
+    def _key(self, i: int) -> bytes:
+        key_offset, key_len, _, _ = self._entry(i)
+        return self._mm[key_offset:key_offset + key_len]
+
+    def _search(self, target: bytes, table: int, count: int) -> Optional[Tuple[int, int]]:
+        """在定长条目表上二分查找键 → (data_offset, data_len)"""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key_offset, key_len, data_offset, data_len = self._entry(mid, table)
+            key = self._mm[key_offset:key_offset + key_len]
+            if key == target:
+                return data_offset, data_len
+            if key < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _find(self, node_id: str) -> Optional[Tuple[int, int]]:
+        """二分查找节点 → (data_offset, data_len)"""
+        return self._search(str(node_id).encode("utf-8"), self._index_offset, self.node_count)
+
+    def children_of(self, parent_id: str, choice_id: str) -> List[str]:
+        """(parent_id, parent_choice_id) 对应的子节点 ID（文件中的子节点表 + 本进程新写入的节点）"""
+        found = self._search(_child_key(parent_id, choice_id), self._child_index_offset, self._child_count)
+        ids: List[str] = []
+        if found is not None:
+            data_offset, data_len = found
+            ids = self._mm[data_offset:data_offset + data_len].decode("utf-8").split("\0")
+        return ids + self._extra_children.get((parent_id, choice_id), [])
+
+    # ---------- 字典接口 ----------
+
+    def __getitem__(self, node_id: str) -> Any:
+        node = self._nodes.get(node_id)
+        if node is not None:
+            return node
+        found = self._find(node_id)
+        if found is None:
+            raise KeyError(node_id)
+        data_offset, data_len = found
+        node = json.loads(self._mm[data_offset:data_offset + data_len].decode("utf-8"))
+        return self._nodes.setdefault(node_id, node)
+
+    def __setitem__(self, node_id: str, node: Any) -> None:
+        if node_id not in self._nodes and self._find(node_id) is None:
+            self._extra += 1
+            if isinstance(node, dict) and node.get("parent_id") and node.get("parent_choice_id"):
+                key = (node["parent_id"], node["parent_choice_id"])
+                self._extra_children.setdefault(key, []).append(node_id)
+        self._nodes[node_id] = node
+
+    def __delitem__(self, node_id: str) -> None:
+        raise TypeError("平铺对话树为只读，不支持删除节点")
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._nodes or (isinstance(node_id, str) and self._find(node_id) is not None)
+
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for i in range(self.node_count):
+            key = self._key(i).decode("utf-8")
+            seen.add(key)
+            yield key
+        for key in list(self._nodes):
+            if key not in seen:
+                yield key
+
+    def __len__(self) -> int:
+        return self.node_count + self._extra
+
+    def close(self) -> None:
+        """释放 mmap（已解码的节点仍可访问）"""
+        try:
+            self._mm.close()
+        except Exception:
+            pass
+
+
+class FlatChildIndex:
+    """FlatTree 的 (parent_id, parent_choice_id) → [child_id] 只读视图（与 build_child_index 的结果同用法）"""
+
+    def __init__(self, tree: FlatTree):
+        self._tree = tree
+
+    def get(self, key: Tuple[str, str], default: Optional[List[str]] = None) -> List[str]:
+        ids = self._tree.children_of(*key)
+        return ids if ids else (default if default is not None else [])
+
+
+def open_flat_tree(path: Union[str, Path], revision: Optional[int] = None) -> Optional[FlatTree]:
+    """
+    打开平铺文件；文件不存在、损坏或版本号与 revision 不一致时返回 None
+
+    Args:
+        path: 文件路径
+        revision: 期望的 dialogue_trees.revision（None 表示不校验）
+    """
+    try:
+        tree = FlatTree(path)
+    except (OSError, ValueError):
+        return None
+    if revision is not None and tree.revision != int(revision):
+        tree.close()
+        return None
+    return tree
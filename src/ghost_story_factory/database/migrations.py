@@ -0,0 +1,167 @@
+"""
+数据库版本迁移
+
+用 SQLite 的 PRAGMA user_version 记录库结构版本：
+- 打开数据库时只读取一次版本号，已是最新则直接返回（快路径，不读 schema 文件、不建表）
+- 版本落后时按顺序执行尚未执行的迁移，全部迁移与版本号更新在同一个写事务内完成
+
+新增表结构时：在 MIGRATIONS 末尾追加 (版本号, 说明, 迁移函数)，迁移函数接收 cursor，
+只做增量变更（建新表 / 加列 / 建索引），不要修改已发布的迁移。
+"""
+
+import sqlite3
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+
+SCHEMA_PATH = Path(__file__).parent.parent.parent.parent / "sql" / "schema.sql"
+
+
+def split_sql(script: str) -> List[str]:
+    """把 SQL 脚本拆成单条语句（按 sqlite3.complete_statement 判断语句结束）"""
+    statements = []
+    buf = ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            stmt = buf.strip()
+            if stmt and stmt != ";":
+                statements.append(stmt)
+            buf = ""
+    rest = "\n".join(l for l in buf.splitlines() if not l.strip().startswith("--")).strip()
+    if rest:
+        statements.append(rest)
+    return statements
+
+
+def _table_columns(cursor: sqlite3.Cursor, table: str) -> List[str]:
+    return [row[1] for row in cursor.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def _migrate_v1_baseline(cursor: sqlite3.Cursor) -> None:
+    """基础表结构（sql/schema.sql）
+
+    兼容引入版本号之前的老库：stories 存在但缺 slug / status 列时先补列，
+    再执行 schema（全部为 IF NOT EXISTS，对已有表无副作用）
+    """
+    if not SCHEMA_PATH.exists():
+        raise FileNotFoundError(f"Schema 文件不存在：{SCHEMA_PATH}")
+
+    exists = cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='stories'"
+    ).fetchone()
+    if exists:
+        cols = _table_columns(cursor, "stories")
+        for col, decl in (("slug", "TEXT"), ("status", "TEXT DEFAULT 'complete'")):
+            if col not in cols:
+                cursor.execute(f"ALTER TABLE stories ADD COLUMN {col} {decl}")
+                print(f"🆕 迁移：stories 表新增列 {col}")
+
+    for stmt in split_sql(SCHEMA_PATH.read_text(encoding="utf-8")):
+        cursor.execute(stmt)
+
+
+def _migrate_v2_text_blobs(cursor: sqlite3.Cursor) -> None:
+    """内容寻址文本块表 + dialogue_trees.encoding（json=原文 / cas=引用 text_blobs）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS text_blobs (
+            hash TEXT PRIMARY KEY,  -- 内容哈希（见 text_store.blob_hash）
+            kind TEXT NOT NULL,  -- narrative / choices
+            data BLOB NOT NULL,  -- 原文或 gzip 压缩后的字节
+            compressed BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    if "encoding" not in _table_columns(cursor, "dialogue_trees"):
+        cursor.execute("ALTER TABLE dialogue_trees ADD COLUMN encoding TEXT DEFAULT 'json'")
+
+
+def _migrate_v3_search_index(cursor: sqlite3.Cursor) -> None:
+    """节点全文索引 node_search（FTS5；已有对话树由 DatabaseManager.init_db 回填）"""
+    from .search_index import create_search_table
+
+    if create_search_table(cursor) is None:
+        print("⚠️  当前 SQLite 未编译 FTS5，跳过节点全文索引")
+
+
+def _migrate_v4_tree_revision(cursor: sqlite3.Cursor) -> None:
+    """dialogue_trees.revision：每次写入对话树递增，用于判断导出的平铺文件是否过期"""
+    if "revision" not in _table_columns(cursor, "dialogue_trees"):
+        cursor.execute("ALTER TABLE dialogue_trees ADD COLUMN revision INTEGER DEFAULT 0")
+
+
+def _migrate_v5_catalog_summary(cursor: sqlite3.Cursor) -> None:
+    """目录汇总：cities.story_count、stories 汇总列、tree_stats（树级统计由 DatabaseManager.init_db 回填）"""
+    from .catalog import create_catalog_tables
+
+    if "story_count" not in _table_columns(cursor, "cities"):
+        cursor.execute("ALTER TABLE cities ADD COLUMN story_count INTEGER DEFAULT 0")
+    story_cols = _table_columns(cursor, "stories")
+    for col in ("character_count", "ending_count", "size_bytes"):
+        if col not in story_cols:
+            cursor.execute(f"ALTER TABLE stories ADD COLUMN {col} INTEGER DEFAULT 0")
+    create_catalog_tables(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_stories_city_created ON stories(city_id, created_at)")
+
+    cursor.execute("UPDATE cities SET story_count = (SELECT COUNT(*) FROM stories s WHERE s.city_id = cities.id)")
+    cursor.execute(
+        "UPDATE stories SET character_count = (SELECT COUNT(*) FROM characters c WHERE c.story_id = stories.id)"
+    )
+
+
+# (版本号, 说明, 迁移函数)；版本号从 1 开始连续递增
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Cursor], None]]] = [
+    (1, "基础表结构", _migrate_v1_baseline),
+    (2, "内容寻址文本块", _migrate_v2_text_blobs),
+    (3, "节点全文索引", _migrate_v3_search_index),
+    (4, "对话树版本号", _migrate_v4_tree_revision),
+    (5, "目录汇总", _migrate_v5_catalog_summary),
+]
+
+# 引入节点全文索引 / 目录汇总的版本：从更早版本升级上来时需要解码已有对话树回填
+SEARCH_INDEX_VERSION = 3
+CATALOG_SUMMARY_VERSION = 5
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_user_version(conn: sqlite3.Connection) -> int:
+    """读取库结构版本号（PRAGMA user_version）"""
+    return int(conn.execute("PRAGMA user_version").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection) -> Tuple[int, int]:
+    """
+    把数据库迁移到最新版本
+
+    多个进程同时打开同一个库时，用 BEGIN IMMEDIATE 取得写锁后重新读取版本号，
+    保证每个迁移只执行一次。
+
+    Args:
+        conn: 数据库连接（不能处于事务中）
+
+    Returns:
+        (迁移前版本, 迁移后版本)；两者相等表示无需迁移
+    """
+    current = get_user_version(conn)
+    if current >= SCHEMA_VERSION:
+        return current, current
+
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        current = get_user_version(conn)
+        start = current
+        for version, description, fn in MIGRATIONS:
+            if version <= current:
+                continue
+            fn(cursor)
+            print(f"🆕 迁移：v{version} {description}")
+            current = version
+        # PRAGMA 不支持参数绑定；版本号来自常量表
+        cursor.execute(f"PRAGMA user_version = {int(current)}")
+        conn.commit()
+        return start, current
+    except Exception:
+        conn.rollback()
+        raise
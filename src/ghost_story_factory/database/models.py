@@ -16,7 +16,7 @@ class City:
     name: str = ""
     description: Optional[str] = None
     created_at: Optional[datetime] = None
-    story_count: int = 0  # 该城市的故事数量（查询时填充）
+    story_count: int = 0  # 该城市的故事数量（汇总列）
 
     @classmethod
     def from_db_row(cls, row: Dict) -> 'City':
@@ -26,7 +26,7 @@ class City:
             name=row.get('name', ''),
             description=row.get('description'),
             created_at=row.get('created_at'),
-            story_count=row.get('story_count', 0)
+            story_count=row.get('story_count') or 0
         )
 
 
@@ -41,8 +41,16 @@ class Story:
     total_nodes: int = 0
     max_depth: int = 0
     generation_cost_usd: float = 0.0
+    status: str = "complete"  # 生成状态：generating / failed / complete
     created_at: Optional[datetime] = None
-    character_count: int = 0  # 角色数量（查询时填充）
+    character_count: int = 0  # 角色数量（汇总列）
+    ending_count: int = 0  # 各角色线结局节点总数（汇总列）
+    size_bytes: int = 0  # 对话树入库字节数（汇总列）
+
+    @property
+    def is_complete(self) -> bool:
+        """所有角色的对话树是否已生成完毕"""
+        return self.status == "complete"
 
     @classmethod
     def from_db_row(cls, row: Dict) -> 'Story':
@@ -56,8 +64,11 @@ class Story:
             total_nodes=row.get('total_nodes', 0),
             max_depth=row.get('max_depth', 0),
             generation_cost_usd=row.get('generation_cost_usd', 0.0),
+            status=row.get('status') or 'complete',
             created_at=row.get('created_at'),
-            character_count=row.get('character_count', 0)
+            character_count=row.get('character_count') or 0,
+            ending_count=row.get('ending_count') or 0,
+            size_bytes=row.get('size_bytes') or 0
         )
 
 
@@ -70,6 +81,7 @@ class Character:
     is_protagonist: bool = False
     description: Optional[str] = None
     created_at: Optional[datetime] = None
+    has_tree: bool = True  # 对话树是否已入库（生成中的故事可能尚未就绪，查询时填充）
 
     @classmethod
     def from_db_row(cls, row: Dict) -> 'Character':
@@ -80,7 +92,8 @@ class Character:
             name=row.get('name', ''),
             is_protagonist=bool(row.get('is_protagonist', 0)),
             description=row.get('description'),
-            created_at=row.get('created_at')
+            created_at=row.get('created_at'),
+            has_tree=bool(row.get('has_tree', 1))
         )
 
 
@@ -107,6 +120,39 @@ class DialogueTree:
         )
 
 
+@dataclass
+class TreeStats:
+    """单棵对话树的统计（来自 tree_stats 汇总表）"""
+    story_id: int = 0
+    character_id: int = 0
+    node_count: int = 0
+    ending_count: int = 0
+    max_depth: int = 0
+    size_bytes: int = 0
+
+    @classmethod
+    def from_db_row(cls, row: Dict) -> 'TreeStats':
+        """从数据库行创建实例"""
+        return cls(
+            story_id=row.get('story_id', 0),
+            character_id=row.get('character_id', 0),
+            node_count=row.get('node_count') or 0,
+            ending_count=row.get('ending_count') or 0,
+            max_depth=row.get('max_depth') or 0,
+            size_bytes=row.get('size_bytes') or 0
+        )
+
+
+@dataclass
+class NodeSearchHit:
+    """节点检索结果（来自 node_search 全文索引）"""
+    story_id: int = 0
+    character_id: int = 0
+    node_id: str = ""
+    scene: str = ""
+    snippet: str = ""  # 命中文本附近的片段
+
+
 @dataclass
 class GenerationMetadata:
     """生成元数据模型"""
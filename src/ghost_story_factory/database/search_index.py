@@ -0,0 +1,214 @@
+"""
+节点全文索引（SQLite FTS5）
+
+对话树以压缩 JSON / 内容寻址形式存储，按内容查找节点原本需要逐棵解压、解析。
+这里在保存对话树时同步维护一张 FTS5 虚表 node_search，每个节点一行：
+
+- narrative：叙事文本
+- choices：各选项文本（换行分隔）
+- scene：场景 ID（node.scene 或 game_state.current_scene）
+- flags：为真的标志位（形如 |flag1|flag2|，便于整词匹配）
+- story_id / character_id / node_id：定位信息（不分词）
+
+分词器优先用 trigram（SQLite ≥ 3.34，中文可按任意子串检索）；不可用时退回 unicode61。
+SQLite 未编译 FTS5 时不建表，检索接口抛出 RuntimeError，保存不受影响。
+"""
+
+import sqlite3
+from typing import Any, Dict, List, Optional, Tuple
+
+from .models import NodeSearchHit
+
+
+SEARCH_TABLE = "node_search"
+
+# 一行索引：(node_id, narrative, choices, scene, flags)
+SearchRow = Tuple[str, str, str, str, str]
+
+_SNIPPET_CHARS = 30
+
+
+def create_search_table(cursor: sqlite3.Cursor) -> Optional[str]:
+    """
+    创建 node_search 虚表
+
+    Returns:
+        使用的分词器（trigram / unicode61）；SQLite 不支持 FTS5 时返回 None
+    """
+    for tokenizer in ("trigram", "unicode61"):
+        try:
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+                    narrative, choices, scene, flags,
+                    story_id UNINDEXED, character_id UNINDEXED, node_id UNINDEXED,
+                    tokenize = '{tokenizer}'
+                )
+            """)
+            return tokenizer
+        except sqlite3.OperationalError as e:
+            if "no such module" in str(e):
+                return None
+            # 分词器不存在：尝试下一个
+    return None
+
+
+def search_tokenizer(conn: sqlite3.Connection) -> Optional[str]:
+    """已建索引表的分词器；未建表时返回 None"""
+    row = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name=?", (SEARCH_TABLE,)
+    ).fetchone()
+    if not row:
+        return None
+    return "trigram" if "trigram" in row[0] else "unicode61"
+
+
+def _flags_text(flags: Any) -> str:
+    if not isinstance(flags, dict):
+        return ""
+    names = [str(k) for k, v in flags.items() if v]
+    return f"|{'|'.join(names)}|" if names else ""
+
+
+def tree_search_rows(tree: Dict[str, Any]) -> List[SearchRow]:
+    """
+    对话树 → 索引行（需要完整的树：叙事已展开、game_state 为完整快照）
+
+    Args:
+        tree: 对话树
+
+    Returns:
+        [(node_id, narrative, choices, scene, flags), ...]
+    """
+    rows: List[SearchRow] = []
+    for node_id, node in tree.items():
+        if not isinstance(node, dict):
+            continue
+        state = node.get("game_state") if isinstance(node.get("game_state"), dict) else {}
+        choices = "\n".join(
+            str(c.get("choice_text") or "") for c in node.get("choices") or [] if isinstance(c, dict)
+        )
+        rows.append((
+            str(node_id),
+            str(node.get("narrative") or ""),
+            choices,
+            str(node.get("scene") or state.get("current_scene") or ""),
+            _flags_text(state.get("flags")),
+        ))
+    return rows
+
+
+def replace_tree_rows(
+    cursor: sqlite3.Cursor,
+    story_id: int,
+    character_id: int,
+    rows: List[SearchRow]
+) -> None:
+    """在当前事务内用 rows 覆盖某棵树的索引"""
+    cursor.execute(
+        f"DELETE FROM {SEARCH_TABLE} WHERE story_id = ? AND character_id = ?",
+        (story_id, character_id)
+    )
+    cursor.executemany(
+        f"INSERT INTO {SEARCH_TABLE} "
+        f"(narrative, choices, scene, flags, story_id, character_id, node_id) "
+        f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(narr, ch, scene, flags, story_id, character_id, node_id)
+         for node_id, narr, ch, scene, flags in rows]
+    )
+
+
+def _phrase(text: str) -> str:
+    """FTS5 短语（双引号转义）"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _like(text: str) -> str:
+    return "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def _snippet(text: str, query: Optional[str]) -> str:
+    if not text:
+        return ""
+    pos = text.find(query) if query else -1
+    if pos < 0:
+        return text[:_SNIPPET_CHARS * 2] + ("…" if len(text) > _SNIPPET_CHARS * 2 else "")
+    start = max(0, pos - _SNIPPET_CHARS)
+    end = min(len(text), pos + len(query) + _SNIPPET_CHARS)
+    return ("…" if start else "") + text[start:end] + ("…" if end < len(text) else "")
+
+
+def search(
+    conn: sqlite3.Connection,
+    text: Optional[str] = None,
+    scene: Optional[str] = None,
+    flag: Optional[str] = None,
+    story_id: Optional[int] = None,
+    character_id: Optional[int] = None,
+    limit: int = 50
+) -> List[NodeSearchHit]:
+    """
+    检索节点（条件之间为 AND）
+
+    Args:
+        conn: 数据库连接
+        text: 叙事或选项文本中包含的子串
+        scene: 场景 ID（精确匹配）
+        flag: 为真的标志位名（精确匹配）
+        story_id / character_id: 限定范围
+        limit: 最多返回条数
+
+    Returns:
+        命中节点（有 text 且可用全文匹配时按相关度排序，否则按位置排序）
+
+    Raises:
+        RuntimeError: 索引不可用（SQLite 不支持 FTS5）
+    """
+    tokenizer = search_tokenizer(conn)
+    if tokenizer is None:
+        raise RuntimeError("节点索引不可用：当前 SQLite 未编译 FTS5")
+
+    where: List[str] = []
+    params: List[Any] = []
+    ranked = False
+
+    if text:
+        # trigram 只能匹配 ≥3 个字符的短语；更短或非 trigram 分词时用 LIKE（仍只扫索引表）
+        if tokenizer == "trigram" and len(text) >= 3:
+            where.append(f"{SEARCH_TABLE} MATCH ?")
+            params.append("{narrative choices} : " + _phrase(text))
+            ranked = True
+        else:
+            where.append("(narrative LIKE ? ESCAPE '\\' OR choices LIKE ? ESCAPE '\\')")
+            params.extend([_like(text), _like(text)])
+    if scene:
+        where.append("scene = ?")
+        params.append(scene)
+    if flag:
+        where.append("flags LIKE ? ESCAPE '\\'")
+        params.append(_like(f"|{flag}|"))
+    if story_id is not None:
+        where.append("story_id = ?")
+        params.append(int(story_id))
+    if character_id is not None:
+        where.append("character_id = ?")
+        params.append(int(character_id))
+
+    sql = f"SELECT story_id, character_id, node_id, scene, narrative, choices FROM {SEARCH_TABLE}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY rank" if ranked else " ORDER BY story_id, character_id, node_id"
+    sql += " LIMIT ?"
+    params.append(max(1, int(limit)))
+
+    hits = []
+    for row in conn.execute(sql, params).fetchall():
+        narrative, choices = row[4] or "", row[5] or ""
+        in_choices = bool(text) and text not in narrative and text in choices
+        hits.append(NodeSearchHit(
+            story_id=int(row[0]),
+            character_id=int(row[1]),
+            node_id=row[2],
+            scene=row[3] or "",
+            snippet=_snippet(choices if in_choices else narrative, text),
+        ))
+    return hits
@@ -0,0 +1,113 @@
+"""
+game_state 增量编码
+
+预生成树的每个节点都带完整的 game_state 快照（PR/GR/WF/场景/物品/标记/时间/最近选项……），
+而子节点与父节点通常只差一次 consequences。入库时根节点（及父节点缺失的节点）保留完整快照，
+其余节点只存与父节点的差异：
+
+- game_state_delta：取值变化或新增的键
+- game_state_unset：父节点有、子节点没有的键
+
+加载时可以立即还原整棵树（materialize_all），也可以只在玩家实际走到的节点上按需还原
+（resolve_state：沿 parent_id 向上找到最近的完整快照，再向下逐层应用差异并记到节点上）。
+还原出的快照在父子节点之间共享未变化的值（列表 / 字典），视为只读。
+"""
+
+from typing import Any, Dict, List, Optional
+
+
+DELTA_KEY = "game_state_delta"
+UNSET_KEY = "game_state_unset"
+
+
+def encode_state_deltas(tree: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    完整快照 → 增量（返回新树，节点浅拷贝，不修改原树）
+
+    Args:
+        tree: 对话树（节点带完整 game_state）
+
+    Returns:
+        增量编码后的对话树
+    """
+    out: Dict[str, Any] = {}
+    for node_id, node in tree.items():
+        if not isinstance(node, dict):
+            out[node_id] = node
+            continue
+        state = node.get("game_state")
+        parent = tree.get(node.get("parent_id")) if node.get("parent_id") else None
+        parent_state = parent.get("game_state") if isinstance(parent, dict) else None
+        if not isinstance(state, dict) or not isinstance(parent_state, dict) or parent is node:
+            out[node_id] = node
+            continue
+
+        delta = {k: v for k, v in state.items() if k not in parent_state or parent_state[k] != v}
+        unset = [k for k in parent_state if k not in state]
+
+        encoded = dict(node)
+        del encoded["game_state"]
+        encoded[DELTA_KEY] = delta
+        if unset:
+            encoded[UNSET_KEY] = unset
+        out[node_id] = encoded
+    return out
+
+
+def resolve_state(tree: Dict[str, Any], node_id: str) -> Optional[Dict[str, Any]]:
+    """
+    取节点的完整 game_state，必要时沿路径还原并记到节点上（之后的访问 O(1)）
+
+    Args:
+        tree: 对话树（可为增量编码）
+        node_id: 节点 ID
+
+    Returns:
+        完整 game_state；节点不存在或没有状态时返回 None
+    """
+    node = tree.get(node_id)
+    if not isinstance(node, dict):
+        return None
+    if DELTA_KEY not in node:
+        return node.get("game_state")
+
+    # 向上收集仍是增量的祖先，直到遇到完整快照
+    chain: List[Dict[str, Any]] = []
+    base: Dict[str, Any] = {}
+    current: Optional[Dict[str, Any]] = node
+    seen = set()
+    while isinstance(current, dict) and DELTA_KEY in current:
+        if id(current) in seen:        # 防御：异常数据中的环
+            break
+        seen.add(id(current))
+        chain.append(current)
+        current = tree.get(current.get("parent_id"))
+    if isinstance(current, dict) and isinstance(current.get("game_state"), dict):
+        base = current["game_state"]
+
+    # 自上而下应用差异；先写 game_state 再移除增量键，并发读取时总能看到其一。
+    # 共享树会被多个线程同时还原：先读增量键、再看 game_state，已被其他线程还原的节点直接沿用
+    state = base
+    for item in reversed(chain):
+        delta = item.get(DELTA_KEY)
+        unset = item.get(UNSET_KEY)
+        resolved = item.get("game_state")
+        if isinstance(resolved, dict) or delta is None:
+            state = resolved if isinstance(resolved, dict) else dict(state)
+            continue
+        state = dict(state)
+        state.update(delta)
+        for key in unset or []:
+            state.pop(key, None)
+        item["game_state"] = state
+        item.pop(DELTA_KEY, None)
+        item.pop(UNSET_KEY, None)
+    return node.get("game_state")
+
+
+def materialize_all(tree: Dict[str, Any]) -> Dict[str, Any]:
+    """还原整棵树的完整快照（原地修改并返回）"""
+    for node_id, node in tree.items():
+        if isinstance(node, dict) and DELTA_KEY in node:
+            resolve_state(tree, node_id)
+    return tree
@@ -0,0 +1,258 @@
+"""
+内容寻址文本存储
+
+同一故事的多条角色线、多个故事之间大量复用相同的文本：开场、默认选项
+（TreeBuilder._get_default_choices）、NodeTextFiller 的占位叙事、失败回退文本……
+这里把重复出现的叙事文本与选项集合按内容哈希存入 text_blobs 表，节点只保存哈希引用：
+
+- narrative        → narrative_ref
+- choices          → choices_ref（选项模板，不含 next_node_id）+ choice_next（各选项的 next_node_id）
+
+next_node_id 依赖节点位置，单独按节点保存，模板才能跨节点复用。
+加载时同一哈希在进程内只解码一次（BlobCache），叙事字符串在所有树之间共享同一对象；
+选项按节点浅拷贝（运行时会回填 next_node_id），嵌套的 consequences / preconditions 共享，视为只读。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+KIND_NARRATIVE = "narrative"
+KIND_CHOICES = "choices"
+
+# 超过该字节数的文本块 gzip 压缩后再存
+_COMPRESS_BYTES = 512
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def blob_hash(kind: str, payload: str) -> str:
+    """内容哈希（64 位 blake2b，十六进制 16 位）"""
+    return hashlib.blake2b(f"{kind}\0{payload}".encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _pack(payload: str) -> Tuple[Any, int]:
+    raw = payload.encode("utf-8")
+    if len(raw) > _COMPRESS_BYTES:
+        return gzip.compress(raw), 1
+    return payload, 0
+
+
+def _unpack(kind: str, data: Any, compressed: Any) -> Any:
+    text = gzip.decompress(data).decode("utf-8") if compressed else data
+    if isinstance(text, bytes):
+        text = text.decode("utf-8")
+    if kind == KIND_CHOICES:
+        return tuple(json.loads(text))
+    return text
+
+
+def _node_payloads(node: Dict[str, Any], min_chars: int) -> List[Tuple[str, str, str]]:
+    """节点中可抽出的内容：[(字段, kind, payload)]"""
+    out = []
+    narrative = node.get("narrative")
+    if isinstance(narrative, str) and len(narrative) >= min_chars:
+        out.append(("narrative", KIND_NARRATIVE, narrative))
+    choices = node.get("choices")
+    if isinstance(choices, list) and choices and all(isinstance(c, dict) for c in choices):
+        template = [{k: v for k, v in c.items() if k != "next_node_id"} for c in choices]
+        out.append(("choices", KIND_CHOICES, json.dumps(template, ensure_ascii=False, sort_keys=True)))
+    return out
+
+
+def encode_trees(
+    trees: Dict[str, Dict[str, Any]],
+    known: Optional[Callable[[List[str]], Iterable[str]]] = None,
+    min_chars: Optional[int] = None
+) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Tuple[str, Any, int]]]]:
+    """
+    一批对话树 → (引用化的树, 各树引用的文本块)
+
+    只抽出“共享”的内容：在这批树中出现两次及以上，或已存在于库中（known 返回的哈希）。
+    只出现一次的文本留在树里，随整棵树一起 gzip，压缩率比逐块存储更高。
+
+    Args:
+        trees: {名称: 对话树}（不会被修改）
+        known: hashes → 其中已入库的哈希（可选）
+        min_chars: 叙事文本短于该长度时保留原文（默认取 NARRATIVE_DEDUP_MIN_CHARS，缺省 16）
+
+    Returns:
+        ({名称: skeleton}, {名称: {hash: (kind, data, compressed)}})
+    """
+    if min_chars is None:
+        min_chars = _env_int("NARRATIVE_DEDUP_MIN_CHARS", 16)
+
+    # 1. 统计每个内容在这批树中的出现次数
+    counts: Dict[str, int] = {}
+    for tree in trees.values():
+        for node in tree.values():
+            if not isinstance(node, dict):
+                continue
+            for _field, kind, payload in _node_payloads(node, min_chars):
+                h = blob_hash(kind, payload)
+                counts[h] = counts.get(h, 0) + 1
+
+    shared = {h for h, n in counts.items() if n >= 2}
+    if known is not None:
+        singles = [h for h, n in counts.items() if n < 2]
+        if singles:
+            shared.update(known(singles))
+
+    # 2. 替换共享内容为引用
+    skeletons: Dict[str, Dict[str, Any]] = {}
+    blobs: Dict[str, Dict[str, Tuple[str, Any, int]]] = {}
+    for name, tree in trees.items():
+        skeleton: Dict[str, Any] = {}
+        used: Dict[str, Tuple[str, Any, int]] = {}
+        for node_id, node in tree.items():
+            if not isinstance(node, dict):
+                skeleton[node_id] = node
+                continue
+            out = dict(node)
+            for field_name, kind, payload in _node_payloads(node, min_chars):
+                h = blob_hash(kind, payload)
+                if h not in shared:
+                    continue
+                if h not in used:
+                    used[h] = (kind,) + _pack(payload)
+                del out[field_name]
+                out[f"{field_name}_ref"] = h
+                if field_name == "choices":
+                    nexts = [c.get("next_node_id") for c in node["choices"]]
+                    if any(nexts):
+                        out["choice_next"] = nexts
+            skeleton[node_id] = out
+        skeletons[name] = skeleton
+        blobs[name] = used
+
+    return skeletons, blobs
+
+
+def encode_tree(
+    tree: Dict[str, Any],
+    known: Optional[Callable[[List[str]], Iterable[str]]] = None,
+    min_chars: Optional[int] = None
+) -> Tuple[Dict[str, Any], Dict[str, Tuple[str, Any, int]]]:
+    """单棵树版本的 encode_trees：返回 (skeleton, blobs)"""
+    skeletons, blobs = encode_trees({"": tree}, known=known, min_chars=min_chars)
+    return skeletons[""], blobs[""]
+
+
+def tree_refs(skeleton: Dict[str, Any]) -> List[str]:
+    """引用化的树中用到的全部哈希（去重）"""
+    refs = set()
+    for node in skeleton.values():
+        if isinstance(node, dict):
+            for key in ("narrative_ref", "choices_ref"):
+                if node.get(key):
+                    refs.add(node[key])
+    return list(refs)
+
+
+class BlobCache:
+    """进程内已解码文本块的 LRU 缓存（线程安全）"""
+
+    def __init__(self, capacity: Optional[int] = None):
+        """
+        Args:
+            capacity: 最多缓存的文本块数量（默认取 NARRATIVE_CACHE_SIZE，缺省 50000）
+        """
+        self.capacity = max(1, capacity or _env_int("NARRATIVE_CACHE_SIZE", 50000))
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(
+        self,
+        refs: Iterable[str],
+        fetch: Callable[[List[str]], Iterable[Tuple[str, str, Any, Any]]]
+    ) -> Dict[str, Any]:
+        """
+        批量取出解码后的文本块；缓存未命中的哈希交给 fetch 一次性查询
+
+        Args:
+            refs: 哈希列表
+            fetch: missing_hashes → [(hash, kind, data, compressed), ...]
+
+        Returns:
+            {hash: 解码值}（叙事为 str，选项模板为 tuple[dict]）
+        """
+        found: Dict[str, Any] = {}
+        missing: List[str] = []
+        with self._lock:
+            for h in refs:
+                if h in self._items:
+                    self._items.move_to_end(h)
+                    found[h] = self._items[h]
+                    self.hits += 1
+                else:
+                    missing.append(h)
+                    self.misses += 1
+
+        if missing:
+            decoded = {h: _unpack(kind, data, compressed) for h, kind, data, compressed in fetch(missing)}
+            with self._lock:
+                for h, value in decoded.items():
+                    # 并发加载同一块时保留先入缓存的对象，保证共享
+                    value = self._items.setdefault(h, value)
+                    self._items.move_to_end(h)
+                    found[h] = value
+                while len(self._items) > self.capacity:
+                    self._items.popitem(last=False)
+        return found
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+def hydrate_tree(skeleton: Dict[str, Any], blobs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    引用化的树 → 普通对话树（原地替换节点字段并返回）
+
+    Raises:
+        ValueError: 引用的文本块不存在
+    """
+    for node_id, node in skeleton.items():
+        if not isinstance(node, dict):
+            continue
+
+        ref = node.pop("narrative_ref", None)
+        if ref is not None:
+            if ref not in blobs:
+                raise ValueError(f"文本块缺失：{ref}（节点 {node_id}）")
+            node["narrative"] = blobs[ref]
+
+        ref = node.pop("choices_ref", None)
+        if ref is not None:
+            if ref not in blobs:
+                raise ValueError(f"选项块缺失：{ref}（节点 {node_id}）")
+            nexts = node.pop("choice_next", None) or []
+            choices = []
+            for idx, template in enumerate(blobs[ref]):
+                choice = dict(template)
+                if idx < len(nexts) and nexts[idx]:
+                    choice["next_node_id"] = nexts[idx]
+                choices.append(choice)
+            node["choices"] = choices
+
+    return skeleton
+
+
+# 进程级共享缓存
+BLOB_CACHE = BlobCache()
@@ -9,6 +9,9 @@ from .response import RuntimeResponseGenerator
 from .game_loop import GameEngine
 from .intent import IntentMappingEngine, Intent, ValidationResult
 from .endings import EndingSystem, EndingType, Ending
+from .generator_pool import get_shared_generators, clear_generator_pool
+from .speculation import SpeculativePregenerator, SpeculationResult
+from .lookahead import LookaheadCache
 
 __all__ = [
     "GameState",
@@ -23,5 +26,10 @@ __all__ = [
     "EndingSystem",
     "EndingType",
     "Ending",
+    "get_shared_generators",
+    "clear_generator_pool",
+    "SpeculativePregenerator",
+    "SpeculationResult",
+    "LookaheadCache",
 ]
 
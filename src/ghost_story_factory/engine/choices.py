@@ -23,12 +23,17 @@ except Exception:
             except Exception:
                 return None
         return default
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 from enum import Enum
 from pathlib import Path
 import json
 
 from .state import GameState
+from .prompt_budget import PromptAssembler, PromptSection
+from .json_stream import StreamingChoiceParser
+from .llm_stream import resolve_llm, stream_completion, streaming_available
+from ..utils.story_summary import get_story_summary, scene_slice
+from ..utils.logging_utils import console
 
 
 class ChoiceType(str, Enum):
@@ -149,6 +154,57 @@ class Choice(BaseModel):
         return " | ".join(previews) if previews else ""
 
 
+# 选择点 Prompt 的静态部分：跨调用逐字节一致，置于 prompt 最前以便前缀缓存命中
+CHOICES_STATIC_PREFIX = """你是一个专业的选择点设计师。请根据当前场景、游戏状态和骨架节拍信息，生成 2-4 个高质量选择点。
+
+## 输出要求
+
+1. 严格输出一个 JSON 对象，字段结构如下（scene_id 填写下文“当前状态”中的场景 ID）：
+
+```json
+{
+  "scene_id": "S1",
+  "choices": [
+    {
+      "id": "A",
+      "text": "选项文本",
+      "tags": ["标签1", "标签2"],
+      "immediate_consequences": {
+        "resonance": "+10",
+        "flags": {"flag_name": true}
+      }
+    }
+  ]
+}
+```
+
+2. 生成 2-4 个彼此差异明显的选项，避免只是改写同一种行为。
+3. 若下文给出了“最近一轮已出现的选项”，不要简单重复其中的具体行为或措辞。
+4. 至少提供一个更激进 / 更保守 / 更超自然的分支，用于制造明显分歧。
+5. 选项必须与当前场景和世界规则高度相关，不要无视场景直接跳转到无关地点或事件。
+6. 如果骨架节拍信息中标记“允许结局出现”，至少有 1 个选项应当在后果中显式写出结局 flag，例如：
+   - `"flags": {"结局_白娘子觉醒": true}` 或 `"flags": {"结局_玩家被镇桥": true}`；
+   这类选项通常为 `choice_type: "critical"`，用于在结构上收束当前故事轮回。
+
+[结局与规则]
+- 至少提供 1 个会推进至关键线索或结局的选项（标记为 'critical'）
+- 遵循世界书规则与主线伏笔，避免烂尾
+
+请只输出上述格式的 JSON，不要包含任何解释性文字或额外段落。"""
+
+
+CHOICES_AGENT_BACKSTORY = (
+    "你精通叙事设计和玩家心理学。"
+    "你擅长设计有意义的选择点，让玩家感觉'我在控制剧情'，"
+    "但实际上所有选择都在设计好的框架内。"
+)
+
+CHOICES_RETRY_SUFFIX = "\n\n重要：仅输出一个 JSON 对象，不要任何解释或额外文本。"
+
+# 选择点模型（环境变量, 默认模型）：KIMI_MODEL_CHOICES → KIMI_MODEL → 默认；CrewAI 与流式路径共用
+CHOICES_MODEL = ("KIMI_MODEL_CHOICES", "moonshot-v1-32k")
+
+
 class ChoicePointsGenerator:
     """选择点生成器
 
@@ -181,6 +237,22 @@ class ChoicePointsGenerator:
             int(os.getenv("KIMI_CONCURRENCY_CHOICES", os.getenv("KIMI_CONCURRENCY", "4")))
         )
 
+        # Prompt 预算：静态指令在前（跨调用逐字节一致），动态段落按优先级裁剪
+        self._assembler = PromptAssembler(
+            "choices",
+            int(os.getenv("PROMPT_BUDGET_CHOICES", "3000")),
+            static_prefix=CHOICES_STATIC_PREFIX,
+        )
+        # 生成器可能被多个构建器线程共享（见 generator_pool），LLM 实例延迟创建需加锁
+        self._llm_lock = threading.Lock()
+
+        # 流式输出 + 增量 JSON 解析（需要 openai SDK 与 API 密钥，不可用时走 CrewAI 路径）
+        self._streaming = os.getenv("CHOICE_STREAMING", "1") == "1"
+
+        # 分层摘要：只附带当前节拍所在幕 / 场景的主线摘要切片；场景锚点使用 GDD 摘要切片
+        self._use_summaries = os.getenv("STORY_SUMMARIES", "1") == "1"
+        self._story_slices: Dict[Any, str] = {}
+
         # JSON 解析遥测计数（仅用于诊断选择点质量问题，不影响运行逻辑）
         self._json_total_calls: int = 0
         self._json_ok_first_try: int = 0
@@ -321,6 +393,7 @@ class ChoicePointsGenerator:
         is_critical_beat: Optional[bool] = None,
         beat_leads_to_ending: Optional[bool] = None,
         recent_choices: Optional[List[str]] = None,
+        act_index: Optional[int] = None,
     ) -> List[Choice]:
         """生成选择点
 
@@ -328,6 +401,7 @@ class ChoicePointsGenerator:
             current_scene: 当前场景 ID，如 "S3"
             game_state: 当前游戏状态
             narrative_context: 当前叙事上下文（可选），由 RuntimeResponseGenerator 提供
+            act_index: 当前节拍所在幕（骨架 act_index，可选），用于选取主线摘要切片
 
         Returns:
             List[Choice]: 选择点列表
@@ -335,7 +409,7 @@ class ChoicePointsGenerator:
         # 如果在本轮生成过程中已经判定 LLM 不可靠，则直接退回默认选项，
         # 避免在后续节点上反复触发相同的上游错误。
         if self._llm_disabled_for_choices:
-            print("⚠️  选择点 LLM 已在本轮中禁用，使用默认选择点。")
+            console("⚠️  选择点 LLM 已在本轮中禁用，使用默认选择点。")
             return self._get_default_choices(current_scene)
 
         # 延迟导入 CrewAI（避免基础功能依赖）
@@ -343,7 +417,7 @@ class ChoicePointsGenerator:
             from crewai import Agent, Task, Crew, LLM
             import os
         except ImportError:
-            print("⚠️  CrewAI 未安装，无法生成选择点，返回默认选择点")
+            console("⚠️  CrewAI 未安装，无法生成选择点，返回默认选择点")
             return self._get_default_choices(current_scene)
 
         # 本次调用的原始 LLM 输出，用于错误时日志记录
@@ -352,7 +426,7 @@ class ChoicePointsGenerator:
         try:
             # 复用 Kimi LLM 实例（选择点生成专用模型）
             llm = self._get_llm()
-            print(f"🤖 [选择点] 使用模型: {self._kimi_model_choices}")
+            console(f"🤖 [选择点] 使用模型: {self._kimi_model_choices}")
 
             # 构建 prompt（使用场景记忆缓存/RAG锚点 + 骨架节拍信息 + 最近一轮选择，避免重复）
             prompt = self._build_prompt(
@@ -364,49 +438,46 @@ class ChoicePointsGenerator:
                 is_critical_beat=is_critical_beat,
                 beat_leads_to_ending=beat_leads_to_ending,
                 recent_choices=recent_choices,
+                act_index=act_index,
             )
-            # 在 prompt 尾部加入结局引导与世界书约束，提升通向结局的倾向
-            endings_hint = (
-                "\n\n[结局与规则]\n"
-                "- 至少提供 1 个会推进至关键线索或结局的选项（标记为 'critical'）\n"
-                "- 遵循世界书规则与主线伏笔，避免烂尾\n"
-            )
-            prompt = prompt + endings_hint
-
-            # 创建 Agent（使用 Kimi LLM）
-            agent = Agent(
-                role="选择点设计师",
-                goal="生成符合场景的选择点，引导玩家在框架内做出选择",
-                backstory=(
-                    "你精通叙事设计和玩家心理学。"
-                    "你擅长设计有意义的选择点，让玩家感觉'我在控制剧情'，"
-                    "但实际上所有选择都在设计好的框架内。"
-                ),
-                verbose=False,
-                allow_delegation=False,
-                llm=llm,  # 使用 Kimi LLM
-            )
+            choices_data: Optional[Dict] = None
+            if self._streaming and streaming_available():
+                # 流式：选项对象闭合即校验，输出明显畸形时提前中断并重试
+                try:
+                    result_text, choices_data = self._stream_choices(prompt, retry_suffix=CHOICES_RETRY_SUFFIX)
+                except Exception as e_stream:
+                    self._streaming = False
+                    console(f"⚠️  [选择点] 流式调用失败，改用 CrewAI 路径：{e_stream}")
+                    choices_data = None
+
+            if choices_data is None:
+                # 创建 Agent（使用 Kimi LLM）
+                agent = Agent(
+                    role="选择点设计师",
+                    goal="生成符合场景的选择点，引导玩家在框架内做出选择",
+                    backstory=CHOICES_AGENT_BACKSTORY,
+                    verbose=False,
+                    allow_delegation=False,
+                    llm=llm,  # 使用 Kimi LLM
+                )
 
-            # 创建任务
-            task = Task(
-                description=prompt,
-                expected_output="严格的 JSON 对象（仅一段），不要额外文本",
-                agent=agent,
-            )
+                # 创建任务
+                task = Task(
+                    description=prompt,
+                    expected_output="严格的 JSON 对象（仅一段），不要额外文本",
+                    agent=agent,
+                )
 
-            # 执行（带一次重试，二次更严格提示）
-            result_text = self._call_llm_with_retry(
-                agent,
-                task,
-                retry_suffix="\n\n重要：仅输出一个 JSON 对象，不要任何解释或额外文本。",
-            )
+                # 执行（带一次重试，二次更严格提示）；解析结果随调用一并返回，不再重复解析
+                result_text, choices_data = self._call_llm_for_choices(
+                    agent,
+                    task,
+                    retry_suffix=CHOICES_RETRY_SUFFIX,
+                )
 
             # 空响应防护：直接回退到本地默认选择，避免解析报错
             if not result_text or not str(result_text).strip():
                 return self._get_default_choices(current_scene)
-
-            # 解析结果
-            choices_data = self._parse_result(result_text)
             # 标准化所有 choice 字段
             raw_choices = [self._normalize_choice_fields(c) for c in choices_data.get('choices', [])]
 
@@ -506,35 +577,39 @@ class ChoicePointsGenerator:
             except Exception:
                 # 日志记录失败不影响主流程
                 pass
-            print(f"⚠️  选择点生成失败，已回退默认选项: {e}")
+            console(f"⚠️  选择点生成失败，已回退默认选项: {e}")
             return self._get_default_choices(current_scene)
 
     def _get_llm(self):
         """获取（并复用）LLM 实例"""
         if self._llm is not None:
             return self._llm
+        with self._llm_lock:
+            if self._llm is None:
+                self._llm = self._create_llm()
+        return self._llm
 
+    def _create_llm(self):
+        """创建 LLM 实例"""
         from crewai import LLM
-        import os
 
-        kimi_key = os.getenv("KIMI_API_KEY") or os.getenv("MOONSHOT_API_KEY")
-        kimi_base = os.getenv("KIMI_API_BASE", "https://api.moonshot.cn/v1")
-        self._kimi_model_choices = os.getenv("KIMI_MODEL_CHOICES") or os.getenv("KIMI_MODEL", "moonshot-v1-32k")
+        kimi_key, kimi_base, self._kimi_model_choices = resolve_llm(*CHOICES_MODEL)
 
-        self._llm = LLM(
+        return LLM(
             model=self._kimi_model_choices,
             api_key=kimi_key,
             base_url=kimi_base
         )
-        return self._llm
 
     def _get_scene_memory(self, scene: str) -> str:
         """获取场景锚点摘要与规则（缓存）"""
         if scene in self._scene_memory:
             return self._scene_memory[scene]
 
-        # 提取当前场景相关的 GDD 片段（最多 500 字）
-        scene_gdd = self._extract_scene_context(self.gdd, scene, max_chars=500)
+        # 当前场景相关的 GDD：优先取预构建的分层摘要切片，定位不到场景时回退到原文片段（最多 500 字）
+        scene_gdd = (
+            self._use_summaries and scene_slice(self.gdd, scene, max_chars=500)
+        ) or self._extract_scene_context(self.gdd, scene, max_chars=500)
         # 提取核心 Lore 规则（最多 300 字）
         core_lore = self._extract_core_lore(self.lore, max_chars=300)
 
@@ -544,31 +619,106 @@ class ChoicePointsGenerator:
         self._scene_memory[scene] = memory
         return memory
 
+    def _get_story_slice(self, scene: str, act_index: Optional[int] = None) -> str:
+        """当前节拍对应的主线摘要切片（缓存）"""
+        if not (self._use_summaries and self.main_story):
+            return ""
+        key = (scene, act_index)
+        if key not in self._story_slices:
+            self._story_slices[key] = get_story_summary(self.main_story).slice_for(
+                scene, act_index=act_index, max_chars=500
+            )
+        return self._story_slices[key]
+
     def _call_llm_with_retry(self, agent, task, retry_suffix: str = "", max_retries: int = 1) -> str:
-        """执行 LLM 任务，失败后附加严格提示进行一次重试"""
+        """执行 LLM 任务，失败后附加严格提示进行一次重试（只返回文本）"""
+        return self._call_llm_for_choices(agent, task, retry_suffix, max_retries)[0]
+
+    def _call_llm_for_choices(self, agent, task, retry_suffix: str = "", max_retries: int = 1) -> Tuple[str, Dict]:
+        """执行 LLM 任务并解析：未解析出任何选项时附加严格提示重试
+
+        Returns:
+            (原始输出文本, 解析结果)，每次输出只解析一次
+        """
         from crewai import Crew, Task
-        # 首次
-        crew = Crew(agents=[agent], tasks=[task], verbose=False)
-        with self._sem:
-            result = crew.kickoff()
-        text = self._extract_llm_text(result)
-        # 解析试探（不计入 JSON 遥测，只用于判断是否需要重试）
+
+        text, data = "", {"scene_id": "unknown", "choices": []}
+        for attempt in range(max(0, max_retries) + 1):
+            if attempt == 0:
+                current_task = task
+            else:
+                # 重试，附加更严格的输出要求
+                current_task = Task(
+                    description=task.description + (retry_suffix or ""),
+                    expected_output="严格 JSON（仅一个对象）",
+                    agent=agent
+                )
+            crew = Crew(agents=[agent], tasks=[current_task], verbose=False)
+            with self._sem:
+                result = crew.kickoff()
+            text = self._extract_llm_text(result)
+            if not text or not str(text).strip():
+                continue
+            data = self._parse_result(text)
+            if data.get("choices"):
+                break
+        return text, data
+
+    def _stream_choices(self, prompt: str, retry_suffix: str = "", max_retries: int = 1) -> Tuple[str, Dict]:
+        """流式生成选择点：边接收边解析，畸形输出提前中断并重试
+
+        Returns:
+            (原始输出文本, 解析结果)
+        """
+        system = f"你是一名选择点设计师。{CHOICES_AGENT_BACKSTORY}"
+        text, data = "", {"scene_id": "unknown", "choices": []}
+        for attempt in range(max(0, max_retries) + 1):
+            parser = StreamingChoiceParser(validator=self._validate_choice)
+            full_prompt = prompt if attempt == 0 else prompt + (retry_suffix or "")
+            stream = stream_completion(full_prompt, system=system, model_env=CHOICES_MODEL[0], default_model=CHOICES_MODEL[1])
+            try:
+                with self._sem:
+                    for chunk in stream:
+                        parser.feed(chunk)
+                        # 顶层对象闭合后不再等待尾随文本；畸形输出立即中断
+                        if parser.complete or parser.aborted:
+                            break
+            finally:
+                stream.close()
+
+            text = parser.text
+            if parser.aborted:
+                console(f"⚠️  [选择点] 输出畸形，提前中断（{parser.abort_reason}）")
+                self._record_parse_metrics(parser)
+                continue
+            if parser.choices:
+                self._record_parse_metrics(parser)
+                data = self._normalize_format(parser.result())
+                break
+            # 未识别出 choices 数组（如单对象格式）：交给完整的容错解析
+            data = self._parse_result(text)
+            if data.get("choices"):
+                break
+        return text, data
+
+    def _validate_choice(self, obj: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """按 Choice 模型校验单个选项，返回规范化后的字段；无效时返回 None"""
+        normalized = self._normalize_choice_fields(obj)
         try:
-            _ = self._parse_result(text, record_metrics=False)
-            return text
+            Choice(**normalized)
         except Exception:
-            if max_retries <= 0:
-                return text
-        # 重试一次，附加更严格的输出要求
-        strict_task = Task(
-            description=task.description + (retry_suffix or ""),
-            expected_output="严格 JSON（仅一个对象）",
-            agent=agent
-        )
-        crew2 = Crew(agents=[agent], tasks=[strict_task], verbose=False)
-        with self._sem:
-            result2 = crew2.kickoff()
-        return self._extract_llm_text(result2)
+            return None
+        return normalized
+
+    def _record_parse_metrics(self, parser: StreamingChoiceParser) -> None:
+        """按增量解析结果更新 JSON 遥测"""
+        self._json_total_calls += 1
+        if parser.choices and parser.complete and parser.invalid == 0:
+            self._json_ok_first_try += 1
+        elif parser.choices:
+            self._json_salvaged += 1
+        else:
+            self._json_failures += 1
 
     def _build_prompt(
         self,
@@ -580,11 +730,13 @@ class ChoicePointsGenerator:
         is_critical_beat: Optional[bool] = None,
         beat_leads_to_ending: Optional[bool] = None,
         recent_choices: Optional[List[str]] = None,
+        act_index: Optional[int] = None,
     ) -> str:
         """构建完整的 prompt（只发送相关内容 + 骨架节拍 + 去重复约束）"""
         context = narrative_context or "玩家刚进入该场景。"
         # 使用场景记忆（RAG 锚点）
         scene_memory = self._get_scene_memory(current_scene)
+        story_slice = self._get_story_slice(current_scene, act_index)
 
         # 骨架节拍信息：提示当前节拍的叙事职责
         beat_lines: List[str] = []
@@ -622,55 +774,21 @@ class ChoicePointsGenerator:
 
         inventory_str = ", ".join(game_state.inventory[:3]) if game_state.inventory else "无"
 
-        return f"""
-你是一个专业的选择点设计师。请根据当前场景、游戏状态和骨架节拍信息，生成 2-4 个高质量选择点。
-
-## 当前状态
+        state_block = f"""## 当前状态
 
 **场景**: {current_scene}
-**上下文**: {context}
 **PR**: {game_state.PR}/100 | **时间**: {game_state.timestamp}
-**道具**: {inventory_str}
-
-## 骨架节拍信息
-{beat_block}
-
-## 场景锚点与规则（缓存）
-
-{scene_memory}
-{recent_block}
-
-## 输出要求
-
-1. 严格输出一个 JSON 对象，字段结构如下：
-
-```json
-{{
-  "scene_id": "{current_scene}",
-  "choices": [
-    {{
-      "id": "A",
-      "text": "选项文本",
-      "tags": ["标签1", "标签2"],
-      "immediate_consequences": {{
-        "resonance": "+10",
-        "flags": {{"flag_name": true}}
-      }}
-    }}
-  ]
-}}
-```
-
-2. 生成 2-4 个彼此差异明显的选项，避免只是改写同一种行为。
-3. 若上文给出了“最近一轮已出现的选项”，不要简单重复其中的具体行为或措辞。
-4. 至少提供一个更激进 / 更保守 / 更超自然的分支，用于制造明显分歧。
-5. 选项必须与当前场景和世界规则高度相关，不要无视场景直接跳转到无关地点或事件。
-6. 如果骨架节拍信息中标记“允许结局出现”，至少有 1 个选项应当在后果中显式写出结局 flag，例如：
-   - `"flags": {"结局_白娘子觉醒": true}` 或 `"flags": {"结局_玩家被镇桥": true}`；
-   这类选项通常为 `choice_type: "critical"`，用于在结构上收束当前故事轮回。
-
-请只输出上述格式的 JSON，不要包含任何解释性文字或额外段落。
-"""
+**道具**: {inventory_str}"""
+
+        # 优先级：状态（必保留）> 节拍 > 最近选项 > 场景锚点 > 叙事上下文 > 主线摘要切片
+        return self._assembler.assemble([
+            PromptSection("state", state_block, priority=0, required=True),
+            PromptSection("narrative_context", f"**上下文**: {context}", priority=4),
+            PromptSection("beat", f"## 骨架节拍信息\n{beat_block}", priority=1),
+            PromptSection("scene_memory", f"## 场景锚点与规则（缓存）\n\n{scene_memory}", priority=3),
+            PromptSection("recent_choices", recent_block.strip(), priority=2),
+            PromptSection("story_slice", f"## 主线摘要（当前节拍）\n{story_slice}" if story_slice else "", priority=5),
+        ])
 
     def _extract_scene_context(self, gdd: str, scene: str, max_chars: int = 500) -> str:
         """提取当前场景相关的 GDD 片段
@@ -683,24 +801,10 @@ class ChoicePointsGenerator:
         Returns:
             str: 场景相关的 GDD 片段
         """
-        # 简单实现：查找包含场景 ID 的段落
-        lines = gdd.split('\n')
-        relevant_lines = []
-        in_relevant_section = False
-
-        for i, line in enumerate(lines):
-            # 如果找到场景标题
-            if scene.lower() in line.lower() or f"场景{scene[1:]}" in line:
-                in_relevant_section = True
-                relevant_lines.append(line)
-                # 收集后续行
-                for j in range(i + 1, min(i + 20, len(lines))):
-                    if lines[j].strip().startswith('#') and lines[j].strip() != line.strip():
-                        break  # 遇到下一个标题
-                    relevant_lines.append(lines[j])
-                break
+        # 使用预构建的文档索引定位场景段落（同一文档只解析一次）
+        from ..utils.doc_index import get_document_index
 
-        result = '\n'.join(relevant_lines)[:max_chars]
+        result = get_document_index(gdd).scene_section(scene, max_lines=20)[:max_chars]
         return result if result else f"场景 {scene}（无详细信息）"
 
     def _extract_core_lore(self, lore: str, max_chars: int = 300) -> str:
@@ -713,17 +817,10 @@ class ChoicePointsGenerator:
         Returns:
             str: 核心规则摘要
         """
-        # 简单实现：提取前几段或关键规则
-        lines = lore.split('\n')
-        core_lines = []
-
-        # 收集包含"规则"、"核心"、"必须"等关键词的行
-        keywords = ['规则', '核心', '必须', '不可', '禁止', '世界观', 'PR', 'GR']
-        for line in lines[:50]:  # 只看前 50 行
-            if any(kw in line for kw in keywords):
-                core_lines.append(line)
-                if len('\n'.join(core_lines)) > max_chars:
-                    break
+        # 收集前 50 行中包含"规则"、"核心"、"必须"等关键词的行（关键词 → 行号索引预先构建）
+        from ..utils.doc_index import get_document_index
+
+        core_lines = get_document_index(lore).rule_lines(within_lines=50, max_chars=max_chars)
 
         result = '\n'.join(core_lines)[:max_chars]
         return result if result else "恐怖氛围游戏，注重细节和心理描写。"
@@ -737,6 +834,18 @@ class ChoicePointsGenerator:
         Returns:
             Dict: 解析后的数据（标准格式）
         """
+        # 快速路径：单遍增量解析（与流式调用共用），识别出 choices 数组即返回
+        parser = StreamingChoiceParser(validator=self._validate_choice, max_preamble=len(result_text or ""))
+        parser.feed(result_text or "")
+        if parser.choices:
+            if record_metrics:
+                self._record_parse_metrics(parser)
+            return self._normalize_format(parser.result())
+
+        return self._parse_result_fallback(result_text, record_metrics)
+
+    def _parse_result_fallback(self, result_text: str, record_metrics: bool = True) -> Dict:
+        """完整的容错解析（正则修复 → raw_decode → 逐个挽救），处理非标准结构"""
         import re
 
         if record_metrics:
@@ -809,8 +918,8 @@ class ChoicePointsGenerator:
             return self._normalize_format(data)
         except json.JSONDecodeError as e:
             # 如果解析失败，尝试修复常见问题
-            print(f"⚠️  首次JSON解析失败: {e}")
-            print(f"📄 原始文本前500字符:\n{result_text[:500]}")
+            console(f"⚠️  首次JSON解析失败: {e}")
+            console(f"📄 原始文本前500字符:\n{result_text[:500]}")
 
             # 尝试修复：移除注释 / 修复尾随逗号
             result_text = re.sub(r'//.*?\n', '\n', result_text)
@@ -822,12 +931,12 @@ class ChoicePointsGenerator:
                 # 使用 JSONDecoder 的 raw_decode 只解析第一个对象
                 decoder = json.JSONDecoder()
                 data, idx = decoder.raw_decode(result_text)
-                print("✅ 使用 raw_decode 成功解析（忽略了后续数据）")
+                console("✅ 使用 raw_decode 成功解析（忽略了后续数据）")
                 if record_metrics:
                     self._json_ok_after_fix += 1
                 return self._normalize_format(data)
             except json.JSONDecodeError as e2:
-                print(f"❌ 二次JSON解析仍然失败: {e2}")
+                console(f"❌ 二次JSON解析仍然失败: {e2}")
 
                 # 最后尝试：从 choices 数组中尽量提取前几个完整选项，构造最小可用结构
                 try:
@@ -872,7 +981,7 @@ class ChoicePointsGenerator:
                             i = j
 
                     if salvaged_choices:
-                        print(f"✅ 从损坏 JSON 中成功挽救 {len(salvaged_choices)} 个 choices")
+                        console(f"✅ 从损坏 JSON 中成功挽救 {len(salvaged_choices)} 个 choices")
                         if record_metrics:
                             self._json_salvaged += 1
                         # 简单提取 scene_id（若存在）
@@ -947,7 +1056,7 @@ class ChoicePointsGenerator:
             }
 
         # 实在没办法，原样返回
-        print(f"⚠️  无法识别的JSON格式，使用原始数据")
+        console(f"⚠️  无法识别的JSON格式，使用原始数据")
         return data
 
     def _normalize_choice_fields(self, choice: Dict) -> Dict:
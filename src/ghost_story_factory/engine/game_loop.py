@@ -12,15 +12,18 @@
 """
 
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
 import json
 import time
 import threading
 from concurrent.futures import ThreadPoolExecutor, Future
 
 from .state import GameState
+from .save_format import AutosaveJournal, SaveGame, read_save, write_save
 from .choices import Choice, ChoiceType, ChoicePointsGenerator
 from .response import RuntimeResponseGenerator
+from .speculation import SpeculativePregenerator
+from .lookahead import LookaheadCache
 
 # 预生成模式导入（延迟导入以避免循环依赖）
 try:
@@ -43,7 +46,9 @@ class GameEngine:
         lore_path: Optional[str] = None,
         main_story_path: Optional[str] = None,
         save_dir: str = "saves",
-        dialogue_loader: Optional['DialogueTreeLoader'] = None
+        dialogue_loader: Optional['DialogueTreeLoader'] = None,
+        cli: Optional['GameCLI'] = None,
+        hybrid: Optional[bool] = None
     ):
         """初始化游戏引擎
 
@@ -54,8 +59,11 @@ class GameEngine:
             main_story_path: 主线故事文件路径（可选，用于会话级缓存）
             save_dir: 存档目录
             dialogue_loader: 对话树加载器（如果提供，则使用预生成模式）
+            cli: 命令行界面（可选，提供时实时模式的流式响应由其渲染）
+            hybrid: 混合模式（预生成模式下缺失分支实时生成并回写；默认读取 HYBRID_MODE）
         """
         self.city = city
+        self.cli = cli
         self.save_dir = Path(save_dir)
         self.save_dir.mkdir(exist_ok=True)
 
@@ -67,6 +75,7 @@ class GameEngine:
             # 预生成模式：从对话树读取，零等待
             print("🎮 [预生成模式] 已加载对话树，零等待游戏体验！")
             self.current_node_id = "root"  # 当前对话节点
+            self.node_path: List[str] = []  # 走过的节点（不含当前节点）
 
             # 预生成模式不需要这些资源
             self.gdd = ""
@@ -74,6 +83,21 @@ class GameEngine:
             self.main_story = ""
             self.choice_generator = None
             self.response_generator = None
+            self.backfiller = None
+
+            import os
+            if hybrid is None:
+                hybrid = os.getenv("HYBRID_MODE", "0") == "1"
+            if hybrid:
+                self._enable_hybrid(gdd_path, lore_path, main_story_path)
+
+            # 自动存档日志：每回合追加一条小记录，中断后可从上次的位置继续
+            self.autosave: Optional[AutosaveJournal] = None
+            if os.getenv("AUTOSAVE", "1") == "1":
+                loader = self.dialogue_loader
+                self.autosave = AutosaveJournal(
+                    self.save_dir / f"autosave_story{loader.story_id}_char{loader.character_id}.journal"
+                )
         else:
             # 实时模式：使用 LLM 生成
             print("🎮 [实时模式] 使用 LLM 即时生成内容")
@@ -103,6 +127,92 @@ class GameEngine:
             self.executor = ThreadPoolExecutor(max_workers=1)
             self.story_initialized = False
 
+            # 流式响应：文本到达即显示，玩家感知的是首 token 延迟而不是整段生成时间
+            import os
+            self.stream_responses = os.getenv("REALTIME_STREAMING", "1") == "1"
+            self.response_latencies: List[Dict[str, float]] = []
+
+            # 投机预生成：玩家阅读选项时为前 K 个选项预先生成响应与下一批选择点；
+            # LOOKAHEAD_DEPTH >= 2 时维护多步前瞻树（LookaheadCache），否则只看一步
+            self.speculator = None
+            if os.getenv("SPECULATION", "1") == "1":
+                try:
+                    top_k = int(os.getenv("SPECULATION_TOP_K", "2"))
+                    max_calls = int(os.getenv("SPECULATION_MAX_CALLS", "24"))
+                    depth = int(os.getenv("LOOKAHEAD_DEPTH", "2"))
+                    capacity = int(os.getenv("LOOKAHEAD_CAPACITY", "16"))
+                    workers = int(os.getenv("LOOKAHEAD_WORKERS", "2"))
+                except Exception:
+                    top_k, max_calls, depth, capacity, workers = 2, 24, 2, 16, 2
+                if top_k > 0 and max_calls > 0:
+                    if depth >= 2:
+                        self.speculator = LookaheadCache(
+                            self.response_generator,
+                            self.choice_generator,
+                            depth=depth,
+                            top_k=top_k,
+                            max_calls=max_calls,
+                            capacity=capacity,
+                            workers=workers,
+                        )
+                    else:
+                        self.speculator = SpeculativePregenerator(
+                            self.response_generator,
+                            self.choice_generator,
+                            top_k=top_k,
+                            max_calls=max_calls,
+                        )
+
+    def _enable_hybrid(
+        self,
+        gdd_path: Optional[str],
+        lore_path: Optional[str],
+        main_story_path: Optional[str]
+    ) -> None:
+        """混合模式：为对话树加载器挂接缺失分支补全器
+
+        缺失分支不再落入 missing_branch 占位结局，而是实时生成并在后台写回数据库。
+        """
+        import os
+        from ..runtime.branch_backfill import BranchBackfiller
+
+        loader = self.dialogue_loader
+        if getattr(loader, "backfiller", None) is not None:
+            self.backfiller = loader.backfiller
+            return
+
+        self.gdd = self._load_gdd(gdd_path)
+        self.lore = self._load_lore(lore_path)
+        self.main_story = self._load_main_story(main_story_path)
+        self.choice_generator = ChoicePointsGenerator(self.gdd, self.lore, self.main_story)
+        self.response_generator = RuntimeResponseGenerator(self.gdd, self.lore, self.main_story)
+
+        try:
+            max_depth = int(os.getenv("HYBRID_MAX_DEPTH", "0")) or None
+        except Exception:
+            max_depth = None
+
+        self.backfiller = BranchBackfiller(
+            loader.db.db_path,
+            loader.story_id,
+            loader.character_id,
+            self.response_generator,
+            self.choice_generator,
+            max_depth=max_depth,
+        )
+        loader.backfiller = self.backfiller
+        print("🧩 [混合模式] 缺失分支将实时生成，并在后台写回对话树")
+
+    def _close_backfiller(self) -> None:
+        """等待缺失分支写回完成（混合模式）"""
+        backfiller = getattr(self, "backfiller", None)
+        if backfiller is None:
+            return
+        backfiller.close()
+        stats = backfiller.stats
+        if stats["generated"]:
+            print(f"🧩 [混合模式] 实时补全 {stats['generated']} 个分支，写回 {stats['written']} 个节点")
+
     def _load_gdd(self, gdd_path: Optional[str]) -> str:
         """加载 GDD 文件
 
@@ -295,7 +405,10 @@ class GameEngine:
         """
         # 🎮 根据模式选择不同的主循环
         if self.mode == "pregenerated":
-            return self.run_pregenerated()
+            try:
+                return self.run_pregenerated()
+            finally:
+                self._close_backfiller()
         else:
             return self.run_realtime()
 
@@ -310,6 +423,8 @@ class GameEngine:
         print(f"\n🎭 开始游戏：{self.city}\n")
         print(self._get_title_screen())
 
+        self._start_autosave()
+
         # 显示开场叙事（从对话树读取）
         opening_narrative = self.dialogue_loader.get_narrative(self.current_node_id)
         print(f"\n{opening_narrative}\n")
@@ -327,6 +442,8 @@ class GameEngine:
                     print("🎬 故事结束")
                     print("=" * 70)
                     self.is_running = False
+                    if self.autosave is not None:
+                        self.autosave.discard()
                     break
 
                 # 转换为 Choice 对象（简化版）
@@ -347,7 +464,11 @@ class GameEngine:
                     print("\n❌ 无效的选择")
                     continue
 
+                if next_node_id != self.current_node_id:
+                    self.node_path.append(self.current_node_id)
                 self.current_node_id = next_node_id
+                self._sync_node_state(selected_choice.choice_id)
+                self._autosave_turn(selected_choice.choice_id)
 
                 # 4. 显示下一个节点的叙事
                 narrative = self.dialogue_loader.get_narrative(self.current_node_id)
@@ -367,6 +488,62 @@ class GameEngine:
 
         return "ending_reached"
 
+    def _sync_node_state(self, choice_id: str) -> None:
+        """预生成模式：以当前节点记录的游戏状态更新 self.state（树中用 time，GameState 用 timestamp）"""
+        node = self.dialogue_loader.get_node(self.current_node_id) or {}
+        for key, value in (node.get("game_state") or {}).items():
+            if key == "time":
+                self.state.timestamp = value
+            elif key != "consequence_tree" and hasattr(self.state, key):
+                setattr(self.state, key, value)
+        self.state.consequence_tree.append(choice_id)
+
+    def _start_autosave(self) -> None:
+        """预生成模式：发现上次未完成的自动存档时询问是否继续，然后开始记录"""
+        if self.autosave is None:
+            return
+        try:
+            save = AutosaveJournal.restore(self.autosave.path)
+            if save is not None and save.node_id and save.node_id != "root" \
+                    and self.dialogue_loader.get_node(save.node_id) is not None:
+                try:
+                    answer = input(f"\n💾 发现未完成的进度（已做出 {len(save.state.consequence_tree)} 次选择），是否继续？(y/n): ")
+                except EOFError:
+                    answer = "n"
+                if answer.strip().lower() == "y":
+                    self._restore_save(save)
+                    print("✅ 已恢复自动存档")
+            self.autosave.start(self._current_save())
+        except Exception as e:
+            print(f"⚠️  自动存档不可用：{e}")
+            self.autosave = None
+
+    def _autosave_turn(self, choice_id: str) -> None:
+        """预生成模式：记录一回合（失败只提示，不影响游戏）"""
+        if self.autosave is None:
+            return
+        try:
+            self.autosave.record_turn(self.current_node_id, self.state, choice_id)
+        except Exception as e:
+            print(f"⚠️  自动存档失败：{e}")
+            self.autosave = None
+
+    def _current_save(self) -> SaveGame:
+        save = SaveGame(state=self.state)
+        if self.mode == "pregenerated":
+            save.node_id = self.current_node_id
+            save.path = list(self.node_path)
+            save.story_id = self.dialogue_loader.story_id
+            save.character_id = self.dialogue_loader.character_id
+        return save
+
+    def _restore_save(self, save: SaveGame) -> None:
+        self.state = save.state
+        if self.mode == "pregenerated" and save.node_id:
+            self.current_node_id = save.node_id
+            self.node_path = list(save.path)
+            self.dialogue_loader.current_node_id = save.node_id
+
     def _convert_choices(self, choices_data: List[Dict[str, Any]]) -> List[Choice]:
         """将对话树中的选择数据转换为 Choice 对象
 
@@ -425,6 +602,10 @@ class GameEngine:
                 # 1. 获取当前场景的选择点（使用预加载优化）
                 self.current_choices = self._get_choices()
 
+                # 🚀 玩家阅读选项时，后台为前 K 个选项投机生成响应
+                if self.speculator is not None:
+                    self.speculator.speculate(self.current_choices, self.state)
+
                 # 2. 显示选择点并获取玩家输入
                 selected_choice = self._prompt_player(self.current_choices)
 
@@ -433,23 +614,17 @@ class GameEngine:
                     self.is_running = False
                     return "player_quit"
 
-                # 3. 生成响应并更新状态
-                print("\n" + "═" * 70)
-                print("✍️  Kimi AI 正在根据你的选择创作剧情...")
-                print("═" * 70)
-                print("💭 思考中：分析你的选择 → 推进剧情 → 营造氛围...")
-                print()
-
-                response = self.response_generator.generate_response(
-                    selected_choice,
-                    self.state,
-                    apply_consequences=True
-                )
-
-                print("✅ 剧情生成完成！\n")
+                # 3. 领取投机结果（命中则本回合零等待），否则生成响应并更新状态
+                speculated = self._take_speculated(selected_choice)
 
-                # 4. 显示响应
-                self._display_response(response)
+                if speculated is not None:
+                    print("\n⚡ 命中预生成剧情（无需等待）")
+                    self.state = speculated.state
+                    if speculated.choices is not None:
+                        self.preloaded_choices = speculated.choices
+                    self._display_response(speculated.response)
+                else:
+                    self._generate_and_display_response(selected_choice)
 
                 # 5. 显示当前状态
                 self._display_state()
@@ -457,8 +632,8 @@ class GameEngine:
                 # 6. 检查是否需要切换场景
                 self._check_scene_transition()
 
-                # 7. 🚀 启动后台预加载下一批选择点（用户读文本时AI在后台工作）
-                if self.preload_enabled and self.is_running:
+                # 7. 🚀 启动后台预加载下一批选择点（投机命中时已随响应一起生成）
+                if self.preload_enabled and self.is_running and self.preloaded_choices is None:
                     self.preload_future = self.executor.submit(self._preload_choices_async)
 
                 # 更新最后行动时间
@@ -485,8 +660,62 @@ class GameEngine:
         ending_type = self._show_ending()
         return ending_type
 
+    def _take_speculated(self, selected_choice: Choice):
+        """领取所选选项的投机 / 前瞻结果
+
+        流式响应开启时，仍在生成中的分支视为未命中：等它整段生成完（响应 + 下一批选择点）
+        比现场边生成边显示更慢；关闭流式时等待进行中的分支仍比从头生成快。
+
+        Returns:
+            SpeculationResult；未启用投机或未命中时返回 None
+        """
+        if self.speculator is None:
+            return None
+        return self.speculator.take(selected_choice, self.state, wait=not self.stream_responses)
+
+    def _generate_and_display_response(self, selected_choice: Choice) -> None:
+        """生成玩家选择的响应（应用后果到 self.state）并显示
+
+        Args:
+            selected_choice: 玩家选定的选项
+        """
+        print("\n" + "═" * 70)
+        print("✍️  Kimi AI 正在根据你的选择创作剧情...")
+        print("═" * 70)
+        print("💭 思考中：分析你的选择 → 推进剧情 → 营造氛围...")
+        print()
+
+        if self.stream_responses:
+            # 4. 边生成边显示响应（系统提示在补全结束后追加）
+            self._display_response_stream(
+                self.response_generator.stream_response(
+                    selected_choice,
+                    self.state,
+                    apply_consequences=True
+                )
+            )
+        else:
+            response = self.response_generator.generate_response(
+                selected_choice,
+                self.state,
+                apply_consequences=True
+            )
+
+            print("✅ 剧情生成完成！\n")
+
+            # 4. 显示响应
+            self._display_response(response)
+
     def _cleanup(self) -> None:
         """清理资源（关闭线程池等）"""
+        speculator = getattr(self, 'speculator', None)
+        if speculator is not None:
+            speculator.shutdown()
+            stats = speculator.get_stats()
+            print(
+                f"⚡ [投机] 命中 {stats['hits']}/{stats['hits'] + stats['misses']}，"
+                f"LLM 调用 {stats['calls']}/{stats['max_calls']}"
+            )
         if hasattr(self, 'executor'):
             self.executor.shutdown(wait=False)
             print("🧹 后台任务已清理")
@@ -758,6 +987,40 @@ class GameEngine:
         print(response)
         print("\n" + "━" * 70)
 
+    def _display_response_stream(self, chunks: Iterable[str]) -> str:
+        """边生成边显示叙事响应，并记录首 token 延迟与总耗时
+
+        Args:
+            chunks: 响应文本片段迭代器
+
+        Returns:
+            str: 完整响应文本
+        """
+        started = time.time()
+        timing: Dict[str, float] = {}
+
+        def _timed():
+            for chunk in chunks:
+                if chunk and "first_token" not in timing:
+                    timing["first_token"] = time.time() - started
+                yield chunk
+
+        if self.cli is not None:
+            response = self.cli.display_narrative_stream(_timed())
+        else:
+            parts = []
+            print("\n" + "━" * 70 + "\n")
+            for chunk in _timed():
+                parts.append(chunk)
+                print(chunk, end="", flush=True)
+            print("\n\n" + "━" * 70)
+            response = "".join(parts)
+
+        timing["total"] = time.time() - started
+        timing.setdefault("first_token", timing["total"])
+        self.response_latencies.append(timing)
+        return response
+
     def _check_scene_transition(self) -> None:
         """检查是否需要切换场景"""
         # TODO: 根据 GDD 定义的场景转换规则判断
@@ -931,17 +1194,17 @@ class GameEngine:
             filename = f"{self.city}_{self.state.current_scene}_{timestamp}.save"
 
         filepath = self.save_dir / filename
-        self.state.save(str(filepath))
+        write_save(filepath, self._current_save())
 
         return str(filepath)
 
     def load_game(self, filepath: str) -> None:
-        """加载游戏进度
+        """加载游戏进度（预生成模式的存档同时恢复所在节点）
 
         Args:
             filepath: 存档文件路径
         """
-        self.state = GameState.load(filepath)
+        self._restore_save(read_save(filepath))
         print(f"✅ 已加载存档：{filepath}")
 
     def _offer_save(self) -> None:
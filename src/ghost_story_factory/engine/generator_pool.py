@@ -0,0 +1,84 @@
+"""生成器共享池
+
+进程级注册表：按 GDD / Lore / 主线故事的内容哈希复用
+ChoicePointsGenerator 与 RuntimeResponseGenerator 实例。
+
+同一故事的多个角色（多个 DialogueTreeBuilder）共用同一组生成器：
+- Prompt 模板只从磁盘加载一次；
+- 场景记忆（_scene_memory）只构建一次；
+- LLM 客户端（及其底层 HTTP 连接池）与并发信号量共享，
+  因此 KIMI_CONCURRENCY* 对整个进程生效，而不是每个构建器各算一份。
+"""
+
+import hashlib
+import threading
+from typing import Dict, Tuple
+
+from .choices import ChoicePointsGenerator
+from .response import RuntimeResponseGenerator
+
+
+_POOL: Dict[str, Tuple[ChoicePointsGenerator, RuntimeResponseGenerator]] = {}
+_POOL_LOCK = threading.Lock()
+
+
+def documents_key(gdd_content: str, lore_content: str, main_story: str = "") -> str:
+    """计算文档组合的内容哈希（作为共享池的键）
+
+    Args:
+        gdd_content: GDD 内容
+        lore_content: Lore 内容
+        main_story: 主线故事内容
+
+    Returns:
+        str: sha256 十六进制摘要
+    """
+    h = hashlib.sha256()
+    for part in (gdd_content or "", lore_content or "", main_story or ""):
+        data = part.encode("utf-8")
+        # 写入长度前缀，避免不同切分产生相同拼接结果
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def get_shared_generators(
+    gdd_content: str,
+    lore_content: str,
+    main_story: str = "",
+) -> Tuple[ChoicePointsGenerator, RuntimeResponseGenerator]:
+    """获取（必要时创建）与文档内容对应的共享生成器
+
+    Args:
+        gdd_content: GDD 内容
+        lore_content: Lore 内容
+        main_story: 主线故事内容
+
+    Returns:
+        (ChoicePointsGenerator, RuntimeResponseGenerator)
+    """
+    key = documents_key(gdd_content, lore_content, main_story)
+    cached = _POOL.get(key)
+    if cached is not None:
+        return cached
+
+    with _POOL_LOCK:
+        cached = _POOL.get(key)
+        if cached is None:
+            cached = (
+                ChoicePointsGenerator(gdd_content, lore_content, main_story),
+                RuntimeResponseGenerator(gdd_content, lore_content, main_story),
+            )
+            _POOL[key] = cached
+        return cached
+
+
+def clear_generator_pool() -> None:
+    """清空共享池（测试或切换故事批次时使用）"""
+    with _POOL_LOCK:
+        _POOL.clear()
+
+
+def generator_pool_size() -> int:
+    """当前共享池中的文档组合数量"""
+    return len(_POOL)
@@ -0,0 +1,197 @@
+"""增量容错 JSON 解析（选择点输出）
+
+ChoicePointsGenerator 期望模型输出 {"scene_id": ..., "choices": [{...}, ...]}。
+StreamingChoiceParser 逐段消费模型输出：
+- 只跟踪结构字符（{ } [ ] 与字符串边界），单遍扫描，不做整段正则改写；
+- choices 数组中每个对象闭合时立即解析并交给 validator 校验（如 Choice 模型）；
+- 明显畸形时（开头长篇非 JSON 文本、多个选项无法解析、括号失衡）标记 aborted，
+  调用方可立即中断流并重试，而不是等完整补全结束后再失败；
+- 顶层数组 [{...}, ...] 也视为选项列表。
+"""
+
+import json
+import re
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional
+
+
+_CHOICES_KEYS = ("choices", "options", "choice_points", "选择点", "选项")
+_KEY_BEFORE_ARRAY = re.compile(r'"([^"]+)"\s*:\s*$')
+_SCENE_ID = re.compile(r'"scene_id"\s*:\s*"([^"]+)"')
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+def loads_tolerant(text: str) -> Optional[Any]:
+    """容错 json.loads：先按原文解析，失败后做常见修复再试一次
+
+    修复项：NFKC 归一化、全角逗号 / 冒号、尾随逗号、// 与 /* */ 注释、
+    断行的 immediate_consequences 键名。
+
+    Returns:
+        解析结果；仍失败返回 None
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    fixed = unicodedata.normalize("NFKC", text)
+    fixed = fixed.replace('，', ',').replace('：', ':')
+    fixed = re.sub(r'//[^\n]*\n', '\n', fixed)
+    fixed = re.sub(r'/\*.*?\*/', '', fixed, flags=re.DOTALL)
+    fixed = _TRAILING_COMMA.sub(r'\1', fixed)
+    fixed = re.sub(r'"immediate_\s*consequences"\s*:', '"immediate_consequences":', fixed, flags=re.IGNORECASE)
+    try:
+        return json.loads(fixed)
+    except ValueError:
+        return None
+
+
+class StreamingChoiceParser:
+    """选择点 JSON 的增量解析器"""
+
+    def __init__(
+        self,
+        validator: Optional[Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]] = None,
+        max_preamble: int = 400,
+        max_invalid: int = 2,
+    ):
+        """
+        Args:
+            validator: 选项校验函数，返回规范化后的选项；返回 None 或抛异常视为无效
+            max_preamble: JSON 开始前允许的非空白字符数，超过视为畸形
+            max_invalid: 允许的无效选项数，达到即视为畸形
+        """
+        self.validator = validator
+        self.max_preamble = max_preamble
+        self.max_invalid = max_invalid
+
+        self.text = ""
+        self.choices: List[Dict[str, Any]] = []
+        self.invalid = 0
+        self.scene_id: Optional[str] = None
+        self.complete = False
+        self.abort_reason: Optional[str] = None
+
+        self._pos = 0
+        self._started = False
+        self._preamble = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._top_start = 0
+        self._segment_start = 0          # 顶层当前键值对的起点（用于识别 "choices": [）
+        self._choices_depth: Optional[int] = None
+        self._obj_start: Optional[int] = None
+
+    @property
+    def aborted(self) -> bool:
+        return self.abort_reason is not None
+
+    def _abort(self, reason: str) -> None:
+        if self.abort_reason is None:
+            self.abort_reason = reason
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """消费一段输出
+
+        Args:
+            chunk: 新到达的文本片段
+
+        Returns:
+            本次新闭合并通过校验的选项列表
+        """
+        if not chunk or self.complete or self.aborted:
+            return []
+        self.text += chunk
+        new_choices: List[Dict[str, Any]] = []
+        text = self.text
+
+        i = self._pos
+        n = len(text)
+        while i < n and not self.complete and not self.aborted:
+            ch = text[i]
+
+            if not self._started:
+                if ch in "{[":
+                    self._started = True
+                    self._top_start = i
+                    self._segment_start = i + 1
+                    self._depth = 1
+                    if ch == "[":
+                        self._choices_depth = 1
+                elif not ch.isspace():
+                    self._preamble += 1
+                    if self._preamble > self.max_preamble:
+                        self._abort("JSON 开始前出现过多非 JSON 文本")
+                i += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                i += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                self._depth += 1
+                if ch == "[" and self._depth == 2 and self._choices_depth is None:
+                    m = _KEY_BEFORE_ARRAY.search(text[self._segment_start:i])
+                    if m and m.group(1) in _CHOICES_KEYS:
+                        self._choices_depth = 2
+                        self._capture_scene_id(i)
+                elif ch == "{" and self._choices_depth is not None and self._depth == self._choices_depth + 1:
+                    self._obj_start = i
+            elif ch in "}]":
+                if ch == "}" and self._obj_start is not None and self._depth == self._choices_depth + 1:
+                    choice = self._accept_object(text[self._obj_start:i + 1])
+                    if choice is not None:
+                        new_choices.append(choice)
+                    self._obj_start = None
+                self._depth -= 1
+                if self._depth < 0:
+                    self._abort("括号不匹配")
+                elif self._depth == 0:
+                    self.complete = True
+                    self._capture_scene_id(i)
+            elif ch == "," and self._depth == 1:
+                self._segment_start = i + 1
+            i += 1
+
+        self._pos = i
+        return new_choices
+
+    def _capture_scene_id(self, end: int) -> None:
+        if self.scene_id is None:
+            m = _SCENE_ID.search(self.text, self._top_start, end)
+            if m:
+                self.scene_id = m.group(1)
+
+    def _accept_object(self, obj_text: str) -> Optional[Dict[str, Any]]:
+        """解析并校验一个闭合的选项对象"""
+        obj = loads_tolerant(obj_text)
+        choice: Optional[Dict[str, Any]] = None
+        if isinstance(obj, dict):
+            if self.validator is None:
+                choice = obj
+            else:
+                try:
+                    choice = self.validator(obj)
+                except Exception:
+                    choice = None
+        if choice is None:
+            self.invalid += 1
+            if self.invalid >= self.max_invalid:
+                self._abort(f"{self.invalid} 个选项无法解析或未通过校验")
+            return None
+        self.choices.append(choice)
+        return choice
+
+    def result(self) -> Dict[str, Any]:
+        """当前已解析出的标准结构 {"scene_id": ..., "choices": [...]}"""
+        return {"scene_id": self.scene_id or "unknown", "choices": list(self.choices)}
@@ -0,0 +1,118 @@
+"""LLM 流式调用
+
+CrewAI 的 kickoff 只能在整段补全结束后返回文本。需要边生成边处理的场景
+（选择点的增量 JSON 解析、实时游玩的逐字输出）直接走 OpenAI 兼容接口的流式补全：
+- 密钥、地址与模型由 resolve_llm 解析，与 CrewAI 路径（各生成器的 _create_llm）一致，
+  开启流式不会悄悄换模型或换服务商；
+- openai SDK 为可选依赖，未安装或未配置密钥时 streaming_available() 返回 False，
+  调用方应回退到原有的 CrewAI 路径。
+"""
+
+import os
+import threading
+from typing import Dict, Iterator, Optional, Tuple
+
+try:
+    from openai import OpenAI  # type: ignore
+    _OPENAI_AVAILABLE = True
+except Exception:
+    OpenAI = None  # type: ignore
+    _OPENAI_AVAILABLE = False
+
+
+_CLIENTS: Dict[Tuple[str, str], object] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def resolve_llm(model_env: str, default_model: str) -> Tuple[Optional[str], str, str]:
+    """解析 (api_key, base_url, model)：CrewAI 路径与流式补全共用
+
+    Args:
+        model_env: 按用途区分的模型环境变量（如 KIMI_MODEL_CHOICES）
+        default_model: 该用途的默认模型
+
+    Returns:
+        (KIMI_API_KEY / MOONSHOT_API_KEY, KIMI_API_BASE, model_env → KIMI_MODEL → default_model)
+    """
+    api_key = os.getenv("KIMI_API_KEY") or os.getenv("MOONSHOT_API_KEY")
+    base_url = os.getenv("KIMI_API_BASE", "https://api.moonshot.cn/v1")
+    model = os.getenv(model_env) or os.getenv("KIMI_MODEL", default_model)
+    return api_key, base_url, model
+
+
+def streaming_available() -> bool:
+    """当前环境是否可以使用流式补全"""
+    return _OPENAI_AVAILABLE and bool(os.getenv("KIMI_API_KEY") or os.getenv("MOONSHOT_API_KEY"))
+
+
+def _get_client(api_key: str, base_url: str):
+    """按 (密钥, 地址) 复用 HTTP 客户端（OpenAI 客户端本身线程安全）"""
+    key = (api_key, base_url)
+    client = _CLIENTS.get(key)
+    if client is not None:
+        return client
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = OpenAI(api_key=api_key, base_url=base_url)
+            _CLIENTS[key] = client
+        return client
+
+
+def stream_completion(
+    prompt: str,
+    system: Optional[str] = None,
+    model_env: str = "KIMI_MODEL",
+    default_model: str = "kimi-k2-0905-preview",
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+) -> Iterator[str]:
+    """流式补全：逐段产出模型输出文本
+
+    调用方提前结束迭代（break / close）时会关闭底层连接，不再为剩余 token 付费等待。
+
+    Args:
+        prompt: 用户消息
+        system: 系统消息（可选）
+        model_env: 按用途区分的模型环境变量（与调用方 _create_llm 相同）
+        default_model: 该用途的默认模型（与调用方 _create_llm 相同）
+        temperature: 采样温度（可选）
+        max_tokens: 最大输出 token（可选）
+
+    Yields:
+        str: 增量文本片段
+
+    Raises:
+        RuntimeError: openai SDK 不可用或未配置 API 密钥
+    """
+    api_key, base_url, model = resolve_llm(model_env, default_model)
+    if not _OPENAI_AVAILABLE or not api_key:
+        raise RuntimeError("流式补全不可用：需要 openai SDK 与 KIMI_API_KEY / MOONSHOT_API_KEY")
+
+    messages = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.append({"role": "user", "content": prompt})
+
+    kwargs = {"model": model, "messages": messages, "stream": True}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    if max_tokens is not None:
+        kwargs["max_tokens"] = max_tokens
+
+    stream = _get_client(api_key, base_url).chat.completions.create(**kwargs)
+    try:
+        for event in stream:
+            try:
+                delta = event.choices[0].delta.content
+            except (AttributeError, IndexError):
+                delta = None
+            if delta:
+                yield delta
+    finally:
+        close = getattr(stream, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception:
+                pass
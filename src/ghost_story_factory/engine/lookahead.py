@@ -0,0 +1,370 @@
+"""实时模式的多步前瞻缓存
+
+SpeculativePregenerator 只为当前展示的选项预生成一步。LookaheadCache 在玩家周围
+维护一棵有界的前瞻树（默认深度 2、每层前 K 个选项）：
+- 节点 = (父状态, 选项) → 投影状态 + 响应 + 下一批选择点；
+  状态投影使用 GameState.apply_choice，与未命中时现场生成响应的状态转移完全一致；
+- 后台调度器按路径概率优先生成：关键选项优先、展示靠前优先、
+  与玩家近期所选标签相近的选项优先；父节点的选择点生成完后再调度其子节点；
+- 玩家前进时以命中的节点为新根，不在新子树内的节点被淘汰（未开始的任务撤销），
+  缓存总量按 LRU 淘汰；每会话 LLM 调用总数有上限。
+
+对外接口与 SpeculativePregenerator 一致（speculate / take / shutdown / get_stats）。
+"""
+
+import heapq
+import itertools
+import json
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from .state import GameState
+from .choices import Choice
+from .speculation import SpeculationResult
+from ..utils.logging_utils import console, quiet_console
+
+
+# 选择类型的先验权重：关键选项更可能被玩家选中，也最值得提前准备
+_TYPE_WEIGHT = {"critical": 3.0, "normal": 1.0, "micro": 0.6}
+# 展示顺序衰减：越靠前越可能被选中
+_POSITION_DECAY = 0.85
+
+_PENDING, _RUNNING, _DONE, _FAILED = "pending", "running", "done", "failed"
+
+EntryKey = Tuple[str, str]
+
+
+@dataclass
+class _Entry:
+    key: EntryKey                      # (父状态 key, choice_id)
+    choice: Choice
+    depth: int
+    probability: float
+    base_state: GameState
+    state: GameState                   # 投影后的状态
+    state_key: str
+    status: str = _PENDING
+    response: Optional[str] = None
+    choices: Optional[List[Choice]] = None
+    done: threading.Event = field(default_factory=threading.Event)
+
+
+def state_key(state: GameState) -> str:
+    """游戏状态的缓存 key（完整状态，含后果链）"""
+    return json.dumps(state.to_dict(), ensure_ascii=False, sort_keys=True, default=str)
+
+
+def project_state(state: GameState, choice: Choice) -> GameState:
+    """投影选择后的状态（不修改原状态）
+
+    与 generate_response / stream_response 应用后果共用 GameState.apply_choice，
+    命中前瞻与现场生成得到同一个状态。
+    """
+    new_state = GameState(**state.to_dict())
+    new_state.apply_choice(choice)
+    return new_state
+
+
+class LookaheadCache:
+    """玩家周围的有界前瞻树（后台按概率优先生成）"""
+
+    CALLS_PER_NODE = 2
+
+    def __init__(
+        self,
+        response_generator,
+        choice_generator,
+        depth: int = 2,
+        top_k: int = 2,
+        max_calls: int = 24,
+        capacity: int = 16,
+        workers: int = 2,
+    ):
+        """
+        Args:
+            response_generator: RuntimeResponseGenerator
+            choice_generator: ChoicePointsGenerator
+            depth: 前瞻深度
+            top_k: 每层前瞻的选项数
+            max_calls: 每会话前瞻 LLM 调用上限
+            capacity: 缓存节点上限（LRU 淘汰）
+            workers: 后台生成线程数
+        """
+        self.response_generator = response_generator
+        self.choice_generator = choice_generator
+        self.depth = max(1, depth)
+        self.top_k = max(1, top_k)
+        self.max_calls = max_calls
+        self.capacity = max(1, capacity)
+
+        self._cond = threading.Condition()
+        self._entries: "OrderedDict[EntryKey, _Entry]" = OrderedDict()
+        self._heap: List[Tuple[float, int, EntryKey]] = []
+        self._seq = itertools.count()
+        self._root_key: Optional[str] = None
+        self._tag_counts: Counter = Counter()
+        self._picks = 0
+        self._calls = 0
+        self._closed = False
+        self.stats: Dict[str, int] = {
+            "scheduled": 0,
+            "generated": 0,
+            "hits": 0,
+            "misses": 0,
+            "evicted": 0,
+            "skipped_budget": 0,
+        }
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"lookahead-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    # ==================== 概率估计 ====================
+
+    def _choice_weight(self, choice: Choice, position: int) -> float:
+        ctype = getattr(choice.choice_type, "value", choice.choice_type) or "normal"
+        weight = _TYPE_WEIGHT.get(str(ctype), 1.0) * (_POSITION_DECAY ** position)
+        if self._picks and choice.tags:
+            affinity = sum(self._tag_counts[t] for t in choice.tags) / self._picks
+            weight *= 1.0 + affinity
+        return weight
+
+    def _rank(self, choices: List[Choice], state: GameState) -> List[Tuple[Choice, float]]:
+        """可选项按被选概率降序排列（同层归一化）"""
+        available = [(i, c) for i, c in enumerate(choices) if c.is_available(state)]
+        if not available:
+            return []
+        weights = [(c, self._choice_weight(c, i)) for i, c in available]
+        total = sum(w for _, w in weights) or 1.0
+        ranked = [(c, w / total) for c, w in weights]
+        ranked.sort(key=lambda cw: -cw[1])
+        return ranked
+
+    # ==================== 调度 ====================
+
+    def _schedule_children(
+        self,
+        parent_state: GameState,
+        parent_key: str,
+        choices: List[Choice],
+        depth: int,
+        parent_probability: float,
+    ) -> None:
+        """为某个状态下的前 K 个选项登记前瞻节点（调用方持有锁）"""
+        if depth > self.depth:
+            return
+        for choice, prob in self._rank(choices, parent_state)[: self.top_k]:
+            key = (parent_key, choice.choice_id)
+            if key in self._entries:
+                continue
+            projected = project_state(parent_state, choice)
+            entry = _Entry(
+                key=key,
+                choice=choice,
+                depth=depth,
+                probability=parent_probability * prob,
+                base_state=parent_state,
+                state=projected,
+                state_key=state_key(projected),
+            )
+            self._entries[key] = entry
+            heapq.heappush(self._heap, (-entry.probability, next(self._seq), key))
+            self.stats["scheduled"] += 1
+        self._enforce_capacity()
+        self._cond.notify_all()
+
+    def speculate(self, choices: List[Choice], state: GameState) -> List[str]:
+        """以当前状态为根，登记 / 保留前瞻树（已命中的子树会被复用）
+
+        Args:
+            choices: 当前展示的选择点
+            state: 当前游戏状态（不会被修改）
+
+        Returns:
+            根下已登记前瞻的 choice_id 列表
+        """
+        root_key = state_key(state)
+        with self._cond:
+            if root_key != self._root_key:
+                self._reroot(root_key)
+            self._schedule_children(GameState(**state.to_dict()), root_key, choices, 1, 1.0)
+            return [k[1] for k in self._entries if k[0] == root_key]
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                entry = None
+                while entry is None:
+                    if self._closed:
+                        return
+                    while self._heap:
+                        _, _, key = heapq.heappop(self._heap)
+                        cand = self._entries.get(key)
+                        if cand is not None and cand.status == _PENDING:
+                            entry = cand
+                            break
+                    if entry is None:
+                        self._cond.wait()
+                if self._calls + self.CALLS_PER_NODE > self.max_calls:
+                    self.stats["skipped_budget"] += 1
+                    self._entries.pop(entry.key, None)
+                    entry.status = _FAILED
+                    entry.done.set()
+                    continue
+                self._calls += self.CALLS_PER_NODE
+                entry.status = _RUNNING
+            # 玩家此时正在输入：生成器与本模块的进度输出改写日志，不打断输入提示
+            with quiet_console():
+                self._generate(entry)
+
+    def _generate(self, entry: _Entry) -> None:
+        """生成一个前瞻节点：响应（投影状态上的系统提示）+ 下一批选择点"""
+        try:
+            working = GameState(**entry.base_state.to_dict())
+            raw = self.response_generator.generate_response(entry.choice, working, apply_consequences=False)
+            response = self.response_generator._add_system_hints(
+                raw, entry.base_state.to_dict(), entry.state.to_dict()
+            )
+            next_choices = self.choice_generator.generate_choices(
+                entry.state.current_scene, GameState(**entry.state.to_dict())
+            )
+        except Exception as e:
+            console(f"⚠️  [前瞻] 生成失败: {e}")
+            with self._cond:
+                entry.status = _FAILED
+                self._entries.pop(entry.key, None)
+            entry.done.set()
+            return
+
+        with self._cond:
+            entry.response = response
+            entry.choices = list(next_choices or [])
+            entry.status = _DONE
+            self.stats["generated"] += 1
+            if entry.key in self._entries:
+                self._schedule_children(
+                    entry.state, entry.state_key, entry.choices, entry.depth + 1, entry.probability
+                )
+        entry.done.set()
+
+    # ==================== 领取与淘汰 ====================
+
+    def take(self, choice: Choice, state: GameState, wait: bool = True) -> Optional[SpeculationResult]:
+        """领取玩家所选选项的前瞻结果，并以其为新根淘汰其余分支
+
+        Args:
+            choice: 玩家选定的选项
+            state: 当前游戏状态
+            wait: 节点生成中时是否等待（未开始的节点视为未命中；流式响应开启时应传 False，
+                  改走现场流式生成，比等整段响应 + 选择点生成完更快）
+
+        Returns:
+            命中时返回结果，否则 None
+        """
+        key = (state_key(state), choice.choice_id)
+        with self._cond:
+            for tag in choice.tags or []:
+                self._tag_counts[tag] += 1
+            self._picks += 1
+            entry = self._entries.get(key)
+            if entry is None or entry.status in (_PENDING, _FAILED) or (entry.status == _RUNNING and not wait):
+                self.stats["misses"] += 1
+                self._reroot(None)
+                return None
+
+        entry.done.wait()
+        with self._cond:
+            if entry.status != _DONE:
+                self.stats["misses"] += 1
+                self._reroot(None)
+                return None
+            self.stats["hits"] += 1
+            self._entries.move_to_end(key)
+            self._reroot(entry.state_key)
+        return SpeculationResult(
+            choice_id=choice.choice_id,
+            response=entry.response,
+            state=GameState(**entry.state.to_dict()),
+            choices=list(entry.choices),
+        )
+
+    def _subtree_keys(self, root_key: Optional[str]) -> set:
+        """root_key 下仍在前瞻深度内的节点（调用方持有锁）"""
+        if root_key is None:
+            return set()
+        keep = set()
+        frontier = {root_key}
+        for _ in range(self.depth):
+            nxt = set()
+            for key, entry in self._entries.items():
+                if key[0] in frontier and key not in keep:
+                    keep.add(key)
+                    nxt.add(entry.state_key)
+            frontier = nxt
+        return keep
+
+    def _reroot(self, root_key: Optional[str]) -> None:
+        """切换根节点：淘汰不在新子树内的节点，并重算深度（调用方持有锁）"""
+        self._root_key = root_key
+        keep = self._subtree_keys(root_key)
+        for key in [k for k in self._entries if k not in keep]:
+            self._evict(key)
+        # 重算深度：新根的子节点深度为 1
+        depth_of = {root_key: 0}
+        for _ in range(self.depth):
+            for key, entry in self._entries.items():
+                if key[0] in depth_of:
+                    entry.depth = depth_of[key[0]] + 1
+                    depth_of.setdefault(entry.state_key, entry.depth)
+        # 已完成但子节点未登记的节点（原先处于深度上限）补登记下一层
+        for entry in list(self._entries.values()):
+            if entry.status == _DONE and entry.depth < self.depth:
+                self._schedule_children(entry.state, entry.state_key, entry.choices or [], entry.depth + 1, entry.probability)
+
+    def _evict(self, key: EntryKey) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.stats["evicted"] += 1
+
+    def _enforce_capacity(self) -> None:
+        """LRU 淘汰：优先淘汰最久未使用、且不在生成中的节点（调用方持有锁）"""
+        while len(self._entries) > self.capacity:
+            victim = next((k for k, e in self._entries.items() if e.status != _RUNNING), None)
+            if victim is None:
+                break
+            self._evict(victim)
+
+    # ==================== 生命周期 ====================
+
+    def cancel_all(self) -> None:
+        """清空前瞻树（未开始的任务不再执行）"""
+        with self._cond:
+            self._reroot(None)
+            self._heap.clear()
+
+    def shutdown(self) -> None:
+        """清空前瞻树并停止后台线程"""
+        with self._cond:
+            self._closed = True
+            self._entries.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+
+    @property
+    def remaining_calls(self) -> int:
+        with self._cond:
+            return max(0, self.max_calls - self._calls)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """前瞻统计（登记 / 生成 / 命中 / 未命中 / 淘汰 / 调用）"""
+        with self._cond:
+            stats = dict(self.stats)
+            stats["calls"] = self._calls
+            stats["max_calls"] = self.max_calls
+            stats["cached"] = len(self._entries)
+        return stats
@@ -0,0 +1,229 @@
+"""Prompt 预算与组装
+
+- count_tokens：本地估算 token 数（安装 tiktoken 时使用 cl100k_base，否则按
+  中日韩字符 1 token、其余字符约 4 字符 1 token 估算）；
+- PromptAssembler：静态前缀 + 按优先级裁剪的动态段落。静态前缀在同一生成器内
+  逐字节不变，放在 prompt 最前面，便于服务端前缀缓存命中；
+- 遥测：按调用类型（choices / response 等）统计 prompt token 规模与裁剪次数。
+"""
+
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+
+_ENCODER = None
+_ENCODER_LOADED = False
+_ENCODER_LOCK = threading.Lock()
+
+
+def _get_encoder():
+    """延迟加载 tiktoken 编码器（可选依赖，不可用时返回 None）"""
+    global _ENCODER, _ENCODER_LOADED
+    if _ENCODER_LOADED:
+        return _ENCODER
+    with _ENCODER_LOCK:
+        if not _ENCODER_LOADED:
+            if os.getenv("PROMPT_TOKENIZER", "auto") != "heuristic":
+                try:
+                    import tiktoken  # type: ignore
+
+                    _ENCODER = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _ENCODER = None
+            _ENCODER_LOADED = True
+    return _ENCODER
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x4E00 <= code <= 0x9FFF
+        or 0x3400 <= code <= 0x4DBF
+        or 0x3000 <= code <= 0x303F
+        or 0xFF00 <= code <= 0xFFEF
+        or 0x3040 <= code <= 0x30FF
+        or 0xAC00 <= code <= 0xD7AF
+    )
+
+
+def count_tokens(text: str) -> int:
+    """估算文本的 token 数
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: token 数
+    """
+    if not text:
+        return 0
+    encoder = _get_encoder()
+    if encoder is not None:
+        try:
+            return len(encoder.encode(text))
+        except Exception:
+            pass
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, suffix: str = "…") -> str:
+    """将文本截断到不超过 max_tokens（二分查找字符长度）
+
+    Args:
+        text: 原文本
+        max_tokens: token 上限
+        suffix: 截断时附加的后缀
+
+    Returns:
+        str: 截断后的文本
+    """
+    if max_tokens <= 0 or not text:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - count_tokens(suffix)
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo] + suffix if lo > 0 else ""
+
+
+@dataclass
+class PromptSection:
+    """动态 prompt 段落
+
+    Attributes:
+        name: 段落名（用于遥测）
+        text: 段落文本
+        priority: 优先级，数值越小越重要，预算不足时先裁剪优先级低的段落
+        required: 是否必须完整保留（不参与裁剪）
+    """
+
+    name: str
+    text: str
+    priority: int = 10
+    required: bool = False
+
+
+class PromptAssembler:
+    """按 token 预算组装 prompt"""
+
+    # 被截断的段落至少保留的 token 数，低于该值直接丢弃
+    MIN_SECTION_TOKENS = 32
+
+    def __init__(self, call_type: str, budget_tokens: int, static_prefix: str = "", static_suffix: str = ""):
+        """
+        Args:
+            call_type: 调用类型（遥测分组键），如 "choices" / "response"
+            budget_tokens: 单次调用的 prompt token 预算（含静态部分）
+            static_prefix: 静态前缀（跨调用逐字节不变）
+            static_suffix: 静态结尾（如“现在开始生成……”）
+        """
+        self.call_type = call_type
+        self.budget_tokens = budget_tokens
+        self.static_prefix = static_prefix
+        self.static_suffix = static_suffix
+        self.static_tokens = count_tokens(static_prefix) + count_tokens(static_suffix)
+
+    def assemble(self, sections: List[PromptSection], extra_tokens: int = 0) -> str:
+        """组装 prompt：静态前缀 + 动态段落（保持传入顺序）+ 静态结尾
+
+        Args:
+            sections: 动态段落
+            extra_tokens: prompt 之外但计入预算的 token（如 Agent backstory）
+
+        Returns:
+            str: 完整 prompt
+        """
+        remaining = self.budget_tokens - self.static_tokens - extra_tokens
+        kept: Dict[int, str] = {}
+        truncated: List[str] = []
+        dropped: List[str] = []
+
+        order = sorted(range(len(sections)), key=lambda i: (not sections[i].required, sections[i].priority, i))
+        for i in order:
+            sec = sections[i]
+            if not sec.text:
+                continue
+            tokens = count_tokens(sec.text)
+            if sec.required or tokens <= remaining:
+                kept[i] = sec.text
+                remaining -= tokens
+                continue
+            if remaining >= self.MIN_SECTION_TOKENS:
+                cut = truncate_to_tokens(sec.text, remaining)
+                if cut:
+                    kept[i] = cut
+                    remaining -= count_tokens(cut)
+                    truncated.append(sec.name)
+                    continue
+            dropped.append(sec.name)
+
+        body = "\n\n".join(kept[i] for i in sorted(kept))
+        parts = [p for p in (self.static_prefix, body, self.static_suffix) if p]
+        prompt = "\n\n".join(parts)
+
+        record_prompt(
+            self.call_type,
+            total_tokens=count_tokens(prompt) + extra_tokens,
+            static_tokens=self.static_tokens + extra_tokens,
+            truncated=truncated,
+            dropped=dropped,
+        )
+        return prompt
+
+
+# ==================== 遥测 ====================
+
+_TELEMETRY: Dict[str, Dict[str, Any]] = {}
+_TELEMETRY_LOCK = threading.Lock()
+
+
+def record_prompt(
+    call_type: str,
+    total_tokens: int,
+    static_tokens: int = 0,
+    truncated: Optional[List[str]] = None,
+    dropped: Optional[List[str]] = None,
+) -> None:
+    """记录一次 prompt 的 token 规模"""
+    with _TELEMETRY_LOCK:
+        stats = _TELEMETRY.setdefault(call_type, {
+            "calls": 0,
+            "total_tokens": 0,
+            "max_tokens": 0,
+            "static_tokens": 0,
+            "truncated_sections": 0,
+            "dropped_sections": 0,
+        })
+        stats["calls"] += 1
+        stats["total_tokens"] += int(total_tokens)
+        stats["max_tokens"] = max(stats["max_tokens"], int(total_tokens))
+        stats["static_tokens"] = int(static_tokens)
+        stats["truncated_sections"] += len(truncated or [])
+        stats["dropped_sections"] += len(dropped or [])
+
+
+def get_prompt_telemetry() -> Dict[str, Dict[str, Any]]:
+    """按调用类型返回 prompt token 统计（含平均值）"""
+    with _TELEMETRY_LOCK:
+        result: Dict[str, Dict[str, Any]] = {}
+        for call_type, stats in _TELEMETRY.items():
+            item = dict(stats)
+            item["avg_tokens"] = round(stats["total_tokens"] / stats["calls"], 1) if stats["calls"] else 0.0
+            result[call_type] = item
+        return result
+
+
+def reset_prompt_telemetry() -> None:
+    """清空遥测（每个故事生成开始时调用；测试中也用于隔离）"""
+    with _TELEMETRY_LOCK:
+        _TELEMETRY.clear()
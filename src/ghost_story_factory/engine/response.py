@@ -8,10 +8,14 @@
 """
 
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Iterator
 import json
 
 from .state import GameState
+from .prompt_budget import PromptAssembler, PromptSection, count_tokens, truncate_to_tokens
+from .llm_stream import resolve_llm, stream_completion, streaming_available
+from ..utils.story_summary import get_story_summary, scene_slice
+from ..utils.logging_utils import console
 try:
     from .choices import Choice
 except Exception:
@@ -26,6 +30,43 @@ except Exception:
             self.tags = tags or []
 
 
+# 响应 Prompt 的静态部分：跨调用逐字节一致，置于 prompt 最前以便前缀缓存命中
+RESPONSE_STATIC_PREFIX = """你是一个专业的恐怖故事作家。根据玩家选择生成沉浸式叙事响应（200-400字）。
+
+## 写作要求
+1. **第二人称视角**（使用"你"），营造恐怖氛围
+2. **包含细节**：至少 2 种感官描写（视觉/听觉/嗅觉）
+3. **体现后果**：反映选择的影响和状态变化
+4. **暗示下一步**：环境提示，但不替玩家决定
+
+重要：必须使用"你"而不是"我"，例如：
+- ✅ "你打开手电筒..."
+- ❌ "我打开手电筒..."
+
+请生成叙事响应（Markdown 格式，200-400字）
+- 不要破坏世界观规则
+- 不要使用现代网络梗
+
+[世界书与收束]
+- 不得破坏既定世界观；回收前文伏笔；逐步逼近结局节点
+- 如果当前已接近真相/危险阈值，暗示关键抉择临近（不替玩家决定）
+
+---"""
+
+RESPONSE_STATIC_SUFFIX = "---\n\n现在开始生成叙事响应（只输出Markdown文本，不要包含JSON或其他格式）："
+
+# 响应模型（环境变量, 默认模型）：KIMI_MODEL_RESPONSE → KIMI_MODEL → 默认；CrewAI 与流式路径共用
+RESPONSE_MODEL = ("KIMI_MODEL_RESPONSE", "kimi-k2-0905-preview")
+
+RESPONSE_AGENT_ROLE = "B站百万粉丝的恐怖故事 UP 主"
+
+RESPONSE_LITE_BACKSTORY = (
+    "你精通恐怖氛围营造和细节描写。"
+    "你的文笔风格是：第一人称视角，强节奏停顿，多感官细节，"
+    "符号反复召回，像一个在深夜给观众讲恐怖故事的 UP 主。"
+)
+
+
 class RuntimeResponseGenerator:
     """运行时响应生成器
 
@@ -54,6 +95,27 @@ class RuntimeResponseGenerator:
         self._concurrency = int(os.getenv("KIMI_CONCURRENCY", "4"))
         self._sem = threading.Semaphore(self._concurrency)
 
+        # Prompt 预算：单次调用总 token 上限（含 backstory），其中为动态段落预留 dynamic_reserve
+        self._prompt_budget = int(os.getenv("PROMPT_BUDGET_RESPONSE", "8000"))
+        self._dynamic_reserve = int(os.getenv("PROMPT_DYNAMIC_RESERVE", "1500"))
+        self._assembler = PromptAssembler(
+            "response",
+            self._prompt_budget,
+            static_prefix=RESPONSE_STATIC_PREFIX,
+            static_suffix=RESPONSE_STATIC_SUFFIX,
+        )
+        self._backstory_cache: Optional[str] = None
+
+        # 分层摘要：backstory 使用全篇大纲，每次调用只附带当前场景的主线 / GDD / Lore 摘要切片
+        self._use_summaries = os.getenv("STORY_SUMMARIES", "1") == "1"
+        self._summary_chars = int(os.getenv("STORY_SUMMARY_CHARS", "2000"))
+        self._story_slices: Dict[str, str] = {}
+        # 生成器可能被多个构建器线程共享（见 generator_pool），LLM 实例延迟创建需加锁
+        self._llm_lock = threading.Lock()
+
+        # 实时游玩的流式输出（stream_response）；流式接口不可用时回退整段生成
+        self._streaming = os.getenv("RESPONSE_STREAMING", "1") == "1"
+
     def _load_prompt_template(self) -> str:
         """加载 prompt 模板
 
@@ -80,12 +142,33 @@ class RuntimeResponseGenerator:
     def _build_backstory_with_story(self) -> str:
         """构建包含完整故事的 backstory（混合方案）
 
+        结果在生成器内缓存，跨调用逐字节一致（便于服务端前缀缓存命中）；
+        故事节选按 token 预算截断：总预算扣除动态预留与静态指令后的余量。
+
         Returns:
             包含故事背景的 backstory 文本
         """
-        # 截取主线故事的前 5000 字符（约 6000 tokens）
-        story_excerpt = self.main_story[:5000] if len(self.main_story) > 5000 else self.main_story
+        if self._backstory_cache is not None:
+            return self._backstory_cache
+
+        frame = self._format_backstory("")
+        excerpt_budget = (
+            self._prompt_budget
+            - self._dynamic_reserve
+            - self._assembler.static_tokens
+            - count_tokens(frame)
+        )
+        story_text = self.main_story
+        if self._use_summaries and len(story_text) > self._summary_chars:
+            # 长故事只放分层大纲，细节由每次调用的场景切片补充
+            story_text = self._get_story_summary().render(self._summary_chars) or story_text
+        story_excerpt = truncate_to_tokens(story_text, max(0, excerpt_budget))
+
+        self._backstory_cache = self._format_backstory(story_excerpt)
+        return self._backstory_cache
 
+    def _format_backstory(self, story_excerpt: str) -> str:
+        """backstory 模板"""
         return f"""你是一个专业的恐怖故事作家，已经阅读了完整的故事背景：
 
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -178,9 +261,8 @@ class RuntimeResponseGenerator:
             import os
         except ImportError:
             # 离线叙事回退：基于当前状态与场景记忆生成简短沉浸文本
-            if apply_consequences and choice.consequences:
-                game_state.update(choice.consequences)
-                game_state.consequence_tree.append(choice.choice_id)
+            if apply_consequences:
+                game_state.apply_choice(choice)
 
             scene_context = self._get_scene_memory(game_state.current_scene)
             pr_hint = "你的神经更紧绷了一些。" if game_state.PR >= 50 else "你努力让呼吸平稳下来。"
@@ -194,35 +276,30 @@ class RuntimeResponseGenerator:
 
         # 复用 LLM（响应生成）
         llm = self._get_llm()
-        print(f"🤖 [响应] 使用模型: {self._kimi_model_response}")
+        console(f"🤖 [响应] 使用模型: {self._kimi_model_response}")
 
         # 保存原始状态（用于对比）
         state_before = game_state.to_dict()
 
-        # 构建 prompt（加入导演上下文以增强连续性）
-        prompt = self._build_prompt(choice, game_state, state_before, director_context=director_context)
-        # 增强：在响应提示中加入世界书与伏笔回收要求，引导走向规范化结局
-        prompt += (
-            "\n\n[世界书与收束]\n"
-            "- 不得破坏既定世界观；回收前文伏笔；逐步逼近结局节点\n"
-            "- 如果当前已接近真相/危险阈值，暗示关键抉择临近（不替玩家决定）\n"
-        )
-
         # 🎯 混合方案：响应生成使用完整故事背景
+        backstory = self._select_backstory()
         if self.main_story:
-            backstory = self._build_backstory_with_story()
-            print("📚 [响应] 使用完整故事背景（高质量模式）")
+            console("📚 [响应] 使用完整故事背景（高质量模式）")
         else:
-            backstory = (
-                "你精通恐怖氛围营造和细节描写。"
-                "你的文笔风格是：第一人称视角，强节奏停顿，多感官细节，"
-                "符号反复召回，像一个在深夜给观众讲恐怖故事的 UP 主。"
-            )
-            print("💡 [响应] 使用精简模式")
+            console("💡 [响应] 使用精简模式")
+
+        # 构建 prompt（静态指令在前；状态 / 导演上下文 / 场景信息按预算裁剪）
+        prompt = self._build_prompt(
+            choice,
+            game_state,
+            state_before,
+            director_context=director_context,
+            backstory_tokens=count_tokens(backstory),
+        )
 
         # 创建 Agent（使用 Kimi LLM）
         agent = Agent(
-            role="B站百万粉丝的恐怖故事 UP 主",
+            role=RESPONSE_AGENT_ROLE,
             goal="生成沉浸式的叙事响应，营造恐怖氛围",
             backstory=backstory,
             verbose=False,
@@ -246,14 +323,12 @@ class RuntimeResponseGenerator:
             raw_text = str(result)
         except Exception as e:
             # 退回到本地兜底响应，避免整个 TreeBuilder 跑崩
-            print(f"⚠️  响应生成失败，使用默认叙事兜底：{e}")
+            console(f"⚠️  响应生成失败，使用默认叙事兜底：{e}")
             raw_text = f"你选择了「{choice.choice_text}」，故事继续在黑暗中推进……"
 
         # 应用后果到游戏状态
-        if apply_consequences and choice.consequences:
-            game_state.update(choice.consequences)
-            # 记录后果树
-            game_state.consequence_tree.append(choice.choice_id)
+        if apply_consequences:
+            game_state.apply_choice(choice)
 
         # 返回响应文本（附带系统提示）
         response_text = self._add_system_hints(
@@ -264,50 +339,156 @@ class RuntimeResponseGenerator:
 
         return response_text
 
+    def stream_response(
+        self,
+        choice: Choice,
+        game_state: GameState,
+        apply_consequences: bool = True,
+        director_context: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """流式生成叙事响应（实时游玩用）
+
+        与 generate_response 使用同一份 backstory 与 prompt，但直接走流式补全，
+        模型输出的片段到达即产出；补全结束后才应用后果，最后产出系统提示片段。
+        流式接口不可用（未安装 openai SDK / 未配置密钥 / RESPONSE_STREAMING=0）时
+        回退为 generate_response，整段作为一个片段产出。
+
+        Args:
+            choice: 玩家选择的选项
+            game_state: 当前游戏状态
+            apply_consequences: 是否自动应用后果到游戏状态（默认 True）
+            director_context: 导演上下文（可选）
+
+        Yields:
+            str: 叙事文本片段；拼接结果与 generate_response 的返回格式一致
+        """
+        if not (self._streaming and streaming_available()):
+            yield self.generate_response(
+                choice, game_state, apply_consequences=apply_consequences, director_context=director_context
+            )
+            return
+
+        state_before = game_state.to_dict()
+        backstory = self._select_backstory()
+        prompt = self._build_prompt(
+            choice,
+            game_state,
+            state_before,
+            director_context=director_context,
+            backstory_tokens=count_tokens(backstory),
+        )
+
+        received = False
+        try:
+            with self._sem:
+                for delta in stream_completion(
+                    prompt,
+                    system=f"你是{RESPONSE_AGENT_ROLE}。\n\n{backstory}",
+                    model_env=RESPONSE_MODEL[0],
+                    default_model=RESPONSE_MODEL[1],
+                ):
+                    received = True
+                    yield delta
+        except Exception as e:
+            if not received:
+                # 尚未输出任何内容：本会话改走 CrewAI 整段生成（状态尚未改动）
+                print(f"⚠️  流式响应不可用，回退整段生成：{e}")
+                self._streaming = False
+                yield self.generate_response(
+                    choice, game_state, apply_consequences=apply_consequences, director_context=director_context
+                )
+                return
+            # 已输出部分文本：保留玩家已看到的内容，照常结算
+            print(f"\n⚠️  流式响应中断：{e}")
+
+        if not received:
+            yield f"你选择了「{choice.choice_text}」，故事继续在黑暗中推进……"
+
+        # 应用后果到游戏状态
+        if apply_consequences:
+            game_state.apply_choice(choice)
+
+        hints = self._add_system_hints("", state_before, game_state.to_dict())
+        if hints:
+            yield hints
+
+    def _select_backstory(self) -> str:
+        """响应 Agent 的 backstory：有主线故事时用完整故事背景，否则用精简版"""
+        if self.main_story:
+            return self._build_backstory_with_story()
+        return RESPONSE_LITE_BACKSTORY
+
     def _get_llm(self):
         """获取（并复用）LLM 实例"""
         if self._llm is not None:
             return self._llm
+        with self._llm_lock:
+            if self._llm is None:
+                self._llm = self._create_llm()
+        return self._llm
 
+    def _create_llm(self):
+        """创建 LLM 实例"""
         from crewai import LLM
-        import os
 
-        kimi_key = os.getenv("KIMI_API_KEY") or os.getenv("MOONSHOT_API_KEY")
-        kimi_base = os.getenv("KIMI_API_BASE", "https://api.moonshot.cn/v1")
-        self._kimi_model_response = os.getenv("KIMI_MODEL_RESPONSE") or os.getenv("KIMI_MODEL", "kimi-k2-0905-preview")
+        kimi_key, kimi_base, self._kimi_model_response = resolve_llm(*RESPONSE_MODEL)
 
-        self._llm = LLM(
+        return LLM(
             model=self._kimi_model_response,
             api_key=kimi_key,
             base_url=kimi_base
         )
-        return self._llm
 
     def _get_scene_memory(self, scene: str) -> str:
         """获取场景锚点与规则（缓存）"""
         if scene in self._scene_memory:
             return self._scene_memory[scene]
 
-        scene_ctx = self._extract_scene_context(self.gdd, scene, max_chars=400)
-        core_lore = self._extract_scene_context(self.lore, scene, max_chars=200)
+        # 优先取 GDD / Lore 预构建的分层摘要切片，定位不到场景时回退到原文片段
+        scene_ctx = (
+            self._use_summaries and scene_slice(self.gdd, scene, max_chars=400)
+        ) or self._extract_scene_context(self.gdd, scene, max_chars=400)
+        core_lore = (
+            self._use_summaries and scene_slice(self.lore, scene, max_chars=200)
+        ) or self._extract_scene_context(self.lore, scene, max_chars=200)
         memory = f"{scene_ctx}\n\n[规则与约束]\n{core_lore}"
         memory = memory[:900]
         self._scene_memory[scene] = memory
         return memory
 
+    def _get_story_summary(self):
+        """主线故事的分层摘要（按内容复用，见 utils.story_summary）"""
+        if self._global_story_summary is None:
+            self._global_story_summary = get_story_summary(self.main_story)
+        return self._global_story_summary
+
+    def _get_story_slice(self, scene: str) -> str:
+        """当前场景对应的主线摘要切片（缓存）"""
+        if not (self._use_summaries and self.main_story):
+            return ""
+        if scene not in self._story_slices:
+            self._story_slices[scene] = self._get_story_summary().slice_for(scene, max_chars=600)
+        return self._story_slices[scene]
+
     def _build_prompt(
         self,
         choice: Choice,
         game_state: GameState,
         state_before: Dict[str, Any],
         director_context: Optional[Dict[str, Any]] = None,
+        backstory_tokens: int = 0,
     ) -> str:
-        """构建完整的 prompt（优化版）"""
+        """构建完整的 prompt（静态前缀 + 按优先级裁剪的动态段落）
+
+        优先级：状态（必保留）> 导演上下文 > 场景信息 > 主线摘要切片；
+        全篇故事（或其分层大纲）在 backstory 中按固定预算截断。
+        """
         # 计算状态变化
         pr_change = game_state.PR - state_before.get('PR', 0)
 
         # 提取场景相关内容（使用场景记忆）
         scene_context = self._get_scene_memory(game_state.current_scene)
+        story_slice = self._get_story_slice(game_state.current_scene)
         # 导演上下文摘要：最近几步的选择 / 响应 / 节拍，用于保持节奏与避免重复。
         ctx_lines = []
         if director_context:
@@ -330,58 +511,38 @@ class RuntimeResponseGenerator:
                 ctx_lines.append(last_resp + ("..." if len(last_resp) == 180 else ""))
         ctx_block = "\n".join(ctx_lines) if ctx_lines else "（暂无历史上下文，可按常规节奏书写。）"
 
-        return f"""
-你是一个专业的恐怖故事作家。根据玩家选择生成沉浸式叙事响应（200-400字）。
-
-## 玩家选择
+        state_block = f"""## 玩家选择
 **选择**: {choice.choice_text}
 **类型**: {choice.choice_type.value} | **标签**: {', '.join(choice.tags[:2]) if choice.tags else '无'}
 
 ## 当前状态
 **场景**: {game_state.current_scene} | **时间**: {game_state.timestamp}
 **PR**: {state_before.get('PR', 0)} → {game_state.PR} ({'+' if pr_change >= 0 else ''}{pr_change})
-**道具**: {', '.join(game_state.inventory[:2]) if game_state.inventory else '无'}
-
-## 场景信息
-{scene_context}
-
-## 最近几步的叙事上下文（请用于保持连贯性，避免简单重复）
-{ctx_block}
-
----
-
-## 写作要求
-1. **第二人称视角**（使用"你"），营造恐怖氛围
-2. **包含细节**：至少 2 种感官描写（视觉/听觉/嗅觉）
-3. **体现后果**：反映选择的影响和状态变化
-4. **暗示下一步**：环境提示，但不替玩家决定
-
-重要：必须使用"你"而不是"我"，例如：
-- ✅ "你打开手电筒..."
-- ❌ "我打开手电筒..."
-
-请生成叙事响应（Markdown 格式，200-400字）
-- 不要破坏世界观规则
-- 不要使用现代网络梗
-
-现在开始生成叙事响应（只输出Markdown文本，不要包含JSON或其他格式）：
-"""
+**道具**: {', '.join(game_state.inventory[:2]) if game_state.inventory else '无'}"""
+
+        return self._assembler.assemble(
+            [
+                PromptSection("state", state_block, priority=0, required=True),
+                PromptSection("scene_memory", f"## 场景信息\n{scene_context}", priority=2),
+                PromptSection(
+                    "director_context",
+                    f"## 最近几步的叙事上下文（请用于保持连贯性，避免简单重复）\n{ctx_block}",
+                    priority=1,
+                ),
+                PromptSection(
+                    "story_slice",
+                    f"## 主线摘要（当前场景）\n{story_slice}" if story_slice else "",
+                    priority=3,
+                ),
+            ],
+            extra_tokens=backstory_tokens,
+        )
 
     def _extract_scene_context(self, gdd: str, scene: str, max_chars: int = 400) -> str:
-        """提取当前场景相关的 GDD 片段"""
-        lines = gdd.split('\n')
-        relevant_lines = []
-
-        for i, line in enumerate(lines):
-            if scene.lower() in line.lower() or f"场景{scene[1:]}" in line:
-                relevant_lines.append(line)
-                for j in range(i + 1, min(i + 15, len(lines))):
-                    if lines[j].strip().startswith('#') and lines[j].strip() != line.strip():
-                        break
-                    relevant_lines.append(lines[j])
-                break
-
-        result = '\n'.join(relevant_lines)[:max_chars]
+        """提取当前场景相关的 GDD 片段（基于预构建的文档索引）"""
+        from ..utils.doc_index import get_document_index
+
+        result = get_document_index(gdd).scene_section(scene, max_lines=15)[:max_chars]
         return result if result else f"场景 {scene}"
 
     def _add_system_hints(
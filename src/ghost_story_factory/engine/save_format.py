@@ -0,0 +1,433 @@
+"""存档格式与自动存档日志
+
+紧凑二进制存档（.save）：
+    magic "GSS\\x01" | flags u8（bit0 = zlib 压缩） | 正文
+    正文按固定顺序写入变长整数（varint / zigzag）与长度前缀 UTF-8 字符串：
+    PR GR WF | current_scene timestamp | inventory | flags | consequence_tree
+    | node_id | path | story_id character_id | 其他字段（JSON，通常为空）
+    类型与上述编码不符的值（非布尔标志位、None 场景、非整数数值等）原样放进“其他字段”，
+    保证与旧版 JSON 存档一样往返无损。
+
+自动存档日志（.journal）：只追加，每回合一条很小的记录，崩溃后可重放恢复：
+    magic "GSJ\\x01" | 记录 ...
+    记录 = 长度 u32 | 类型 u8 | 载荷 | crc32 u32
+    - SNAPSHOT：载荷为完整二进制存档
+    - TURN：节点 ID、选项 ID、与上一回合相比变化的状态字段（列表只记追加部分）
+    重放从快照开始逐条应用，遇到不完整或校验失败的尾部记录即停止（写到一半时崩溃）。
+    每 AUTOSAVE_COMPACT_EVERY 回合（默认 50）把日志压缩为一条快照，文件大小保持有界。
+"""
+
+import json
+import os
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .state import GameState
+
+
+SAVE_MAGIC = b"GSS\x01"
+JOURNAL_MAGIC = b"GSJ\x01"
+
+_FLAG_ZLIB = 0x01
+_COMPRESS_BYTES = 256
+
+_RECORD_HEADER = struct.Struct("<IB")
+_CRC = struct.Struct("<I")
+_SNAPSHOT = 1
+_TURN = 2
+
+# 二进制正文中按位置写入的 GameState 字段；其余字段（将来新增的）以 JSON 附在末尾
+_PACKED_FIELDS = ("PR", "GR", "WF", "current_scene", "timestamp", "inventory", "flags", "consequence_tree")
+
+
+@dataclass
+class SaveGame:
+    """一份存档：游戏状态 + 预生成对话树中的位置"""
+
+    state: GameState = field(default_factory=GameState)
+    node_id: Optional[str] = None                      # 当前节点（实时模式为 None）
+    path: List[str] = field(default_factory=list)      # 走过的节点 ID（不含当前节点）
+    story_id: Optional[int] = None
+    character_id: Optional[int] = None
+
+
+# ==================== 二进制编码 ====================
+
+class _Writer:
+    def __init__(self):
+        self.buf = bytearray()
+
+    def uint(self, value: int) -> None:
+        value = int(value)
+        while value >= 0x80:
+            self.buf.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.buf.append(value)
+
+    def sint(self, value: int) -> None:
+        value = int(value)
+        self.uint((value << 1) ^ (value >> 63))
+
+    def str(self, value: Optional[str]) -> None:
+        raw = (value or "").encode("utf-8")
+        self.uint(len(raw))
+        self.buf += raw
+
+    def strs(self, values: List[str]) -> None:
+        self.uint(len(values))
+        for v in values:
+            self.str(str(v))
+
+
+class _Reader:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def uint(self) -> int:
+        result = shift = 0
+        while True:
+            if self.pos >= len(self.data):
+                raise ValueError("存档数据不完整")
+            b = self.data[self.pos]
+            self.pos += 1
+            result |= (b & 0x7F) << shift
+            if not b & 0x80:
+                return result
+            shift += 7
+
+    def sint(self) -> int:
+        value = self.uint()
+        return (value >> 1) ^ -(value & 1)
+
+    def str(self) -> str:
+        n = self.uint()
+        if self.pos + n > len(self.data):
+            raise ValueError("存档数据不完整")
+        value = self.data[self.pos:self.pos + n].decode("utf-8")
+        self.pos += n
+        return value
+
+    def strs(self) -> List[str]:
+        return [self.str() for _ in range(self.uint())]
+
+
+def _split_state(state: GameState) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """GameState → (按位置编码的字段, 其他字段)；类型不符合二进制编码的值归入其他字段"""
+    data = state.to_dict()
+    extra = {k: v for k, v in data.items() if k not in _PACKED_FIELDS}
+    packed: Dict[str, Any] = {}
+    for key in ("PR", "GR", "WF"):
+        value = data.get(key)
+        if isinstance(value, int) and not isinstance(value, bool):
+            packed[key] = value
+        else:
+            packed[key], extra[key] = 0, value
+    for key in ("current_scene", "timestamp"):
+        value = data.get(key)
+        if isinstance(value, str):
+            packed[key] = value
+        else:
+            packed[key], extra[key] = "", value
+    for key in ("inventory", "consequence_tree"):
+        value = data.get(key)
+        if isinstance(value, list) and all(isinstance(v, str) for v in value):
+            packed[key] = value
+        else:
+            packed[key], extra[key] = [], value
+    flags = data.get("flags")
+    if isinstance(flags, dict):
+        packed["flags"] = {k: v for k, v in flags.items() if isinstance(k, str) and isinstance(v, bool)}
+        others = {k: v for k, v in flags.items() if k not in packed["flags"]}
+        if others:
+            extra["flags"] = others        # 解码时与布尔标志位合并
+    else:
+        packed["flags"], extra["flags"] = {}, flags
+    return packed, extra
+
+
+def encode_save(save: SaveGame) -> bytes:
+    """SaveGame → 二进制存档"""
+    packed, extra = _split_state(save.state)
+    w = _Writer()
+    w.sint(packed["PR"])
+    w.sint(packed["GR"])
+    w.sint(packed["WF"])
+    w.str(packed["current_scene"])
+    w.str(packed["timestamp"])
+    w.strs(packed["inventory"])
+    w.uint(len(packed["flags"]))
+    for name, value in packed["flags"].items():
+        w.str(name)
+        w.uint(1 if value else 0)
+    w.strs(packed["consequence_tree"])
+    w.str(save.node_id)
+    w.strs(list(save.path))
+    w.uint(0 if save.story_id is None else int(save.story_id) + 1)
+    w.uint(0 if save.character_id is None else int(save.character_id) + 1)
+    w.str(json.dumps(extra, ensure_ascii=False, separators=(",", ":")) if extra else "")
+
+    body = bytes(w.buf)
+    flags = 0
+    if len(body) > _COMPRESS_BYTES:
+        compressed = zlib.compress(body, 6)
+        if len(compressed) < len(body):
+            body, flags = compressed, _FLAG_ZLIB
+    return SAVE_MAGIC + bytes([flags]) + body
+
+
+def decode_save(data: bytes) -> SaveGame:
+    """二进制存档 → SaveGame
+
+    Raises:
+        ValueError: 不是二进制存档或数据损坏
+    """
+    if data[:4] != SAVE_MAGIC or len(data) < 5:
+        raise ValueError("不是二进制存档")
+    body = data[5:]
+    if data[4] & _FLAG_ZLIB:
+        try:
+            body = zlib.decompress(body)
+        except zlib.error as e:
+            raise ValueError(f"存档解压失败：{e}")
+
+    r = _Reader(body)
+    state = GameState(PR=r.sint(), GR=r.sint(), WF=r.sint())
+    state.current_scene = r.str()
+    state.timestamp = r.str()
+    state.inventory = r.strs()
+    state.flags = {}
+    for _ in range(r.uint()):
+        name = r.str()
+        state.flags[name] = bool(r.uint())
+    state.consequence_tree = r.strs()
+    node_id = r.str() or None
+    path = r.strs()
+    story_id = r.uint() - 1
+    character_id = r.uint() - 1
+    extra = r.str()
+    for key, value in (json.loads(extra) if extra else {}).items():
+        if key == "flags" and isinstance(value, dict):
+            state.flags.update(value)
+        elif hasattr(state, key):
+            setattr(state, key, value)
+    return SaveGame(
+        state=state,
+        node_id=node_id,
+        path=path,
+        story_id=None if story_id < 0 else story_id,
+        character_id=None if character_id < 0 else character_id,
+    )
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_save(filepath: Union[str, Path], save: SaveGame) -> None:
+    """写入二进制存档（先写临时文件再替换，不会留下写了一半的存档）"""
+    _atomic_write(Path(filepath), encode_save(save))
+
+
+def read_save(filepath: Union[str, Path]) -> SaveGame:
+    """读取存档（兼容旧版 JSON 存档：只含 GameState 字段）
+
+    Raises:
+        FileNotFoundError: 存档文件不存在
+        ValueError: 存档格式错误
+    """
+    data = Path(filepath).read_bytes()
+    if data[:4] == SAVE_MAGIC:
+        return decode_save(data)
+    try:
+        return SaveGame(state=GameState(**json.loads(data.decode("utf-8"))))
+    except (UnicodeDecodeError, json.JSONDecodeError, TypeError) as e:
+        raise ValueError(f"存档格式错误：{e}")
+
+
+# ==================== 自动存档日志 ====================
+
+def _state_diff(prev: Dict[str, Any], cur: Dict[str, Any]) -> Dict[str, Any]:
+    """与上一回合相比变化的字段；列表只是在末尾追加时记为 "+字段": 追加部分"""
+    diff: Dict[str, Any] = {}
+    for key, value in cur.items():
+        old = prev.get(key)
+        if old == value:
+            continue
+        if isinstance(old, list) and isinstance(value, list) and value[:len(old)] == old:
+            diff["+" + key] = value[len(old):]
+        else:
+            diff[key] = value
+    return diff
+
+
+def _apply_diff(state: GameState, diff: Dict[str, Any]) -> None:
+    for key, value in diff.items():
+        if key.startswith("+"):
+            key = key[1:]
+            if hasattr(state, key):
+                setattr(state, key, list(getattr(state, key)) + list(value))
+        elif hasattr(state, key):
+            setattr(state, key, value)
+
+
+def _record(kind: int, payload: bytes) -> bytes:
+    body = bytes([kind]) + payload
+    return _RECORD_HEADER.pack(len(payload), kind) + payload + _CRC.pack(zlib.crc32(body))
+
+
+def _read_records(data: bytes) -> List[Tuple[int, bytes]]:
+    """日志 → [(类型, 载荷)]；遇到不完整或校验失败的记录即停止"""
+    records = []
+    pos = len(JOURNAL_MAGIC)
+    while pos + _RECORD_HEADER.size <= len(data):
+        length, kind = _RECORD_HEADER.unpack_from(data, pos)
+        start = pos + _RECORD_HEADER.size
+        end = start + length
+        if end + _CRC.size > len(data):
+            break
+        payload = data[start:end]
+        (crc,) = _CRC.unpack_from(data, end)
+        if crc != zlib.crc32(bytes([kind]) + payload):
+            break
+        records.append((kind, payload))
+        pos = end + _CRC.size
+    return records
+
+
+class AutosaveJournal:
+    """只追加的自动存档日志（一个会话一个文件）
+
+    不常驻文件句柄：每条记录打开-追加-关闭，多人服务上会话再多也不占用文件描述符。
+    """
+
+    def __init__(self, path: Union[str, Path], compact_every: Optional[int] = None):
+        """
+        Args:
+            path: 日志文件路径
+            compact_every: 每多少回合压缩一次（默认取 AUTOSAVE_COMPACT_EVERY，缺省 50）
+        """
+        self.path = Path(path)
+        if compact_every is None:
+            try:
+                compact_every = int(os.getenv("AUTOSAVE_COMPACT_EVERY", "50"))
+            except Exception:
+                compact_every = 50
+        self.compact_every = max(1, compact_every)
+        self.fsync = os.getenv("AUTOSAVE_FSYNC", "0") == "1"
+        self.turns_since_compact = 0
+        self._save: Optional[SaveGame] = None
+        self._state_dict: Dict[str, Any] = {}
+
+    @property
+    def save(self) -> Optional[SaveGame]:
+        """日志当前代表的存档（只读）"""
+        return self._save
+
+    def start(self, save: SaveGame) -> None:
+        """以 save 为起点（覆盖已有日志）"""
+        self._save = SaveGame(
+            state=GameState(**save.state.to_dict()),
+            node_id=save.node_id,
+            path=list(save.path),
+            story_id=save.story_id,
+            character_id=save.character_id,
+        )
+        self._state_dict = self._save.state.to_dict()
+        self.compact()
+
+    def load(self) -> Optional[SaveGame]:
+        """重放已有日志并以其为起点继续记录（顺带压缩、丢弃损坏的尾部）
+
+        Returns:
+            恢复出的存档；日志不存在或没有有效快照时返回 None
+        """
+        save = self.restore(self.path)
+        if save is not None:
+            self.start(save)
+        return save
+
+    def record_turn(self, node_id: Optional[str], state: GameState, choice_id: Optional[str] = None) -> None:
+        """记录一回合：前进到 node_id，状态变为 state
+
+        Raises:
+            RuntimeError: 尚未 start / load
+        """
+        if self._save is None:
+            raise RuntimeError("自动存档日志尚未开始（先调用 start 或 load）")
+
+        cur = state.to_dict()
+        w = _Writer()
+        w.str(node_id)
+        w.str(choice_id)
+        diff = _state_diff(self._state_dict, cur)
+        w.str(json.dumps(diff, ensure_ascii=False, separators=(",", ":")) if diff else "")
+        self._append(_record(_TURN, bytes(w.buf)))
+
+        if self._save.node_id is not None and node_id != self._save.node_id:
+            self._save.path.append(self._save.node_id)
+        self._save.node_id = node_id
+        self._save.state = GameState(**cur)
+        self._state_dict = cur
+
+        self.turns_since_compact += 1
+        if self.turns_since_compact >= self.compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """把日志重写为一条快照"""
+        if self._save is None:
+            return
+        _atomic_write(self.path, JOURNAL_MAGIC + _record(_SNAPSHOT, encode_save(self._save)))
+        self.turns_since_compact = 0
+
+    def discard(self) -> None:
+        """删除日志（会话正常结束）"""
+        self._save = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _append(self, record: bytes) -> None:
+        with open(self.path, "ab") as f:
+            f.write(record)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    @staticmethod
+    def restore(path: Union[str, Path]) -> Optional[SaveGame]:
+        """重放日志 → 存档；日志不存在、格式不对或没有有效快照时返回 None"""
+        try:
+            data = Path(path).read_bytes()
+        except FileNotFoundError:
+            return None
+        if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+            return None
+
+        save: Optional[SaveGame] = None
+        for kind, payload in _read_records(data):
+            try:
+                if kind == _SNAPSHOT:
+                    save = decode_save(payload)
+                elif kind == _TURN and save is not None:
+                    r = _Reader(payload)
+                    node_id = r.str() or None
+                    r.str()                                     # choice_id：仅供排查
+                    diff = r.str()
+                    if diff:
+                        _apply_diff(save.state, json.loads(diff))
+                    if save.node_id is not None and node_id != save.node_id:
+                        save.path.append(save.node_id)
+                    save.node_id = node_id
+            except ValueError:
+                break
+        return save
@@ -0,0 +1,217 @@
+"""实时模式的投机预生成
+
+玩家阅读选项时，后台为排在前面的 K 个可选项预先生成「响应 + 下一批选择点」：
+- 每个投机任务在游戏状态副本上运行，不影响当前状态；
+- 玩家选定后命中的任务直接交付结果，其余任务取消（未开始的直接撤销，
+  进行中的在当前 LLM 调用结束后不再继续生成选择点）；
+- 每个会话有 LLM 调用次数上限（spend cap），提交前预留、分支结束后退还未发生的调用。
+"""
+
+import copy
+import json
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from .state import GameState
+from .choices import Choice
+from ..utils.logging_utils import quiet_console
+
+
+@dataclass
+class SpeculationResult:
+    """一个投机分支的结果"""
+
+    choice_id: str
+    response: str
+    state: GameState
+    choices: Optional[List[Choice]] = None
+
+
+@dataclass
+class _Speculation:
+    choice: Choice
+    state_key: str
+    future: Optional[Future] = None
+    calls: int = 0
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+
+
+class SpeculativePregenerator:
+    """为展示中的选项投机生成响应与下一批选择点"""
+
+    # 每个分支的 LLM 调用：响应 1 次 + 选择点 1 次
+    CALLS_PER_BRANCH = 2
+
+    def __init__(
+        self,
+        response_generator,
+        choice_generator,
+        top_k: int = 2,
+        max_calls: int = 24,
+        with_choices: bool = True,
+    ):
+        """
+        Args:
+            response_generator: RuntimeResponseGenerator
+            choice_generator: ChoicePointsGenerator
+            top_k: 每回合投机的选项数
+            max_calls: 每会话投机 LLM 调用上限（<=0 表示不投机）
+            with_choices: 是否连同下一批选择点一起投机
+        """
+        self.response_generator = response_generator
+        self.choice_generator = choice_generator
+        self.top_k = max(0, top_k)
+        self.max_calls = max_calls
+        self.with_choices = with_choices
+
+        self._executor = ThreadPoolExecutor(max_workers=max(1, self.top_k))
+        self._lock = threading.Lock()
+        self._pending: Dict[str, _Speculation] = {}
+        self._reserved = 0
+        self.stats: Dict[str, int] = {
+            "submitted": 0,
+            "hits": 0,
+            "misses": 0,
+            "cancelled": 0,
+            "calls": 0,
+            "skipped_budget": 0,
+        }
+
+    @staticmethod
+    def _state_key(state: GameState) -> str:
+        return json.dumps(state.to_dict(), ensure_ascii=False, sort_keys=True, default=str)
+
+    @property
+    def _per_branch(self) -> int:
+        return self.CALLS_PER_BRANCH if self.with_choices else 1
+
+    @property
+    def remaining_calls(self) -> int:
+        """剩余可预留的投机调用数"""
+        with self._lock:
+            return max(0, self.max_calls - self._reserved)
+
+    def speculate(self, choices: List[Choice], state: GameState) -> List[str]:
+        """为展示中的前 K 个可选项提交投机任务（会先取消上一回合的任务）
+
+        Args:
+            choices: 当前展示的选择点（按展示顺序）
+            state: 当前游戏状态（不会被修改）
+
+        Returns:
+            已提交投机的 choice_id 列表
+        """
+        self.cancel_all()
+        state_key = self._state_key(state)
+        per_branch = self._per_branch
+        submitted: List[str] = []
+
+        candidates = [c for c in choices if c.is_available(state)][: self.top_k]
+        for choice in candidates:
+            with self._lock:
+                if self._reserved + per_branch > self.max_calls:
+                    self.stats["skipped_budget"] += 1
+                    break
+                self._reserved += per_branch
+            spec = _Speculation(choice=choice, state_key=state_key)
+            spec.future = self._executor.submit(self._run, spec, copy.deepcopy(state))
+            spec.future.add_done_callback(lambda _f, spec=spec: self._settle(spec))
+            with self._lock:
+                self._pending[choice.choice_id] = spec
+                self.stats["submitted"] += 1
+            submitted.append(choice.choice_id)
+        return submitted
+
+    def _run(self, spec: _Speculation, state: GameState) -> Optional[SpeculationResult]:
+        """后台执行一个投机分支（生成器的进度输出改写日志：玩家此时正在输入）"""
+        if spec.cancel_event.is_set():
+            return None
+        with quiet_console():
+            self._count_call(spec)
+            response = self.response_generator.generate_response(spec.choice, state, apply_consequences=True)
+
+            choices = None
+            if self.with_choices:
+                if spec.cancel_event.is_set():
+                    return None
+                self._count_call(spec)
+                choices = self.choice_generator.generate_choices(state.current_scene, state)
+        return SpeculationResult(choice_id=spec.choice.choice_id, response=response, state=state, choices=choices)
+
+    def _count_call(self, spec: _Speculation) -> None:
+        with self._lock:
+            spec.calls += 1
+            self.stats["calls"] += 1
+
+    def _settle(self, spec: _Speculation) -> None:
+        """分支结束（完成 / 取消 / 失败）后退还未发生的预留调用"""
+        with self._lock:
+            self._reserved = max(0, self._reserved - (self._per_branch - spec.calls))
+
+    def take(self, choice: Choice, state: GameState, wait: bool = True) -> Optional[SpeculationResult]:
+        """领取玩家所选选项的投机结果，并取消其余分支
+
+        Args:
+            choice: 玩家选定的选项
+            state: 当前游戏状态（必须与投机时一致，否则视为未命中）
+            wait: 命中但尚未完成时是否等待（整段生成时仍比从头生成快；流式响应开启时应传 False）
+
+        Returns:
+            命中时返回结果，否则 None
+        """
+        with self._lock:
+            spec = self._pending.pop(choice.choice_id, None)
+        self.cancel_all()
+
+        if spec is None or spec.state_key != self._state_key(state):
+            if spec is not None:
+                self._cancel(spec)
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        if not wait and not spec.future.done():
+            self._cancel(spec)
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+
+        try:
+            result = spec.future.result()
+        except Exception as e:
+            print(f"⚠️  [投机] 预生成失败: {e}")
+            result = None
+        with self._lock:
+            self.stats["hits" if result is not None else "misses"] += 1
+        return result
+
+    def _cancel(self, spec: _Speculation) -> None:
+        """取消一个分支：未开始的直接撤销，进行中的不再继续后续调用"""
+        spec.cancel_event.set()
+        if spec.future is not None:
+            spec.future.cancel()
+        with self._lock:
+            self.stats["cancelled"] += 1
+
+    def cancel_all(self) -> None:
+        """取消所有未领取的投机分支"""
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for spec in pending:
+            self._cancel(spec)
+
+    def shutdown(self) -> None:
+        """取消未领取分支并关闭线程池"""
+        self.cancel_all()
+        self._executor.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """投机统计（提交 / 命中 / 未命中 / 取消 / 实际调用 / 因预算跳过）"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["reserved"] = self._reserved
+            stats["max_calls"] = self.max_calls
+        return stats
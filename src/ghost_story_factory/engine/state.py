@@ -6,8 +6,6 @@
 
 from dataclasses import dataclass, field, asdict
 from typing import List, Dict, Any, Optional
-import json
-from pathlib import Path
 import re
 
 
@@ -93,6 +91,20 @@ class GameState:
                 if isinstance(value, list):
                     self.consequence_tree.extend(value)
 
+    def apply_choice(self, choice: Any) -> None:
+        """应用玩家选择的后果，并把 choice_id 记入后果树（无后果的选择也记入，
+        与预生成模式 / 游玩服务一致，“做出选择 N 次”按后果树长度统计）
+
+        实时响应（generate_response / stream_response）与前瞻投影共用这一状态转移，
+        保证命中前瞻缓存与现场生成得到的状态完全一致。
+
+        Args:
+            choice: Choice（需有 choice_id 与 consequences）
+        """
+        if choice.consequences:
+            self.update(choice.consequences)
+        self.consequence_tree.append(choice.choice_id)
+
     def check_preconditions(self, conditions: Dict[str, Any]) -> bool:
         """检查前置条件是否满足
 
@@ -247,20 +259,18 @@ class GameState:
             return False
 
     def save(self, filepath: str) -> None:
-        """保存状态到文件
+        """保存状态到文件（紧凑二进制格式，见 save_format）
 
         Args:
             filepath: 保存路径，如 "saves/杭州_S4_02:30.save"
         """
-        path = Path(filepath)
-        path.parent.mkdir(parents=True, exist_ok=True)
+        from .save_format import SaveGame, write_save
 
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(asdict(self), f, ensure_ascii=False, indent=2)
+        write_save(filepath, SaveGame(state=self))
 
     @classmethod
     def load(cls, filepath: str) -> 'GameState':
-        """从文件加载状态
+        """从文件加载状态（兼容旧版 JSON 存档）
 
         Args:
             filepath: 存档路径
@@ -270,12 +280,11 @@ class GameState:
 
         Raises:
             FileNotFoundError: 存档文件不存在
-            json.JSONDecodeError: 存档文件格式错误
+            ValueError: 存档文件格式错误
         """
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        from .save_format import read_save
 
-        return cls(**data)
+        return read_save(filepath).state
 
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典（用于序列化）"""
@@ -0,0 +1,124 @@
+"""
+选择点缓存
+
+宽树中大量节点落在同一场景、量化状态几乎相同（StateManager._quantize_key_state），
+却仍各自触发一次 generate_choices。ChoiceCache 以 (场景, 量化状态, 节拍类型) 为键
+缓存已生成的选择集：
+- 命中时按 reuse_probability 决定是否复用，保留一定的新鲜生成比例；
+- 同一选择集最多复用 max_reuse 次，避免整棵树被同一组选项刷屏；
+- 复用前做轻量改写：去掉与上一轮已出现选项重复的条目，剩余不足时视为未命中。
+"""
+
+import json
+import random
+import threading
+from copy import deepcopy
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+CacheKey = Tuple[str, str, str]
+
+
+class ChoiceCache:
+    """选择集缓存（线程安全）"""
+
+    def __init__(
+        self,
+        reuse_probability: float = 0.5,
+        max_reuse: int = 2,
+        min_choices: int = 2,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            reuse_probability: 命中时复用的概率（0 表示从不复用，1 表示总是复用）
+            max_reuse: 同一选择集最多被复用的次数
+            min_choices: 改写后至少保留的选项数，不足时视为未命中
+            seed: 随机种子（便于复现）
+        """
+        self.reuse_probability = max(0.0, min(1.0, reuse_probability))
+        self.max_reuse = max(0, max_reuse)
+        self.min_choices = max(1, min_choices)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        # 键 -> {"choices": [...], "reuses": int}
+        self._entries: Dict[CacheKey, Dict[str, Any]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0  # 命中但因概率 / 上限 / 去重未复用
+
+    @staticmethod
+    def make_key(quantized_state: Dict[str, Any], beat_type: Optional[str] = None) -> CacheKey:
+        """由量化状态与节拍类型构造缓存键
+
+        Args:
+            quantized_state: StateManager._quantize_key_state 的结果
+            beat_type: 节拍类型（guided 模式下）
+
+        Returns:
+            缓存键
+        """
+        rest = {k: v for k, v in quantized_state.items() if k != "scene"}
+        return (
+            str(quantized_state.get("scene") or ""),
+            json.dumps(rest, sort_keys=True, ensure_ascii=False, default=str),
+            beat_type or "",
+        )
+
+    def get(self, key: CacheKey, avoid_texts: Optional[Iterable[str]] = None) -> Optional[List[Dict[str, Any]]]:
+        """查找可复用的选择集
+
+        Args:
+            key: 缓存键
+            avoid_texts: 需要避开的选项文本（如上一轮已出现的选项）
+
+        Returns:
+            复用的选择集副本；未命中或本次不复用时返回 None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["reuses"] >= self.max_reuse or self._rng.random() >= self.reuse_probability:
+                self.skipped += 1
+                return None
+
+            avoid = {t.strip() for t in (avoid_texts or []) if t}
+            choices = [
+                deepcopy(c) for c in entry["choices"]
+                if str(c.get("choice_text", "")).strip() not in avoid
+            ]
+            if len(choices) < self.min_choices:
+                self.skipped += 1
+                return None
+
+            entry["reuses"] += 1
+            self.hits += 1
+            return choices
+
+    def put(self, key: CacheKey, choices: List[Dict[str, Any]]) -> None:
+        """写入新生成的选择集（已有条目保留，避免覆盖正在被复用的集合）"""
+        if not choices:
+            return
+        with self._lock:
+            self._entries.setdefault(key, {"choices": deepcopy(choices), "reuses": 0})
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            lookups = self.hits + self.misses + self.skipped
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def clear(self) -> None:
+        """清空缓存与统计"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.skipped = 0
@@ -0,0 +1,189 @@
+"""
+扩展前沿（Frontier）
+
+DialogueTreeBuilder 的待扩展节点队列：
+- 默认 FIFO（与原 BFS 行为一致）；
+- Beam 模式下为 best-first 堆：按 (节点分数, 深度, 骨架节拍优先级) 取最优，
+  超出 beam_width 时淘汰最差节点，每次操作均摊 O(log n)，
+  不再在每个父节点扩展后对整个队列做 O(n log n) 全量排序。
+
+检查点中以 to_checkpoint() 的结构持久化，恢复时保持堆序与淘汰顺序不变。
+"""
+
+import heapq
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 优先级元组：(score, depth, beat_priority)，数值越大越优先
+Priority = Tuple[int, int, int]
+
+
+class Frontier:
+    """待扩展节点队列（FIFO 或 best-first 有界堆）"""
+
+    def __init__(self, best_first: bool = False, beam_width: Optional[int] = None):
+        """
+        初始化前沿
+
+        Args:
+            best_first: 是否按优先级出队（Beam 模式）
+            beam_width: 前沿容量上限；None 或 <=0 表示不限
+        """
+        self.best_first = best_first
+        self.beam_width = beam_width if beam_width and beam_width > 0 else None
+
+        # FIFO 模式：(node_dict, depth)
+        self._fifo: deque = deque()
+
+        # best-first 模式：
+        # - _best: 小顶堆 (-score, -depth, -beat, seq)，堆顶为最优
+        # - _worst: 小顶堆 (score, depth, beat, -seq)，堆顶为最差（用于淘汰）
+        # - _entries: seq -> (priority, node_dict, depth)，已出队/淘汰的 seq 在两个堆中惰性删除
+        self._best: List[Tuple[int, int, int, int]] = []
+        self._worst: List[Tuple[int, int, int, int]] = []
+        self._entries: Dict[int, Tuple[Priority, Dict[str, Any], int]] = {}
+        self._seq = 0
+
+    # ==================== 基本操作 ====================
+
+    def push(self, node_dict: Dict[str, Any], depth: int, priority: Optional[Priority] = None):
+        """
+        入队
+
+        Args:
+            node_dict: 节点字典
+            depth: 节点深度
+            priority: (score, depth, beat_priority)，仅 best-first 模式使用
+        """
+        if not self.best_first:
+            self._fifo.append((node_dict, depth))
+            return
+
+        prio = tuple(priority) if priority is not None else (0, depth, 0)
+        seq = self._seq
+        self._seq += 1
+        self._entries[seq] = (prio, node_dict, depth)
+        heapq.heappush(self._best, (-prio[0], -prio[1], -prio[2], seq))
+        heapq.heappush(self._worst, (prio[0], prio[1], prio[2], -seq))
+
+        # 有界：超出容量时淘汰最差节点
+        if self.beam_width is not None:
+            while len(self._entries) > self.beam_width:
+                self._evict_worst()
+            self._maybe_compact()
+
+    def pop(self) -> Tuple[Dict[str, Any], int]:
+        """出队（FIFO 取最早，best-first 取最优）"""
+        if not self.best_first:
+            return self._fifo.popleft()
+
+        while self._best:
+            seq = heapq.heappop(self._best)[3]
+            entry = self._entries.pop(seq, None)
+            if entry is not None:
+                self._maybe_compact()
+                return entry[1], entry[2]
+        raise IndexError("pop from an empty frontier")
+
+    def __len__(self) -> int:
+        if not self.best_first:
+            return len(self._fifo)
+        return len(self._entries)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def items(self) -> List[Tuple[Dict[str, Any], int]]:
+        """按出队顺序返回当前所有 (node_dict, depth)"""
+        if not self.best_first:
+            return list(self._fifo)
+        ordered = sorted(self._entries.items(), key=lambda kv: (
+            -kv[1][0][0], -kv[1][0][1], -kv[1][0][2], kv[0]
+        ))
+        return [(entry[1], entry[2]) for _, entry in ordered]
+
+    def _evict_worst(self):
+        """淘汰当前最差节点（惰性跳过已出队条目）"""
+        while self._worst:
+            seq = -heapq.heappop(self._worst)[3]
+            if self._entries.pop(seq, None) is not None:
+                return
+
+    def _maybe_compact(self):
+        """两个堆中的失效条目超过有效条目两倍时重建，保证内存与均摊复杂度有界"""
+        live = len(self._entries)
+        if len(self._best) > 2 * live + 32:
+            self._best = [t for t in self._best if t[3] in self._entries]
+            heapq.heapify(self._best)
+        if len(self._worst) > 2 * live + 32:
+            self._worst = [t for t in self._worst if -t[3] in self._entries]
+            heapq.heapify(self._worst)
+
+    # ==================== 检查点 ====================
+
+    def to_checkpoint(self) -> Dict[str, Any]:
+        """序列化为检查点结构"""
+        if not self.best_first:
+            return {
+                "mode": "fifo",
+                "entries": [[node_dict, depth] for node_dict, depth in self._fifo],
+            }
+        return {
+            "mode": "best_first",
+            "beam_width": self.beam_width,
+            "next_seq": self._seq,
+            "entries": [
+                [seq, list(prio), node_dict, depth]
+                for seq, (prio, node_dict, depth) in sorted(self._entries.items())
+            ],
+        }
+
+    @classmethod
+    def from_checkpoint(
+        cls,
+        data: Any,
+        best_first: bool = False,
+        beam_width: Optional[int] = None,
+        priority_fn=None,
+    ) -> "Frontier":
+        """
+        从检查点恢复
+
+        兼容旧版检查点中的纯列表队列（[[node_dict, depth], ...]）：
+        best-first 模式下通过 priority_fn(node_dict, depth) 重新计算优先级。
+
+        Args:
+            data: 检查点中的 frontier 结构或旧版 queue 列表
+            best_first: 当前运行是否为 best-first 模式
+            beam_width: 前沿容量上限
+            priority_fn: 旧数据缺少优先级时的计算函数
+
+        Returns:
+            Frontier 实例
+        """
+        frontier = cls(best_first=best_first, beam_width=beam_width)
+
+        if isinstance(data, dict):
+            mode = data.get("mode", "fifo")
+            raw_entries = data.get("entries") or []
+        else:
+            mode = "fifo"
+            raw_entries = data or []
+
+        if mode == "best_first":
+            # 按原 seq 顺序重放，保持同分时的先后次序
+            for seq, prio, node_dict, depth in raw_entries:
+                if best_first:
+                    frontier._seq = int(seq)
+                    frontier.push(node_dict, int(depth), tuple(prio))
+                else:
+                    frontier.push(node_dict, int(depth))
+            if best_first:
+                frontier._seq = max(frontier._seq, int(data.get("next_seq", 0) or 0))
+            return frontier
+
+        for node_dict, depth in raw_entries:
+            prio = priority_fn(node_dict, depth) if (best_first and priority_fn) else None
+            frontier.push(node_dict, int(depth), prio)
+        return frontier
@@ -0,0 +1,160 @@
+"""
+近重复文本检测（MinHash + LSH）
+
+TreeBuilder 在扩展子树之前用它发现「几乎照抄已有节点」的响应文本：
+- 文本归一化后切成字符 n-gram（中文无需分词）；
+- MinHash 签名估计 Jaccard 相似度，按 band 分桶做 LSH，查询只比较同桶候选；
+- 纯 Python 实现，哈希函数固定种子，跨进程结果一致。
+"""
+
+import random
+import re
+import threading
+import zlib
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NORMALIZE = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def shingles(text: str, size: int = 3) -> Set[str]:
+    """文本 → 字符 n-gram 集合（去空白与标点）
+
+    Args:
+        text: 原文本
+        size: n-gram 长度
+
+    Returns:
+        n-gram 集合；文本短于 size 时返回整段文本本身
+    """
+    norm = _NORMALIZE.sub("", (text or "").lower())
+    if not norm:
+        return set()
+    if len(norm) <= size:
+        return {norm}
+    return {norm[i:i + size] for i in range(len(norm) - size + 1)}
+
+
+def jaccard(a: str, b: str, size: int = 3) -> float:
+    """两段文本 n-gram 集合的精确 Jaccard 相似度（用于短文本，如选项文本）"""
+    sa, sb = shingles(a, size), shingles(b, size)
+    if not sa or not sb:
+        return 0.0
+    return len(sa & sb) / len(sa | sb)
+
+
+class NearDuplicateIndex:
+    """MinHash LSH 索引（线程安全）"""
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 3,
+        seed: int = 1,
+    ):
+        """
+        Args:
+            threshold: 判定为近重复的相似度阈值（估计 Jaccard）
+            num_perm: MinHash 置换数（签名长度）
+            bands: LSH band 数（须整除 num_perm）
+            shingle_size: 字符 n-gram 长度
+            seed: 哈希置换种子
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm({num_perm}) 必须能被 bands({bands}) 整除")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        rng = random.Random(seed)
+        self._perms: List[Tuple[int, int]] = [
+            (rng.randint(1, _MERSENNE - 1), rng.randint(0, _MERSENNE - 1))
+            for _ in range(num_perm)
+        ]
+        self._lock = threading.Lock()
+        self._buckets: List[Dict[Tuple[int, ...], List[Hashable]]] = [{} for _ in range(bands)]
+        self._signatures: Dict[Hashable, Tuple[int, ...]] = {}
+        self._tags: Dict[Hashable, Optional[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        """计算 MinHash 签名；空文本返回 None"""
+        grams = shingles(text, self.shingle_size)
+        if not grams:
+            return None
+        hashes = [zlib.crc32(g.encode("utf-8")) for g in grams]
+        return tuple(
+            min(((a * h + b) % _MERSENNE) & _MAX_HASH for h in hashes)
+            for a, b in self._perms
+        )
+
+    def _band_keys(self, sig: Tuple[int, ...]):
+        for band in range(self.bands):
+            yield band, sig[band * self.rows:(band + 1) * self.rows]
+
+    @staticmethod
+    def _similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+        same = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+        return same / len(sig_a)
+
+    def add(self, key: Hashable, text: str, tag: Optional[str] = None) -> None:
+        """加入一段文本
+
+        Args:
+            key: 文本标识（如节点 ID）
+            text: 文本
+            tag: 附加标签（如场景 ID），查询时可按标签过滤
+        """
+        sig = self.signature(text)
+        if sig is None:
+            return
+        with self._lock:
+            if key in self._signatures:
+                return
+            self._signatures[key] = sig
+            self._tags[key] = tag
+            for band, band_key in self._band_keys(sig):
+                self._buckets[band].setdefault(band_key, []).append(key)
+
+    def query(self, text: str, tag: Optional[str] = None) -> List[Tuple[Hashable, float]]:
+        """查找近重复文本
+
+        Args:
+            text: 待查询文本
+            tag: 仅返回该标签下的结果（None 表示不过滤）
+
+        Returns:
+            [(key, 估计相似度)]，按相似度降序，只包含不低于阈值的结果
+        """
+        sig = self.signature(text)
+        if sig is None:
+            return []
+        with self._lock:
+            candidates: Set[Hashable] = set()
+            for band, band_key in self._band_keys(sig):
+                candidates.update(self._buckets[band].get(band_key, ()))
+            matches = []
+            for key in candidates:
+                if tag is not None and self._tags.get(key) != tag:
+                    continue
+                sim = self._similarity(sig, self._signatures[key])
+                if sim >= self.threshold:
+                    matches.append((key, sim))
+        matches.sort(key=lambda kv: -kv[1])
+        return matches
+
+    def clear(self) -> None:
+        """清空索引"""
+        with self._lock:
+            for bucket in self._buckets:
+                bucket.clear()
+            self._signatures.clear()
+            self._tags.clear()
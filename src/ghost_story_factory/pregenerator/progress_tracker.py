@@ -23,12 +23,14 @@ except Exception:
 class ProgressTracker:
     """进度追踪器"""
 
-    def __init__(self, total_estimated_nodes: int = 1500):
+    def __init__(self, total_estimated_nodes: int = 1500, show_progress_bar: bool = True):
         """
         初始化进度追踪器
 
         Args:
             total_estimated_nodes: 预计总节点数
+            show_progress_bar: 是否启用 rich 实时进度条（多角色并发生成时需关闭，
+                rich 同一时刻只允许一个 live 显示）
         """
         # 控制台：无 rich 时回退到标准输出
         if _RICH_AVAILABLE:
@@ -49,6 +51,7 @@ class ProgressTracker:
         self.total_tokens = 0
 
         # 进度条
+        self.show_progress_bar = show_progress_bar
         self.progress = None
         self.task_id = None
 
@@ -80,8 +83,8 @@ class ProgressTracker:
 
         self.console.print("\n")
 
-        # 创建进度条（无 rich 时不启用）
-        if _RICH_AVAILABLE:
+        # 创建进度条（无 rich 或显式关闭时不启用）
+        if _RICH_AVAILABLE and self.show_progress_bar:
             self.progress = Progress(
                 SpinnerColumn(),
                 TextColumn("[progress.description]{task.description}"),
@@ -18,6 +18,8 @@ from crewai import Agent, Task, Crew
 from crewai.llm import LLM
 
 from .skeleton_model import PlotSkeleton
+from ..utils.doc_index import get_document_index
+from ..utils.story_summary import get_story_summary
 
 # templates 目录：项目根目录下的 templates/
 TEMPLATE_DIR = Path(__file__).resolve().parents[3] / "templates"
@@ -59,11 +61,27 @@ def _load_prompt() -> str:
 
 
 def _shorten(text: str, max_chars: int = 4000) -> str:
-    """对长文本做截断，避免上下文爆炸"""
+    """对长文本做截断，避免上下文爆炸
+
+    借助文档索引按标题分段均衡截断：每一幕/每一节都保留开头部分，
+    避免只保留前 max_chars 字导致后半部分结构完全丢失。
+    """
     text = text.strip()
     if len(text) <= max_chars:
         return text
-    return text[: max_chars] + "\n\n...[内容已截断]..."
+    return get_document_index(text).shorten(max_chars)
+
+
+def _condense(text: str, max_chars: int = 4000) -> str:
+    """长文档压缩：优先使用分层摘要大纲（全篇 / 幕 / 场景），关闭摘要时回退到 _shorten"""
+    text = (text or "").strip()
+    if len(text) <= max_chars:
+        return text
+    if os.getenv("STORY_SUMMARIES", "1") == "1":
+        outline = get_story_summary(text).render(max_chars)
+        if outline:
+            return outline
+    return _shorten(text, max_chars)
 
 
 def _try_parse_json(text: str) -> Dict[str, Any]:
@@ -204,8 +222,8 @@ class SkeletonGenerator:
             raw_prompt.replace("{{CITY}}", self.city)
             .replace("{{TITLE}}", title.strip() or "未命名故事")
             .replace("{{SYNOPSIS}}", synopsis.strip())
-            .replace("{{LORE_V2}}", _shorten(lore_v2_text))
-            .replace("{{MAIN_STORY}}", _shorten(main_story_text))
+            .replace("{{LORE_V2}}", _condense(lore_v2_text))
+            .replace("{{MAIN_STORY}}", _condense(main_story_text))
         )
 
         agent = Agent(
@@ -56,6 +56,17 @@ class StateManager:
             "inventory_core": tuple(sorted(game_state.get("inventory", [])[:3]))
         }
 
+    def merge_key(self, game_state: Dict[str, Any]) -> str:
+        """
+        内容合并用的状态键：PR/GR/时间按 _quantize_key_state 量化，标志位与物品栏完整比较
+
+        两个节点键相同才允许互相合并，选择带来的物品 / 标志位不会因合并丢失。
+        """
+        key = self._quantize_key_state(game_state)
+        key["flags"] = sorted((str(k), v) for k, v in (game_state.get("flags") or {}).items())
+        key["inventory_core"] = sorted(str(i) for i in (game_state.get("inventory") or []))
+        return json.dumps(key, sort_keys=True, ensure_ascii=False, default=str)
+
     def _quantize_time(self, time_str: str) -> str:
         """将时间量化到 10 分钟粒度，减少状态爆炸"""
         try:
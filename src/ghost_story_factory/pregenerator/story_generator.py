@@ -6,7 +6,7 @@
 
 import os
 import time
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 from pathlib import Path
 
 from .synopsis_generator import StorySynopsis
@@ -15,7 +15,7 @@ from .skeleton_generator import SkeletonGenerator
 from .text_filler import NodeTextFiller
 from .story_report import build_story_report
 from ..database import DatabaseManager
-from ..utils.logging_utils import get_logger, get_run_logger
+from ..utils.logging_utils import ensure_logs_dir, get_logger, get_run_logger
 from ..utils.slug import story_slug
 
 
@@ -112,11 +112,17 @@ class StoryGeneratorWithRetry:
             },
         )
 
+        # prompt 遥测是进程级累计值：每个故事从零开始统计，元数据中只记录本故事的调用
+        from ..engine.prompt_budget import reset_prompt_telemetry
+        reset_prompt_telemetry()
+
         # 尝试次数 = 1 次基础尝试 + max_retries 额外重试
         attempts = self.max_retries + 1
         auto_restart = os.getenv("AUTO_RESTART_ON_FAIL", "0") == "1"
 
         for attempt_idx in range(1, attempts + 1):
+            db = None
+            stream_story_id = None
             try:
                 # 1. 生成文档（GDD、Lore、主线故事）
                 print("📄 Step 1/4: 生成游戏设计文档...")
@@ -133,6 +139,12 @@ class StoryGeneratorWithRetry:
                     # 预分析容错，不影响后续
                     print(f"⚠️  世界书预分析失败（已忽略）：{_e}")
 
+                # 1.6 分层摘要（全篇 / 幕 / 场景），存放在文档旁，供后续 prompt 按节拍取切片
+                try:
+                    self._prepare_story_summaries(gdd_content, lore_content, main_story)
+                except Exception as _e:
+                    print(f"⚠️  分层摘要构建失败（已忽略）：{_e}")
+
                 # 若仅需文档阶段（Stage A），在此直接返回
                 if stage_mode == "docs":
                     return {
@@ -227,6 +239,43 @@ class StoryGeneratorWithRetry:
                         # 骨架配置异常时，不影响原有行为
                         pass
 
+                # 流式落库：先建立故事与角色记录，每完成一个角色就保存其对话树，
+                # 主角线完成后即可游玩，失败时已完成的角色不会丢失
+                db = DatabaseManager()
+                stream_story_id = self._begin_streaming_story(db, characters)
+
+                filler = NodeTextFiller(skeleton=skeleton) if skeleton is not None else None
+                per_char_reports: Dict[str, Any] = {}
+                finished: set = set()
+                persisted: set = set()
+
+                def _finish_tree(char: Dict[str, Any], tree: Dict[str, Any]) -> Dict[str, Any]:
+                    """单个角色完成后：骨架模式下填充节点文本与结构报告，然后落库"""
+                    char_name = char["name"]
+                    if filler is not None:
+                        # 填充节点文本与节拍元数据
+                        tree = filler.fill(tree)
+
+                        # 生成结构与时长报告
+                        try:
+                            per_char_reports[char_name] = build_story_report(
+                                dialogue_tree=tree,
+                                skeleton=skeleton,
+                            )
+                        except Exception as e_report:
+                            # 报告失败不阻断主流程，只打印提示
+                            print(f"⚠️  结构报告生成失败（角色={char_name}，已忽略）：{e_report}")
+
+                    if stream_story_id is not None:
+                        try:
+                            db.save_character_tree(stream_story_id, char_name, tree)
+                            persisted.add(char_name)
+                        except Exception as e_save:
+                            print(f"⚠️  角色「{char_name}」对话树落库失败，将在最终保存时重试：{e_save}")
+
+                    finished.add(char_name)
+                    return tree
+
                 dialogue_trees = {}
 
                 # 🔄 尝试加载角色级别的检查点
@@ -239,84 +288,31 @@ class StoryGeneratorWithRetry:
                         print(f"   ✓ {char_name}")
                     print()
 
-                for char in characters:
-                    # 跳过已完成的角色
-                    if char['name'] in dialogue_trees:
-                        print(f"⏩ 跳过已完成的角色「{char['name']}」")
-                        continue
-
-                    print(f"\n🔄 正在为角色「{char['name']}」生成对话树...")
-
-                    # 使用角色专属的检查点路径
-                    checkpoint_path = f"checkpoints/{self.city}_{char['name']}_tree.json"
-
-                    tree_builder = DialogueTreeBuilder(
-                        city=self.city,
-                        synopsis=self.synopsis.synopsis,
-                        gdd_content=gdd_content,
-                        lore_content=lore_content,
-                        main_story=main_story,
-                        test_mode=self.test_mode,
-                        plot_skeleton=skeleton,
-                    )
-
-                    # 在完整预生成流水线中，使用更密集的检查点，降低失败重跑成本。
-                    # 默认每 10 个节点落一次检查点，可通过 PREGEN_CHECKPOINT_INTERVAL 覆盖。
-                    try:
-                        import os as _os
-                        interval = int(_os.getenv("PREGEN_CHECKPOINT_INTERVAL", "10"))
-                        if interval > 0:
-                            tree_builder.checkpoint_interval = interval
-                    except Exception:
-                        pass
-
-                    tree = tree_builder.generate_tree(
-                        max_depth=max_depth,
-                        min_main_path_depth=min_main_path,
-                        checkpoint_path=checkpoint_path
-                    )
+                dialogue_trees = self._generate_character_trees(
+                    characters=characters,
+                    dialogue_trees=dialogue_trees,
+                    gdd_content=gdd_content,
+                    lore_content=lore_content,
+                    main_story=main_story,
+                    skeleton=skeleton,
+                    max_depth=max_depth,
+                    min_main_path=min_main_path,
+                    on_tree_done=_finish_tree,
+                )
 
-                    dialogue_trees[char['name']] = tree
-                    print(f"   ✅ {char['name']} 的对话树生成完成：{len(tree)} 个节点")
-
-                    # 保存角色级检查点（每完成一个角色）
-                    self._save_character_checkpoint(
-                        characters,
-                        dialogue_trees,
-                        gdd_content,
-                        lore_content,
-                        main_story
-                    )
+                # 检查点恢复的角色未经过 _finish_tree，这里补做
+                for char in characters:
+                    char_name = char["name"]
+                    if char_name not in finished and isinstance(dialogue_trees.get(char_name), dict):
+                        dialogue_trees[char_name] = _finish_tree(char, dialogue_trees[char_name])
 
                 print("\n")
                 print("   ✅ 所有对话树生成完成")
                 print("\n")
 
-                # 3.5 基于骨架的节点填充与结构报告（仅在 v4 骨架模式下执行）
+                # 3.5 基于骨架的节点填充与结构报告（仅在 v4 骨架模式下；已由 _finish_tree 逐角色完成）
                 if skeleton is not None:
-                    print("🧩 Step 3.5: 基于骨架填充节点文本并生成结构报告（v4 模式）...")
-
-                    filler = NodeTextFiller(skeleton=skeleton)
-                    per_char_reports: Dict[str, Any] = {}
-
-                    for char in characters:
-                        char_name = char["name"]
-                        tree = dialogue_trees.get(char_name)
-                        if not isinstance(tree, dict):
-                            continue
-
-                        # 填充节点文本与节拍元数据
-                        dialogue_trees[char_name] = filler.fill(tree)
-
-                        # 生成结构与时长报告
-                        try:
-                            per_char_reports[char_name] = build_story_report(
-                                dialogue_tree=dialogue_trees[char_name],
-                                skeleton=skeleton,
-                            )
-                        except Exception as e_report:
-                            # 报告失败不阻断主流程，只打印提示
-                            print(f"⚠️  结构报告生成失败（角色={char_name}，已忽略）：{e_report}")
+                    print("🧩 Step 3.5: 结构报告（v4 模式，节点文本已在各角色完成时填充）...")
 
                     # 简要输出主角报告的结论，便于人工快速判断
                     main_char_name = characters[0]["name"]
@@ -332,7 +328,6 @@ class StoryGeneratorWithRetry:
 
                 # 4. 保存到数据库
                 print("💾 Step 4/4: 保存到数据库...")
-                db = DatabaseManager()
 
                 # 计算元数据
                 main_tree = dialogue_trees[characters[0]['name']]  # 主角的树
@@ -341,7 +336,7 @@ class StoryGeneratorWithRetry:
                 # 如果有骨架与结构报告，则在元数据中附加结构质量标记（仅用于上层与日志，不影响 DB schema）
                 if skeleton is not None:
                     main_char_name = characters[0]["name"]
-                    main_report = per_char_reports.get(main_char_name) if 'per_char_reports' in locals() else None
+                    main_report = per_char_reports.get(main_char_name)
                     if isinstance(main_report, dict):
                         verdict = main_report.get("verdict", {}) or {}
                         # 轻量质量状态：通过 → accepted，否则 warning（由上层或人工决定是否采信）
@@ -350,14 +345,23 @@ class StoryGeneratorWithRetry:
                         metadata["structure"]["report"] = main_report
                         metadata["structure"]["quality_state"] = quality_state
 
-                story_id = db.save_story(
-                    city_name=self.city,
-                    title=self.synopsis.title,
-                    synopsis=self.synopsis.synopsis,
-                    characters=characters,
-                    dialogue_trees=dialogue_trees,
-                    metadata=metadata
-                )
+                if stream_story_id is not None:
+                    # 各角色的树已逐个落库：补写落库失败的角色，再写入最终元数据
+                    for char in characters:
+                        char_name = char["name"]
+                        if char_name in dialogue_trees and char_name not in persisted:
+                            db.save_character_tree(stream_story_id, char_name, dialogue_trees[char_name])
+                    db.finalize_story(stream_story_id, metadata)
+                    story_id = stream_story_id
+                else:
+                    story_id = db.save_story(
+                        city_name=self.city,
+                        title=self.synopsis.title,
+                        synopsis=self.synopsis.synopsis,
+                        characters=characters,
+                        dialogue_trees=dialogue_trees,
+                        metadata=metadata
+                    )
 
                 db.close()
                 print(f"   ✅ 故事已保存到数据库（ID: {story_id}）")
@@ -379,6 +383,17 @@ class StoryGeneratorWithRetry:
             except Exception as e:
                 # 记录异常细节（文件日志 + 失败摘要文件）
                 _logger.exception("故事生成失败一次 (attempt=%s/%s)", attempt_idx, attempts)
+                if db is not None:
+                    # 已落库的角色保留可玩；故事标记为中断，下次生成同名故事时继续写入
+                    if stream_story_id is not None:
+                        try:
+                            db.set_story_status(stream_story_id, "failed")
+                        except Exception:
+                            pass
+                    try:
+                        db.close()
+                    except Exception:
+                        pass
                 try:
                     self._write_failure_log(
                         reason=str(e),
@@ -415,6 +430,190 @@ class StoryGeneratorWithRetry:
                 print(f"   等待 10 秒后重试...")
                 time.sleep(10)
 
+    def _generate_character_trees(
+        self,
+        characters: list,
+        dialogue_trees: Dict[str, Any],
+        gdd_content: str,
+        lore_content: str,
+        main_story: str,
+        skeleton,
+        max_depth: int,
+        min_main_path: int,
+        on_tree_done: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        为所有未完成的角色生成对话树（支持多角色并发）
+
+        并发数由 CHARACTER_CONCURRENCY 控制（默认 3，设为 1 即按顺序生成）。
+        各角色的构建器从生成器共享池取得同一组 LLM 生成器（共享 LLM 客户端与并发信号量），
+        总请求并发仍受 KIMI_CONCURRENCY* 约束；每个角色保留独立的树检查点，
+        每完成一个角色即写入角色级检查点。
+
+        Args:
+            characters: 角色列表
+            dialogue_trees: 已完成的对话树（角色名 -> 树），会被原地补全
+            gdd_content: GDD 内容
+            lore_content: Lore 内容
+            main_story: 主线故事
+            skeleton: 故事骨架（可为 None）
+            max_depth: 最大深度
+            min_main_path: 主线最小深度
+            on_tree_done: 单个角色完成（且写入检查点）后的回调 (char, tree) → tree，
+                在工作线程中执行，返回值替换该角色的树（用于填充文本与逐角色落库）
+
+        Returns:
+            全部角色的对话树
+        """
+        import threading
+        import concurrent.futures
+
+        pending = []
+        for char in characters:
+            # 跳过已完成的角色
+            if char['name'] in dialogue_trees:
+                print(f"⏩ 跳过已完成的角色「{char['name']}」")
+                continue
+            pending.append(char)
+
+        if not pending:
+            return dialogue_trees
+
+        try:
+            workers = int(os.getenv("CHARACTER_CONCURRENCY", "3"))
+        except Exception:
+            workers = 1
+        workers = max(1, min(workers, len(pending)))
+        parallel = workers > 1
+
+        builders = {
+            char['name']: self._create_tree_builder(
+                char, gdd_content, lore_content, main_story, skeleton, parallel
+            )
+            for char in pending
+        }
+        if parallel:
+            print(f"   ⚡ 并发生成 {len(pending)} 个角色的对话树（workers={workers}）")
+
+        save_lock = threading.Lock()
+
+        def _run(char: Dict[str, Any]) -> Dict[str, Any]:
+            print(f"\n🔄 正在为角色「{char['name']}」生成对话树...")
+            tree = builders[char['name']].generate_tree(
+                max_depth=max_depth,
+                min_main_path_depth=min_main_path,
+                checkpoint_path=f"checkpoints/{self.city}_{char['name']}_tree.json"
+            )
+            with save_lock:
+                dialogue_trees[char['name']] = tree
+                print(f"   ✅ {char['name']} 的对话树生成完成：{len(tree)} 个节点")
+
+                # 保存角色级检查点（每完成一个角色）
+                self._save_character_checkpoint(
+                    characters,
+                    dialogue_trees,
+                    gdd_content,
+                    lore_content,
+                    main_story
+                )
+
+            if on_tree_done is not None:
+                tree = on_tree_done(char, tree)
+                with save_lock:
+                    dialogue_trees[char['name']] = tree
+            return tree
+
+        if not parallel:
+            for char in pending:
+                _run(char)
+            return dialogue_trees
+
+        # 并发：单个角色失败不打断其余角色，全部结束后再抛出首个错误（已完成的角色已落检查点）
+        errors = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run, char): char for char in pending}
+            for fut in concurrent.futures.as_completed(futures):
+                try:
+                    fut.result()
+                except Exception as e:
+                    name = futures[fut]['name']
+                    print(f"❌ 角色「{name}」的对话树生成失败：{e}")
+                    errors.append(e)
+        if errors:
+            raise errors[0]
+
+        # 保持与角色列表一致的顺序
+        return {
+            char['name']: dialogue_trees[char['name']]
+            for char in characters
+            if char['name'] in dialogue_trees
+        }
+
+    def _begin_streaming_story(self, db, characters: list) -> Optional[int]:
+        """
+        建立生成中的故事记录，供逐角色落库
+
+        STREAM_PERSIST=0 或数据库不支持流式保存时返回 None（回退到生成结束后整体 save_story）
+
+        Returns:
+            故事 ID 或 None
+        """
+        if os.getenv("STREAM_PERSIST", "1") == "0" or not hasattr(db, "begin_story"):
+            return None
+        try:
+            story_id = db.begin_story(
+                city_name=self.city,
+                title=self.synopsis.title,
+                synopsis=self.synopsis.synopsis,
+                characters=characters,
+                metadata={"estimated_duration": self.synopsis.estimated_duration},
+            )
+            print(f"   💾 已建立故事记录（ID: {story_id}，status=generating），角色完成后逐个落库")
+            return story_id
+        except Exception as e:
+            print(f"⚠️  建立故事记录失败，改为生成结束后整体保存：{e}")
+            return None
+
+    def _create_tree_builder(
+        self,
+        char: Dict[str, Any],
+        gdd_content: str,
+        lore_content: str,
+        main_story: str,
+        skeleton,
+        parallel: bool = False,
+    ):
+        """为单个角色创建对话树构建器"""
+        tree_builder = DialogueTreeBuilder(
+            city=self.city,
+            synopsis=self.synopsis.synopsis,
+            gdd_content=gdd_content,
+            lore_content=lore_content,
+            main_story=main_story,
+            test_mode=self.test_mode,
+            plot_skeleton=skeleton,
+        )
+
+        # 在完整预生成流水线中，使用更密集的检查点，降低失败重跑成本。
+        # 默认每 10 个节点落一次检查点，可通过 PREGEN_CHECKPOINT_INTERVAL 覆盖。
+        try:
+            interval = int(os.getenv("PREGEN_CHECKPOINT_INTERVAL", "10"))
+            if interval > 0:
+                tree_builder.checkpoint_interval = interval
+        except Exception:
+            pass
+
+        if parallel:
+            # 并发时：增量日志按角色拆分，避免多个线程交错写同一文件；
+            # 关闭 rich 实时进度条（同一时刻只允许一个 live 显示）
+            if hasattr(tree_builder, "incremental_log_path"):
+                tree_builder.incremental_log_path = f"checkpoints/{self.city}_{char['name']}_incremental.jsonl"
+            tracker = getattr(tree_builder, "progress_tracker", None)
+            if tracker is not None:
+                tracker.show_progress_bar = False
+
+        return tree_builder
+
     def _write_failure_log(self, reason: str, attempt: int, attempts: int, extra: Optional[Dict[str, Any]] = None) -> None:
         """写一份失败摘要日志到 logs/failures/ 下，包含失败原因与关键信息。
 
@@ -423,7 +622,7 @@ class StoryGeneratorWithRetry:
         try:
             from datetime import datetime
             import json
-            logs_dir = Path("logs/failures")
+            logs_dir = ensure_logs_dir() / "failures"
             logs_dir.mkdir(parents=True, exist_ok=True)
             ts = datetime.now().strftime("%Y%m%d_%H%M%S")
             safe_title = self.synopsis.title.replace("/", "_")
@@ -465,12 +664,15 @@ class StoryGeneratorWithRetry:
         main_story_path: Optional[str]
     ) -> tuple:
         """生成或加载文档"""
+        # 记录命中的文档路径（摘要文件写在文档旁）
+        self._document_paths = {}
 
         # 如果提供了路径，直接加载（缓存命中）
         if gdd_path and Path(gdd_path).exists():
             print(f"   📦 使用缓存 GDD: {gdd_path}")
             with open(gdd_path, 'r', encoding='utf-8') as f:
                 gdd_content = f.read()
+            self._document_paths["gdd"] = Path(gdd_path)
         else:
             gdd_content = None
 
@@ -479,6 +681,7 @@ class StoryGeneratorWithRetry:
             print(f"   📦 使用缓存 Lore v2: {lore_path}")
             with open(lore_path, 'r', encoding='utf-8') as f:
                 lore_content = f.read()
+            self._document_paths["lore"] = Path(lore_path)
         else:
             lore_content = None
 
@@ -486,6 +689,7 @@ class StoryGeneratorWithRetry:
             print(f"   📦 使用缓存主线: {main_story_path}")
             with open(main_story_path, 'r', encoding='utf-8') as f:
                 main_story = f.read()
+            self._document_paths["story"] = Path(main_story_path)
         else:
             main_story = None
 
@@ -496,24 +700,25 @@ class StoryGeneratorWithRetry:
             safe_title = _re_sub(r'[^\w\u4e00-\u9fff]+', '_', self.synopsis.title)
             title_dir = base_dir / safe_title
 
-            def _read_if_missing(current, path, label):
+            def _read_if_missing(current, path, label, key):
                 if current is not None:
                     return current
                 if path.exists():
                     print(f"   📦 自动命中缓存 {label}: {path}")
+                    self._document_paths[key] = path
                     return path.read_text(encoding='utf-8')
                 return None
 
             if base_dir.exists():
                 # 先查标题子目录
                 if title_dir.exists():
-                    gdd_content = _read_if_missing(gdd_content, title_dir / f"{self.city}_{safe_title}_gdd.md", "GDD")
-                    lore_content = _read_if_missing(lore_content, title_dir / f"{self.city}_{safe_title}_lore_v2.md", "Lore v2")
-                    main_story = _read_if_missing(main_story, title_dir / f"{self.city}_{safe_title}_story.md", "主线")
+                    gdd_content = _read_if_missing(gdd_content, title_dir / f"{self.city}_{safe_title}_gdd.md", "GDD", "gdd")
+                    lore_content = _read_if_missing(lore_content, title_dir / f"{self.city}_{safe_title}_lore_v2.md", "Lore v2", "lore")
+                    main_story = _read_if_missing(main_story, title_dir / f"{self.city}_{safe_title}_story.md", "主线", "story")
                 # 再查城市级文件
-                gdd_content = _read_if_missing(gdd_content, base_dir / f"{self.city}_gdd.md", "GDD")
-                lore_content = _read_if_missing(lore_content, base_dir / f"{self.city}_lore_v2.md", "Lore v2")
-                main_story = _read_if_missing(main_story, base_dir / f"{self.city}_story.md", "主线")
+                gdd_content = _read_if_missing(gdd_content, base_dir / f"{self.city}_gdd.md", "GDD", "gdd")
+                lore_content = _read_if_missing(lore_content, base_dir / f"{self.city}_lore_v2.md", "Lore v2", "lore")
+                main_story = _read_if_missing(main_story, base_dir / f"{self.city}_story.md", "主线", "story")
         except Exception:
             pass
 
@@ -545,6 +750,7 @@ class StoryGeneratorWithRetry:
                             lore_path2 = (base_dir / f"{self.city}_lore_v2.md")
                         if lore_path2.exists():
                             lore_content = lore_path2.read_text(encoding='utf-8')
+                            self._document_paths["lore"] = lore_path2
 
                 if gdd_content is None:
                     gdd_content = full_gen.artifacts.get("gdd")
@@ -556,6 +762,7 @@ class StoryGeneratorWithRetry:
                             gdd_path2 = (base_dir / f"{self.city}_gdd.md")
                         if gdd_path2.exists():
                             gdd_content = gdd_path2.read_text(encoding='utf-8')
+                            self._document_paths["gdd"] = gdd_path2
 
                 if main_story is None:
                     main_story = full_gen.artifacts.get("story")
@@ -567,6 +774,7 @@ class StoryGeneratorWithRetry:
                             story_path2 = (base_dir / f"{self.city}_story.md")
                         if story_path2.exists():
                             main_story = story_path2.read_text(encoding='utf-8')
+                            self._document_paths["story"] = story_path2
 
                 print("   ✅ 已使用完整生成器文档")
             except Exception as e:
@@ -582,6 +790,27 @@ class StoryGeneratorWithRetry:
 
         return gdd_content, lore_content, main_story
 
+    def _prepare_story_summaries(self, gdd_content: str, lore_content: str, main_story: str) -> None:
+        """一次性构建主线 / Lore / GDD 的分层摘要
+
+        文档来自磁盘时摘要写在文档旁（xxx.md → xxx.summary.json），源文本未变化时直接复用；
+        生成器按内容取用（get_story_summary / scene_slice）：主线切片进选择点与响应 prompt，
+        GDD / Lore 切片作为场景锚点，Lore 大纲进骨架 prompt。可通过 STORY_SUMMARIES=0 关闭。
+        """
+        if os.getenv("STORY_SUMMARIES", "1") != "1":
+            return
+
+        from ..utils.story_summary import load_or_build_summary, summary_path_for
+
+        paths = getattr(self, "_document_paths", {}) or {}
+        for key, text in (("story", main_story), ("lore", lore_content), ("gdd", gdd_content)):
+            if not text:
+                continue
+            doc_path = paths.get(key)
+            summary = load_or_build_summary(text, summary_path_for(doc_path) if doc_path else None)
+            scenes = sum(len(a.scenes) for a in summary.acts)
+            print(f"   🗂️  {key} 摘要：{len(summary.acts)} 幕 / {scenes} 场景")
+
     def _preflight_analyze_worldbook(self, lore_content: str) -> None:
         """对 v2 世界书做启发式预分析，提前提醒可能达不到深度/结局阈值。
 
@@ -885,6 +1114,7 @@ class StoryGeneratorWithRetry:
     def _calculate_metadata(self, main_tree: Dict, all_trees: Dict) -> Dict[str, Any]:
         """计算元数据"""
         from .time_validator import TimeValidator
+        from ..engine.prompt_budget import get_prompt_telemetry
 
         validator = TimeValidator()
         report = validator.get_validation_report(main_tree)
@@ -898,7 +1128,8 @@ class StoryGeneratorWithRetry:
             "cost": 0.0,  # TODO: 实际计算
             "total_tokens": 0,  # TODO: 实际统计
             "generation_time": 0,  # TODO: 实际计时
-            "model": os.getenv("KIMI_MODEL_RESPONSE", "kimi-k2-0905-preview")
+            "model": os.getenv("KIMI_MODEL_RESPONSE", "kimi-k2-0905-preview"),
+            "prompt_telemetry": get_prompt_telemetry(),
         }
 
     def _print_success_summary(self, metadata: Dict):
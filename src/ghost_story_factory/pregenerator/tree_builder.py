@@ -6,10 +6,10 @@
 """
 
 import os
+import threading
 import time
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-from collections import deque
 from copy import deepcopy
 
 from .dialogue_node import DialogueNode, create_root_node
@@ -17,6 +17,9 @@ from .state_manager import StateManager
 from .progress_tracker import ProgressTracker
 from .time_validator import TimeValidator
 from .skeleton_model import PlotSkeleton
+from .frontier import Frontier
+from .choice_cache import ChoiceCache
+from .near_duplicate import NearDuplicateIndex, jaccard
 
 
 class DialogueTreeBuilder:
@@ -114,10 +117,51 @@ class DialogueTreeBuilder:
             except Exception:
                 pass
 
+        # Spine-first：先生成一条直达结局的关键路径，再并发回填旁支（默认关闭）
+        self.spine_first = os.getenv("SPINE_FIRST", "0") == "1"
+        # 主干在达到主线深度前中断（候选全被合并 / 过早结局）时，从最深的主干节点重新生成选择的次数
+        try:
+            self.spine_retries = int(os.getenv("SPINE_RETRIES", "3"))
+        except Exception:
+            self.spine_retries = 3
+
         # Beam 搜索（主线优先），默认关闭以保持向后兼容
         self.beam_mode = os.getenv("BEAM_MODE", "0") == "1"
         self.beam_width = int(os.getenv("BEAM_WIDTH", "50"))
 
+        # 选择点缓存：同场景 + 量化状态 + 节拍类型的节点按概率复用已生成的选择集（CHOICE_CACHE=0 关闭）
+        self.choice_cache: Optional[ChoiceCache] = None
+        if os.getenv("CHOICE_CACHE", "1") == "1":
+            try:
+                seed_raw = os.getenv("CHOICE_CACHE_SEED")
+                self.choice_cache = ChoiceCache(
+                    reuse_probability=float(os.getenv("CHOICE_CACHE_REUSE_PROB", "0.5")),
+                    max_reuse=int(os.getenv("CHOICE_CACHE_MAX_REUSE", "2")),
+                    seed=int(seed_raw) if seed_raw else None,
+                )
+            except Exception:
+                self.choice_cache = ChoiceCache()
+
+        # 近重复检测：新响应与同场景已有节点几乎雷同时，在展开子树前重新生成
+        # NEAR_DUP_POLICY：regenerate（默认，同场景雷同先重写）/ merge（不重写）/ off
+        # 状态可合并的目标已由 find_approximate 在调用 LLM 前复用；这里只额外合并
+        # 同一批并发生成、彼此不可见的兄弟节点（状态键相同、且目标不是祖先）
+        self.near_dup_policy = os.getenv("NEAR_DUP_POLICY", "regenerate")
+        self.near_dup_index: Optional[NearDuplicateIndex] = None
+        if self.near_dup_policy != "off":
+            try:
+                self.near_dup_threshold = float(os.getenv("NEAR_DUP_THRESHOLD", "0.8"))
+                self.near_dup_retries = int(os.getenv("NEAR_DUP_RETRIES", "1"))
+                # 过短的文本多为占位 / 兜底响应，不参与近重复判定
+                self.near_dup_min_chars = int(os.getenv("NEAR_DUP_MIN_CHARS", "60"))
+            except Exception:
+                self.near_dup_threshold, self.near_dup_retries, self.near_dup_min_chars = 0.8, 1, 60
+            self.near_dup_index = NearDuplicateIndex(threshold=self.near_dup_threshold)
+        self.near_dup_stats = {"merged": 0, "regenerated": 0, "choices_dropped": 0}
+        self._near_dup_lock = threading.Lock()
+        # 已入索引的节点：node_id -> (状态键, parent_id)，合并时校验状态并排除祖先
+        self._near_dup_nodes: Dict[str, Tuple[str, Optional[str]]] = {}
+
         # 导演上下文（DirectorContext）：记录最近若干步的选择 / 响应 / 节拍信息，
         # 供 Choice / Response Prompt 避免重复并保持节奏一致。
         self.director_context = {
@@ -131,7 +175,22 @@ class DialogueTreeBuilder:
             self.director_context_window = 5
 
     def _init_generators(self):
-        """初始化 LLM 生成器（复用现有引擎）"""
+        """初始化 LLM 生成器（复用现有引擎）
+
+        默认从进程级共享池获取：同一组文档（GDD/Lore/主线）的多个构建器
+        共用生成器实例、场景记忆与 LLM 客户端。GENERATOR_POOL=0 时每个构建器独立创建。
+        """
+        if os.getenv("GENERATOR_POOL", "1") == "1":
+            from ..engine.generator_pool import get_shared_generators
+
+            self.choice_generator, self.response_generator = get_shared_generators(
+                self.gdd,
+                self.lore,
+                self.main_story
+            )
+            print("✅ LLM 生成器初始化完成（共享池）")
+            return
+
         from ..engine.choices import ChoicePointsGenerator
         from ..engine.response import RuntimeResponseGenerator
 
@@ -241,7 +300,7 @@ class DialogueTreeBuilder:
         if checkpoint:
             print("\n✅ 发现未完成的检查点！正在恢复...")
             dialogue_tree = checkpoint.get("tree", {})
-            queue_data = checkpoint.get("queue", [])
+            frontier_data = checkpoint.get("frontier") or checkpoint.get("queue", [])
             node_counter = checkpoint.get("node_counter", 1)
             state_cache = checkpoint.get("state_cache", {})
             scene_index = checkpoint.get("scene_index", {})
@@ -249,13 +308,26 @@ class DialogueTreeBuilder:
             if not state_cache and checkpoint.get("state_registry"):
                 state_cache = checkpoint.get("state_registry", {})
 
-            # 恢复队列
-            queue = deque([(node_data, depth) for node_data, depth in queue_data])
+            # 恢复队列（新版为 frontier 结构，旧版为纯列表）
+            queue = Frontier.from_checkpoint(
+                frontier_data,
+                best_first=self.beam_mode,
+                beam_width=self.beam_width,
+                priority_fn=self._frontier_priority,
+            )
 
             # 恢复状态管理器
             self.state_manager.state_cache = state_cache or {}
             self.state_manager.scene_index = scene_index or {}
 
+            # 重建近重复索引
+            if self.near_dup_index is not None:
+                for node_id, node_data in dialogue_tree.items():
+                    self._register_near_dup(
+                        node_id, node_data.get("narrative") or "", node_data.get("scene"),
+                        node_data.get("game_state") or {}, node_data.get("parent_id"),
+                    )
+
             print(f"   已恢复 {len(dialogue_tree)} 个节点")
             print(f"   队列中还有 {len(queue)} 个待处理节点")
             print(f"   从节点 #{node_counter} 继续生成...\n")
@@ -284,24 +356,49 @@ class DialogueTreeBuilder:
             state_hash = self.state_manager.get_state_hash(root_node.game_state)
             root_node.state_hash = state_hash
             self.state_manager.register_state(state_hash, "root")
+            self._register_near_dup("root", root_node.narrative or "", root_node.scene, root_node.game_state, None)
 
             # 初始化对话树和队列（确保选择已生成）
             root_dict = root_node.to_dict()
             dialogue_tree = {
                 "root": root_dict
             }
-            queue = deque([(root_dict, 0)])  # (节点字典, 深度)
+            queue = self._new_frontier()  # (节点字典, 深度)
+            queue.push(root_dict, 0, self._frontier_priority(root_dict, 0))
 
             node_counter = 1
 
         # 打开增量日志
         self._open_incremental_log()
 
+        # Spine-first：新生成时先沿关键路径拉出一条主干直达结局，再回填旁支
+        if self.spine_first and not checkpoint:
+            spine_ids, node_counter = self._build_spine(dialogue_tree, node_counter, max_depth)
+            spine_depth = len(spine_ids) - 1
+            spine_ending = bool(dialogue_tree[spine_ids[-1]].get("is_ending"))
+            print(
+                f"🦴 主干完成：深度 {spine_depth}，"
+                f"{'已到达结局' if spine_ending else '未到达结局'}"
+                f"（主线要求 ≥ {self.min_main_path_depth}）"
+            )
+            if spine_depth < self.min_main_path_depth:
+                print("⚠️  主干深度未达标，回填阶段与后续扩展将继续尝试加深")
+
+            # 主干上的非结局节点入队，回填其余分支（已挂接的选择会被跳过）
+            queue = self._new_frontier()
+            for nid in spine_ids:
+                node = dialogue_tree[nid]
+                if node.get("is_ending"):
+                    continue
+                node_depth = int(node.get("depth", 0))
+                queue.push(node, node_depth, self._frontier_priority(node, node_depth))
+
+            self._save_full_checkpoint(dialogue_tree, queue, node_counter, checkpoint_path)
+
         # BFS/Beam 遍历（批量并发扩展子节点）
-        import concurrent.futures, threading
-        id_lock = threading.Lock()
+        import concurrent.futures
         while queue:
-            current_node_dict, depth = queue.popleft()
+            current_node_dict, depth = queue.pop()
             current_node = DialogueNode.from_dict(current_node_dict)
 
             # 检查终止条件
@@ -309,140 +406,24 @@ class DialogueTreeBuilder:
                 continue
 
             # 为每个选择生成子节点（并发限制）
-            # Skeleton / guided 模式：对选择进行排序，使推进/critical 优先
-            choices_all = list(current_node.choices or [])
-            if self.skeleton_mode and choices_all:
-                def _score_choice(ch: dict) -> int:
-                    score = 0
-                    if ch.get("choice_type") == "critical" or ch.get("critical") is True:
-                        score += 100
-                    cons = ch.get("consequences") or {}
-                    if isinstance(cons, dict):
-                        if cons.get("critical") is True:
-                            score += 80
-                        for k in ("next_scene", "CT", "next_event"):
-                            if k in cons:
-                                score += 50
-                        for k in ("time", "timestamp", "time_skip"):
-                            if k in cons:
-                                score += 20
-                    # 轻量关键词启发（仅在文本存在时）
-                    txt = (ch.get("choice_text") or "")
-                    if any(kw in txt for kw in ("前往", "推进", "直接", "关键")):
-                        score += 10
-                    return -score  # 小顶堆：负分排序即高分在前
-                try:
-                    choices_all.sort(key=_score_choice)
-                except Exception:
-                    pass
-
-            # guided 模式：根据骨架对下一层深度的分支数做约束；否则使用全局配置
-            if self.guided_mode and choices_all:
-                max_children = self._max_children_for_next_depth(depth + 1)
-                if max_children is not None and max_children > 0:
-                    choices_batch = choices_all[:max_children]
-                else:
-                    choices_batch = choices_all[:self.max_branches_per_node]
-            else:
-                choices_batch = choices_all[:self.max_branches_per_node]
-
-            def _expand_choice(choice):
-                # 创建新状态
-                new_state = self.state_manager.update_state(
-                    current_node.game_state,
-                    choice.get("consequences", {})
-                )
-
-                # 记录最近一次选择文本及本轮所有选项文本，供后续节点在 Prompt 中做“去重复”约束
-                try:
-                    new_state["last_choice_text"] = choice.get("choice_text", "")
-                    all_texts = [
-                        c.get("choice_text", "")
-                        for c in choices_all
-                        if isinstance(c, dict)
-                    ]
-                    new_state["last_choices_texts"] = [t for t in all_texts if t]
-                except Exception:
-                    pass
-
-                # 计算状态哈希
-                state_hash = self.state_manager.get_state_hash(new_state)
-
-                # 检查状态是否已存在（去重）
-                existing_node_id = self.state_manager.get_node_by_state(state_hash)
-                if existing_node_id:
-                    return {
-                        "type": "reuse",
-                        "parent_id": current_node.node_id,
-                        "choice_id": choice.get("choice_id"),
-                        "existing_node_id": existing_node_id
-                    }
-
-                # 近似状态匹配（同场景合并）
-                approx_node_id = self.state_manager.find_approximate(new_state)
-                if approx_node_id:
-                    return {
-                        "type": "reuse",
-                        "parent_id": current_node.node_id,
-                        "choice_id": choice.get("choice_id"),
-                        "existing_node_id": approx_node_id
-                    }
-
-                # 创建新节点
-                child_node = DialogueNode(
-                    node_id="",  # 暂不分配，主线程统一编号
-                    scene=new_state.get("current_scene", current_node.scene),
-                    depth=depth + 1,
-                    game_state=new_state,
-                    state_hash=state_hash,
-                    parent_id=current_node.node_id,
-                    parent_choice_id=choice.get("choice_id"),
-                    generated_at=datetime.now().isoformat()
-                )
-
-                # 生成响应文本
-                child_node.narrative = self._generate_response(choice, new_state)
+            choices_all, choices_batch = self._select_choice_batch(current_node, depth)
 
-                # 更新导演上下文（最近选择 / 响应 / 节拍）
-                try:
-                    beat_meta = None
-                    if self.guided_mode and self.plot_skeleton is not None:
-                        beat = self._beat_for_depth(depth + 1)
-                        if beat is not None:
-                            beat_meta = {
-                                "depth": depth + 1,
-                                "beat_type": getattr(beat, "beat_type", None),
-                                "tension_level": getattr(beat, "tension_level", None),
-                                "is_critical": getattr(beat, "is_critical_branch_point", None),
-                            }
-                    self._update_director_context(choice, child_node, beat_meta)
-                except Exception:
-                    pass
-
-                # 检查是否结局；guided 模式下根据骨架控制结局出现位置
-                child_node.is_ending = self._check_ending(new_state)
-                if self.guided_mode and child_node.is_ending:
-                    # 若骨架不允许当前深度出现结局，则强制改为非结局继续推进
-                    if not self._allow_ending_for_depth(depth + 1):
-                        child_node.is_ending = False
-
-                if child_node.is_ending:
-                    child_node.ending_type = self._determine_ending_type(new_state)
-                else:
-                    # 生成下一批选择
-                    child_node.choices = self._generate_choices(child_node)
-
-                return {
-                    "type": "new",
-                    "parent_id": current_node.node_id,
-                    "choice": choice,
-                    "child": child_node
-                }
+            # 跳过已挂接的选择（spine-first 模式下主干已扩展过的分支）
+            linked = {
+                c.get("choice_id")
+                for c in dialogue_tree.get(current_node.node_id, {}).get("choices", [])
+                if c.get("next_node_id")
+            }
+            if linked:
+                choices_batch = [c for c in choices_batch if c.get("choice_id") not in linked]
 
             # 并发执行扩展
             results: List[dict] = []
             with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrent_workers) as executor:
-                futures = [executor.submit(_expand_choice, c) for c in choices_batch]
+                futures = [
+                    executor.submit(self._expand_choice, current_node, depth, c, choices_all)
+                    for c in choices_batch
+                ]
                 for fut in concurrent.futures.as_completed(futures):
                     try:
                         results.append(fut.result())
@@ -452,61 +433,25 @@ class DialogueTreeBuilder:
             # 汇总结果（保证数据一致性）
             for res in results:
                 if res["type"] == "reuse":
-                    choice_id = res["choice_id"]
-                    existing_node_id = res["existing_node_id"]
-                    parent_node_id = res["parent_id"]
-                    for parent_choice in dialogue_tree[parent_node_id]["choices"]:
-                        if parent_choice.get("choice_id") == choice_id:
-                            parent_choice["next_node_id"] = existing_node_id
-                            break
+                    self._link_choice(dialogue_tree, res["parent_id"], res["choice_id"], res["existing_node_id"])
                     continue
 
                 child_node: DialogueNode = res["child"]
-                choice = res["choice"]
-
-                # 分配唯一ID（线程安全）
-                with id_lock:
-                    child_node.node_id = f"node_{node_counter:04d}"
-                    node_counter += 1
-
-                # 添加到树
-                dialogue_tree[child_node.node_id] = child_node.to_dict()
-                self.state_manager.register_state(child_node.state_hash, child_node.node_id)
-                self.state_manager.register_scene_index(child_node.game_state, child_node.state_hash)
-                choice["next_node_id"] = child_node.node_id
-
-                # 记录父子关系
-                parent_node_id = current_node.node_id
-                dialogue_tree[parent_node_id]["children"].append(child_node.node_id)
-                for parent_choice in dialogue_tree[parent_node_id]["choices"]:
-                    if parent_choice.get("choice_id") == choice.get("choice_id"):
-                        parent_choice["next_node_id"] = child_node.node_id
-                        break
-
-                # 加入队列
-                if not child_node.is_ending:
-                    queue.append((child_node.to_dict(), depth + 1))
-
-                # 增量日志记录
-                self._append_incremental_log({
-                    "event": "add_node",
-                    "node": child_node.to_dict()
-                })
-
-                # 更新进度
-                self.progress_tracker.update(
-                    current_depth=depth + 1,
-                    node_count=len(dialogue_tree),
-                    current_branch=f"{child_node.scene} → {choice.get('choice_text', '')[:20]}..."
+
+                # 同批兄弟节点并发生成，彼此在 _expand_choice 中不可见：挂接前再查一次
+                dup_id = self._near_duplicate_target(child_node)
+                if dup_id:
+                    self._link_choice(dialogue_tree, current_node.node_id, res["choice"].get("choice_id"), dup_id)
+                    continue
+
+                node_counter = self._attach_child(
+                    dialogue_tree, current_node.node_id, child_node, res["choice"], node_counter
                 )
 
-            # Beam：收缩前沿，优先保留更“推进”的节点
-            if self.beam_mode and len(queue) > self.beam_width:
-                try:
-                    ranked = sorted(list(queue), key=lambda t: -self._score_node(t[0], t[1]))
-                    queue = deque(ranked[: self.beam_width])
-                except Exception:
-                    pass
+                # 加入队列（Beam 模式下超出 beam_width 时在堆内淘汰最差节点）
+                if not child_node.is_ending:
+                    child_dict = child_node.to_dict()
+                    queue.push(child_dict, depth + 1, self._frontier_priority(child_dict, depth + 1))
 
             # 定期保存检查点（包含完整状态）
             if len(dialogue_tree) % self.checkpoint_interval == 0:
@@ -576,13 +521,16 @@ class DialogueTreeBuilder:
             leaves.sort(key=lambda x: int(x[1].get("depth", 0)), reverse=True)
 
             # 基于叶子重建队列并继续 BFS 扩展（顺序执行，保证稳定性）
-            queue = deque([(dialogue_tree[nid], int(node.get("depth", 0))) for nid, node in leaves])
+            queue = self._new_frontier()
+            for nid, node in leaves:
+                leaf_depth = int(node.get("depth", 0))
+                queue.push(dialogue_tree[nid], leaf_depth, self._frontier_priority(dialogue_tree[nid], leaf_depth))
 
             import threading
             id_lock = threading.Lock()
 
             while queue:
-                current_node_dict, depth = queue.popleft()
+                current_node_dict, depth = queue.pop()
                 current_node = DialogueNode.from_dict(current_node_dict)
 
                 if self.state_manager.should_prune(current_node.game_state, depth, max_depth):
@@ -590,27 +538,8 @@ class DialogueTreeBuilder:
 
                 choices_all = list(current_node.choices or [])
                 if self.skeleton_mode and choices_all:
-                    def _score_choice2(ch: dict) -> int:
-                        score = 0
-                        if ch.get("choice_type") == "critical" or ch.get("critical") is True:
-                            score += 100
-                        cons = ch.get("consequences") or {}
-                        if isinstance(cons, dict):
-                            if cons.get("critical") is True:
-                                score += 80
-                            for k in ("next_scene", "CT", "next_event"):
-                                if k in cons:
-                                    score += 50
-                            for k in ("time", "timestamp", "time_skip"):
-                                if k in cons:
-                                    score += 20
-
-                        txt = (ch.get("choice_text") or "")
-                        if any(kw in txt for kw in ("前往", "推进", "直接", "关键")):
-                            score += 10
-                        return -score
                     try:
-                        choices_all.sort(key=_score_choice2)
+                        choices_all.sort(key=lambda ch: -self._score_choice(ch))
                     except Exception:
                         pass
                 choices_batch = choices_all[:self.max_branches_per_node]
@@ -676,7 +605,8 @@ class DialogueTreeBuilder:
 
                     # 入队继续扩展
                     if not child_node.is_ending:
-                        queue.append((child_node.to_dict(), depth + 1))
+                        child_dict = child_node.to_dict()
+                        queue.push(child_dict, depth + 1, self._frontier_priority(child_dict, depth + 1))
 
                     # 增量日志 & 进度
                     self._append_incremental_log({"event": "add_node", "node": child_node.to_dict()})
@@ -686,14 +616,6 @@ class DialogueTreeBuilder:
                         current_branch=f"{child_node.scene} → {choice.get('choice_text', '')[:20]}..."
                     )
 
-                # Beam：收缩前沿
-                if self.beam_mode and len(queue) > self.beam_width:
-                    try:
-                        ranked = sorted(list(queue), key=lambda t: -self._score_node(t[0], t[1]))
-                        queue = deque(ranked[: self.beam_width])
-                    except Exception:
-                        pass
-
             # 扩展一轮后再次验证
             report = self.time_validator.get_validation_report(dialogue_tree)
             print("📊 扩展后再次验证...")
@@ -801,8 +723,451 @@ class DialogueTreeBuilder:
         # 关闭增量日志
         self._close_incremental_log()
 
+        if self.choice_cache is not None:
+            stats = self.choice_cache.stats()
+            print(
+                f"♻️  选择点缓存：复用 {stats['hits']} 次 / 新生成 {stats['misses'] + stats['skipped']} 次"
+                f"（命中率 {stats['hit_rate']:.0%}）"
+            )
+        if self.near_dup_index is not None:
+            print(
+                f"🧬 近重复检测：合并 {self.near_dup_stats['merged']} 个节点，"
+                f"重写 {self.near_dup_stats['regenerated']} 次，去除雷同选项 {self.near_dup_stats['choices_dropped']} 个"
+            )
+
         return dialogue_tree
 
+    def _select_choice_batch(self, node: DialogueNode, depth: int):
+        """
+        选出本节点要扩展的选择
+
+        Skeleton / guided 模式下先排序，使推进/critical 优先；
+        guided 模式根据骨架对下一层深度的分支数做约束，否则使用全局配置。
+
+        Returns:
+            (排序后的全部选择, 本次扩展的选择批次)
+        """
+        choices_all = list(node.choices or [])
+        if self.skeleton_mode and choices_all:
+            try:
+                choices_all.sort(key=lambda ch: -self._score_choice(ch))
+            except Exception:
+                pass
+
+        if self.guided_mode and choices_all:
+            max_children = self._max_children_for_next_depth(depth + 1)
+            if max_children is not None and max_children > 0:
+                return choices_all, choices_all[:max_children]
+        return choices_all, choices_all[:self.max_branches_per_node]
+
+    def _build_spine(
+        self,
+        dialogue_tree: Dict[str, Any],
+        node_counter: int,
+        max_depth: int,
+    ):
+        """
+        构建关键路径主干：每层只扩展一个最优选择，直至到达结局或最大深度
+
+        主干上每层只产生一次 LLM 调用链，主线深度的成本随深度线性增长；
+        过早出现的结局保留为旁支结局，并改走下一个候选选择；候选用尽仍未达到主线深度时，
+        在最深的主干节点上重新生成选择继续延伸（最多 SPINE_RETRIES 次），之后才进入回填。
+
+        Args:
+            dialogue_tree: 对话树（至少包含 root）
+            node_counter: 节点计数器
+            max_depth: 最大深度
+
+        Returns:
+            (主干节点 ID 列表（含 root）, 更新后的节点计数器)
+        """
+        spine_ids = ["root"]
+        current_node = DialogueNode.from_dict(dialogue_tree["root"])
+        depth = 0
+        retries = max(0, self.spine_retries)
+
+        while depth < max_depth:
+            choices_all, choices_batch = self._select_choice_batch(current_node, depth)
+            # 主干始终优先走推进性最强的选择
+            candidates = sorted(choices_batch, key=lambda ch: -self._score_choice(ch))
+
+            next_node: Optional[DialogueNode] = None
+            early_ending: Optional[DialogueNode] = None
+            while True:
+                for choice in candidates:
+                    try:
+                        res = self._expand_choice(current_node, depth, choice, choices_all)
+                    except Exception as e:
+                        print(f"⚠️  主干节点生成异常: {e}")
+                        continue
+
+                    if res["type"] == "reuse":
+                        self._link_choice(dialogue_tree, res["parent_id"], res["choice_id"], res["existing_node_id"])
+                        continue
+
+                    child_node: DialogueNode = res["child"]
+                    node_counter = self._attach_child(
+                        dialogue_tree, current_node.node_id, child_node, res["choice"], node_counter
+                    )
+
+                    # 过早出现的结局保留为旁支结局，改走下一个候选
+                    if child_node.is_ending and depth + 1 < self.min_main_path_depth:
+                        early_ending = early_ending or child_node
+                        continue
+                    next_node = child_node
+                    break
+
+                if next_node is not None or retries <= 0:
+                    break
+                # 候选用尽而主线深度未达标：在最深的主干节点上重新生成选择，继续向下延伸
+                retries -= 1
+                candidates = self._fresh_spine_choices(dialogue_tree, current_node)
+                print(f"🦴 主干在深度 {depth} 中断，重新生成选择继续延伸（剩余重试 {retries} 次）")
+                if not candidates:
+                    continue
+
+            # 重试用尽：过早结局作为主干终点（验证阶段与后续扩展继续尝试加深）
+            if next_node is None:
+                next_node = early_ending
+            if next_node is None:
+                break
+
+            spine_ids.append(next_node.node_id)
+            if next_node.is_ending:
+                break
+            current_node = next_node
+            depth += 1
+
+        return spine_ids, node_counter
+
+    def _fresh_spine_choices(self, dialogue_tree: Dict[str, Any], node: DialogueNode) -> List[Dict[str, Any]]:
+        """
+        为中断的主干节点追加一个新选择（文本与已有选择不重复，ID 冲突时加后缀）
+
+        每次只追加推进性最强的一个，避免节点的选项数膨胀。
+
+        Returns:
+            新追加的选择（列表，可能为空）
+        """
+        try:
+            fresh = self._generate_choices(node) or []
+        except Exception as e:
+            print(f"⚠️  主干重新生成选择失败: {e}")
+            return []
+        existing = dialogue_tree[node.node_id]["choices"]
+        used_ids = {c.get("choice_id") for c in existing}
+        used_texts = {c.get("choice_text") for c in existing}
+        for ch in sorted(fresh, key=lambda c: -self._score_choice(c)):
+            if not isinstance(ch, dict) or ch.get("choice_text") in used_texts:
+                continue
+            ch = dict(ch)
+            base_id = str(ch.get("choice_id") or "R")
+            choice_id, n = base_id, 1
+            while choice_id in used_ids:
+                choice_id, n = f"{base_id}_{n}", n + 1
+            ch["choice_id"] = choice_id
+            existing.append(ch)
+            node.choices = list(existing)
+            return [ch]
+        return []
+
+    def _expand_choice(
+        self,
+        current_node: DialogueNode,
+        depth: int,
+        choice: Dict[str, Any],
+        choices_all: List[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        扩展单个选择：推进状态、去重/近似合并，必要时生成新子节点内容
+
+        Args:
+            current_node: 父节点
+            depth: 父节点深度
+            choice: 要扩展的选择
+            choices_all: 父节点的全部选择（用于记录“本轮选项”去重上下文）
+
+        Returns:
+            {"type": "reuse", ...} 或 {"type": "new", "child": DialogueNode, ...}
+        """
+        # 创建新状态
+        new_state = self.state_manager.update_state(
+            current_node.game_state,
+            choice.get("consequences", {})
+        )
+
+        # 记录最近一次选择文本及本轮所有选项文本，供后续节点在 Prompt 中做“去重复”约束
+        try:
+            new_state["last_choice_text"] = choice.get("choice_text", "")
+            all_texts = [
+                c.get("choice_text", "")
+                for c in choices_all
+                if isinstance(c, dict)
+            ]
+            new_state["last_choices_texts"] = [t for t in all_texts if t]
+        except Exception:
+            pass
+
+        # 计算状态哈希
+        state_hash = self.state_manager.get_state_hash(new_state)
+
+        # 检查状态是否已存在（去重）
+        existing_node_id = self.state_manager.get_node_by_state(state_hash)
+        if existing_node_id:
+            return {
+                "type": "reuse",
+                "parent_id": current_node.node_id,
+                "choice_id": choice.get("choice_id"),
+                "existing_node_id": existing_node_id
+            }
+
+        # 近似状态匹配（同场景合并）
+        approx_node_id = self.state_manager.find_approximate(new_state)
+        if approx_node_id:
+            return {
+                "type": "reuse",
+                "parent_id": current_node.node_id,
+                "choice_id": choice.get("choice_id"),
+                "existing_node_id": approx_node_id
+            }
+
+        # 创建新节点
+        child_node = DialogueNode(
+            node_id="",  # 暂不分配，主线程统一编号
+            scene=new_state.get("current_scene", current_node.scene),
+            depth=depth + 1,
+            game_state=new_state,
+            state_hash=state_hash,
+            parent_id=current_node.node_id,
+            parent_choice_id=choice.get("choice_id"),
+            generated_at=datetime.now().isoformat()
+        )
+
+        # 生成响应文本
+        child_node.narrative = self._generate_response(choice, new_state)
+
+        # 近重复检测：与同场景已有节点雷同的响应在生成下一批选择之前重写
+        if self.near_dup_policy == "regenerate" and self.near_dup_index is not None:
+            self._regenerate_near_duplicate(child_node, choice, new_state)
+
+        # 更新导演上下文（最近选择 / 响应 / 节拍）
+        try:
+            beat_meta = None
+            if self.guided_mode and self.plot_skeleton is not None:
+                beat = self._beat_for_depth(depth + 1)
+                if beat is not None:
+                    beat_meta = {
+                        "depth": depth + 1,
+                        "beat_type": getattr(beat, "beat_type", None),
+                        "tension_level": getattr(beat, "tension_level", None),
+                        "is_critical": getattr(beat, "is_critical_branch_point", None),
+                    }
+            self._update_director_context(choice, child_node, beat_meta)
+        except Exception:
+            pass
+
+        # 检查是否结局；guided 模式下根据骨架控制结局出现位置
+        child_node.is_ending = self._check_ending(new_state)
+        if self.guided_mode and child_node.is_ending:
+            # 若骨架不允许当前深度出现结局，则强制改为非结局继续推进
+            if not self._allow_ending_for_depth(depth + 1):
+                child_node.is_ending = False
+
+        if child_node.is_ending:
+            child_node.ending_type = self._determine_ending_type(new_state)
+        else:
+            # 生成下一批选择
+            child_node.choices = self._generate_choices(child_node)
+
+        return {
+            "type": "new",
+            "parent_id": current_node.node_id,
+            "choice": choice,
+            "child": child_node
+        }
+
+    def _register_near_dup(
+        self,
+        node_id: str,
+        narrative: str,
+        scene: Optional[str],
+        game_state: Dict[str, Any],
+        parent_id: Optional[str],
+    ) -> None:
+        """把节点加入近重复索引（记录状态键与父节点，供合并时校验）"""
+        if self.near_dup_index is None:
+            return
+        self.near_dup_index.add(node_id, narrative, tag=scene)
+        with self._near_dup_lock:
+            self._near_dup_nodes[node_id] = (self.state_manager.merge_key(game_state or {}), parent_id)
+
+    def _near_duplicate_target(self, child_node: DialogueNode) -> Optional[str]:
+        """
+        与子节点响应近重复、可合并的兄弟节点 ID（挂接同一批并发生成的子节点时调用）
+
+        只合并同场景且状态键相同的节点（合并后玩家沿用目标节点的 game_state，状态不同会丢掉
+        本次选择的物品 / 标志位）；父节点及其祖先不作为目标（否则树中出现环）。
+        """
+        if self.near_dup_index is None or len(child_node.narrative or "") < self.near_dup_min_chars:
+            return None
+        matches = self.near_dup_index.query(child_node.narrative, tag=child_node.scene)
+        if not matches:
+            return None
+
+        child_key = self.state_manager.merge_key(child_node.game_state or {})
+        with self._near_dup_lock:
+            ancestors = set()
+            current = child_node.parent_id
+            while current and current not in ancestors:
+                ancestors.add(current)
+                current = self._near_dup_nodes.get(current, ("", None))[1]
+            for node_id, _score in matches:
+                meta = self._near_dup_nodes.get(node_id)
+                if meta is None or node_id in ancestors or meta[0] != child_key:
+                    continue
+                self.near_dup_stats["merged"] += 1
+                return node_id
+        return None
+
+    def _regenerate_near_duplicate(
+        self,
+        child_node: DialogueNode,
+        choice: Dict[str, Any],
+        new_state: Dict[str, Any],
+    ) -> None:
+        """
+        响应与同场景已有节点雷同时重写（最多 near_dup_retries 次）；
+        跨场景的雷同不计入（不会合并，也不值得花一次重写）。
+        """
+        if len(child_node.narrative or "") < self.near_dup_min_chars:
+            return
+        for _ in range(max(0, self.near_dup_retries)):
+            if not self.near_dup_index.query(child_node.narrative or "", tag=child_node.scene):
+                return
+            child_node.narrative = self._generate_response(choice, new_state)
+            with self._near_dup_lock:
+                self.near_dup_stats["regenerated"] += 1
+
+    def _dedupe_choice_texts(self, choices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """去掉与兄弟选项近重复的选项（至少保留 2 个）"""
+        if self.near_dup_index is None or len(choices) <= 2:
+            return choices
+        kept: List[Dict[str, Any]] = []
+        for ch in choices:
+            text = str(ch.get("choice_text", ""))
+            if any(jaccard(text, str(k.get("choice_text", ""))) >= self.near_dup_threshold for k in kept):
+                continue
+            kept.append(ch)
+        if len(kept) < 2:
+            return choices
+        with self._near_dup_lock:
+            self.near_dup_stats["choices_dropped"] += len(choices) - len(kept)
+        return kept
+
+    def _link_choice(
+        self,
+        dialogue_tree: Dict[str, Any],
+        parent_id: str,
+        choice_id: Optional[str],
+        target_id: str,
+    ):
+        """将父节点中指定选择指向目标节点"""
+        for parent_choice in dialogue_tree[parent_id]["choices"]:
+            if parent_choice.get("choice_id") == choice_id:
+                parent_choice["next_node_id"] = target_id
+                break
+
+    def _attach_child(
+        self,
+        dialogue_tree: Dict[str, Any],
+        parent_id: str,
+        child_node: DialogueNode,
+        choice: Dict[str, Any],
+        node_counter: int,
+    ) -> int:
+        """
+        为新子节点分配 ID 并挂接到树（注册状态、父子关系、增量日志、进度）
+
+        Returns:
+            更新后的节点计数器
+        """
+        child_node.node_id = f"node_{node_counter:04d}"
+        node_counter += 1
+
+        # 添加到树
+        dialogue_tree[child_node.node_id] = child_node.to_dict()
+        self.state_manager.register_state(child_node.state_hash, child_node.node_id)
+        self.state_manager.register_scene_index(child_node.game_state, child_node.state_hash)
+        self._register_near_dup(
+            child_node.node_id, child_node.narrative or "", child_node.scene,
+            child_node.game_state, parent_id,
+        )
+        choice["next_node_id"] = child_node.node_id
+
+        # 记录父子关系
+        dialogue_tree[parent_id]["children"].append(child_node.node_id)
+        self._link_choice(dialogue_tree, parent_id, choice.get("choice_id"), child_node.node_id)
+
+        # 增量日志记录
+        self._append_incremental_log({
+            "event": "add_node",
+            "node": child_node.to_dict()
+        })
+
+        # 更新进度
+        self.progress_tracker.update(
+            current_depth=child_node.depth,
+            node_count=len(dialogue_tree),
+            current_branch=f"{child_node.scene} → {choice.get('choice_text', '')[:20]}..."
+        )
+        return node_counter
+
+    def _new_frontier(self) -> Frontier:
+        """创建扩展前沿：Beam 模式为有界 best-first 堆，否则为 FIFO（BFS）"""
+        return Frontier(best_first=self.beam_mode, beam_width=self.beam_width)
+
+    def _frontier_priority(self, node_dict: Dict[str, Any], depth: int):
+        """前沿优先级：(节点分数, 深度, 骨架节拍优先级)，数值越大越先扩展"""
+        if not self.beam_mode:
+            return None
+        return (self._score_node(node_dict, depth), int(depth), self._beat_priority(depth))
+
+    def _beat_priority(self, depth: int) -> int:
+        """骨架节拍优先级（guided 模式）：关键分支点 / 通往结局 / 高张力的节拍优先。"""
+        beat = self._beat_for_depth(depth)
+        if not beat:
+            return 0
+        try:
+            prio = int(getattr(beat, "tension_level", 0) or 0)
+            if getattr(beat, "is_critical_branch_point", False):
+                prio += 20
+            if getattr(beat, "leads_to_ending", False):
+                prio += 10
+            return prio
+        except Exception:
+            return 0
+
+    def _score_choice(self, ch: Dict[str, Any]) -> int:
+        """Skeleton 模式下的选择排序分数：推进/critical 优先（分数越高越靠前）"""
+        score = 0
+        if ch.get("choice_type") == "critical" or ch.get("critical") is True:
+            score += 100
+        cons = ch.get("consequences") or {}
+        if isinstance(cons, dict):
+            if cons.get("critical") is True:
+                score += 80
+            for k in ("next_scene", "CT", "next_event"):
+                if k in cons:
+                    score += 50
+            for k in ("time", "timestamp", "time_skip"):
+                if k in cons:
+                    score += 20
+        # 轻量关键词启发（仅在文本存在时）
+        txt = (ch.get("choice_text") or "")
+        if any(kw in txt for kw in ("前往", "推进", "直接", "关键")):
+            score += 10
+        return score
+
     def _score_node(self, node_dict: Dict[str, Any], depth: int) -> int:
         """为 Beam/Skeleton 计算节点优先级分数。
 
@@ -931,10 +1296,12 @@ class DialogueTreeBuilder:
             tension_level = None
             is_critical = None
             beat_leads_to_ending = None
+            act_index = None
             if self.guided_mode and self.plot_skeleton is not None:
                 try:
                     beat = self._beat_for_depth(node.depth + 1)
                     if beat is not None:
+                        act_index = getattr(beat, "act_index", None)
                         beat_type = getattr(beat, "beat_type", None)
                         tension_level = getattr(beat, "tension_level", None)
                         is_critical = getattr(beat, "is_critical_branch_point", None)
@@ -948,6 +1315,19 @@ class DialogueTreeBuilder:
                 except Exception:
                     beat_leads_to_ending = None
 
+            # 选择点缓存：近似状态的节点直接复用（或跳过）已生成的选择集
+            cache_key = None
+            if self.choice_cache is not None:
+                cache_state = dict(node.game_state)
+                cache_state["current_scene"] = node.scene
+                cache_key = ChoiceCache.make_key(
+                    self.state_manager._quantize_key_state(cache_state),
+                    beat_type,
+                )
+                cached = self.choice_cache.get(cache_key, avoid_texts=recent_choices)
+                if cached is not None:
+                    return cached
+
             # 调用生成器（注意参数顺序：scene, state）
             choices = self.choice_generator.generate_choices(
                 node.scene,
@@ -958,10 +1338,11 @@ class DialogueTreeBuilder:
                 is_critical_beat=is_critical,
                 beat_leads_to_ending=beat_leads_to_ending,
                 recent_choices=recent_choices,
+                act_index=act_index,
             )
 
             # 转换为字典格式
-            return [
+            result = [
                 {
                     "choice_id": choice.choice_id,
                     "choice_text": choice.choice_text,
@@ -971,6 +1352,10 @@ class DialogueTreeBuilder:
                 }
                 for choice in choices
             ]
+            result = self._dedupe_choice_texts(result)
+            if cache_key is not None:
+                self.choice_cache.put(cache_key, result)
+            return result
 
         except Exception as e:
             print(f"⚠️  选择生成失败：{e}")
@@ -1109,7 +1494,7 @@ class DialogueTreeBuilder:
     def _save_full_checkpoint(
         self,
         dialogue_tree: Dict[str, Any],
-        queue: deque,
+        queue: Frontier,
         node_counter: int,
         checkpoint_path: str
     ):
@@ -1118,15 +1503,15 @@ class DialogueTreeBuilder:
 
         Args:
             dialogue_tree: 当前对话树
-            queue: BFS 队列
+            queue: 扩展前沿（FIFO 或 best-first 堆）
             node_counter: 节点计数器
             checkpoint_path: 检查点文件路径
         """
         import json
         from pathlib import Path
 
-        # 序列化队列（deque -> list）
-        queue_data = list(queue)
+        # 序列化前沿：保留堆结构与优先级（旧版 queue 列表仍可在恢复时读取）
+        frontier_data = queue.to_checkpoint()
 
         # 构建检查点数据
         checkpoint = {
@@ -1136,7 +1521,7 @@ class DialogueTreeBuilder:
             "total_tokens": self.progress_tracker.total_tokens,
             "elapsed_time": time.time() - self.progress_tracker.start_time,
             "tree": dialogue_tree,
-            "queue": queue_data,
+            "frontier": frontier_data,
             "node_counter": node_counter,
             "state_cache": self.state_manager.state_cache,
             "scene_index": self.state_manager.scene_index,
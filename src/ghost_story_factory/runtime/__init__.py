@@ -1,10 +1,11 @@
 """
 运行时系统
 
-负责游戏运行时的对话树加载和查询
+负责游戏运行时的对话树加载和查询，以及混合模式下缺失分支的补全与回写
 """
 
 from .dialogue_loader import DialogueTreeLoader
+from .branch_backfill import BranchBackfiller
 
-__all__ = ['DialogueTreeLoader']
+__all__ = ['DialogueTreeLoader', 'BranchBackfiller']
 
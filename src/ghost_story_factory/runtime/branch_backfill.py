@@ -0,0 +1,183 @@
+"""
+缺失分支的实时补全与异步回写（混合模式）
+
+预生成对话树中，某些选项没有对应子节点（预算耗尽、旧检查点、修复遗留等）。
+纯预生成模式只能创建 missing_branch 占位结局；混合模式下改为：
+- 以父节点的游戏状态为起点，实时调用 LLM 生成响应与下一批选择点，立即交给玩家；
+- 新节点放入后台单线程队列，写回数据库中该故事的对话树，后来的玩家直接命中。
+
+补全节点 ID 由 (父节点, 选项) 决定（rt_ + 哈希），多名玩家补全同一分支时写回幂等。
+"""
+
+import hashlib
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from ..engine.state import GameState
+from ..utils.logging_utils import console, quiet_console
+
+
+def backfill_node_id(parent_id: str, choice_id: str) -> str:
+    """补全节点 ID：同一 (父节点, 选项) 总是得到同一 ID"""
+    digest = hashlib.sha1(f"{parent_id}|{choice_id}".encode("utf-8")).hexdigest()[:10]
+    return f"rt_{digest}"
+
+
+class BranchBackfiller:
+    """缺失分支的实时生成器 + 数据库异步回写队列"""
+
+    def __init__(
+        self,
+        db_path: str,
+        story_id: int,
+        character_id: int,
+        response_generator,
+        choice_generator,
+        max_depth: Optional[int] = None,
+    ):
+        """
+        Args:
+            db_path: 数据库文件路径（回写线程使用独立连接）
+            story_id: 故事 ID
+            character_id: 角色 ID
+            response_generator: RuntimeResponseGenerator
+            choice_generator: ChoicePointsGenerator
+            max_depth: 补全节点的最大深度（达到后标记为结局，None 表示不限）
+        """
+        self.db_path = str(db_path)
+        self.story_id = story_id
+        self.character_id = character_id
+        self.response_generator = response_generator
+        self.choice_generator = choice_generator
+        self.max_depth = max_depth
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"generated": 0, "written": 0, "write_errors": 0}
+
+    # ==================== 实时生成 ====================
+
+    @staticmethod
+    def _to_game_state(state_dict: Dict[str, Any]) -> GameState:
+        state = GameState()
+        for key, value in (state_dict or {}).items():
+            if hasattr(state, key):
+                setattr(state, key, value)
+        return state
+
+    def generate_node(self, parent: Dict[str, Any], choice: Dict[str, Any]) -> Dict[str, Any]:
+        """为 parent 下的 choice 实时生成子节点（不修改 parent）
+
+        Args:
+            parent: 父节点字典
+            choice: 选项字典（choice_id / choice_text / consequences ...）
+
+        Returns:
+            子节点字典（与预生成节点同结构，附加 source="realtime"）
+        """
+        from ..engine.choices import Choice
+
+        state = self._to_game_state(parent.get("game_state") or {})
+        choice_obj = Choice(
+            choice_id=choice.get("choice_id", "A"),
+            choice_text=choice.get("choice_text", ""),
+            choice_type=choice.get("choice_type") or "normal",
+            consequences=choice.get("consequences") or {},
+            preconditions=choice.get("preconditions") or {},
+        )
+        narrative = self.response_generator.generate_response(choice_obj, state, apply_consequences=True)
+
+        depth = int(parent.get("depth", 0)) + 1
+        next_choices: List[Dict[str, Any]] = []
+        if self.max_depth is None or depth < self.max_depth:
+            for c in self.choice_generator.generate_choices(state.current_scene, state) or []:
+                ctype = getattr(c.choice_type, "value", c.choice_type)
+                next_choices.append({
+                    "choice_id": c.choice_id,
+                    "choice_text": c.choice_text,
+                    "choice_type": ctype,
+                    "consequences": c.consequences,
+                    "preconditions": c.preconditions,
+                })
+
+        with self._lock:
+            self.stats["generated"] += 1
+
+        return {
+            "node_id": backfill_node_id(parent.get("node_id", ""), choice.get("choice_id", "")),
+            "scene": state.current_scene,
+            "depth": depth,
+            "game_state": state.to_dict(),
+            "state_hash": None,
+            "narrative": narrative,
+            "choices": next_choices,
+            "parent_id": parent.get("node_id"),
+            "parent_choice_id": choice.get("choice_id"),
+            "children": [],
+            "is_ending": not next_choices,
+            "ending_type": "realtime_end" if not next_choices else None,
+            "generated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "source": "realtime",
+        }
+
+    # ==================== 异步回写 ====================
+
+    def enqueue_write(self, node: Dict[str, Any]) -> None:
+        """把补全节点加入回写队列（FIFO，父节点先于子节点写入）"""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._write_loop, name="branch-backfill", daemon=True)
+                self._worker.start()
+        self._queue.put(dict(node))
+
+    def _write_loop(self) -> None:
+        """回写线程：使用独立连接，逐个节点合并进对话树"""
+        # 玩家此时多半停在输入提示：回写的输出改写日志，不打断输入
+        with quiet_console():
+            self._write_nodes()
+
+    def _write_nodes(self) -> None:
+        from ..database import DatabaseManager
+
+        db = None
+        while True:
+            node = self._queue.get()
+            try:
+                if node is None:
+                    return
+                if db is None:
+                    db = DatabaseManager(self.db_path)
+                added = db.merge_dialogue_nodes(self.story_id, self.character_id, [node])
+                with self._lock:
+                    self.stats["written"] += added
+            except Exception as e:
+                console(f"⚠️  [回写] 分支写回失败：{e}")
+                with self._lock:
+                    self.stats["write_errors"] += 1
+            finally:
+                self._queue.task_done()
+                if node is None and db is not None:
+                    db.close()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待回写队列清空
+
+        Returns:
+            是否在超时前清空
+        """
+        if timeout is None:
+            self._queue.join()
+            return True
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.05)
+        return not self._queue.unfinished_tasks
+
+    def close(self, timeout: Optional[float] = 30.0) -> None:
+        """写完剩余节点后停止回写线程"""
+        if self._worker is not None and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join(timeout)
@@ -4,14 +4,83 @@
 从数据库加载对话树并提供查询接口
 """
 
-from typing import Dict, Any, List, Optional
+import os
+from typing import Dict, Any, List, Optional, Tuple
 from ..database import DatabaseManager
+from ..database.flat_tree import FlatTree, flat_tree_path, open_flat_tree
+from ..database.state_delta import resolve_state
+
+
+ChildIndex = Dict[Tuple[str, str], List[str]]
+
+
+def build_child_index(tree: Dict[str, Any]) -> ChildIndex:
+    """构建 (parent_id, parent_choice_id) → [child_id] 索引（避免每次跳转全树扫描）"""
+    index: ChildIndex = {}
+    for nid, node in tree.items():
+        if not isinstance(node, dict):
+            continue
+        pid = node.get("parent_id")
+        pcid = node.get("parent_choice_id")
+        if pid and pcid:
+            index.setdefault((pid, pcid), []).append(nid)
+    return index
+
+
+def resolve_next_node(
+    tree: Dict[str, Any],
+    node_id: str,
+    choice_id: str,
+    child_index: Optional[ChildIndex] = None,
+) -> Tuple[Optional[str], str]:
+    """解析某节点下选项指向的子节点（只读，不修改树）
+
+    依次尝试：
+    1) choice.next_node_id；
+    2) parent_id + parent_choice_id 唯一映射（旧检查点未回填 next_node_id）；
+    3) 当前节点仅一个 children 时按唯一子节点前进。
+
+    Args:
+        tree: 对话树
+        node_id: 当前节点 ID
+        choice_id: 选项 ID
+        child_index: build_child_index 的结果（可选，缺省时全树扫描）
+
+    Returns:
+        (子节点 ID 或 None, 解析方式："next_node_id" / "parent_choice_id" / "single_child" / "")
+    """
+    node = tree.get(node_id)
+    if not node:
+        return None, ""
+    for ch in (node.get("choices", []) or []):
+        if ch.get("choice_id") != choice_id:
+            continue
+        next_id = ch.get("next_node_id")
+        if next_id and next_id in tree:
+            return next_id, "next_node_id"
+        if child_index is not None:
+            candidates = child_index.get((node_id, choice_id), [])
+        else:
+            candidates = []
+            for nid, nd in tree.items():
+                try:
+                    if nd.get("parent_id") == node_id and nd.get("parent_choice_id") == choice_id:
+                        candidates.append(nid)
+                except Exception:
+                    continue
+        if len(candidates) == 1:
+            return candidates[0], "parent_choice_id"
+        children = (node.get("children") or [])
+        if len(children) == 1 and children[0] in tree:
+            return children[0], "single_child"
+        return None, ""
+    return None, ""
 
 
 class DialogueTreeLoader:
     """对话树加载器"""
 
-    def __init__(self, db: DatabaseManager, story_id: int, character_id: int):
+    def __init__(self, db: DatabaseManager, story_id: int, character_id: int, backfiller=None):
         """
         初始化加载器
 
@@ -19,12 +88,14 @@ class DialogueTreeLoader:
             db: 数据库管理器
             story_id: 故事 ID
             character_id: 角色 ID
+            backfiller: 缺失分支补全器（BranchBackfiller，可选；提供时为混合模式）
         """
         self.db = db
         self.story_id = story_id
         self.character_id = character_id
         self.tree = None
         self.current_node_id = "root"
+        self.backfiller = backfiller
 
         self.load()
 
@@ -32,18 +103,48 @@ class DialogueTreeLoader:
         """加载对话树"""
         print(f"📂 加载对话树：story_id={self.story_id}, character_id={self.character_id}")
 
-        self.tree = self.db.load_dialogue_tree(self.story_id, self.character_id)
+        self.tree = self._load_flat_tree() if os.getenv("FLAT_TREE", "1") != "0" else None
+        if self.tree is None:
+            # game_state 按需还原：只在走到的节点上还原增量快照
+            self.tree = self.db.load_dialogue_tree(self.story_id, self.character_id, lazy_state=True)
 
         if self.tree:
-            print(f"✅ 对话树已加载：{len(self.tree)} 个节点")
+            mode = "（mmap 平铺文件）" if isinstance(self.tree, FlatTree) else ""
+            print(f"✅ 对话树已加载：{len(self.tree)} 个节点{mode}")
         else:
             raise ValueError("对话树加载失败")
 
+    def _load_flat_tree(self) -> Optional[FlatTree]:
+        """mmap 打开平铺文件；不存在或已过期时先从数据库导出（每个版本只导出一次）
+
+        Returns:
+            FlatTree；对话树不存在或导出失败时返回 None（回退为从数据库加载）
+        """
+        revision = self.db.get_tree_revision(self.story_id, self.character_id)
+        if revision is None:
+            return None
+        path = flat_tree_path(self.db.flat_tree_dir, self.story_id, self.character_id)
+        tree = open_flat_tree(path, revision)
+        if tree is not None:
+            return tree
+        try:
+            self.db.export_flat_tree(self.story_id, self.character_id)
+        except Exception as e:
+            print(f"⚠️  导出平铺对话树失败，改为直接加载：{e}")
+            return None
+        return open_flat_tree(path)
+
+    @property
+    def child_index(self) -> Optional[ChildIndex]:
+        """平铺文件自带的子节点表（查找不解码节点）；内存树返回 None（resolve_next_node 全树扫描）"""
+        return self.tree.child_index if isinstance(self.tree, FlatTree) else None
+
     def get_current_node(self) -> Dict[str, Any]:
         """获取当前节点"""
         if not self.tree or self.current_node_id not in self.tree:
             raise ValueError(f"节点不存在：{self.current_node_id}")
 
+        resolve_state(self.tree, self.current_node_id)
         return self.tree[self.current_node_id]
 
     def get_node(self, node_id: str) -> Optional[Dict[str, Any]]:
@@ -51,6 +152,7 @@ class DialogueTreeLoader:
         if not self.tree:
             return None
 
+        resolve_state(self.tree, node_id)
         return self.tree.get(node_id)
 
     def get_narrative(self, node_id: str = None) -> str:
@@ -79,27 +181,13 @@ class DialogueTreeLoader:
         node = self.get_node(node_id)
         if not node:
             return False
-        for ch in (node.get("choices", []) or []):
-            if ch.get("choice_id") == choice_id:
-                next_id = ch.get("next_node_id")
-                if next_id and next_id in self.tree:
-                    return True
-                # 通过 parent_choice_id 唯一映射判断
-                candidates = []
-                for nid, nd in self.tree.items():
-                    try:
-                        if nd.get("parent_id") == node_id and nd.get("parent_choice_id") == choice_id:
-                            candidates.append(nid)
-                    except Exception:
-                        continue
-                if len(candidates) == 1:
-                    return True
-                # 父节点仅一个 children 也可推进
-                children = (node.get("children") or [])
-                if len(children) == 1 and children[0] in self.tree:
-                    return True
-                return False
-        return False
+        if not any(ch.get("choice_id") == choice_id for ch in (node.get("choices", []) or [])):
+            return False
+        next_id, _ = resolve_next_node(self.tree, node_id, choice_id, self.child_index)
+        if next_id:
+            return True
+        # 混合模式：缺失分支可实时补全
+        return self.backfiller is not None
 
     def select_choice(self, choice_id: str) -> Optional[str]:
         """
@@ -116,31 +204,26 @@ class DialogueTreeLoader:
         for choice in choices:
             if choice.get("choice_id") == choice_id:
                 next_node_id = choice.get("next_node_id")
-                if next_node_id and next_node_id in self.tree:
-                    self.current_node_id = next_node_id
-                    return next_node_id
                 # 回退路径：有些旧检查点的 choice 可能未写回 next_node_id，
-                # 但子节点记录了 parent_id 与 parent_choice_id，可通过它们恢复跳转
-                # 1) 通过 parent_id/current_node 与 parent_choice_id=choice_id 定位唯一子节点
-                candidates = []
-                for nid, node in self.tree.items():
+                # 但子节点记录了 parent_id 与 parent_choice_id，可通过它们恢复跳转；
+                # 若仍找不到，但当前节点仅有一个 children，则按唯一子节点前进
+                resolved, how = resolve_next_node(self.tree, self.current_node_id, choice_id, self.child_index)
+                if resolved:
+                    self.current_node_id = resolved
+                    if how == "parent_choice_id":
+                        print(f"ℹ️  回退修复：基于 parent_choice_id → {self.current_node_id}")
+                    elif how == "single_child":
+                        print(f"ℹ️  回退修复：按唯一子节点前进 → {self.current_node_id}")
+                    return resolved
+                # 3) 混合模式：实时生成缺失分支，并在后台写回数据库
+                if self.backfiller is not None:
                     try:
-                        if node.get("parent_id") == self.current_node_id and node.get("parent_choice_id") == choice_id:
-                            candidates.append(nid)
-                    except Exception:
-                        continue
-                if len(candidates) == 1:
-                    self.current_node_id = candidates[0]
-                    print(f"ℹ️  回退修复：基于 parent_choice_id → {self.current_node_id}")
-                    return self.current_node_id
-                # 2) 若找不到，但当前节点仅有一个 children，则按唯一子节点前进
-                node = self.get_node(self.current_node_id) or {}
-                children = node.get("children", []) or []
-                if len(children) == 1 and children[0] in self.tree:
-                    self.current_node_id = children[0]
-                    print(f"ℹ️  回退修复：按唯一子节点前进 → {self.current_node_id}")
-                    return self.current_node_id
-                # 3) 仍不可用：为预生成缺失的分支创建占位节点，避免玩家死链
+                        new_id = self._backfill_choice(choice)
+                        print(f"✨ 缺失分支已实时生成 → {new_id}")
+                        return new_id
+                    except Exception as e:
+                        print(f"⚠️  实时补全失败，改用占位分支：{e}")
+                # 4) 仍不可用：为预生成缺失的分支创建占位节点，避免玩家死链
                 try:
                     stub_id = self._create_stub_node_for_choice(choice)
                     if stub_id:
@@ -154,6 +237,28 @@ class DialogueTreeLoader:
         print(f"⚠️  选择不存在：{choice_id}")
         return None
 
+    def _backfill_choice(self, choice: Dict[str, Any]) -> str:
+        """实时生成 choice 对应的子节点，挂接到当前节点并加入回写队列
+
+        Returns:
+            新节点 ID
+        """
+        current_node = self.get_current_node()
+        print("⏳ 该分支尚未预生成，正在实时生成...")
+        node = self.backfiller.generate_node(current_node, choice)
+        new_id = node["node_id"]
+
+        self.tree[new_id] = node
+        parent_children = current_node.get("children") or []
+        if new_id not in parent_children:
+            parent_children.append(new_id)
+        current_node["children"] = parent_children
+        choice["next_node_id"] = new_id
+
+        self.backfiller.enqueue_write(node)
+        self.current_node_id = new_id
+        return new_id
+
     def _create_stub_node_for_choice(self, choice: Dict[str, Any]) -> Optional[str]:
         """当 choice 缺少 next_node_id 且无法推断时，创建一个占位子节点并挂接。
 
@@ -161,7 +266,7 @@ class DialogueTreeLoader:
         """
         if not self.tree or self.current_node_id not in self.tree:
             return None
-        current_node = self.tree[self.current_node_id]
+        current_node = self.get_current_node()
 
         # 生成新的节点 ID（沿用 node_XXXX 递增规则）
         max_num = 0
@@ -0,0 +1,12 @@
+"""
+游玩服务
+
+为 Web 前端提供预生成故事的多人并发游玩（HTTP + WebSocket），
+多个会话共享按容量限制的对话树缓存
+"""
+
+from .tree_cache import TreeCache, CachedTree
+from .sessions import PlaySession, SessionStore
+from .play_server import PlayService, PlayServer
+
+__all__ = ['TreeCache', 'CachedTree', 'PlaySession', 'SessionStore', 'PlayService', 'PlayServer']
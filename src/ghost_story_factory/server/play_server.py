@@ -0,0 +1,444 @@
+"""
+本地游玩服务（HTTP + WebSocket）
+
+为 Web 前端提供预生成故事的多人并发游玩：
+- 对话树在 TreeCache 中按 LRU 共享，会话只保存 (故事, 角色, 节点, GameState)；
+- HTTP JSON 接口：
+    GET    /health                      健康检查
+    GET    /stories                     可游玩的故事与角色
+    POST   /sessions                    {"story_id", "character_id"} → 开始游玩
+    GET    /sessions/<id>               当前节点视图
+    POST   /sessions/<id>/choose        {"choice_id"} → 前进一步
+    DELETE /sessions/<id>               结束会话
+    GET    /stats                       缓存与会话统计
+- WebSocket（GET /ws）：每条消息为 JSON {"op": "stories" | "start" | "choose" | "state", ...}，
+  回复 {"ok": true, "data": ...} 或 {"ok": false, "error": ...}；连接记住自己的会话。
+
+只使用标准库（ThreadingHTTPServer），每个连接一个线程。
+
+指定 --autosave-dir 时每个会话写一个只追加的自动存档日志（{session_id}.journal），
+每回合追加一条小记录；服务重启或会话被淘汰后，按会话 ID 访问会从日志恢复。
+
+使用：
+    ghost-story-serve --db database/ghost_stories.db --port 8765
+"""
+
+import argparse
+import json
+import re
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..database import DatabaseManager
+from ..database.state_delta import resolve_state
+from ..engine.save_format import AutosaveJournal, SaveGame
+from ..engine.state import GameState
+from ..runtime.dialogue_loader import resolve_next_node
+from .sessions import PlaySession, SessionStore
+from .tree_cache import CachedTree, TreeCache
+from . import websocket as ws
+
+
+class SessionNotFound(KeyError):
+    """会话不存在或已过期"""
+
+
+class PlayService:
+    """游玩逻辑（与传输层无关，线程安全）"""
+
+    def __init__(
+        self,
+        db_path: str = "database/ghost_stories.db",
+        max_nodes: int = 200_000,
+        max_trees: int = 64,
+        session_ttl: float = 3600.0,
+        max_sessions: int = 10_000,
+        autosave_dir: Optional[str] = None,
+    ):
+        """
+        Args:
+            db_path: 数据库文件路径
+            max_nodes: 树缓存节点总数上限
+            max_trees: 树缓存数量上限
+            session_ttl: 会话闲置过期时间（秒）
+            max_sessions: 会话数量上限
+            autosave_dir: 自动存档日志目录（None 表示不自动存档）
+        """
+        self.db = DatabaseManager(db_path)
+        # 共享树中的 game_state 保持增量编码，会话走到哪个节点再还原哪个
+        self.trees = TreeCache(
+            lambda story_id, character_id: self.db.load_dialogue_tree(story_id, character_id, lazy_state=True),
+            max_nodes=max_nodes,
+            max_trees=max_trees,
+        )
+        self.sessions = SessionStore(ttl_seconds=session_ttl, max_sessions=max_sessions)
+        self.autosave_dir = Path(autosave_dir) if autosave_dir else None
+        if self.autosave_dir is not None:
+            self.autosave_dir.mkdir(parents=True, exist_ok=True)
+
+    def close(self) -> None:
+        self.db.close()
+
+    # ==================== 查询 ====================
+
+    def list_stories(self) -> List[Dict[str, Any]]:
+        """所有故事及其角色"""
+        result = []
+        for city in self.db.get_cities():
+            for story in self.db.get_stories_by_city(city.id):
+                result.append({
+                    "story_id": story.id,
+                    "city": city.name,
+                    "title": story.title,
+                    "synopsis": story.synopsis,
+                    "status": story.status,
+                    # 生成中的故事只列出对话树已落库的角色
+                    "characters": [
+                        {"character_id": c.id, "name": c.name, "is_protagonist": c.is_protagonist}
+                        for c in self.db.get_characters_by_story(story.id)
+                        if c.has_tree
+                    ],
+                })
+        return result
+
+    def _journal(self, session_id: str) -> Optional[AutosaveJournal]:
+        if self.autosave_dir is None or not re.fullmatch(r"[0-9a-f]+", session_id or ""):
+            return None
+        return AutosaveJournal(self.autosave_dir / f"{session_id}.journal")
+
+    def _session(self, session_id: str) -> Tuple[PlaySession, CachedTree]:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self._restore_session(session_id)
+        if session is None:
+            raise SessionNotFound(session_id)
+        return session, self.trees.get(session.story_id, session.character_id)
+
+    def _restore_session(self, session_id: str) -> Optional[PlaySession]:
+        """内存中没有的会话：从自动存档日志恢复"""
+        journal = self._journal(session_id)
+        if journal is None:
+            return None
+        save = journal.load()
+        if save is None or save.story_id is None or save.character_id is None:
+            return None
+        session = self.sessions.create(
+            save.story_id, save.character_id, save.node_id or "root", save.state, session_id=session_id
+        )
+        session.journal = journal
+        return session
+
+    @staticmethod
+    def _autosave(session: PlaySession, choice_id: Optional[str] = None) -> None:
+        if session.journal is None:
+            return
+        try:
+            session.journal.record_turn(session.node_id, session.state, choice_id)
+        except OSError as e:
+            print(f"⚠️  自动存档失败（会话 {session.session_id}）：{e}")
+
+    @staticmethod
+    def _available_choices(cached: CachedTree, node_id: str) -> List[Dict[str, Any]]:
+        node = cached.tree.get(node_id) or {}
+        available = []
+        for ch in node.get("choices", []) or []:
+            if ch.get("hidden"):
+                continue
+            next_id, _ = resolve_next_node(cached.tree, node_id, ch.get("choice_id"), cached.child_index)
+            if next_id:
+                available.append(ch)
+        return available
+
+    def view(self, session: PlaySession, cached: CachedTree) -> Dict[str, Any]:
+        """会话当前节点的视图"""
+        node = cached.tree.get(session.node_id) or {}
+        choices = self._available_choices(cached, session.node_id)
+        return {
+            "session_id": session.session_id,
+            "story_id": session.story_id,
+            "character_id": session.character_id,
+            "node_id": session.node_id,
+            "scene": node.get("scene"),
+            "narrative": node.get("narrative", ""),
+            "choices": [
+                {
+                    "choice_id": ch.get("choice_id"),
+                    "choice_text": ch.get("choice_text", ""),
+                    "choice_type": ch.get("choice_type", "normal"),
+                }
+                for ch in choices
+            ],
+            "is_ending": bool(node.get("is_ending")) or not choices,
+            "ending_type": node.get("ending_type"),
+            "state": session.state.to_dict(),
+        }
+
+    # ==================== 游玩 ====================
+
+    def start(self, story_id: int, character_id: int) -> Dict[str, Any]:
+        """开始游玩
+
+        Raises:
+            ValueError: 对话树不存在
+        """
+        cached = self.trees.get(int(story_id), int(character_id))
+        state = _state_from_node(resolve_state(cached.tree, "root"), GameState())
+        session = self.sessions.create(int(story_id), int(character_id), "root", state)
+        session.journal = self._journal(session.session_id)
+        if session.journal is not None:
+            session.journal.start(SaveGame(
+                state=state, node_id="root", story_id=session.story_id, character_id=session.character_id
+            ))
+        return self.view(session, cached)
+
+    def get(self, session_id: str) -> Dict[str, Any]:
+        """当前视图"""
+        session, cached = self._session(session_id)
+        return self.view(session, cached)
+
+    def choose(self, session_id: str, choice_id: str) -> Dict[str, Any]:
+        """选择一个选项并前进
+
+        Raises:
+            SessionNotFound: 会话不存在或已过期
+            ValueError: 选项不存在或不可达
+        """
+        session, cached = self._session(session_id)
+        choice = next(
+            (c for c in self._available_choices(cached, session.node_id) if c.get("choice_id") == choice_id),
+            None,
+        )
+        if choice is None:
+            raise ValueError(f"选项不可用：{choice_id}")
+        next_id, _ = resolve_next_node(cached.tree, session.node_id, choice_id, cached.child_index)
+
+        next_state = resolve_state(cached.tree, next_id)
+        if next_state:
+            state = _state_from_node(next_state, session.state)
+        else:
+            state = GameState(**session.state.to_dict())
+            if choice.get("consequences"):
+                state.update(choice["consequences"])
+        state.consequence_tree = list(session.state.consequence_tree) + [choice_id]
+
+        session.node_id = next_id
+        session.state = state
+        self._autosave(session, choice_id)
+        return self.view(session, cached)
+
+    def end(self, session_id: str) -> bool:
+        """结束会话（同时删除其自动存档）"""
+        journal = self._journal(session_id)
+        existed = journal is not None and journal.path.exists()
+        if journal is not None:
+            journal.discard()
+        return self.sessions.delete(session_id) or existed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tree_cache": self.trees.get_stats(),
+            "sessions": len(self.sessions),
+            "db": self.db.get_pool_stats(),
+        }
+
+
+def _state_from_node(node_state: Optional[Dict[str, Any]], previous: GameState) -> GameState:
+    """节点上记录的游戏状态 → GameState（树中用 time，GameState 用 timestamp）"""
+    state = GameState(**previous.to_dict())
+    for key, value in (node_state or {}).items():
+        if key == "time":
+            state.timestamp = value
+        elif key != "consequence_tree" and hasattr(state, key):
+            setattr(state, key, value)
+    return state
+
+
+# ==================== HTTP / WebSocket 传输层 ====================
+
+_SESSION_PATH = re.compile(r"^/sessions/([0-9a-f]+)(/choose)?$")
+
+
+class PlayRequestHandler(BaseHTTPRequestHandler):
+    """HTTP 请求处理（server.service 为 PlayService）"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "GhostStoryPlay/1.0"
+
+    @property
+    def service(self) -> PlayService:
+        return self.server.service  # type: ignore[attr-defined]
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if getattr(self.server, "verbose", False):
+            super().log_message(format, *args)
+
+    def _send_json(self, status: int, payload: Any) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        data = json.loads(self.rfile.read(length).decode("utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是 JSON 对象")
+        return data
+
+    def _dispatch(self, method: str) -> None:
+        try:
+            status, payload = self._route(method)
+        except SessionNotFound:
+            status, payload = 404, {"error": "会话不存在或已过期"}
+        except (ValueError, TypeError, KeyError) as e:
+            status, payload = 400, {"error": str(e)}
+        except Exception as e:
+            status, payload = 500, {"error": f"服务器错误：{e}"}
+        self._send_json(status, payload)
+
+    def _route(self, method: str) -> Tuple[int, Any]:
+        path = self.path.split("?", 1)[0].rstrip("/") or "/"
+        if method == "GET" and path == "/health":
+            return 200, {"ok": True}
+        if method == "GET" and path == "/stories":
+            return 200, self.service.list_stories()
+        if method == "GET" and path == "/stats":
+            return 200, self.service.stats()
+        if method == "POST" and path == "/sessions":
+            body = self._read_json()
+            return 201, self.service.start(body["story_id"], body["character_id"])
+
+        m = _SESSION_PATH.match(path)
+        if m:
+            session_id, choose = m.group(1), m.group(2)
+            if method == "POST" and choose:
+                return 200, self.service.choose(session_id, str(self._read_json()["choice_id"]))
+            if method == "GET" and not choose:
+                return 200, self.service.get(session_id)
+            if method == "DELETE" and not choose:
+                if not self.service.end(session_id):
+                    raise SessionNotFound(session_id)
+                return 200, {"ok": True}
+        return 404, {"error": f"未知路径：{method} {path}"}
+
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] == "/ws" and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._serve_websocket()
+            return
+        self._dispatch("GET")
+
+    def do_POST(self) -> None:
+        self._dispatch("POST")
+
+    def do_DELETE(self) -> None:
+        self._dispatch("DELETE")
+
+    def do_OPTIONS(self) -> None:
+        self.send_response(204)
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Allow-Methods", "GET, POST, DELETE, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "Content-Type")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    # ==================== WebSocket ====================
+
+    def _serve_websocket(self) -> None:
+        key = self.headers.get("Sec-WebSocket-Key")
+        if not key:
+            self._send_json(400, {"error": "缺少 Sec-WebSocket-Key"})
+            return
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", ws.accept_key(key))
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        session_id: Optional[str] = None
+        while True:
+            try:
+                text = ws.recv_text(self.rfile, self.wfile)
+            except (ws.WebSocketClosed, ValueError, OSError):
+                return
+            if text is None:
+                return
+            try:
+                msg = json.loads(text)
+                op = msg.get("op")
+                if op == "stories":
+                    data: Any = self.service.list_stories()
+                elif op == "start":
+                    data = self.service.start(msg["story_id"], msg["character_id"])
+                    session_id = data["session_id"]
+                elif op == "choose":
+                    data = self.service.choose(msg.get("session_id") or session_id, str(msg["choice_id"]))
+                elif op == "state":
+                    data = self.service.get(msg.get("session_id") or session_id)
+                else:
+                    raise ValueError(f"未知操作：{op}")
+                reply = {"ok": True, "op": op, "data": data}
+            except SessionNotFound:
+                reply = {"ok": False, "error": "会话不存在或已过期"}
+            except Exception as e:
+                reply = {"ok": False, "error": str(e)}
+            try:
+                ws.send_text(self.wfile, json.dumps(reply, ensure_ascii=False))
+            except OSError:
+                return
+
+
+class PlayServer(ThreadingHTTPServer):
+    """多线程游玩服务"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+    # 默认 backlog 为 5，并发玩家同时建连时会被内核直接重置
+    request_queue_size = 256
+
+    def __init__(self, address: Tuple[str, int], service: PlayService, verbose: bool = False):
+        super().__init__(address, PlayRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def main(argv=None) -> None:
+    """命令行入口：启动本地游玩服务"""
+    parser = argparse.ArgumentParser(description="预生成故事游玩服务（HTTP + WebSocket）")
+    parser.add_argument("--db", default="database/ghost_stories.db", help="数据库路径")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    parser.add_argument("--max-nodes", type=int, default=200_000, help="对话树缓存节点上限")
+    parser.add_argument("--max-trees", type=int, default=64, help="对话树缓存数量上限")
+    parser.add_argument("--session-ttl", type=float, default=3600.0, help="会话闲置过期时间（秒）")
+    parser.add_argument("--autosave-dir", default=None, help="自动存档日志目录（默认不自动存档）")
+    parser.add_argument("--verbose", action="store_true", help="打印访问日志")
+    args = parser.parse_args(argv)
+
+    service = PlayService(
+        args.db,
+        max_nodes=args.max_nodes,
+        max_trees=args.max_trees,
+        session_ttl=args.session_ttl,
+        autosave_dir=args.autosave_dir,
+    )
+    server = PlayServer((args.host, args.port), service, verbose=args.verbose)
+    print(f"🌐 游玩服务已启动：http://{args.host}:{server.server_address[1]}  (WebSocket: /ws)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 游玩服务已停止")
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+游玩会话存储
+
+每个会话只保存 (story_id, character_id, node_id, GameState)，对话树本身在 TreeCache 中共享。
+会话闲置超过 TTL 后过期；数量超过上限时淘汰最久未活动的会话。
+启用自动存档时每个会话附带一个 AutosaveJournal，服务重启 / 会话被淘汰后可按会话 ID 恢复。
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from ..engine.save_format import AutosaveJournal
+from ..engine.state import GameState
+
+
+@dataclass
+class PlaySession:
+    """一名玩家的游玩进度"""
+
+    session_id: str
+    story_id: int
+    character_id: int
+    node_id: str = "root"
+    state: GameState = field(default_factory=GameState)
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+    journal: Optional[AutosaveJournal] = field(default=None, repr=False)
+
+
+class SessionStore:
+    """线程安全的会话表（TTL + 数量上限）"""
+
+    def __init__(self, ttl_seconds: float = 3600.0, max_sessions: int = 10_000):
+        """
+        Args:
+            ttl_seconds: 会话闲置过期时间（秒）
+            max_sessions: 会话数量上限
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions: "OrderedDict[str, PlaySession]" = OrderedDict()
+
+    def create(self, story_id: int, character_id: int, node_id: str = "root",
+               state: Optional[GameState] = None, session_id: Optional[str] = None) -> PlaySession:
+        """创建会话（session_id 为空时生成新 ID；恢复自动存档时沿用原 ID）"""
+        session = PlaySession(
+            session_id=session_id or uuid.uuid4().hex,
+            story_id=story_id,
+            character_id=character_id,
+            node_id=node_id,
+            state=state or GameState(),
+        )
+        with self._lock:
+            self._expire()
+            self._sessions[session.session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session
+
+    def get(self, session_id: str) -> Optional[PlaySession]:
+        """获取会话（过期返回 None），并刷新活动时间"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if time.time() - session.updated_at > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            session.updated_at = time.time()
+            self._sessions.move_to_end(session_id)
+            return session
+
+    def delete(self, session_id: str) -> bool:
+        """删除会话"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def _expire(self) -> None:
+        """清理过期会话（调用方持有锁；按活动时间有序，遇到未过期即停）"""
+        now = time.time()
+        while self._sessions:
+            sid, session = next(iter(self._sessions.items()))
+            if now - session.updated_at <= self.ttl_seconds:
+                break
+            del self._sessions[sid]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
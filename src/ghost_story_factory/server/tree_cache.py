@@ -0,0 +1,123 @@
+"""
+对话树共享缓存
+
+多个会话游玩同一故事时共享同一份解码后的对话树：
+- 以 (story_id, character_id) 为键，按节点总数限制容量，超出时 LRU 淘汰；
+- 同一棵树并发未命中时只加载一次（single-flight），其余请求等待结果；
+- 同时预建 (parent_id, parent_choice_id) → 子节点索引，跳转无需全树扫描。
+
+缓存中的树视为只读；运行时补全（混合模式）等写操作应走数据库后调用 invalidate。
+"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from ..runtime.dialogue_loader import ChildIndex, build_child_index
+
+
+TreeKey = Tuple[int, int]
+
+
+@dataclass
+class CachedTree:
+    """解码后的对话树及其子节点索引"""
+
+    story_id: int
+    character_id: int
+    tree: Dict[str, Any]
+    child_index: ChildIndex
+
+    @property
+    def size(self) -> int:
+        return len(self.tree)
+
+
+class TreeCache:
+    """按节点数限制容量的对话树 LRU 缓存（线程安全）"""
+
+    def __init__(
+        self,
+        loader: Callable[[int, int], Dict[str, Any]],
+        max_nodes: int = 200_000,
+        max_trees: int = 64,
+    ):
+        """
+        Args:
+            loader: (story_id, character_id) → 对话树字典（如 DatabaseManager.load_dialogue_tree）
+            max_nodes: 缓存节点总数上限
+            max_trees: 缓存树数量上限
+        """
+        self._loader = loader
+        self.max_nodes = max_nodes
+        self.max_trees = max_trees
+
+        self._lock = threading.Lock()
+        self._trees: "OrderedDict[TreeKey, CachedTree]" = OrderedDict()
+        self._loading: Dict[TreeKey, threading.Event] = {}
+        self._nodes = 0
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "loads": 0, "evictions": 0}
+
+    def get(self, story_id: int, character_id: int) -> CachedTree:
+        """获取对话树（未命中时加载）
+
+        Raises:
+            ValueError: 对话树不存在或解码失败（来自 loader）
+        """
+        key = (story_id, character_id)
+        while True:
+            with self._lock:
+                cached = self._trees.get(key)
+                if cached is not None:
+                    self._trees.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return cached
+                waiter = self._loading.get(key)
+                if waiter is None:
+                    waiter = threading.Event()
+                    self._loading[key] = waiter
+                    self.stats["misses"] += 1
+                    break
+            # 其他线程正在加载同一棵树：等待后重试
+            waiter.wait()
+
+        try:
+            tree = self._loader(story_id, character_id)
+            cached = CachedTree(story_id, character_id, tree, build_child_index(tree))
+            with self._lock:
+                self.stats["loads"] += 1
+                self._insert(key, cached)
+            return cached
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            waiter.set()
+
+    def _insert(self, key: TreeKey, cached: CachedTree) -> None:
+        """放入缓存并按容量淘汰（调用方持有锁）"""
+        old = self._trees.pop(key, None)
+        if old is not None:
+            self._nodes -= old.size
+        self._trees[key] = cached
+        self._nodes += cached.size
+        # 至少保留刚放入的树（即使它本身超出节点上限）
+        while len(self._trees) > 1 and (self._nodes > self.max_nodes or len(self._trees) > self.max_trees):
+            _, evicted = self._trees.popitem(last=False)
+            self._nodes -= evicted.size
+            self.stats["evictions"] += 1
+
+    def invalidate(self, story_id: int, character_id: Optional[int] = None) -> None:
+        """使某故事（或某角色）的缓存失效"""
+        with self._lock:
+            for key in [k for k in self._trees if k[0] == story_id and (character_id is None or k[1] == character_id)]:
+                self._nodes -= self._trees.pop(key).size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["trees"] = len(self._trees)
+            stats["nodes"] = self._nodes
+            stats["max_nodes"] = self.max_nodes
+        return stats
@@ -0,0 +1,111 @@
+"""
+最小 WebSocket 实现（RFC 6455，标准库）
+
+只覆盖游玩服务需要的部分：握手、文本帧收发、ping/pong、close；
+不支持扩展（permessage-deflate）与分片消息。
+"""
+
+import base64
+import hashlib
+import os
+import struct
+from typing import Optional, Tuple
+
+
+_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONT, OP_TEXT, OP_BINARY, OP_CLOSE, OP_PING, OP_PONG = 0x0, 0x1, 0x2, 0x8, 0x9, 0xA
+
+MAX_FRAME_BYTES = 1 << 20
+
+
+class WebSocketClosed(Exception):
+    """对端关闭连接"""
+
+
+def accept_key(client_key: str) -> str:
+    """计算握手响应的 Sec-WebSocket-Accept"""
+    digest = hashlib.sha1((client_key.strip() + _GUID).encode("ascii")).digest()
+    return base64.b64encode(digest).decode("ascii")
+
+
+def _read_exact(rfile, n: int) -> bytes:
+    data = rfile.read(n)
+    if data is None or len(data) < n:
+        raise WebSocketClosed("连接已断开")
+    return data
+
+
+def read_frame(rfile) -> Tuple[int, bytes]:
+    """读取一帧
+
+    Returns:
+        (opcode, payload)
+
+    Raises:
+        WebSocketClosed: 连接断开
+        ValueError: 帧过大或格式不支持
+    """
+    b1, b2 = _read_exact(rfile, 2)
+    fin = b1 & 0x80
+    opcode = b1 & 0x0F
+    masked = b2 & 0x80
+    length = b2 & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", _read_exact(rfile, 2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", _read_exact(rfile, 8))
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"帧过大：{length} 字节")
+    if not fin or opcode == OP_CONT:
+        raise ValueError("不支持分片消息")
+    mask = _read_exact(rfile, 4) if masked else None
+    payload = _read_exact(rfile, length) if length else b""
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def encode_frame(payload: bytes, opcode: int = OP_TEXT, mask: bool = False) -> bytes:
+    """编码一帧（服务端发送不加掩码；客户端发送须加掩码）"""
+    header = bytearray([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    n = len(payload)
+    if n < 126:
+        header.append(mask_bit | n)
+    elif n < (1 << 16):
+        header.append(mask_bit | 126)
+        header += struct.pack("!H", n)
+    else:
+        header.append(mask_bit | 127)
+        header += struct.pack("!Q", n)
+    if mask:
+        key = os.urandom(4)
+        header += key
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bytes(header) + payload
+
+
+def recv_text(rfile, wfile) -> Optional[str]:
+    """接收下一条文本消息（自动回应 ping；收到 close 时回应并返回 None）"""
+    while True:
+        opcode, payload = read_frame(rfile)
+        if opcode == OP_TEXT:
+            return payload.decode("utf-8")
+        if opcode == OP_PING:
+            wfile.write(encode_frame(payload, OP_PONG))
+            wfile.flush()
+        elif opcode == OP_CLOSE:
+            try:
+                wfile.write(encode_frame(payload[:2], OP_CLOSE))
+                wfile.flush()
+            except Exception:
+                pass
+            return None
+        # 其他帧（pong / binary）忽略
+
+
+def send_text(wfile, text: str) -> None:
+    """发送文本消息"""
+    wfile.write(encode_frame(text.encode("utf-8"), OP_TEXT))
+    wfile.flush()
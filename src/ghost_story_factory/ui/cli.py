@@ -8,7 +8,7 @@
 - 交互式选择菜单
 """
 
-from typing import List, Optional
+from typing import Iterable, List, Optional
 from pathlib import Path
 
 try:
@@ -20,11 +20,12 @@ try:
     from rich.prompt import Prompt, Confirm
     from rich.layout import Layout
     from rich.text import Text
+    from rich.live import Live
     RICH_AVAILABLE = True
 except ImportError:
     # 回退占位，避免类型注解在无 rich 环境下触发 NameError
     Console = Markdown = Panel = Table = Progress = BarColumn = TextColumn = Prompt = Confirm = Layout = object  # type: ignore
-    Text = object  # type: ignore
+    Text = Live = object  # type: ignore
     RICH_AVAILABLE = False
 
 import sys
@@ -215,6 +216,52 @@ class GameCLI:
             print(text)
             print("━" * 70 + "\n")
 
+    def display_narrative_stream(
+        self,
+        chunks: Iterable[str],
+        style: str = "green",
+        refresh_per_second: int = 12,
+    ) -> str:
+        """边生成边显示叙事文本
+
+        Rich 模式下用 Live 面板按已到达的文本重绘 Markdown；
+        纯文本模式下逐段输出并立即刷新。
+
+        Args:
+            chunks: 文本片段迭代器（如 RuntimeResponseGenerator.stream_response）
+            style: 样式（仅 Rich 模式）
+            refresh_per_second: Rich 面板最大刷新频率
+
+        Returns:
+            str: 完整文本
+        """
+        parts: List[str] = []
+
+        if self.use_rich:
+            def _render():
+                try:
+                    return Panel(Markdown("".join(parts)), border_style=style, padding=(1, 2))
+                except Exception:
+                    return Panel(Text("".join(parts)), border_style=style, padding=(1, 2))
+
+            with Live(_render(), console=self.console, refresh_per_second=refresh_per_second) as live:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    parts.append(chunk)
+                    live.update(_render())
+            return "".join(parts)
+
+        print("\n" + "━" * 70)
+        for chunk in chunks:
+            if not chunk:
+                continue
+            parts.append(chunk)
+            sys.stdout.write(chunk)
+            sys.stdout.flush()
+        print("\n" + "━" * 70 + "\n")
+        return "".join(parts)
+
     def display_choices(
         self,
         choices: List[Choice],
@@ -172,9 +172,14 @@ class MenuSystem:
 
         # 显示故事列表
         for idx, story in enumerate(stories, 1):
-            self.console.print(f"[bold cyan]{idx}.[/bold cyan] [bold]{story.title}[/bold]")
+            status = ""
+            if story.status == "generating":
+                status = " [yellow]⏳ 生成中（已完成的角色线可先玩）[/yellow]"
+            elif story.status == "failed":
+                status = " [red]⚠️ 生成中断（仅部分角色线可玩）[/red]"
+            self.console.print(f"[bold cyan]{idx}.[/bold cyan] [bold]{story.title}[/bold]{status}")
             self.console.print(f"   简介: {story.synopsis[:100]}...")
-            self.console.print(f"   时长: {story.estimated_duration_minutes} 分钟 | 角色: {story.character_count} 个 | 节点: {story.total_nodes} 个")
+            self.console.print(f"   时长: {story.estimated_duration_minutes} 分钟 | 角色: {story.character_count} 个 | 节点: {story.total_nodes} 个 | 结局: {story.ending_count} 个")
             self.console.print("")
 
         choice = self.console.input(f"输入故事编号 [1-{len(stories)}] 或 q 返回: ").strip()
@@ -207,6 +212,8 @@ class MenuSystem:
         # 显示角色列表
         for idx, char in enumerate(characters, 1):
             mark = "⭐ [主角线]" if char.is_protagonist else ""
+            if not char.has_tree:
+                mark += " [yellow]⏳ 对话树生成中[/yellow]"
             self.console.print(f"[bold cyan]{idx}.[/bold cyan] [bold]{char.name}[/bold] {mark}")
             if char.description:
                 self.console.print(f"   {char.description}")
@@ -220,6 +227,10 @@ class MenuSystem:
         try:
             idx = int(choice) - 1
             if 0 <= idx < len(characters):
+                if not characters[idx].has_tree:
+                    self.console.print("[yellow]⏳ 该角色的对话树还在生成，请先选择其他角色[/yellow]")
+                    input("按 Enter 继续...")
+                    return self._select_character(story)
                 return characters[idx]
         except ValueError:
             pass
@@ -0,0 +1,254 @@
+"""文档索引工具
+
+为 GDD / Lore / 主线故事等长文档一次性构建索引，替代每次缓存未命中时的整篇逐行扫描：
+- 场景 ID → 段落起始行（S1 / 场景1 等形式一次解析完成，其余 ID 首次查询后记忆）；
+- 规则关键词 → 行号列表（用于提取核心 Lore 规则）；
+- 标题分段 → 按段落均衡截断长文档（供 SkeletonGenerator 的 _shorten 使用）。
+
+get_document_index(text) 按文档内容复用索引，同一字符串对象的查询为 O(1)。
+"""
+
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# 核心规则关键词（与 ChoicePointsGenerator._extract_core_lore 保持一致）
+RULE_KEYWORDS: Tuple[str, ...] = ('规则', '核心', '必须', '不可', '禁止', '世界观', 'PR', 'GR')
+
+_SCENE_TOKEN = re.compile(r"s(\d+)")
+_SCENE_CN_TOKEN = re.compile(r"场景(\d+)")
+
+
+class DocumentIndex:
+    """单篇文档的行级索引"""
+
+    def __init__(self, text: str):
+        self.text = text or ""
+        self.lines: List[str] = self.text.split('\n')
+
+        # 每行在原文中的起始偏移
+        self.line_offsets: List[int] = []
+        offset = 0
+        for line in self.lines:
+            self.line_offsets.append(offset)
+            offset += len(line) + 1
+
+        # 标题行（以 # 开头）
+        self.heading_lines: List[int] = [
+            i for i, line in enumerate(self.lines) if line.strip().startswith('#')
+        ]
+
+        # 场景 ID → 首个匹配行（子串语义：S1 也会命中含 S10 的行，与原逐行扫描一致）
+        self._latin_first: Dict[str, int] = {}
+        self._cn_first: Dict[str, int] = {}
+        for i, line in enumerate(self.lines):
+            for m in _SCENE_TOKEN.finditer(line.lower()):
+                self._register_prefixes(self._latin_first, m.group(1), i)
+            for m in _SCENE_CN_TOKEN.finditer(line):
+                self._register_prefixes(self._cn_first, m.group(1), i)
+        self._scene_cache: Dict[str, Optional[int]] = {}
+
+        # 规则关键词 → 行号列表
+        self.keyword_lines: Dict[str, List[int]] = {kw: [] for kw in RULE_KEYWORDS}
+        for i, line in enumerate(self.lines):
+            for kw in RULE_KEYWORDS:
+                if kw in line:
+                    self.keyword_lines[kw].append(i)
+
+    @staticmethod
+    def _register_prefixes(table: Dict[str, int], digits: str, line_no: int) -> None:
+        """登记数字串的全部前缀（"10" → "1"、"10"），只保留首次出现的行"""
+        for k in range(1, len(digits) + 1):
+            table.setdefault(digits[:k], line_no)
+
+    # ==================== 场景段落 ====================
+
+    def find_scene_line(self, scene: str) -> Optional[int]:
+        """查找场景首次出现的行号
+
+        匹配规则与原实现一致：行中包含场景 ID（不区分大小写）或“场景{编号}”。
+
+        Args:
+            scene: 场景 ID，如 S3
+
+        Returns:
+            行号；未找到返回 None
+        """
+        if scene in self._scene_cache:
+            return self._scene_cache[scene]
+
+        scene_lower = (scene or "").lower()
+        m = re.fullmatch(r"s(\d+)", scene_lower)
+        if m:
+            # 快速路径：S{n} 形式直接查表
+            candidates = [
+                self._latin_first.get(m.group(1)),
+                self._cn_first.get(m.group(1)),
+            ]
+            found = [c for c in candidates if c is not None]
+            line_no = min(found) if found else None
+        else:
+            # 非常规场景 ID：扫描一次后记忆
+            cn_key = f"场景{scene[1:]}"
+            line_no = None
+            for i, line in enumerate(self.lines):
+                if scene_lower in line.lower() or cn_key in line:
+                    line_no = i
+                    break
+
+        self._scene_cache[scene] = line_no
+        return line_no
+
+    def scene_section(self, scene: str, max_lines: int = 20) -> str:
+        """提取场景段落：命中行及其后续行，直到下一个标题或达到行数上限
+
+        Args:
+            scene: 场景 ID
+            max_lines: 最多包含的行数（含命中行）
+
+        Returns:
+            段落文本；未找到返回空串
+        """
+        start = self.find_scene_line(scene)
+        if start is None:
+            return ""
+        head = self.lines[start]
+        section = [head]
+        for j in range(start + 1, min(start + max_lines, len(self.lines))):
+            stripped = self.lines[j].strip()
+            if stripped.startswith('#') and stripped != head.strip():
+                break  # 遇到下一个标题
+            section.append(self.lines[j])
+        return '\n'.join(section)
+
+    def section_offsets(self, scene: str, max_lines: int = 20) -> Optional[Tuple[int, int]]:
+        """场景段落在原文中的 (起始, 结束) 字符偏移"""
+        section = self.scene_section(scene, max_lines)
+        if not section:
+            return None
+        start = self.line_offsets[self.find_scene_line(scene)]
+        return start, start + len(section)
+
+    # ==================== 规则行 ====================
+
+    def rule_lines(
+        self,
+        keywords: Sequence[str] = RULE_KEYWORDS,
+        within_lines: int = 50,
+        max_chars: Optional[int] = None,
+    ) -> List[str]:
+        """按原文顺序返回前 within_lines 行中包含任一关键词的行
+
+        Args:
+            keywords: 关键词列表（默认规则关键词）
+            within_lines: 只看前 N 行
+            max_chars: 累计长度超过该值后停止收集
+
+        Returns:
+            命中的行列表
+        """
+        hits = set()
+        for kw in keywords:
+            line_nos = self.keyword_lines.get(kw)
+            if line_nos is None:
+                line_nos = [i for i, line in enumerate(self.lines) if kw in line]
+                self.keyword_lines[kw] = line_nos
+            for i in line_nos:
+                if i >= within_lines:
+                    break
+                hits.add(i)
+
+        result: List[str] = []
+        total = -1
+        for i in sorted(hits):
+            result.append(self.lines[i])
+            total += len(self.lines[i]) + 1
+            if max_chars is not None and total > max_chars:
+                break
+        return result
+
+    # ==================== 截断 ====================
+
+    def shorten(self, max_chars: int = 4000, marker: str = "\n\n...[内容已截断]...") -> str:
+        """按标题分段均衡截断：每个段落保留开头若干行，而不是只保留全文前缀
+
+        没有标题时退化为在行边界处截断前缀。
+
+        Args:
+            max_chars: 输出最大字符数（不含截断标记）
+            marker: 截断标记
+
+        Returns:
+            截断后的文本
+        """
+        text = self.text.strip()
+        if len(text) <= max_chars:
+            return text
+
+        starts = [i for i in self.heading_lines]
+        if not starts:
+            cut = text[:max_chars]
+            nl = cut.rfind('\n')
+            if nl > max_chars // 2:
+                cut = cut[:nl]
+            return cut + marker
+
+        # 标题前的引言视为第 0 段
+        if starts[0] != 0:
+            starts = [0] + starts
+        bounds = list(zip(starts, starts[1:] + [len(self.lines)]))
+        share = max(1, max_chars // len(bounds))
+
+        parts: List[str] = []
+        used = 0
+        for begin, end in bounds:
+            budget = min(share, max_chars - used)
+            if budget <= 0:
+                break
+            chunk: List[str] = []
+            size = 0
+            for i in range(begin, end):
+                line = self.lines[i]
+                if not line.strip() and not chunk:
+                    continue
+                if size + len(line) + 1 > budget:
+                    if not chunk:
+                        chunk.append(line[: max(0, budget - 1)])
+                    break
+                chunk.append(line)
+                size += len(line) + 1
+            if chunk:
+                block = '\n'.join(chunk).rstrip()
+                parts.append(block)
+                used += len(block) + 1
+        return '\n'.join(parts) + marker
+
+
+_INDEX_CACHE: Dict[str, DocumentIndex] = {}
+_INDEX_LOCK = threading.Lock()
+_INDEX_CACHE_LIMIT = 64
+
+
+def get_document_index(text: str) -> DocumentIndex:
+    """获取（必要时构建）文档索引，按内容复用
+
+    Args:
+        text: 文档全文
+
+    Returns:
+        DocumentIndex
+    """
+    text = text or ""
+    index = _INDEX_CACHE.get(text)
+    if index is not None:
+        return index
+    with _INDEX_LOCK:
+        index = _INDEX_CACHE.get(text)
+        if index is None:
+            index = DocumentIndex(text)
+            if len(_INDEX_CACHE) >= _INDEX_CACHE_LIMIT:
+                # 简单淘汰最早加入的索引
+                _INDEX_CACHE.pop(next(iter(_INDEX_CACHE)))
+            _INDEX_CACHE[text] = index
+        return index
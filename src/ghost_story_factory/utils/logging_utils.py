@@ -2,9 +2,11 @@
 轻量日志工具
 
 目标：
-- 在每次生成会话启动时创建一个 logs/<app>_YYYYmmdd_HHMMSS.log 文件
+- 在每次生成会话启动时创建一个 logs/<app>_YYYYmmdd_HHMMSS.log 文件（LOG_DIR 可改写目录）
 - 返回统一的 logger 与日志路径，供整个进程复用
 - 自动安装 sys.excepthook，确保未捕获异常也会写入日志
+- console / quiet_console：生成器的进度输出；后台线程（投机 / 前瞻）在 quiet_console()
+  内调用生成器时改写 debug 日志，不与玩家的输入提示交错
 
 用法：
     from ghost_story_factory.utils.logging_utils import get_run_logger, get_logger
@@ -18,17 +20,20 @@
 import logging
 import os
 import sys
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Optional, Tuple, Dict
+from typing import Iterator, Optional, Tuple, Dict
 
 _LOGGER: Optional[logging.Logger] = None
 _LOG_FILE_PATH: Optional[str] = None
+_CONSOLE = threading.local()
 
 
-def _ensure_logs_dir() -> Path:
-    root = Path(os.getcwd())
-    logs_dir = root / "logs"
+def ensure_logs_dir() -> Path:
+    """日志目录：默认 <cwd>/logs，可通过 env LOG_DIR 改写（测试中指向临时目录）"""
+    logs_dir = Path(os.getenv("LOG_DIR") or Path(os.getcwd()) / "logs")
     logs_dir.mkdir(parents=True, exist_ok=True)
     return logs_dir
 
@@ -61,7 +66,7 @@ def get_run_logger(app_name: str, context: Optional[Dict[str, object]] = None) -
                 pass
         return _LOGGER, _LOG_FILE_PATH
 
-    logs_dir = _ensure_logs_dir()
+    logs_dir = ensure_logs_dir()
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{app_name}_{ts}.log"
     log_path = str(logs_dir / filename)
@@ -119,3 +124,22 @@ def get_logger() -> Tuple[logging.Logger, Optional[str]]:
     return logger, None
 
 
+
+
+@contextmanager
+def quiet_console() -> Iterator[None]:
+    """当前线程内 console() 不打印，改写 debug 日志（可嵌套）"""
+    depth = getattr(_CONSOLE, "quiet", 0)
+    _CONSOLE.quiet = depth + 1
+    try:
+        yield
+    finally:
+        _CONSOLE.quiet = depth
+
+
+def console(message: str) -> None:
+    """打印进度 / 提示信息；quiet_console() 内改写 debug 日志"""
+    if getattr(_CONSOLE, "quiet", 0):
+        logging.getLogger("ghost_story_factory").debug(message)
+    else:
+        print(message)
@@ -0,0 +1,420 @@
+"""分层故事摘要
+
+一次性为主线故事 / Lore 等长文档构建「全篇 → 幕 → 场景」三级摘要，生成器按当前节拍
+只取相关切片放进 prompt，替代整篇发送或按字数硬截断：
+- 层级来自 Markdown 标题：唯一的一级标题视为文档标题，其下最浅一层标题为「幕」，
+  幕内更深一层标题为「场景」；
+- 摘要为抽取式（每段保留开头的完整句子），无需额外 LLM 调用，结果可复现；
+- 摘要以 JSON 存放在文档旁（xxx_story.md → xxx_story.summary.json），
+  以源文本 sha256 校验是否过期。
+
+get_story_summary(text) 按文档内容复用摘要（与 get_document_index 一致）。
+"""
+
+import hashlib
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .doc_index import get_document_index
+
+
+SUMMARY_VERSION = 1
+
+_SCENE_ID = re.compile(r"(?<![A-Za-z0-9])[Ss](\d+)(?!\d)")
+_SCENE_CN = re.compile(r"场景\s*(\d+)")
+_SENTENCE = re.compile(r"[^。！？!?；;]+[。！？!?；;]?")
+
+
+@dataclass
+class SceneSummary:
+    """场景级摘要"""
+
+    title: str
+    summary: str
+    scene_id: str = ""
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"title": self.title, "summary": self.summary, "scene_id": self.scene_id}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SceneSummary":
+        return cls(
+            title=str(data.get("title", "") or ""),
+            summary=str(data.get("summary", "") or ""),
+            scene_id=str(data.get("scene_id", "") or ""),
+        )
+
+
+@dataclass
+class ActSummary:
+    """幕级摘要"""
+
+    title: str
+    summary: str
+    scenes: List[SceneSummary] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "title": self.title,
+            "summary": self.summary,
+            "scenes": [s.to_dict() for s in self.scenes],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ActSummary":
+        return cls(
+            title=str(data.get("title", "") or ""),
+            summary=str(data.get("summary", "") or ""),
+            scenes=[SceneSummary.from_dict(s) for s in data.get("scenes") or [] if isinstance(s, dict)],
+        )
+
+
+@dataclass
+class StorySummary:
+    """全篇摘要（含幕 / 场景两级）"""
+
+    title: str
+    summary: str
+    acts: List[ActSummary] = field(default_factory=list)
+    source_sha256: str = ""
+
+    # ==================== 序列化 ====================
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": SUMMARY_VERSION,
+            "source_sha256": self.source_sha256,
+            "title": self.title,
+            "summary": self.summary,
+            "acts": [a.to_dict() for a in self.acts],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StorySummary":
+        return cls(
+            title=str(data.get("title", "") or ""),
+            summary=str(data.get("summary", "") or ""),
+            acts=[ActSummary.from_dict(a) for a in data.get("acts") or [] if isinstance(a, dict)],
+            source_sha256=str(data.get("source_sha256", "") or ""),
+        )
+
+    def save(self, path: Path) -> None:
+        """写入 JSON 文件"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+
+    # ==================== 查询 ====================
+
+    def _candidates(self) -> List[Tuple[int, Optional[int]]]:
+        """可被当前节拍定位的单元：(幕序号, 场景序号)，幕下无场景时以幕本身为单元"""
+        units: List[Tuple[int, Optional[int]]] = []
+        for ai, act in enumerate(self.acts):
+            if act.scenes:
+                units.extend((ai, si) for si in range(len(act.scenes)))
+            else:
+                units.append((ai, None))
+        return units
+
+    def locate(self, scene: Optional[str] = None, act_index: Optional[int] = None) -> Tuple[Optional[int], Optional[int]]:
+        """定位当前节拍对应的 (幕序号, 场景序号)
+
+        优先按标题中的场景 ID（S3 / 场景3）匹配；否则把 S{n} 视为第 n 个场景；
+        都失败时退回 act_index（骨架中的幕序号，从 1 开始）。
+
+        Args:
+            scene: 场景 ID
+            act_index: 骨架幕序号（1-based）
+
+        Returns:
+            (幕序号, 场景序号)，未命中的一级为 None
+        """
+        units = self._candidates()
+        m = _SCENE_ID.fullmatch((scene or "").strip())
+        if m:
+            for ai, si in units:
+                unit_id = self.acts[ai].scenes[si].scene_id if si is not None else _scene_id_of(self.acts[ai].title)
+                if unit_id and unit_id.upper() == scene.strip().upper():
+                    return ai, si
+            n = int(m.group(1))
+            if 1 <= n <= len(units):
+                return units[n - 1]
+        if act_index is not None and 1 <= act_index <= len(self.acts):
+            return act_index - 1, None
+        return None, None
+
+    def slice_for(self, scene: Optional[str] = None, act_index: Optional[int] = None, max_chars: int = 600) -> str:
+        """取当前节拍相关的摘要切片：全篇摘要 + 所在幕摘要 + 所在场景摘要
+
+        Args:
+            scene: 场景 ID
+            act_index: 骨架幕序号（1-based）
+            max_chars: 切片最大字符数
+
+        Returns:
+            str: 摘要切片
+        """
+        ai, si = self.locate(scene, act_index)
+        parts: List[str] = []
+        if self.summary:
+            parts.append(f"【全篇】{self.summary}")
+        if ai is not None:
+            act = self.acts[ai]
+            parts.append(f"【本幕·{act.title}】{act.summary}")
+            if si is not None:
+                sc = act.scenes[si]
+                parts.append(f"【本场·{sc.title}】{sc.summary}")
+        return _clip("\n".join(parts), max_chars)
+
+    def render(self, max_chars: int = 4000) -> str:
+        """渲染完整大纲；超长时依次省略场景摘要、场景标题，最后按字数截断
+
+        Args:
+            max_chars: 最大字符数
+
+        Returns:
+            str: 大纲文本
+        """
+        for detail in (2, 1, 0):
+            lines = [f"# {self.title}"] if self.title else []
+            if self.summary:
+                lines.append(self.summary)
+            for act in self.acts:
+                lines.append(f"## {act.title}")
+                if act.summary:
+                    lines.append(act.summary)
+                for sc in act.scenes if detail else []:
+                    lines.append(f"- {sc.title}：{sc.summary}" if detail == 2 else f"- {sc.title}")
+            text = "\n".join(lines)
+            if len(text) <= max_chars:
+                return text
+        return _clip(text, max_chars)
+
+
+# ==================== 构建 ====================
+
+
+def _clip(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[: max(0, max_chars - 1)] + "…"
+
+
+def _scene_id_of(title: str) -> str:
+    m = _SCENE_ID.search(title) or _SCENE_CN.search(title)
+    return f"S{m.group(1)}" if m else ""
+
+
+def _clean_line(line: str) -> str:
+    """去掉 Markdown 列表 / 引用 / 强调标记"""
+    line = line.strip()
+    line = re.sub(r"^([-*+>]\s+|\d+[.)、]\s*)", "", line)
+    return line.replace("**", "").replace("__", "").strip()
+
+
+def _lead_summary(lines: List[str], max_chars: int) -> str:
+    """抽取式摘要：按顺序保留完整句子，直到达到字数上限"""
+    body: List[str] = []
+    in_code = False
+    for raw in lines:
+        stripped = raw.strip()
+        if stripped.startswith("```"):
+            in_code = not in_code
+            continue
+        if in_code or not stripped or stripped.startswith(("#", "|", "---", "━")):
+            continue
+        cleaned = _clean_line(stripped)
+        if cleaned:
+            body.append(cleaned)
+
+    result = ""
+    for sentence in _SENTENCE.findall(" ".join(body)):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if len(result) + len(sentence) > max_chars:
+            if not result:
+                result = _clip(sentence, max_chars)
+            break
+        result += sentence
+    return result
+
+
+def _heading_level(line: str) -> int:
+    stripped = line.strip()
+    return len(stripped) - len(stripped.lstrip("#"))
+
+
+def _heading_title(line: str) -> str:
+    return line.strip().lstrip("#").strip()
+
+
+def build_story_summary(
+    text: str,
+    scene_chars: int = 160,
+    act_chars: int = 240,
+    doc_chars: int = 300,
+) -> StorySummary:
+    """从 Markdown 文档构建分层摘要
+
+    Args:
+        text: 文档全文
+        scene_chars: 场景摘要字数上限
+        act_chars: 幕摘要字数上限
+        doc_chars: 全篇摘要字数上限
+
+    Returns:
+        StorySummary
+    """
+    text = text or ""
+    index = get_document_index(text)
+    lines = index.lines
+    headings = [(i, _heading_level(lines[i])) for i in index.heading_lines]
+    sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    if not headings:
+        return StorySummary(title="", summary=_lead_summary(lines, doc_chars), source_sha256=sha)
+
+    # 唯一的最浅标题作为文档标题，其下一层为幕
+    levels = sorted({lvl for _, lvl in headings})
+    top = [i for i, lvl in headings if lvl == levels[0]]
+    title = ""
+    act_level = levels[0]
+    if len(top) == 1 and len(levels) > 1:
+        title = _heading_title(lines[top[0]])
+        act_level = levels[1]
+
+    act_starts = [i for i, lvl in headings if lvl == act_level]
+    preamble_start = top[0] + 1 if title else 0
+    preamble = lines[preamble_start:act_starts[0]] if act_starts else lines[preamble_start:]
+
+    acts: List[ActSummary] = []
+    for k, start in enumerate(act_starts):
+        end = next((i for i, lvl in headings if i > start and lvl <= act_level), len(lines))
+        inner = [(i, lvl) for i, lvl in headings if start < i < end]
+        scenes: List[SceneSummary] = []
+        intro_end = end
+        if inner:
+            scene_level = min(lvl for _, lvl in inner)
+            scene_starts = [i for i, lvl in inner if lvl == scene_level]
+            intro_end = scene_starts[0]
+            for j, s_start in enumerate(scene_starts):
+                s_end = scene_starts[j + 1] if j + 1 < len(scene_starts) else end
+                s_title = _heading_title(lines[s_start])
+                scenes.append(SceneSummary(
+                    title=s_title,
+                    summary=_lead_summary(lines[s_start + 1:s_end], scene_chars),
+                    scene_id=_scene_id_of(s_title),
+                ))
+
+        act_summary = _lead_summary(lines[start + 1:intro_end], act_chars)
+        if not act_summary and scenes:
+            # 幕没有导语时，用各场景摘要的首句拼接
+            firsts = [(_SENTENCE.findall(s.summary) or [""])[0].strip() for s in scenes]
+            act_summary = _clip("".join(f for f in firsts if f), act_chars)
+        acts.append(ActSummary(title=_heading_title(lines[start]), summary=act_summary, scenes=scenes))
+
+    doc_summary = _lead_summary(preamble, doc_chars)
+    if not doc_summary:
+        firsts = [(_SENTENCE.findall(a.summary) or [""])[0].strip() for a in acts]
+        doc_summary = _clip("".join(f for f in firsts if f), doc_chars)
+
+    return StorySummary(title=title, summary=doc_summary, acts=acts, source_sha256=sha)
+
+
+# ==================== 存储与复用 ====================
+
+_SUMMARY_CACHE: Dict[str, StorySummary] = {}
+_SUMMARY_LOCK = threading.Lock()
+_SUMMARY_CACHE_LIMIT = 32
+
+
+def summary_path_for(doc_path: Path) -> Path:
+    """文档对应的摘要文件路径：xxx_story.md → xxx_story.summary.json"""
+    doc_path = Path(doc_path)
+    return doc_path.with_name(f"{doc_path.stem}.summary.json")
+
+
+def _remember(text: str, summary: StorySummary) -> StorySummary:
+    with _SUMMARY_LOCK:
+        if text not in _SUMMARY_CACHE and len(_SUMMARY_CACHE) >= _SUMMARY_CACHE_LIMIT:
+            _SUMMARY_CACHE.pop(next(iter(_SUMMARY_CACHE)))
+        _SUMMARY_CACHE[text] = summary
+    return summary
+
+
+def get_story_summary(text: str) -> StorySummary:
+    """获取（必要时构建）文档摘要，按内容复用
+
+    Args:
+        text: 文档全文
+
+    Returns:
+        StorySummary
+    """
+    text = text or ""
+    summary = _SUMMARY_CACHE.get(text)
+    if summary is not None:
+        return summary
+    return _remember(text, build_story_summary(text))
+
+
+def scene_slice(text: str, scene: Optional[str], max_chars: int = 500) -> str:
+    """按场景取文档（GDD / Lore）的摘要切片；文档中定位不到该场景时返回空串
+
+    调用方在返回空串时回退到原文片段（doc_index 场景段落）。
+
+    Args:
+        text: 文档全文
+        scene: 场景 ID
+        max_chars: 切片最大字符数
+
+    Returns:
+        str: 摘要切片或空串
+    """
+    if not (text or "").strip():
+        return ""
+    summary = get_story_summary(text)
+    if summary.locate(scene)[0] is None:
+        return ""
+    return summary.slice_for(scene, max_chars=max_chars)
+
+
+def load_or_build_summary(text: str, path: Optional[Path] = None) -> StorySummary:
+    """从文档旁的摘要文件加载（源文本未变化时），否则重新构建并写回
+
+    Args:
+        text: 文档全文
+        path: 摘要文件路径；为 None 时只在内存中构建
+
+    Returns:
+        StorySummary
+    """
+    text = text or ""
+    sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    if path is not None:
+        path = Path(path)
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("version") == SUMMARY_VERSION and data.get("source_sha256") == sha:
+                return _remember(text, StorySummary.from_dict(data))
+        except (OSError, ValueError):
+            pass
+
+    summary = build_story_summary(text)
+    if path is not None:
+        try:
+            summary.save(path)
+        except OSError:
+            pass
+    return _remember(text, summary)
+
+
+def clear_story_summaries() -> None:
+    """清空内存中的摘要缓存（测试用）"""
+    with _SUMMARY_LOCK:
+        _SUMMARY_CACHE.clear()
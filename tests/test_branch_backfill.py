@@ -0,0 +1,115 @@
+"""
+混合模式缺失分支补全测试
+
+目标：
+- 验证缺失分支被实时生成并交给玩家，而不是落入 missing_branch 占位结局；
+- 验证补全节点在后台写回数据库，后来的玩家直接命中；
+- 验证同一分支重复写回是幂等的；
+- 验证后台回写（含失败）不打印到终端（玩家正在输入）。
+"""
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.engine.choices import Choice
+from ghost_story_factory.runtime import BranchBackfiller, DialogueTreeLoader
+from ghost_story_factory.runtime.branch_backfill import backfill_node_id
+
+
+class _Responses:
+    def generate_response(self, choice, state, apply_consequences=True):
+        if apply_consequences and choice.consequences:
+            state.update(choice.consequences)
+        return f"你{choice.choice_text}，走廊尽头的灯灭了。"
+
+
+class _Choices:
+    def generate_choices(self, scene, state):
+        return [Choice(choice_id="N1", choice_text="摸黑前进"), Choice(choice_id="N2", choice_text="原路返回")]
+
+
+def _tree():
+    return {
+        "root": {
+            "node_id": "root", "scene": "S1", "depth": 0,
+            "game_state": {"PR": 5, "current_scene": "S1"},
+            "narrative": "开场", "parent_id": None, "children": ["node_0001", "node_0002"],
+            "choices": [
+                {"choice_id": "A", "choice_text": "开门", "next_node_id": "node_0001"},
+                {"choice_id": "B", "choice_text": "敲墙", "consequences": {"PR": "+10"}},
+                {"choice_id": "C", "choice_text": "关灯", "next_node_id": "node_0002"},
+            ],
+            "is_ending": False,
+        },
+        "node_0001": {
+            "node_id": "node_0001", "scene": "S1", "depth": 1, "game_state": {"PR": 5},
+            "narrative": "门后", "parent_id": "root", "parent_choice_id": "A",
+            "children": [], "choices": [], "is_ending": True,
+        },
+        "node_0002": {
+            "node_id": "node_0002", "scene": "S1", "depth": 1, "game_state": {"PR": 5},
+            "narrative": "黑暗", "parent_id": "root", "parent_choice_id": "C",
+            "children": [], "choices": [], "is_ending": True,
+        },
+    }
+
+
+def _save(db):
+    return db.save_story(
+        city_name="测试城", title="缺失分支", synopsis="",
+        characters=[{"name": "主角", "is_protagonist": True}],
+        dialogue_trees={"主角": _tree()}, metadata={},
+    )
+
+
+def test_missing_branch_generated_and_written_back(tmp_path, capsys):
+    db_path = tmp_path / "stories.db"
+    db = DatabaseManager(str(db_path))
+    story_id = _save(db)
+    character_id = db.get_characters_by_story(story_id)[0].id
+
+    backfiller = BranchBackfiller(db_path, story_id, character_id, _Responses(), _Choices())
+    loader = DialogueTreeLoader(db, story_id, character_id, backfiller=backfiller)
+    assert loader.can_traverse("B")
+    capsys.readouterr()
+
+    new_id = loader.select_choice("B")
+    assert new_id == backfill_node_id("root", "B")
+    node = loader.get_current_node()
+    assert not node["is_ending"] and node["source"] == "realtime"
+    assert node["game_state"]["PR"] == 15
+    assert [c["choice_id"] for c in loader.get_choices()] == ["N1", "N2"]
+
+    backfiller.close()
+    assert backfiller.stats["written"] == 1
+    assert "数据库" not in capsys.readouterr().out          # 回写线程的连接开关不打印
+
+    # 后来的玩家（无补全器）直接命中写回的分支
+    later = DialogueTreeLoader(DatabaseManager(str(db_path)), story_id, character_id)
+    assert later.can_traverse("B")
+    assert later.select_choice("B") == new_id
+    assert "灯灭了" in later.get_narrative()
+
+    # 重复写回幂等
+    assert db.merge_dialogue_nodes(story_id, character_id, [node]) == 0
+    db.close()
+
+
+def test_without_backfiller_stub_is_kept(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = _save(db)
+    character_id = db.get_characters_by_story(story_id)[0].id
+    loader = DialogueTreeLoader(db, story_id, character_id)
+
+    assert not loader.can_traverse("B")
+    loader.select_choice("B")
+    assert loader.get_ending_type() == "missing_branch"
+    db.close()
+
+
+def test_write_back_failure_stays_off_the_prompt(tmp_path, capsys):
+    # 数据库路径是目录：回写必然失败
+    backfiller = BranchBackfiller(str(tmp_path), 1, 1, _Responses(), _Choices())
+    backfiller.enqueue_write({"node_id": "rt_x", "parent_id": "root", "parent_choice_id": "B"})
+    assert backfiller.flush(timeout=5)
+    backfiller.close()
+    assert backfiller.stats["write_errors"] == 1
+    assert "写回失败" not in capsys.readouterr().out
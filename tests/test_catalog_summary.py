@@ -0,0 +1,89 @@
+"""
+目录汇总测试
+
+目标：
+- 验证保存 / 流式落库 / 合并节点后，城市故事数、故事角色数 / 节点数 / 结局数 / 最大深度 / 字节数随之更新；
+- 验证菜单查询只读汇总列（不连接 characters、不读对话树）；
+- 验证从旧版本升级的库会回填汇总。
+"""
+
+import sqlite3
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.database import migrations
+
+
+def _tree(endings=1, depth=2):
+    tree = {"root": {"node_id": "root", "depth": 0, "choices": [], "children": []}}
+    for i in range(1, depth + 1):
+        tree[f"node_{i:04d}"] = {"node_id": f"node_{i:04d}", "depth": i, "parent_id": "root",
+                                 "parent_choice_id": "A", "is_ending": i > depth - endings}
+    return tree
+
+
+def test_summary_maintained_on_save(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = db.save_story(
+        city_name="测试城", title="汇总", synopsis="简介",
+        characters=[{"name": "甲", "is_protagonist": True}, {"name": "乙"}],
+        dialogue_trees={"甲": _tree(endings=2, depth=4), "乙": _tree()}, metadata={"total_nodes": 99},
+    )
+    db.begin_story("测试城", "进行中", "简介", [{"name": "丙"}])
+
+    city = db.get_cities()[0]
+    assert city.story_count == 2
+    story = db.get_story_by_id(story_id)
+    assert (story.character_count, story.total_nodes, story.ending_count, story.max_depth) == (2, 8, 3, 4)
+    stats = db.get_tree_stats(story_id)
+    assert [s.node_count for s in stats] == [5, 3] and story.size_bytes == sum(s.size_bytes for s in stats) > 0
+
+    chars = {c.name: c.id for c in db.get_characters_by_story(story_id)}
+    db.merge_dialogue_nodes(story_id, chars["乙"], [
+        {"node_id": "node_0009", "parent_id": "root", "parent_choice_id": "B", "depth": 1, "is_ending": True},
+    ])
+    story = db.get_story_by_id(story_id)
+    assert (story.total_nodes, story.ending_count) == (9, 4)
+    db.close()
+
+
+def test_menu_queries_read_only_summary_columns(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    db.save_story(city_name="测试城", title="一", synopsis="简介", characters=[{"name": "甲"}],
+                  dialogue_trees={"甲": _tree()}, metadata={})
+    city_id = db.get_cities()[0].id
+
+    traced = []
+    with db._reader() as conn:
+        conn.set_trace_callback(traced.append)
+        try:
+            db.get_cities()
+            db.get_stories_by_city(city_id)
+        finally:
+            conn.set_trace_callback(None)
+    sql = " ".join(traced).lower()
+    assert "count(" not in sql and "join" not in sql and "dialogue_trees" not in sql
+    db.close()
+
+
+def test_upgrade_backfills_summary(tmp_path):
+    db_path = str(tmp_path / "stories.db")
+    db = DatabaseManager(db_path)
+    story_id = db.save_story(city_name="测试城", title="旧", synopsis="简介", characters=[{"name": "甲"}],
+                             dialogue_trees={"甲": _tree(endings=1, depth=3)}, metadata={})
+    db.close()
+
+    # 回退到汇总之前：清空汇总列与 tree_stats，重新打开时执行 v5 迁移并回填
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE tree_stats")
+    conn.execute("UPDATE stories SET character_count = 0, ending_count = 0, size_bytes = 0")
+    conn.execute("UPDATE cities SET story_count = 0")
+    conn.execute(f"PRAGMA user_version = {migrations.CATALOG_SUMMARY_VERSION - 1}")
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(db_path)
+    story = db.get_story_by_id(story_id)
+    assert db.get_cities()[0].story_count == 1
+    assert (story.character_count, story.ending_count, story.max_depth) == (1, 1, 3)
+    assert story.size_bytes > 0
+    db.close()
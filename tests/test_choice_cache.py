@@ -0,0 +1,93 @@
+"""
+选择点缓存测试
+
+目标：
+- 验证复用概率与单集合复用上限；
+- 验证复用前去掉与上一轮重复的选项，剩余不足时视为未命中；
+- 验证 TreeBuilder 对量化状态相同的节点复用选择集，减少 generate_choices 调用。
+"""
+
+from typing import List
+
+from ghost_story_factory.engine.choices import Choice
+from ghost_story_factory.pregenerator.choice_cache import ChoiceCache
+from ghost_story_factory.pregenerator.dialogue_node import DialogueNode
+from ghost_story_factory.pregenerator.tree_builder import DialogueTreeBuilder
+
+
+CHOICES = [
+    {"choice_id": "A", "choice_text": "推门", "choice_type": "normal", "consequences": {}, "preconditions": {}},
+    {"choice_id": "B", "choice_text": "后退", "choice_type": "normal", "consequences": {}, "preconditions": {}},
+    {"choice_id": "C", "choice_text": "喊人", "choice_type": "normal", "consequences": {}, "preconditions": {}},
+]
+
+
+def test_reuse_probability_and_cap():
+    key = ChoiceCache.make_key({"scene": "S1", "PR": 10}, "setup")
+    assert key != ChoiceCache.make_key({"scene": "S1", "PR": 10}, "climax")
+
+    never = ChoiceCache(reuse_probability=0.0)
+    never.put(key, CHOICES)
+    assert never.get(key) is None and never.stats()["skipped"] == 1
+
+    cache = ChoiceCache(reuse_probability=1.0, max_reuse=2)
+    assert cache.get(key) is None            # 未写入：miss
+    cache.put(key, CHOICES)
+    first = cache.get(key)
+    assert [c["choice_id"] for c in first] == ["A", "B", "C"]
+    first[0]["choice_text"] = "被调用方修改"
+    assert cache.get(key)[0]["choice_text"] == "推门"   # 返回的是副本
+    assert cache.get(key) is None            # 达到复用上限
+    assert cache.stats() == {"entries": 1, "hits": 2, "misses": 1, "skipped": 1, "hit_rate": 0.5}
+
+
+def test_reuse_drops_recent_duplicates():
+    cache = ChoiceCache(reuse_probability=1.0, max_reuse=5, min_choices=2)
+    key = ChoiceCache.make_key({"scene": "S2"})
+    cache.put(key, CHOICES)
+
+    reused = cache.get(key, avoid_texts=["推门"])
+    assert [c["choice_text"] for c in reused] == ["后退", "喊人"]
+    assert cache.get(key, avoid_texts=["推门", "后退"]) is None
+
+
+class _CountingChoiceGenerator:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_choices(self, scene, state, **kwargs) -> List[Choice]:
+        self.calls += 1
+        return [Choice(choice_id=f"{scene}_A", choice_text=f"第 {self.calls} 次生成")]
+
+
+def test_builder_reuses_choice_sets_for_quantized_states(monkeypatch):
+    monkeypatch.setenv("CHOICE_CACHE", "1")
+    monkeypatch.setenv("CHOICE_CACHE_REUSE_PROB", "1")
+    monkeypatch.setenv("CHOICE_CACHE_MAX_REUSE", "1")
+
+    builder = DialogueTreeBuilder(
+        city="测试城",
+        synopsis="测试 synopsis",
+        gdd_content="GDD",
+        lore_content="LORE",
+        main_story="STORY",
+        test_mode=True,
+    )
+    builder.choice_cache.min_choices = 1
+    gen = _CountingChoiceGenerator()
+    builder.choice_generator = gen
+
+    def _node(node_id: str, pr: int, scene: str = "S3") -> DialogueNode:
+        return DialogueNode(node_id=node_id, scene=scene, depth=2, game_state={"PR": pr, "time": "00:12"})
+
+    first = builder._generate_choices(_node("n1", 20))
+    # PR 21 与 20 量化到同一档：复用
+    assert builder._generate_choices(_node("n2", 21)) == first
+    # 达到复用上限后重新生成
+    assert builder._generate_choices(_node("n3", 19))[0]["choice_text"] == "第 2 次生成"
+    # 不同场景：不复用
+    builder._generate_choices(_node("n4", 20, scene="S4"))
+    assert gen.calls == 3
+
+    monkeypatch.setenv("CHOICE_CACHE", "0")
+    assert DialogueTreeBuilder("测试城", "s", "G", "L", "S", test_mode=True).choice_cache is None
@@ -0,0 +1,63 @@
+"""
+数据库版本迁移测试
+
+目标：
+- 验证新库迁移到最新版本，之后打开只做版本检查（不再读取 schema 文件）；
+- 验证引入版本号之前的老库（缺 slug / status 列）能被补齐且数据保留；
+- 验证迁移列表版本号连续递增。
+"""
+
+import sqlite3
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.database import migrations
+
+
+def test_fresh_db_then_fast_path(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "stories.db")
+    DatabaseManager(db_path).close()
+
+    conn = sqlite3.connect(db_path)
+    assert migrations.get_user_version(conn) == migrations.SCHEMA_VERSION
+    conn.close()
+
+    # 快路径：schema 文件不可用也能正常打开
+    monkeypatch.setattr(migrations, "SCHEMA_PATH", tmp_path / "missing.sql")
+    db = DatabaseManager(db_path)
+    assert db.get_cities() == []
+    db.close()
+
+
+def test_legacy_db_is_upgraded(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE cities (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE NOT NULL,
+                             description TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        CREATE TABLE stories (id INTEGER PRIMARY KEY AUTOINCREMENT, city_id INTEGER NOT NULL,
+                              title TEXT NOT NULL, synopsis TEXT NOT NULL,
+                              estimated_duration_minutes INTEGER, total_nodes INTEGER, max_depth INTEGER,
+                              generation_cost_usd REAL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+        INSERT INTO cities (name) VALUES ('老城');
+        INSERT INTO stories (city_id, title, synopsis) VALUES (1, '老故事', '简介');
+    """)
+    conn.commit()
+    conn.close()
+
+    db = DatabaseManager(db_path)
+    story = db.get_stories_by_city(1)[0]
+    assert story.title == "老故事" and story.status == "complete"
+    assert db.get_characters_by_story(story.id) == []
+    db.close()
+
+    conn = sqlite3.connect(db_path)
+    assert migrations.get_user_version(conn) == migrations.SCHEMA_VERSION
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(stories)")]
+    assert "slug" in cols and "status" in cols
+    conn.close()
+
+
+def test_migration_versions_are_sequential():
+    versions = [v for v, _, _ in migrations.MIGRATIONS]
+    assert versions == list(range(1, len(versions) + 1))
+    assert migrations.SCHEMA_VERSION == versions[-1]
@@ -0,0 +1,109 @@
+"""
+数据库连接池与写队列测试
+
+目标：
+- 验证文件库默认切换为 WAL，读连接池有界；
+- 验证写事务进行中，其他线程的读取不被阻塞（只看到已提交数据）；
+- 验证多线程并发保存经写队列串行化，不出现 database is locked。
+"""
+
+import threading
+
+from ghost_story_factory.database import DatabaseManager
+
+
+def _save(db, title):
+    return db.save_story(
+        city_name="测试城", title=title, synopsis="简介",
+        characters=[{"name": "主角", "is_protagonist": True}],
+        dialogue_trees={"主角": {"root": {"node_id": "root", "choices": [], "children": []}}},
+        metadata={"total_nodes": 1},
+    )
+
+
+def test_wal_mode_and_bounded_reader_pool(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"), pool_size=2)
+    _save(db, "一")
+    assert db.journal_mode == "wal"
+
+    barrier = threading.Barrier(8)
+    errors = []
+
+    def reader():
+        try:
+            barrier.wait()
+            for _ in range(20):
+                assert db.get_cities()[0].story_count == 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    stats = db.get_pool_stats()
+    assert stats["readers"] <= 2 and stats["idle_readers"] == stats["readers"]
+    db.close()
+
+
+def test_reads_not_blocked_by_open_write_transaction(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    _save(db, "一")
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_write(conn):
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("INSERT INTO cities (name) VALUES ('新城')")
+        started.set()
+        release.wait(5)
+        conn.commit()
+        return "done"
+
+    future = db.submit_write(slow_write)
+    assert started.wait(5)
+
+    # 写事务未提交：读取立即返回且看不到未提交的城市
+    assert [c.name for c in db.get_cities()] == ["测试城"]
+    assert db.load_dialogue_tree(1, 1)["root"]["node_id"] == "root"
+
+    release.set()
+    assert future.result(5) == "done"
+    assert {c.name for c in db.get_cities()} == {"测试城", "新城"}
+    db.close()
+
+
+def test_concurrent_saves_are_serialized(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    ids, errors = [], []
+    lock = threading.Lock()
+
+    def writer(i):
+        try:
+            story_id = _save(db, f"故事{i}")
+            with lock:
+                ids.append(story_id)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    pending = db.save_story_async(
+        city_name="异步城", title="异步", synopsis="简介",
+        characters=[{"name": "主角"}], dialogue_trees={}, metadata={},
+    )
+
+    assert not errors and len(set(ids)) == 12
+    assert pending.result(5) > 0
+    db.close()                                   # 关闭前写队列已排空
+
+    reopened = DatabaseManager(str(tmp_path / "stories.db"))
+    assert sum(c.story_count for c in reopened.get_cities()) == 13
+    reopened.close()
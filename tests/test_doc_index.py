@@ -0,0 +1,75 @@
+"""
+文档索引测试
+
+目标：
+- 验证 DocumentIndex 的场景段落提取与原逐行扫描结果一致（含 S1 命中 S10 的子串语义）；
+- 验证规则关键词行提取与原 _extract_core_lore 一致；
+- 验证按标题分段截断会保留每一段的开头。
+"""
+
+from ghost_story_factory.utils.doc_index import DocumentIndex, get_document_index
+from ghost_story_factory.engine.choices import ChoicePointsGenerator
+
+
+GDD = "\n".join([
+    "# 总览",
+    "这是一个测试 GDD。",
+    "## 场景10 地下室",
+    "地下室很冷。",
+    "## S2 走廊",
+    "走廊尽头有门。",
+    "仍在走廊。",
+    "## S3 大厅",
+    "大厅空无一人。",
+])
+
+
+def _legacy_scene_context(gdd: str, scene: str, window: int) -> str:
+    """原实现：整篇逐行扫描"""
+    lines = gdd.split('\n')
+    relevant = []
+    for i, line in enumerate(lines):
+        if scene.lower() in line.lower() or f"场景{scene[1:]}" in line:
+            relevant.append(line)
+            for j in range(i + 1, min(i + window, len(lines))):
+                if lines[j].strip().startswith('#') and lines[j].strip() != line.strip():
+                    break
+                relevant.append(lines[j])
+            break
+    return '\n'.join(relevant)
+
+
+def test_scene_section_matches_legacy_scan():
+    index = DocumentIndex(GDD)
+    for scene in ("S1", "S2", "s3", "S10", "S9", "大厅", "总览"):
+        for window in (15, 20, 2):
+            assert index.scene_section(scene, max_lines=window) == _legacy_scene_context(GDD, scene, window)
+
+    # S1 以子串语义命中“场景10”
+    assert index.scene_section("S1").startswith("## 场景10")
+    start, end = index.section_offsets("S2")
+    assert GDD[start:end].startswith("## S2 走廊")
+
+
+def test_rule_lines_and_generator_integration():
+    lore = "\n".join(["世界观：雨夜", "无关内容", "规则一：不可回头", "PR 超过 100 即崩溃"] + ["填充"] * 60 + ["规则：第 65 行"])
+    index = get_document_index(lore)
+    assert index is get_document_index(lore)
+    assert index.rule_lines(within_lines=50) == ["世界观：雨夜", "规则一：不可回头", "PR 超过 100 即崩溃"]
+
+    gen = ChoicePointsGenerator(gdd_content=GDD, lore_content=lore, main_story="")
+    assert gen._extract_core_lore(lore, max_chars=300) == "世界观：雨夜\n规则一：不可回头\nPR 超过 100 即崩溃"
+    assert gen._extract_scene_context(GDD, "S2").startswith("## S2 走廊")
+    assert gen._extract_scene_context(GDD, "S99") == "场景 S99（无详细信息）"
+
+
+def test_shorten_keeps_every_section():
+    text = "\n".join(
+        f"# 第{i}幕\n" + "\n".join(f"第{i}幕 内容行 {k}" for k in range(40))
+        for i in range(1, 5)
+    )
+    short = DocumentIndex(text).shorten(400)
+    for i in range(1, 5):
+        assert f"# 第{i}幕" in short
+    assert short.endswith("...[内容已截断]...")
+    assert len(short) <= 400 + len("\n\n...[内容已截断]...")
@@ -0,0 +1,142 @@
+"""
+mmap 平铺对话树测试
+
+目标：
+- 验证 导出 → mmap 打开 后按节点 ID 读到的内容与原树一致，game_state 为完整快照；
+- 验证 DialogueTreeLoader 首次加载时导出、之后直接复用文件，树更新后文件被视为过期并重新导出；
+- 验证进程内新增的节点（实时补全 / 占位分支）不影响文件，损坏文件回退为从数据库加载；
+- 验证旧树（选项缺 next_node_id）按子节点表跳转，只解码走到的节点。
+"""
+
+import pytest
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.database.flat_tree import (
+    FlatTree, flat_tree_path, open_flat_tree, write_flat_tree,
+)
+from ghost_story_factory.runtime import DialogueTreeLoader
+
+
+def _tree():
+    tree = {}
+    for i in range(30):
+        node_id = "root" if i == 0 else f"node_{i:04d}"
+        tree[node_id] = {
+            "node_id": node_id,
+            "narrative": f"第 {i} 段：走廊里的灯又灭了一盏。",
+            "choices": [{"choice_id": "A", "choice_text": "继续", "next_node_id": f"node_{i + 1:04d}"}]
+            if i < 29 else [],
+            "parent_id": None if i == 0 else ("root" if i == 1 else f"node_{i - 1:04d}"),
+            "parent_choice_id": None if i == 0 else "A",
+            "children": [f"node_{i + 1:04d}"] if i < 29 else [],
+            "is_ending": i == 29,
+            "game_state": {"PR": i, "current_scene": "S1", "flags": {"灯灭": i > 3}},
+        }
+    return tree
+
+
+def test_write_and_read_flat_tree(tmp_path):
+    tree = _tree()
+    path = write_flat_tree(tree, tmp_path / "t.gsft", revision=7)
+    flat = FlatTree(path)
+
+    assert flat.revision == 7 and len(flat) == len(tree)
+    assert set(flat) == set(tree)
+    assert flat["node_0017"] == tree["node_0017"]
+    assert "node_0029" in flat and "node_9999" not in flat
+    assert flat.get("node_9999") is None
+    with pytest.raises(KeyError):
+        flat["node_9999"]
+
+    # 进程内写入只影响本进程
+    flat["node_0030"] = {"node_id": "node_0030"}
+    flat["node_0001"]["children"].append("node_0030")
+    assert len(flat) == 31 and "node_0030" in flat
+    assert open_flat_tree(path)["node_0001"] == tree["node_0001"]
+    assert open_flat_tree(path, revision=8) is None
+    flat.close()
+
+
+def test_loader_exports_once_and_reexports_when_stale(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    tree = _tree()
+    story_id = db.save_story(
+        city_name="测试城", title="平铺", synopsis="简介",
+        characters=[{"name": "甲", "is_protagonist": True}], dialogue_trees={"甲": tree}, metadata={},
+    )
+    char_id = db.get_characters_by_story(story_id)[0].id
+    path = flat_tree_path(db.flat_tree_dir, story_id, char_id)
+
+    loader = DialogueTreeLoader(db, story_id, char_id)
+    assert isinstance(loader.tree, FlatTree) and path.exists()
+    assert loader.select_choice("A") == "node_0001"
+    assert loader.get_current_node()["game_state"] == tree["node_0001"]["game_state"]   # 增量已还原
+    mtime = path.stat().st_mtime_ns
+
+    again = DialogueTreeLoader(db, story_id, char_id)
+    assert path.stat().st_mtime_ns == mtime                                            # 直接复用
+    assert again.get_stats()["total_nodes"] == 30
+
+    updated = db.load_dialogue_tree(story_id, char_id)
+    updated["node_0002"]["narrative"] = "改写后的叙事"
+    db.replace_dialogue_tree(story_id, char_id, updated)
+    fresh = DialogueTreeLoader(db, story_id, char_id)
+    assert fresh.tree.revision == db.get_tree_revision(story_id, char_id)
+    assert fresh.get_narrative("node_0002") == "改写后的叙事"
+    db.close()
+
+
+def test_corrupt_file_falls_back_to_database(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = db.save_story(
+        city_name="测试城", title="损坏", synopsis="简介",
+        characters=[{"name": "甲"}], dialogue_trees={"甲": _tree()}, metadata={},
+    )
+    char_id = db.get_characters_by_story(story_id)[0].id
+    path = flat_tree_path(db.flat_tree_dir, story_id, char_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"not a tree")
+    assert open_flat_tree(path) is None
+
+    # 损坏文件被重新导出
+    loader = DialogueTreeLoader(db, story_id, char_id)
+    assert isinstance(loader.tree, FlatTree)
+    assert loader.get_narrative("root") == _tree()["root"]["narrative"]
+    db.close()
+
+
+def test_legacy_choices_resolve_without_decoding_whole_tree(tmp_path):
+    # 旧检查点：选项没有 next_node_id，只能靠子节点的 parent_id + parent_choice_id 找到
+    tree = {}
+    for i in range(200):
+        node_id = "root" if i == 0 else f"node_{i:04d}"
+        parent = None if i == 0 else ("root" if i <= 2 else f"node_{(i - 1) // 2:04d}")
+        tree[node_id] = {
+            "node_id": node_id, "narrative": f"第 {i} 段", "parent_id": parent,
+            "parent_choice_id": None if i == 0 else ("A" if i % 2 else "B"),
+            "choices": [{"choice_id": "A", "choice_text": "左"}, {"choice_id": "B", "choice_text": "右"}],
+            "children": [], "game_state": {"PR": i},
+        }
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = db.save_story(
+        city_name="测试城", title="旧树", synopsis="简介",
+        characters=[{"name": "甲"}], dialogue_trees={"甲": tree}, metadata={},
+    )
+    char_id = db.get_characters_by_story(story_id)[0].id
+
+    loader = DialogueTreeLoader(db, story_id, char_id)
+    assert isinstance(loader.tree, FlatTree)
+    visited = ["root"]
+    for choice_id in ["A", "B", "A"]:
+        assert all(loader.can_traverse(c["choice_id"]) for c in loader.get_choices())
+        visited.append(loader.select_choice(choice_id))
+    assert visited == ["root", "node_0001", "node_0004", "node_0009"]
+    assert set(loader.tree._nodes) <= set(visited)          # 只解码走过的节点（200 个中的几个）
+
+    # 叶子节点的分支不存在：占位节点写入进程内子节点表
+    leaf = DialogueTreeLoader(db, story_id, char_id)
+    leaf.current_node_id = "node_0150"
+    stub_id = leaf.select_choice("A")
+    assert stub_id == "node_0200" and leaf.tree.child_index.get(("node_0150", "A")) == [stub_id]
+    assert leaf.can_traverse("A", "node_0150")
+    db.close()
@@ -0,0 +1,75 @@
+"""
+生成器共享池测试
+
+目标：
+- 验证相同文档内容复用同一组生成器，不同文档得到不同实例；
+- 验证多线程并发获取时只创建一组实例；
+- 验证 DialogueTreeBuilder 默认从共享池初始化生成器。
+"""
+
+import threading
+
+from ghost_story_factory.engine.generator_pool import (
+    clear_generator_pool,
+    documents_key,
+    generator_pool_size,
+    get_shared_generators,
+)
+from ghost_story_factory.pregenerator.tree_builder import DialogueTreeBuilder
+
+
+def test_same_documents_share_generators():
+    clear_generator_pool()
+    choice_a, response_a = get_shared_generators("GDD", "LORE", "STORY")
+    choice_b, response_b = get_shared_generators("GDD", "LORE", "STORY")
+    choice_c, _ = get_shared_generators("GDD-2", "LORE", "STORY")
+
+    assert choice_a is choice_b and response_a is response_b
+    assert choice_c is not choice_a
+    assert generator_pool_size() == 2
+    # 长度前缀：不同切分不应产生同一键
+    assert documents_key("ab", "c") != documents_key("a", "bc")
+    clear_generator_pool()
+
+
+def test_concurrent_lookup_creates_single_instance():
+    clear_generator_pool()
+    results = []
+    start = threading.Barrier(8)
+
+    def _worker():
+        start.wait()
+        results.append(get_shared_generators("GDD", "LORE", "STORY"))
+
+    threads = [threading.Thread(target=_worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len({id(pair[0]) for pair in results}) == 1
+    assert generator_pool_size() == 1
+    clear_generator_pool()
+
+
+def test_tree_builders_use_shared_pool(monkeypatch):
+    clear_generator_pool()
+    monkeypatch.setenv("GENERATOR_POOL", "1")
+
+    builders = [
+        DialogueTreeBuilder(
+            city="测试城",
+            synopsis="测试 synopsis",
+            gdd_content="GDD",
+            lore_content="LORE",
+            main_story="STORY",
+            test_mode=True,
+        )
+        for _ in range(2)
+    ]
+    for b in builders:
+        b._init_generators()
+
+    assert builders[0].choice_generator is builders[1].choice_generator
+    assert builders[0].response_generator is builders[1].response_generator
+    clear_generator_pool()
@@ -0,0 +1,121 @@
+"""
+增量 JSON 解析测试
+
+目标：
+- 验证选项对象在流中闭合即被解析与校验，与分块方式无关；
+- 验证开头大段非 JSON 文本或连续无效选项时提前中断；
+- 验证流式选择点生成在畸形输出时中断重试，且每段输出只解析一次；
+- 验证流式路径与 CrewAI 路径使用同一模型、密钥与地址。
+"""
+
+import json
+from types import SimpleNamespace
+
+import ghost_story_factory.engine.choices as choices_module
+import ghost_story_factory.engine.llm_stream as llm_stream
+from ghost_story_factory.engine.choices import ChoicePointsGenerator
+from ghost_story_factory.engine.json_stream import StreamingChoiceParser, loads_tolerant
+
+
+PAYLOAD = json.dumps(
+    {
+        "scene_id": "S3",
+        "choices": [
+            {"id": "A", "text": "推开车厢门 {小心}", "immediate_consequences": {"flags": {"结局_白娘子觉醒": True}}},
+            {"id": "B", "text": "原地数车厢", "tags": ["保守"]},
+        ],
+    },
+    ensure_ascii=False,
+)
+
+
+def _chunks(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_choices_emitted_as_objects_close():
+    for size in (1, 7, len(PAYLOAD)):
+        parser = StreamingChoiceParser()
+        emitted = []
+        for chunk in _chunks("```json\n" + PAYLOAD + "\n```\n以上。", size):
+            emitted.extend(parser.feed(chunk))
+        assert [c["id"] for c in emitted] == ["A", "B"]
+        assert parser.complete and not parser.aborted
+        assert parser.result()["scene_id"] == "S3"
+
+    # 第一个选项闭合时第二个尚未到达
+    parser = StreamingChoiceParser()
+    first_obj_end = PAYLOAD.index("}}},") + 3
+    assert [c["id"] for c in parser.feed(PAYLOAD[:first_obj_end])] == ["A"]
+    assert not parser.complete
+
+
+def test_abort_on_malformed_stream():
+    prose = StreamingChoiceParser(max_preamble=20)
+    prose.feed("好的，下面我来为你详细介绍这个场景中玩家可以做出的各种选择以及它们的后果")
+    assert prose.aborted
+
+    bad = StreamingChoiceParser(validator=lambda obj: obj if "text" in obj else None, max_invalid=2)
+    bad.feed('{"choices": [{"foo": 1}, {"text": "ok"}, {"bar": 2}, {"text": "late"}]}')
+    assert bad.aborted and [c["text"] for c in bad.choices] == ["ok"]
+
+    assert loads_tolerant('{"a": 1，"b": [1, 2,],}') == {"a": 1, "b": [1, 2]}
+
+
+def test_streaming_generation_retries_after_early_abort(monkeypatch):
+    monkeypatch.setenv("KIMI_API_KEY", "test-key")
+    monkeypatch.setenv("CHOICE_STREAMING", "1")
+    consumed = []
+
+    def fake_stream(prompt, system=None, model=None, **kwargs):
+        if len(consumed) == 0:
+            consumed.append("bad")
+            yield "抱歉，" * 300
+            # 中断后不应继续读取
+            consumed.append("read-after-abort")
+            yield PAYLOAD
+        else:
+            consumed.append("good")
+            assert "仅输出一个 JSON 对象" in prompt
+            for chunk in _chunks(PAYLOAD + "\n多余的尾随文本", 16):
+                yield chunk
+
+    monkeypatch.setattr(choices_module, "stream_completion", fake_stream)
+    monkeypatch.setattr(choices_module, "streaming_available", lambda: True)
+
+    gen = ChoicePointsGenerator(gdd_content="## S3 车厢", lore_content="规则", main_story="")
+    monkeypatch.setattr(gen, "_get_llm", lambda: None)
+    monkeypatch.setattr(gen, "_parse_result", lambda *a, **k: (_ for _ in ()).throw(AssertionError("不应重复解析")))
+
+    result = gen.generate_choices("S3", choices_module.GameState(current_scene="S3"))
+    assert consumed == ["bad", "good"]
+    assert [c.choice_text for c in result][:2] == ["推开车厢门 {小心}", "原地数车厢"]
+    metrics = gen.get_json_metrics()
+    assert metrics["total_calls"] == 2 and metrics["failures"] == 1 and metrics["ok_first_try"] == 1
+
+
+def test_streaming_uses_same_model_and_endpoint_as_crewai(monkeypatch):
+    for name in ("KIMI_MODEL", "KIMI_MODEL_CHOICES", "KIMI_API_BASE", "MOONSHOT_API_KEY", "KIMI_API_KEY"):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setattr(llm_stream, "_OPENAI_AVAILABLE", True)
+
+    # 只配置 OpenAI 密钥：CrewAI 路径只认 Kimi 密钥，流式也不可用（不会悄悄换服务商）
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-openai")
+    assert not llm_stream.streaming_available()
+
+    monkeypatch.setenv("KIMI_API_KEY", "test-key")
+    requests = []
+
+    def fake_client(api_key, base_url):
+        def create(**kwargs):
+            requests.append((api_key, base_url, kwargs["model"]))
+            return iter([SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=PAYLOAD))])])
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    monkeypatch.setattr(llm_stream, "_get_client", fake_client)
+    gen = ChoicePointsGenerator(gdd_content="## S3 车厢", lore_content="规则", main_story="")
+    gen._stream_choices("生成选择点")
+
+    crewai_llm = gen._create_llm()
+    assert requests == [("test-key", crewai_llm.base_url, crewai_llm.model)]
+    assert gen._kimi_model_choices == "moonshot-v1-32k"
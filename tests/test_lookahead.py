@@ -0,0 +1,159 @@
+"""
+多步前瞻缓存测试
+
+目标：
+- 验证后台按概率优先生成深度 2 的前瞻树（关键选项优先）；
+- 验证命中前瞻与未命中时现场生成得到同一状态，命中后子树被复用、兄弟分支被淘汰；
+- 验证每会话调用上限与 LRU 容量生效；
+- 验证后台前瞻生成时生成器的进度输出不打印到终端；
+- 验证流式响应开启时，仍在生成中的前瞻节点视为未命中，不阻塞等待。
+"""
+
+import threading
+import time
+
+import ghost_story_factory.engine.response as response_module
+from ghost_story_factory.engine.choices import Choice, ChoiceType
+from ghost_story_factory.engine.game_loop import GameEngine
+from ghost_story_factory.engine.lookahead import LookaheadCache
+from ghost_story_factory.engine.response import RuntimeResponseGenerator
+from ghost_story_factory.engine.state import GameState
+from ghost_story_factory.utils.logging_utils import console
+
+
+class _Responses:
+    _add_system_hints = RuntimeResponseGenerator._add_system_hints
+
+    def __init__(self, gate: threading.Event = None):
+        self.order = []
+        self.gate = gate
+
+    def generate_response(self, choice, state, apply_consequences=True):
+        if self.gate is not None:
+            self.gate.wait(2)
+        self.order.append(choice.choice_id)
+        return f"响应:{choice.choice_id}"
+
+
+class _Choices:
+    def generate_choices(self, scene, state):
+        depth = len(state.consequence_tree)
+        return [
+            Choice(choice_id=f"D{depth}_X", choice_text="向前", consequences={"PR": "+5"}),
+            Choice(choice_id=f"D{depth}_Y", choice_text="后退"),
+        ]
+
+
+def _root_choices():
+    return [
+        Choice(choice_id="B", choice_text="观察", choice_type=ChoiceType.NORMAL),
+        Choice(choice_id="C", choice_text="发呆", choice_type=ChoiceType.MICRO),
+        Choice(choice_id="A", choice_text="冲进去", choice_type=ChoiceType.CRITICAL, consequences={"PR": "+20"}),
+    ]
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_builds_depth_two_tree_and_reuses_subtree_on_hit():
+    gate = threading.Event()
+    responses = _Responses(gate)
+    cache = LookaheadCache(responses, _Choices(), depth=2, top_k=2, max_calls=100, workers=1)
+    state = GameState()
+
+    assert sorted(cache.speculate(_root_choices(), state)) == ["A", "B"]
+    gate.set()
+    assert _wait_for(lambda: cache.get_stats()["generated"] == 6)
+    assert responses.order[0] == "A"                     # 关键选项优先
+
+    result = cache.take(_root_choices()[2], state)
+    assert result.state.PR == state.PR + 20
+    assert result.state.consequence_tree == ["A"] and "PR +20" in result.response
+
+    # A 与兄弟分支 B 的子树被淘汰；以 A 为新根补登记下一层，保持深度 2
+    stats = cache.get_stats()
+    assert stats["evicted"] == 4 and stats["scheduled"] == 10 and stats["cached"] == 6
+    cache.speculate(result.choices, result.state)
+    nxt = cache.take(result.choices[0], result.state)
+    assert nxt is not None and nxt.state.PR == state.PR + 25
+    assert cache.get_stats()["hits"] == 2
+    cache.shutdown()
+
+
+def test_spend_cap_and_capacity():
+    cache = LookaheadCache(_Responses(), _Choices(), depth=2, top_k=2, max_calls=4, workers=1)
+    cache.speculate(_root_choices(), GameState())
+    assert _wait_for(lambda: cache.get_stats()["skipped_budget"] >= 1)
+    stats = cache.get_stats()
+    assert stats["generated"] == 2 and stats["calls"] == 4
+    cache.shutdown()
+
+    small = LookaheadCache(_Responses(threading.Event()), _Choices(), depth=2, top_k=3, capacity=2, workers=1)
+    small.speculate(_root_choices(), GameState())
+    assert small.get_stats()["cached"] <= 2
+    small.shutdown()
+
+
+def test_hit_and_miss_reach_the_same_state(monkeypatch):
+    # 整数为绝对值、WF 上限 10、时间字段原样写入：与 GameState.update 的语义一致
+    monkeypatch.setattr(response_module, "stream_completion", lambda prompt, **kwargs: iter(["你等了很久。"]))
+    monkeypatch.setattr(response_module, "streaming_available", lambda: True)
+    choice = Choice(
+        choice_id="W", choice_text="等待",
+        consequences={"PR": 5, "WF": "+5", "timestamp": "+3min", "flags": {"等过": True}, "inventory": ["怀表"]},
+    )
+    state = GameState(PR=40, WF=8, timestamp="00:10")
+
+    cache = LookaheadCache(_Responses(), _Choices(), depth=1, top_k=1, max_calls=100, workers=1)
+    cache.speculate([choice], state)
+    assert _wait_for(lambda: cache.get_stats()["generated"] == 1)
+    hit = cache.take(choice, state)
+    cache.shutdown()
+
+    miss = GameState(**state.to_dict())
+    gen = RuntimeResponseGenerator(gdd_content="## S1\n走廊", lore_content="规则")
+    list(gen.stream_response(choice, miss))
+
+    assert hit.state == miss
+    assert (miss.PR, miss.WF, miss.timestamp) == (5, 10, "+3min")
+    assert state.PR == 40 and state.consequence_tree == []
+
+
+def test_background_generation_is_quiet(capsys):
+    class _Chatty(_Choices):
+        def generate_choices(self, scene, state):
+            console("🤖 [选择点] 使用模型: test")
+            return super().generate_choices(scene, state)
+
+    cache = LookaheadCache(_Responses(), _Chatty(), depth=1, top_k=2, max_calls=100, workers=1)
+    cache.speculate(_root_choices(), GameState())
+    assert _wait_for(lambda: cache.get_stats()["generated"] == 2)
+    assert "使用模型" not in capsys.readouterr().out
+    cache.shutdown()
+
+
+def test_streaming_engine_does_not_wait_for_running_node():
+    gate = threading.Event()
+    cache = LookaheadCache(_Responses(gate), _Choices(), depth=2, top_k=1, max_calls=100, workers=1)
+    state = GameState()
+    engine = GameEngine.__new__(GameEngine)
+    engine.speculator, engine.state, engine.stream_responses = cache, state, True
+
+    cache.speculate(_root_choices(), state)
+    assert _wait_for(lambda: any(e.status == "running" for e in list(cache._entries.values())))
+    started = time.time()
+    assert engine._take_speculated(_root_choices()[2]) is None
+    assert time.time() - started < 1.0 and cache.get_stats()["misses"] == 1
+
+    # 已生成完的节点照常命中
+    gate.set()
+    cache.speculate(_root_choices(), state)
+    assert _wait_for(lambda: cache.get_stats()["generated"] >= 2)
+    assert engine._take_speculated(_root_choices()[2]).response.startswith("响应:A")
+    cache.shutdown()
@@ -0,0 +1,139 @@
+"""
+近重复检测测试
+
+目标：
+- 验证 MinHash LSH 能找出近似照抄的文本，并按标签（场景）过滤；
+- 验证 TreeBuilder 默认在生成下一批选择前重写与同场景节点雷同的响应，跨场景雷同不重写；
+- 验证同一批兄弟节点雷同且状态键相同时合并，状态不同或目标为祖先时不合并；
+- 验证同一批选项中的雷同选项被去除。
+"""
+
+from typing import Any, Dict, List
+
+from ghost_story_factory.pregenerator.dialogue_node import DialogueNode
+from ghost_story_factory.pregenerator.near_duplicate import NearDuplicateIndex, jaccard
+from ghost_story_factory.pregenerator.tree_builder import DialogueTreeBuilder
+
+
+BASE = (
+    "你推开值班室的门，六台监控屏同时闪了一下，绿灰色的画面里钢索反光突然增亮。"
+    "值班经理手里的钥匙声戛然而止，他盯着你手里的校准日志，眼角抽动了一下。"
+)
+NEAR = BASE.replace("六台", "七台").replace("戛然而止", "忽然停下")
+OTHER = "观景台只有一盏白炽灯，灯罩破了个洞，雨后的雾气被低频声浪推得一起一伏，远处山谷传来回声。"
+
+
+def test_index_finds_near_copies_only():
+    index = NearDuplicateIndex(threshold=0.7)
+    index.add("n1", BASE, tag="S2")
+    index.add("n2", OTHER, tag="S1")
+
+    matches = index.query(NEAR)
+    assert matches and matches[0][0] == "n1" and matches[0][1] >= 0.7
+    assert index.query(NEAR, tag="S1") == []
+    assert index.query("完全无关的一段文字，讲的是图书馆里的猫。") == []
+    assert len(index) == 2
+    assert jaccard("打开手电照向车厢", "打开手电，照向车厢！") == 1.0
+
+
+class _NarrativeBuilder(DialogueTreeBuilder):
+    def __init__(self, narratives: List[str], **kwargs):
+        super().__init__(
+            city="测试城",
+            synopsis="测试 synopsis",
+            gdd_content="GDD",
+            lore_content="LORE",
+            main_story="STORY",
+            test_mode=True,
+            **kwargs,
+        )
+        self._narratives = list(narratives)
+        self.choice_calls = 0
+
+    def _generate_response(self, choice: Dict[str, Any], new_state: Dict[str, Any]) -> str:
+        return self._narratives.pop(0)
+
+    def _generate_choices(self, node) -> List[Dict[str, Any]]:
+        self.choice_calls += 1
+        return [{"choice_id": "A", "choice_text": "继续", "consequences": {}}]
+
+
+def _parent() -> DialogueNode:
+    return DialogueNode(node_id="root", scene="S2", depth=0, game_state={"current_scene": "S2", "PR": 5})
+
+
+def _sibling(narrative: str, state: Dict[str, Any]) -> DialogueNode:
+    return DialogueNode(
+        node_id="", scene="S2", depth=1, narrative=narrative,
+        game_state={"current_scene": "S2", **state}, parent_id="root",
+    )
+
+
+def test_builder_regenerates_same_scene_duplicate_by_default(monkeypatch):
+    monkeypatch.delenv("NEAR_DUP_POLICY", raising=False)
+    monkeypatch.setenv("NEAR_DUP_THRESHOLD", "0.7")
+    builder = _NarrativeBuilder([NEAR, OTHER])
+    assert builder.near_dup_policy == "regenerate"
+    builder.near_dup_index.add("node_0007", BASE, tag="S2")
+
+    res = builder._expand_choice(_parent(), 0, {"choice_id": "B", "consequences": {"PR": 10}}, [])
+    assert res["type"] == "new" and res["child"].narrative == OTHER
+    assert builder.choice_calls == 1
+    assert builder.near_dup_stats == {"merged": 0, "regenerated": 1, "choices_dropped": 0}
+
+
+def test_cross_scene_duplicate_is_not_rewritten(monkeypatch):
+    monkeypatch.delenv("NEAR_DUP_POLICY", raising=False)
+    monkeypatch.setenv("NEAR_DUP_THRESHOLD", "0.7")
+    builder = _NarrativeBuilder([NEAR])
+    builder.near_dup_index.add("node_0007", BASE, tag="S5")
+
+    res = builder._expand_choice(_parent(), 0, {"choice_id": "B", "consequences": {"PR": 10}}, [])
+    assert res["type"] == "new" and res["child"].narrative == NEAR
+    assert builder.near_dup_stats["regenerated"] == 0
+
+
+def test_merge_only_siblings_with_equal_state(monkeypatch):
+    monkeypatch.setenv("NEAR_DUP_POLICY", "merge")
+    monkeypatch.setenv("NEAR_DUP_THRESHOLD", "0.7")
+    builder = _NarrativeBuilder([])
+    builder._register_near_dup("root", "开场", "S2", {"current_scene": "S2", "PR": 5}, None)
+    builder._register_near_dup("node_0007", BASE, "S2", {"current_scene": "S2", "PR": 15}, "root")
+
+    assert builder._near_duplicate_target(_sibling(NEAR, {"PR": 15})) == "node_0007"
+    assert builder.near_dup_stats["merged"] == 1
+
+    # 选择带来了物品：合并会丢掉它
+    assert builder._near_duplicate_target(_sibling(NEAR, {"PR": 15, "inventory": ["校准日志"]})) is None
+
+    # 状态相同但目标是父节点的祖先：合并会成环
+    builder = _NarrativeBuilder([])
+    builder._register_near_dup("node_0001", BASE, "S2", {"current_scene": "S2", "PR": 15}, None)
+    builder._register_near_dup("root", "开场", "S2", {"current_scene": "S2", "PR": 5}, "node_0001")
+    assert builder._near_duplicate_target(_sibling(NEAR, {"PR": 15})) is None
+    assert builder.near_dup_stats["merged"] == 0
+
+
+def test_merge_policy_does_not_rewrite(monkeypatch):
+    monkeypatch.setenv("NEAR_DUP_POLICY", "merge")
+    monkeypatch.setenv("NEAR_DUP_THRESHOLD", "0.7")
+    builder = _NarrativeBuilder([NEAR])
+    builder.near_dup_index.add("node_0007", BASE, tag="S2")
+
+    res = builder._expand_choice(_parent(), 0, {"choice_id": "B", "consequences": {"PR": 10}}, [])
+    assert res["type"] == "new" and res["child"].narrative == NEAR
+    assert builder.near_dup_stats["regenerated"] == 0
+
+
+def test_sibling_choice_texts_are_deduped(monkeypatch):
+    monkeypatch.setenv("NEAR_DUP_POLICY", "merge")
+    builder = _NarrativeBuilder([])
+    choices = [
+        {"choice_id": "A", "choice_text": "打开手电照向第三节车厢"},
+        {"choice_id": "B", "choice_text": "打开手电，照向第三节车厢！"},
+        {"choice_id": "C", "choice_text": "转身离开观景台"},
+    ]
+    assert [c["choice_id"] for c in builder._dedupe_choice_texts(choices)] == ["A", "C"]
+
+    monkeypatch.setenv("NEAR_DUP_POLICY", "off")
+    assert _NarrativeBuilder([]).near_dup_index is None
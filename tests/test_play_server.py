@@ -0,0 +1,168 @@
+"""
+游玩服务测试
+
+目标：
+- 验证多个会话并发游玩时共享同一份缓存树，树缓存按节点数 LRU 淘汰；
+- 验证 HTTP 接口：开始 / 选择 / 查询 / 结束，以及错误码；
+- 验证 WebSocket 握手与消息往返。
+"""
+
+import base64
+import json
+import os
+import socket
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.server import PlayServer, PlayService, TreeCache
+from ghost_story_factory.server import websocket as ws
+
+
+def _tree():
+    return {
+        "root": {
+            "node_id": "root", "scene": "S1", "depth": 0, "game_state": {"PR": 5, "current_scene": "S1"},
+            "narrative": "开场", "parent_id": None, "children": ["node_0001", "node_0002"],
+            "choices": [
+                {"choice_id": "A", "choice_text": "开门", "next_node_id": "node_0001"},
+                {"choice_id": "B", "choice_text": "敲墙"},                       # 经 parent_choice_id 解析
+                {"choice_id": "C", "choice_text": "发呆"},                       # 缺失分支：不展示
+            ],
+        },
+        "node_0001": {
+            "node_id": "node_0001", "scene": "S2", "depth": 1, "game_state": {"PR": 20, "time": "00:30"},
+            "narrative": "门后", "parent_id": "root", "parent_choice_id": "A", "children": [], "choices": [],
+            "is_ending": True, "ending_type": "escape",
+        },
+        "node_0002": {
+            "node_id": "node_0002", "scene": "S1", "depth": 1, "game_state": {"PR": 10},
+            "narrative": "墙里有回声", "parent_id": "root", "parent_choice_id": "B", "children": [], "choices": [],
+        },
+    }
+
+
+@pytest.fixture()
+def server(tmp_path):
+    db_path = str(tmp_path / "stories.db")
+    db = DatabaseManager(db_path)
+    story_id = db.save_story(
+        city_name="测试城", title="游玩服务", synopsis="简介",
+        characters=[{"name": "主角", "is_protagonist": True}],
+        dialogue_trees={"主角": _tree()}, metadata={},
+    )
+    character_id = db.get_characters_by_story(story_id)[0].id
+    db.close()
+
+    service = PlayService(db_path)
+    srv = PlayServer(("127.0.0.1", 0), service)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{srv.server_address[1]}", srv.server_address[1], story_id, character_id, service
+    srv.shutdown()
+    srv.server_close()
+    service.close()
+
+
+def _call(url, method="GET", body=None):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=5) as resp:
+            return resp.status, json.loads(resp.read().decode("utf-8"))
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read().decode("utf-8"))
+
+
+def test_http_play_flow_and_shared_cache(server):
+    base, _, story_id, character_id, service = server
+
+    status, stories = _call(f"{base}/stories")
+    assert status == 200 and stories[0]["characters"][0]["character_id"] == character_id
+
+    results = []
+
+    def player(choice_id):
+        _, view = _call(f"{base}/sessions", "POST", {"story_id": story_id, "character_id": character_id})
+        results.append(_call(f"{base}/sessions/{view['session_id']}/choose", "POST", {"choice_id": choice_id}))
+
+    threads = [threading.Thread(target=player, args=("AB"[i % 2],)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert all(status == 200 for status, _ in results)
+    ended = [v for _, v in results if v["node_id"] == "node_0001"]
+    assert len(ended) == 4 and ended[0]["is_ending"] and ended[0]["ending_type"] == "escape"
+    assert ended[0]["state"]["PR"] == 20 and ended[0]["state"]["timestamp"] == "00:30"
+    assert ended[0]["state"]["consequence_tree"] == ["A"]
+    assert {v["node_id"] for _, v in results} == {"node_0001", "node_0002"}
+
+    cache = service.trees.get_stats()
+    assert cache["loads"] == 1 and cache["trees"] == 1         # 8 个会话共享一棵树
+
+    _, view = _call(f"{base}/sessions", "POST", {"story_id": story_id, "character_id": character_id})
+    assert [c["choice_id"] for c in view["choices"]] == ["A", "B"]
+    assert _call(f"{base}/sessions/{view['session_id']}/choose", "POST", {"choice_id": "C"})[0] == 400
+    assert _call(f"{base}/sessions/{view['session_id']}", "DELETE")[0] == 200
+    assert _call(f"{base}/sessions/{view['session_id']}")[0] == 404
+    assert _call(f"{base}/sessions", "POST", {"story_id": 999, "character_id": 1})[0] == 400
+
+
+def test_websocket_round_trip(server):
+    _, port, story_id, character_id, _ = server
+    sock = socket.create_connection(("127.0.0.1", port), timeout=5)
+    key = base64.b64encode(os.urandom(16)).decode()
+    sock.sendall((
+        "GET /ws HTTP/1.1\r\nHost: localhost\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+        f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+    ).encode())
+    rfile = sock.makefile("rb")
+    status_line = rfile.readline()
+    headers = {}
+    while True:
+        line = rfile.readline().decode().strip()
+        if not line:
+            break
+        k, v = line.split(":", 1)
+        headers[k.strip().lower()] = v.strip()
+    assert b"101" in status_line and headers["sec-websocket-accept"] == ws.accept_key(key)
+
+    def send(msg):
+        sock.sendall(ws.encode_frame(json.dumps(msg).encode(), ws.OP_TEXT, mask=True))
+        opcode, payload = ws.read_frame(rfile)
+        assert opcode == ws.OP_TEXT
+        return json.loads(payload.decode())
+
+    started = send({"op": "start", "story_id": story_id, "character_id": character_id})
+    assert started["ok"] and started["data"]["node_id"] == "root"
+    moved = send({"op": "choose", "choice_id": "B"})
+    assert moved["ok"] and moved["data"]["narrative"] == "墙里有回声"
+    assert send({"op": "nope"})["ok"] is False
+
+    sock.sendall(ws.encode_frame(b"\x03\xe8", ws.OP_CLOSE, mask=True))
+    assert ws.read_frame(rfile)[0] == ws.OP_CLOSE
+    sock.close()
+
+
+def test_tree_cache_lru_by_node_count():
+    sizes = {1: 3, 2: 3, 3: 3}
+    loads = []
+
+    def loader(story_id, character_id):
+        loads.append(story_id)
+        return {f"n{i}": {"node_id": f"n{i}"} for i in range(sizes[story_id])}
+
+    cache = TreeCache(loader, max_nodes=6)
+    cache.get(1, 1)
+    cache.get(2, 1)
+    cache.get(1, 1)                      # 1 变为最近使用
+    cache.get(3, 1)                      # 淘汰 2
+    cache.get(1, 1)
+    assert loads == [1, 2, 3]
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1 and stats["nodes"] == 6 and stats["hits"] == 2
@@ -0,0 +1,78 @@
+"""
+Prompt 预算测试
+
+目标：
+- 验证动态段落在预算不足时按优先级截断 / 丢弃，必保留段落始终完整；
+- 验证选择点 / 响应 prompt 的静态前缀跨调用逐字节一致且位于最前；
+- 验证按调用类型统计的 prompt 遥测；
+- 回归：选择点 prompt 构建不再因 f-string 花括号抛出格式错误。
+"""
+
+from ghost_story_factory.engine.choices import CHOICES_STATIC_PREFIX, Choice, ChoicePointsGenerator, ChoiceType
+from ghost_story_factory.engine.prompt_budget import (
+    PromptAssembler,
+    PromptSection,
+    count_tokens,
+    get_prompt_telemetry,
+    reset_prompt_telemetry,
+    truncate_to_tokens,
+)
+from ghost_story_factory.engine.response import RuntimeResponseGenerator
+from ghost_story_factory.engine.state import GameState
+
+
+def test_truncate_and_priority_order():
+    text = "鬼" * 200
+    cut = truncate_to_tokens(text, 50)
+    assert count_tokens(cut) <= 50 and cut.endswith("…")
+    assert truncate_to_tokens("短文本", 50) == "短文本"
+
+    reset_prompt_telemetry()
+    assembler = PromptAssembler("unit", budget_tokens=120, static_prefix="前缀")
+    prompt = assembler.assemble([
+        PromptSection("state", "状" * 60, priority=0, required=True),
+        PromptSection("low", "低" * 100, priority=5),
+        PromptSection("high", "高" * 40, priority=1),
+    ])
+
+    assert prompt.startswith("前缀\n\n" + "状" * 60)
+    assert "高" * 40 in prompt          # 高优先级完整保留
+    assert "低" * 100 not in prompt     # 低优先级被截断或丢弃
+    assert prompt.index("状") < prompt.index("高")  # 输出保持传入顺序
+
+    stats = get_prompt_telemetry()["unit"]
+    assert stats["calls"] == 1
+    assert stats["truncated_sections"] + stats["dropped_sections"] == 1
+
+
+def test_choice_prompt_static_prefix_and_no_format_error():
+    reset_prompt_telemetry()
+    gen = ChoicePointsGenerator(gdd_content="## S1 大厅\n空无一人", lore_content="规则：不可回头", main_story="")
+    p1 = gen._build_prompt("S1", GameState(current_scene="S1"), "雨夜", beat_type="climax", beat_leads_to_ending=True)
+    p2 = gen._build_prompt("S2", GameState(current_scene="S2", PR=40), None, recent_choices=["回头看"])
+
+    assert p1.startswith(CHOICES_STATIC_PREFIX) and p2.startswith(CHOICES_STATIC_PREFIX)
+    assert '"flags": {"结局_白娘子觉醒": true}' in p1
+    assert "**场景**: S2" in p2 and "回头看" in p2
+    assert get_prompt_telemetry()["choices"]["calls"] == 2
+
+
+def test_response_prompt_respects_budget(monkeypatch):
+    monkeypatch.setenv("PROMPT_BUDGET_RESPONSE", "1200")
+    reset_prompt_telemetry()
+    gen = RuntimeResponseGenerator(gdd_content="## S1 大厅\n" + "灯" * 3000, lore_content="规则", main_story="夜" * 5000)
+    backstory = gen._build_backstory_with_story()
+    assert backstory is gen._build_backstory_with_story()
+
+    choice = Choice(choice_id="A", choice_text="推门", choice_type=ChoiceType.NORMAL)
+    state = GameState(current_scene="S1")
+    prompts = [
+        gen._build_prompt(choice, state, {"PR": 0}, backstory_tokens=count_tokens(backstory))
+        for _ in range(2)
+    ]
+    prefix = gen._assembler.static_prefix
+    assert all(p.startswith(prefix) for p in prompts)
+    assert count_tokens(prompts[0]) + count_tokens(backstory) <= 1200
+
+    stats = get_prompt_telemetry()["response"]
+    assert stats["calls"] == 2 and stats["max_tokens"] <= 1200
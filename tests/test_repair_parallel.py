@@ -0,0 +1,67 @@
+"""
+对话树批量修复（并行模式）测试
+
+目标：
+- 验证多进程按故事并行修复时回填 / 隐藏统计正确，且按批写回数据库；
+- 验证 dry-run 不写回，顺序模式与并行模式结果一致。
+"""
+
+from ghost_story_factory.database import DatabaseManager
+from tools.repair_dialogue_trees import run_repair
+
+
+def _broken_tree():
+    return {
+        "root": {
+            "node_id": "root", "narrative": "开场",
+            "choices": [
+                {"choice_id": "A", "choice_text": "向前"},          # 可由子节点 parent_choice_id 回填
+                {"choice_id": "B", "choice_text": "回头"},          # 无法推断 → hidden
+            ],
+            "children": ["node_0001"],
+        },
+        "node_0001": {"node_id": "node_0001", "narrative": "走廊", "choices": [],
+                      "parent_id": "root", "parent_choice_id": "A", "children": []},
+    }
+
+
+def _make_db(path, stories=3):
+    db = DatabaseManager(path)
+    for i in range(stories):
+        db.save_story(
+            city_name="测试城", title=f"故事{i}", synopsis="简介",
+            characters=[{"name": "甲"}, {"name": "乙"}],
+            dialogue_trees={"甲": _broken_tree(), "乙": _broken_tree()}, metadata={},
+        )
+    db.close()
+
+
+def test_parallel_repair_writes_in_batches(tmp_path):
+    db_path = str(tmp_path / "stories.db")
+    _make_db(db_path)
+
+    dry = run_repair(db_path, apply=False, workers=2)
+    assert (dry["trees"], dry["fixed"], dry["hidden"], dry["written"]) == (6, 6, 6, 0)
+
+    result = run_repair(db_path, apply=True, workers=2, batch_size=1)
+    assert result["workers"] == 2 and len(result["by_story"]) == 3
+    assert (result["fixed"], result["hidden"], result["written"]) == (6, 6, 6)
+
+    db = DatabaseManager(db_path)
+    for sid, cid, tree in db.iter_dialogue_trees():
+        choices = {c["choice_id"]: c for c in tree["root"]["choices"]}
+        assert choices["A"]["next_node_id"] == "node_0001"
+        assert choices["B"]["hidden"] is True
+    assert db.get_tree_revision(sid, cid) == 2
+    db.close()
+
+    # 已修复：再次运行无需写回（顺序模式）
+    again = run_repair(db_path, apply=True, workers=1)
+    assert (again["fixed"], again["written"]) == (0, 0)
+
+
+def test_single_story_filter(tmp_path):
+    db_path = str(tmp_path / "stories.db")
+    _make_db(db_path, stories=2)
+    result = run_repair(db_path, story_id=2, apply=True, workers=4)
+    assert list(result["by_story"]) == [2] and result["workers"] == 1
@@ -0,0 +1,70 @@
+"""
+实时游玩流式响应测试
+
+目标：
+- 验证 stream_response 逐段产出模型输出，补全结束后才应用后果并追加系统提示；
+- 验证首个 token 前流式失败时回退整段生成；
+- 验证 GameCLI / GameEngine 边收边显示并记录首 token 延迟。
+"""
+
+import ghost_story_factory.engine.response as response_module
+from ghost_story_factory.engine.choices import Choice
+from ghost_story_factory.engine.game_loop import GameEngine
+from ghost_story_factory.engine.response import RuntimeResponseGenerator
+from ghost_story_factory.engine.state import GameState
+from ghost_story_factory.ui.cli import GameCLI
+
+
+def _choice() -> Choice:
+    return Choice(choice_id="S1_C1", choice_text="打开手电", consequences={"PR": "+10"})
+
+
+def test_stream_yields_deltas_then_hints(monkeypatch):
+    seen_states = []
+    state = GameState()
+
+    def fake_stream(prompt, system=None, model=None, **kwargs):
+        assert "打开手电" in prompt and "恐怖故事" in system
+        for part in ("你按下开关，", "光柱扫过墙面。"):
+            seen_states.append(state.PR)
+            yield part
+
+    monkeypatch.setattr(response_module, "stream_completion", fake_stream)
+    monkeypatch.setattr(response_module, "streaming_available", lambda: True)
+
+    gen = RuntimeResponseGenerator(gdd_content="## S1\n走廊", lore_content="规则")
+    pr_before = state.PR
+    chunks = list(gen.stream_response(_choice(), state))
+
+    assert chunks[:2] == ["你按下开关，", "光柱扫过墙面。"]
+    assert seen_states == [pr_before, pr_before]            # 流式输出期间状态未改动
+    assert state.PR == pr_before + 10 and state.consequence_tree == ["S1_C1"]
+    assert "【系统提示】" in chunks[-1] and "PR +10" in chunks[-1]
+
+
+def test_stream_falls_back_before_first_token(monkeypatch):
+    def broken_stream(prompt, **kwargs):
+        raise RuntimeError("connection refused")
+        yield  # pragma: no cover
+
+    monkeypatch.setattr(response_module, "stream_completion", broken_stream)
+    monkeypatch.setattr(response_module, "streaming_available", lambda: True)
+
+    gen = RuntimeResponseGenerator(gdd_content="GDD", lore_content="LORE")
+    monkeypatch.setattr(gen, "generate_response", lambda *a, **k: "整段响应")
+
+    assert list(gen.stream_response(_choice(), GameState())) == ["整段响应"]
+    assert gen._streaming is False
+
+
+def test_cli_and_engine_render_stream(monkeypatch, tmp_path, capsys):
+    cli = GameCLI(use_rich=False)
+    assert cli.display_narrative_stream(iter(["第一段", "", "第二段"])) == "第一段第二段"
+    assert "第一段第二段" in capsys.readouterr().out
+
+    engine = GameEngine.__new__(GameEngine)
+    engine.cli = cli
+    engine.response_latencies = []
+    assert engine._display_response_stream(iter(["a", "b"])) == "ab"
+    timing = engine.response_latencies[-1]
+    assert 0 <= timing["first_token"] <= timing["total"]
@@ -0,0 +1,160 @@
+"""
+存档格式与自动存档日志测试
+
+目标：
+- 验证二进制存档往返无损、比旧版 JSON 存档小，且仍能读取旧版 JSON 存档；
+- 验证非布尔标志位、None 场景等非标准取值往返不变；
+- 验证自动存档日志逐回合重放、丢弃写了一半的尾部记录、按回合数压缩为单条快照；
+- 验证游玩服务重启后按会话 ID 从日志恢复进度。
+"""
+
+import json
+from dataclasses import asdict
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.engine.save_format import (
+    AutosaveJournal, SaveGame, decode_save, encode_save, read_save, write_save,
+)
+from ghost_story_factory.engine.state import GameState
+from ghost_story_factory.server import PlayService
+
+
+def _state(turns=3):
+    state = GameState(PR=42, GR=-3, WF=7, current_scene="S3", timestamp="01:15")
+    state.inventory = ["旧钥匙", "手电筒"]
+    state.flags = {"镜像_已异变": True, "门已锁": False}
+    state.consequence_tree = [chr(ord("A") + i % 3) for i in range(turns)]
+    return state
+
+
+def test_binary_round_trip_and_legacy_json(tmp_path):
+    save = SaveGame(state=_state(), node_id="node_0042", path=["root", "node_0001"], story_id=3, character_id=0)
+    assert decode_save(encode_save(save)) == save
+
+    legacy = tmp_path / "legacy.save"
+    legacy.write_text(json.dumps(asdict(_state()), ensure_ascii=False, indent=2), encoding="utf-8")
+    assert len(encode_save(SaveGame(state=_state()))) < legacy.stat().st_size / 2
+    assert GameState.load(str(legacy)) == _state()
+    assert read_save(legacy).node_id is None
+
+    path = tmp_path / "game.save"
+    _state().save(str(path))
+    assert GameState.load(str(path)) == _state()
+
+    # 长路径走压缩
+    long = SaveGame(state=_state(200), node_id="node_0200", path=[f"node_{i:04d}" for i in range(200)])
+    write_save(path, long)
+    assert read_save(path) == long and path.stat().st_size < 1500
+
+
+def test_non_standard_values_round_trip(tmp_path):
+    # 模型生成的后果可能写入非布尔标志位；旧版 JSON 存档原样保存，二进制存档也必须如此
+    state = _state()
+    state.flags.update({"x": "false", "次数": 3, "线索": ["脚印"], "空": None})
+    state.current_scene = None
+    state.inventory = ["旧钥匙", {"name": "照片", "count": 2}]
+    state.WF = 1.5
+    save = SaveGame(state=state, node_id="node_0001")
+    decoded = decode_save(encode_save(save))
+    assert decoded == save
+    assert decoded.state.flags["x"] == "false" and decoded.state.current_scene is None
+
+    path = tmp_path / "odd.save"
+    state.save(str(path))
+    assert GameState.load(str(path)) == state
+
+    journal = AutosaveJournal(tmp_path / "odd.journal")
+    journal.start(save)
+    state.flags["x"] = "true"
+    journal.record_turn("node_0002", state, "A")
+    assert AutosaveJournal.restore(journal.path).state == state
+
+
+def test_journal_replay_and_torn_tail(tmp_path):
+    path = tmp_path / "s.journal"
+    journal = AutosaveJournal(path, compact_every=100)
+    state = GameState(current_scene="S1")
+    journal.start(SaveGame(state=state, node_id="root", story_id=1, character_id=2))
+    start_size = path.stat().st_size
+
+    for i in range(1, 6):
+        state.PR += 5
+        state.consequence_tree.append("A")
+        journal.record_turn(f"node_{i:04d}", state, "A")
+    per_turn = (path.stat().st_size - start_size) / 5
+    assert per_turn < 80                                   # 每回合只追加增量
+
+    save = AutosaveJournal.restore(path)
+    assert save.node_id == "node_0005" and save.state == state
+    assert save.path == ["root"] + [f"node_{i:04d}" for i in range(1, 5)]
+    assert (save.story_id, save.character_id) == (1, 2)
+
+    # 写到一半时崩溃：尾部记录不完整，恢复到上一回合
+    data = path.read_bytes()
+    path.write_bytes(data[:-3])
+    save = AutosaveJournal.restore(path)
+    assert save.node_id == "node_0004" and save.state.PR == state.PR - 5
+
+    resumed = AutosaveJournal(path)
+    assert resumed.load().node_id == "node_0004"
+    resumed.record_turn("node_0099", save.state, "B")
+    assert AutosaveJournal.restore(path).node_id == "node_0099"
+
+    resumed.discard()
+    assert not path.exists() and AutosaveJournal.restore(path) is None
+
+
+def test_journal_compaction(tmp_path):
+    path = tmp_path / "s.journal"
+    journal = AutosaveJournal(path, compact_every=4)
+    state = GameState()
+    journal.start(SaveGame(state=state, node_id="root"))
+    sizes = []
+    for i in range(1, 13):
+        state.consequence_tree.append("A")
+        journal.record_turn(f"node_{i:04d}", state, "A")
+        sizes.append(path.stat().st_size)
+
+    assert journal.turns_since_compact == 0
+    assert sizes[3] < sizes[2]                              # 第 4 回合后压缩为单条快照
+    assert max(sizes) < 400
+    save = AutosaveJournal.restore(path)
+    assert save.node_id == "node_0012" and len(save.path) == 12
+    assert save.state.consequence_tree == ["A"] * 12
+
+
+def test_play_service_restores_session_after_restart(tmp_path):
+    db_path = str(tmp_path / "stories.db")
+    db = DatabaseManager(db_path)
+    tree = {
+        "root": {
+            "node_id": "root", "narrative": "开场", "game_state": {"PR": 5, "current_scene": "S1"},
+            "choices": [{"choice_id": "A", "choice_text": "开门", "next_node_id": "node_0001"}],
+            "children": ["node_0001"],
+        },
+        "node_0001": {
+            "node_id": "node_0001", "narrative": "门后", "parent_id": "root", "parent_choice_id": "A",
+            "game_state": {"PR": 20}, "choices": [], "children": [], "is_ending": True,
+        },
+    }
+    story_id = db.save_story(
+        city_name="测试城", title="存档", synopsis="简介",
+        characters=[{"name": "主角"}], dialogue_trees={"主角": tree}, metadata={},
+    )
+    char_id = db.get_characters_by_story(story_id)[0].id
+    db.close()
+
+    autosave_dir = tmp_path / "autosave"
+    service = PlayService(db_path, autosave_dir=str(autosave_dir))
+    session_id = service.start(story_id, char_id)["session_id"]
+    service.choose(session_id, "A")
+    service.close()
+
+    restarted = PlayService(db_path, autosave_dir=str(autosave_dir))
+    view = restarted.get(session_id)
+    assert view["node_id"] == "node_0001" and view["state"]["PR"] == 20
+    assert view["state"]["consequence_tree"] == ["A"]
+
+    assert restarted.end(session_id)
+    assert not (autosave_dir / f"{session_id}.journal").exists()
+    restarted.close()
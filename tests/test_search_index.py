@@ -0,0 +1,94 @@
+"""
+节点全文索引测试
+
+目标：
+- 验证保存故事时同步建立索引，可按文本 / 场景 / 标志位检索，结果带定位信息；
+- 验证覆盖保存、合并节点后索引随之更新；
+- 验证从旧版本升级的库会回填已有对话树的索引。
+"""
+
+import sqlite3
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.database import migrations
+from tools.search_nodes import format_hits
+
+
+def _tree():
+    return {
+        "root": {
+            "node_id": "root", "scene": "S1", "narrative": "午夜的走廊尽头挂着一面蒙着水汽的旧镜子。",
+            "choices": [{"choice_id": "A", "choice_text": "擦掉镜子上的水汽", "next_node_id": "node_0001"}],
+            "children": ["node_0001"], "game_state": {"current_scene": "S1", "flags": {}},
+        },
+        "node_0001": {
+            "node_id": "node_0001", "scene": "S2", "parent_id": "root", "parent_choice_id": "A",
+            "narrative": "镜中的你没有跟着转身。", "choices": [], "children": [],
+            "game_state": {"current_scene": "S2", "flags": {"镜像_已异变": True, "门已锁": False}},
+        },
+    }
+
+
+def _save(db, title="镜子"):
+    return db.save_story(
+        city_name="测试城", title=title, synopsis="简介",
+        characters=[{"name": "甲", "is_protagonist": True}], dialogue_trees={"甲": _tree()}, metadata={},
+    )
+
+
+def test_search_by_text_scene_flag(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = _save(db)
+    char_id = db.get_characters_by_story(story_id)[0].id
+
+    hits = db.search_nodes("蒙着水汽")
+    assert [(h.story_id, h.character_id, h.node_id) for h in hits] == [(story_id, char_id, "root")]
+    assert "蒙着水汽" in hits[0].snippet
+
+    assert [h.node_id for h in db.search_nodes("擦掉镜子")] == ["root"]          # 选项文本
+    assert {h.node_id for h in db.search_nodes("镜")} == {"root", "node_0001"}    # 短查询走 LIKE
+    assert [h.node_id for h in db.search_nodes(scene="S2")] == ["node_0001"]
+    assert [h.node_id for h in db.search_nodes(flag="镜像_已异变")] == ["node_0001"]
+    assert db.search_nodes(flag="门已锁") == []                                    # 为假的标志位不入索引
+    assert db.search_nodes("镜", scene="S1", story_id=story_id + 1) == []
+    assert "node_0001" in format_hits(db.search_nodes(scene="S2"))
+    db.close()
+
+
+def test_index_follows_replace_and_merge(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = _save(db)
+    char_id = db.get_characters_by_story(story_id)[0].id
+
+    tree = db.load_dialogue_tree(story_id, char_id)
+    tree["node_0001"]["narrative"] = "镜面裂开一道细缝。"
+    db.replace_dialogue_tree(story_id, char_id, tree)
+    assert db.search_nodes("没有跟着转身") == []
+    assert [h.node_id for h in db.search_nodes("裂开一道")] == ["node_0001"]
+
+    db.merge_dialogue_nodes(story_id, char_id, [{
+        "node_id": "node_0002", "parent_id": "node_0001", "parent_choice_id": "A",
+        "narrative": "缝隙里渗出冰冷的水。", "choices": [], "children": [],
+    }])
+    assert [h.node_id for h in db.search_nodes("渗出冰冷")] == ["node_0002"]
+    db.close()
+
+
+def test_upgrade_backfills_index(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "stories.db")
+    monkeypatch.setenv("SEARCH_INDEX", "0")
+    db = DatabaseManager(db_path)
+    _save(db)
+    db.close()
+
+    # 回退到索引之前的版本：重新打开时执行 v3 迁移并回填
+    conn = sqlite3.connect(db_path)
+    conn.execute("DROP TABLE node_search")
+    conn.execute(f"PRAGMA user_version = {migrations.SEARCH_INDEX_VERSION - 1}")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setenv("SEARCH_INDEX", "1")
+    db = DatabaseManager(db_path)
+    assert [h.node_id for h in db.search_nodes("蒙着水汽")] == ["root"]
+    db.close()
@@ -0,0 +1,140 @@
+"""
+投机预生成测试
+
+目标：
+- 验证为前 K 个可选项投机生成响应与下一批选择点，命中时交付状态副本上的结果；
+- 验证未选中的分支被取消、状态不一致时不命中；
+- 验证每会话的调用上限生效，取消的分支退还未发生的调用；
+- 验证后台投机调用时生成器的进度输出不打印到终端（玩家正在输入）；
+- 验证流式响应开启时，仍在生成中的分支视为未命中（改走流式），不阻塞等待。
+"""
+
+import threading
+import time
+
+from ghost_story_factory.engine.choices import Choice
+from ghost_story_factory.engine.game_loop import GameEngine
+from ghost_story_factory.engine.speculation import SpeculativePregenerator
+from ghost_story_factory.engine.state import GameState
+from ghost_story_factory.utils.logging_utils import console
+
+
+class _Responses:
+    def __init__(self, gate: threading.Event = None):
+        self.gate = gate
+        self.calls = []
+
+    def generate_response(self, choice, state, apply_consequences=True):
+        self.calls.append(choice.choice_id)
+        if self.gate is not None:
+            self.gate.wait(2)
+        if apply_consequences and choice.consequences:
+            state.update(choice.consequences)
+        return f"响应:{choice.choice_id}"
+
+
+class _Choices:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_choices(self, scene, state):
+        self.calls += 1
+        return [Choice(choice_id=f"next_{state.PR}", choice_text="继续")]
+
+
+def _choices():
+    return [
+        Choice(choice_id="A", choice_text="开门", consequences={"PR": "+10"}),
+        Choice(choice_id="B", choice_text="后退", consequences={"PR": "-5"}),
+        Choice(choice_id="C", choice_text="喊人"),
+    ]
+
+
+def test_hit_returns_branch_result_without_touching_state():
+    responses, choice_gen = _Responses(), _Choices()
+    spec = SpeculativePregenerator(responses, choice_gen, top_k=2, max_calls=10)
+    state = GameState()
+    pr = state.PR
+
+    assert spec.speculate(_choices(), state) == ["A", "B"]
+    result = spec.take(_choices()[0], state)
+
+    assert result.response == "响应:A" and result.state.PR == pr + 10
+    assert [c.choice_id for c in result.choices] == [f"next_{pr + 10}"]
+    assert state.PR == pr
+    assert "C" not in responses.calls
+    assert spec.get_stats()["hits"] == 1
+    spec.shutdown()
+
+
+def test_miss_on_unspeculated_choice_or_changed_state():
+    spec = SpeculativePregenerator(_Responses(), _Choices(), top_k=1, max_calls=10)
+    state = GameState()
+    spec.speculate(_choices(), state)
+    assert spec.take(_choices()[2], state) is None
+
+    spec.speculate(_choices(), state)
+    state.update({"PR": "+1"})
+    assert spec.take(_choices()[0], state) is None
+    assert spec.get_stats()["misses"] == 2
+    spec.shutdown()
+
+
+def test_spend_cap_and_cancel_refund():
+    gate = threading.Event()
+    responses, choice_gen = _Responses(gate), _Choices()
+    spec = SpeculativePregenerator(responses, choice_gen, top_k=1, max_calls=3)
+    state = GameState()
+
+    # 单线程池：A 进行中（等待 gate），预留 2 次调用；上限 3 只够一个分支
+    spec.top_k = 2
+    assert spec.speculate(_choices(), state) == ["A"]
+    assert spec.get_stats()["skipped_budget"] == 1
+
+    # 玩家选了未投机的 C：A 被取消，响应结束后不再生成选择点，退还 1 次
+    assert spec.take(_choices()[2], state) is None
+    gate.set()
+    spec._executor.shutdown(wait=True)
+    stats = spec.get_stats()
+    assert choice_gen.calls == 0
+    assert stats["calls"] == 1 and stats["reserved"] == 1 and stats["cancelled"] >= 1
+    assert spec.remaining_calls == 2
+
+
+class _ChattyResponses(_Responses):
+    def generate_response(self, choice, state, apply_consequences=True):
+        console("🤖 [响应] 使用模型: test")
+        return super().generate_response(choice, state, apply_consequences)
+
+
+def test_background_calls_do_not_print(capsys):
+    responses = _ChattyResponses()
+    spec = SpeculativePregenerator(responses, _Choices(), top_k=2, max_calls=10)
+    state = GameState()
+    spec.speculate(_choices(), state)
+    assert spec.take(_choices()[0], state) is not None
+    assert "使用模型" not in capsys.readouterr().out
+
+    responses.generate_response(_choices()[2], GameState())        # 前台调用照常打印
+    assert "使用模型" in capsys.readouterr().out
+    spec.shutdown()
+
+
+def test_streaming_engine_does_not_wait_for_running_branch():
+    gate = threading.Event()
+    spec = SpeculativePregenerator(_Responses(gate), _Choices(), top_k=1, max_calls=10)
+    state = GameState()
+    engine = GameEngine.__new__(GameEngine)
+    engine.speculator, engine.state, engine.stream_responses = spec, state, True
+
+    spec.speculate(_choices(), state)
+    started = time.time()
+    assert engine._take_speculated(_choices()[0]) is None
+    assert time.time() - started < 1.0 and spec.get_stats()["misses"] == 1
+
+    # 关闭流式：等待进行中的分支
+    engine.stream_responses = False
+    spec.speculate(_choices(), state)
+    threading.Timer(0.05, gate.set).start()
+    assert engine._take_speculated(_choices()[0]).response == "响应:A"
+    spec.shutdown()
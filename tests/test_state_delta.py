@@ -0,0 +1,133 @@
+"""
+game_state 增量编码测试
+
+目标：
+- 验证深链路上 增量编码 → 还原 与原树一致（含新增 / 修改 / 删除的键）；
+- 验证默认加载得到完整快照，lazy_state=True 时只还原实际访问的路径；
+- 验证增量编码后入库的树更小，STATE_DELTA=0 时保存完整快照；
+- 验证多线程同时还原共享树上的同一节点不出错、结果一致（游玩服务共享缓存树）。
+"""
+
+import json
+import sys
+import threading
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.database.state_delta import (
+    DELTA_KEY, UNSET_KEY, encode_state_deltas, materialize_all, resolve_state,
+)
+from ghost_story_factory.runtime import DialogueTreeLoader
+
+
+def _state(i):
+    return {
+        "PR": 10 + i, "GR": 0, "WF": 1,
+        "current_scene": "S1" if i < 5 else "S2",
+        "inventory": ["手电筒"] + (["钥匙"] if i >= 3 else []),
+        "flags": {"门已打开": i >= 2},
+        "timestamp": f"00:{i:02d}",
+        "consequence_tree": ["A"] * i,
+    }
+
+
+def _chain(depth=12):
+    tree = {}
+    for i in range(depth):
+        node_id = "root" if i == 0 else f"node_{i:04d}"
+        state = _state(i)
+        if i == 7:
+            state["last_choice"] = "B"          # 只在一个节点出现的键：子节点需要记录删除
+        tree[node_id] = {
+            "node_id": node_id,
+            "narrative": f"第 {i} 段叙事",
+            "choices": [{"choice_id": "A", "choice_text": "继续", "next_node_id": f"node_{i + 1:04d}"}],
+            "parent_id": None if i == 0 else ("root" if i == 1 else f"node_{i - 1:04d}"),
+            "children": [f"node_{i + 1:04d}"] if i < depth - 1 else [],
+            "depth": i,
+            "game_state": state,
+        }
+    tree["orphan"] = {"node_id": "orphan", "parent_id": "missing", "game_state": _state(0)}
+    return tree
+
+
+def test_encode_resolve_round_trip():
+    tree = _chain()
+    encoded = encode_state_deltas(tree)
+
+    assert "game_state" in encoded["root"] and "game_state" in encoded["orphan"]
+    assert encoded["node_0001"][DELTA_KEY] == {"PR": 11, "timestamp": "00:01", "consequence_tree": ["A"]}
+    assert encoded["node_0008"][UNSET_KEY] == ["last_choice"]
+    assert "game_state" in tree["node_0005"]                # 原树不变
+
+    assert resolve_state(encoded, "node_0011") == tree["node_0011"]["game_state"]
+    assert materialize_all(encoded) == tree
+
+
+def test_lazy_load_resolves_only_visited_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLAT_TREE", "0")            # 直接从数据库加载（平铺文件见 test_flat_tree.py）
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    tree = _chain()
+    story_id = db.save_story(
+        city_name="测试城", title="增量", synopsis="简介",
+        characters=[{"name": "甲", "is_protagonist": True}], dialogue_trees={"甲": tree}, metadata={},
+    )
+    char_id = db.get_characters_by_story(story_id)[0].id
+
+    assert db.load_dialogue_tree(story_id, char_id) == tree
+
+    loader = DialogueTreeLoader(db, story_id, char_id)
+    assert DELTA_KEY in loader.tree["node_0003"]
+    assert loader.get_node("node_0003")["game_state"] == tree["node_0003"]["game_state"]
+    assert "game_state" in loader.tree["node_0002"]         # 路径上的祖先顺带还原
+    assert DELTA_KEY in loader.tree["node_0004"]            # 没走到的节点保持增量
+    db.close()
+
+
+def test_delta_encoding_shrinks_stored_tree(tmp_path, monkeypatch):
+    def stored_size(name):
+        db = DatabaseManager(str(tmp_path / f"{name}.db"))
+        db.save_story(
+            city_name="测试城", title=name, synopsis="简介",
+            characters=[{"name": "甲"}], dialogue_trees={"甲": _chain(40)}, metadata={},
+        )
+        conn = db._write_conn
+        row = conn.execute("SELECT tree_data, compressed FROM dialogue_trees").fetchone()
+        decoded = db._decode_tree(row[0], row[1])
+        db.close()
+        return len(json.dumps(decoded, ensure_ascii=False))
+
+    monkeypatch.setenv("STATE_DELTA", "0")
+    full = stored_size("full")
+    monkeypatch.setenv("STATE_DELTA", "1")
+    delta = stored_size("delta")
+    assert delta < full
+
+
+def test_concurrent_resolve_on_shared_tree():
+    tree = _chain(60)
+    expected = tree["node_0059"]["game_state"]
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        for _ in range(50):
+            encoded = encode_state_deltas(tree)
+            barrier = threading.Barrier(8)
+            results, errors = [], []
+
+            def worker():
+                barrier.wait()
+                try:
+                    results.append(resolve_state(encoded, "node_0059"))
+                except Exception as e:          # noqa: BLE001 - 记录后统一断言
+                    errors.append(e)
+
+            threads = [threading.Thread(target=worker) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            assert errors == []
+            assert all(r == expected for r in results) and len(results) == 8
+            assert materialize_all(encoded) == tree
+    finally:
+        sys.setswitchinterval(interval)
@@ -3,9 +3,11 @@ StoryGeneratorWithRetry 模式切换测试
 
 目标：
 - 验证 USE_PLOT_SKELETON=0 时不会调用 SkeletonGenerator，完全走 v3 兼容路径；
-- 验证 USE_PLOT_SKELETON=1 时会调用 SkeletonGenerator，并触发 NodeTextFiller + story_report 流程。
+- 验证 USE_PLOT_SKELETON=1 时会调用 SkeletonGenerator，并触发 NodeTextFiller + story_report 流程；
+- 验证同一进程连续生成多个故事时，元数据中的 prompt 遥测只统计本故事。
 """
 
+import sys
 from typing import Any, Dict, List
 
 import pytest
@@ -13,6 +15,16 @@ import pytest
 from ghost_story_factory.pregenerator.synopsis_generator import StorySynopsis
 from ghost_story_factory.pregenerator import story_generator as sg
 from ghost_story_factory.pregenerator.skeleton_model import PlotSkeleton
+from ghost_story_factory.utils import logging_utils
+
+
+@pytest.fixture(autouse=True)
+def _isolated_run_logs(tmp_path, monkeypatch):
+    """运行日志写到临时目录，不落进仓库的 logs/"""
+    monkeypatch.setenv("LOG_DIR", str(tmp_path / "logs"))
+    monkeypatch.setattr(logging_utils, "_LOGGER", None)
+    monkeypatch.setattr(logging_utils, "_LOG_FILE_PATH", None)
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
 
 
 def _make_dummy_synopsis() -> StorySynopsis:
@@ -432,3 +444,83 @@ def test_story_generator_stage_skeleton_runs_without_tree(monkeypatch):
     # TreeBuilder 与 DB 仍不应被触发
     assert "tree_builder_plot_skeleton" not in captured
     assert "db_city_name" not in captured
+
+
+def test_story_generator_builds_character_trees_concurrently(monkeypatch):
+    """CHARACTER_CONCURRENCY>1 时，多个角色的对话树应并发生成，并各自使用独立检查点。"""
+    import threading
+
+    captured = _patch_common_lightweight(monkeypatch)
+    monkeypatch.setenv("USE_PLOT_SKELETON", "0")
+    monkeypatch.setenv("CHARACTER_CONCURRENCY", "2")
+
+    def fake_extract_characters(self, main_story: str) -> List[Dict[str, Any]]:
+        return [
+            {"name": "角色甲", "is_protagonist": True, "description": ""},
+            {"name": "角色乙", "is_protagonist": False, "description": ""},
+        ]
+
+    monkeypatch.setattr(sg.StoryGeneratorWithRetry, "_extract_characters", fake_extract_characters)
+
+    # 两个角色必须同时进入 generate_tree 才能通过屏障，顺序执行会超时失败
+    barrier = threading.Barrier(2, timeout=5)
+    checkpoint_paths: List[str] = []
+
+    class ConcurrentTreeBuilder:
+        def __init__(self, **kwargs) -> None:
+            self.choice_generator = None
+            self.response_generator = None
+
+        def generate_tree(self, max_depth: int, min_main_path_depth: int, checkpoint_path: str):
+            checkpoint_paths.append(checkpoint_path)
+            barrier.wait()
+            return {"root": {"id": "root", "depth": 0, "narrative": checkpoint_path}}
+
+    monkeypatch.setattr(sg, "DialogueTreeBuilder", ConcurrentTreeBuilder)
+
+    gen = sg.StoryGeneratorWithRetry(
+        city="测试城",
+        synopsis=_make_dummy_synopsis(),
+        test_mode=True,
+        multi_character=True,
+    )
+    result = gen.generate_full_story()
+
+    assert result["story_id"] == 42
+    db_trees = captured["db_dialogue_trees"]
+    assert list(db_trees.keys()) == ["角色甲", "角色乙"]
+    assert sorted(checkpoint_paths) == sorted(
+        ["checkpoints/测试城_角色甲_tree.json", "checkpoints/测试城_角色乙_tree.json"]
+    )
+
+
+def test_prompt_telemetry_is_per_story(monkeypatch):
+    """同一进程内第二个故事的元数据不应累计第一个故事的 prompt 遥测。"""
+    from ghost_story_factory.engine.prompt_budget import get_prompt_telemetry, record_prompt
+
+    captured = _patch_common_lightweight(monkeypatch)
+    monkeypatch.setenv("USE_PLOT_SKELETON", "0")
+
+    def fake_generate_documents(self, gdd_path, lore_path, main_story_path):
+        record_prompt("choices", 100)
+        return ("GDD", "Lore", "Main story")
+
+    monkeypatch.setattr(sg.StoryGeneratorWithRetry, "_generate_documents", fake_generate_documents)
+    monkeypatch.setattr(
+        sg.StoryGeneratorWithRetry,
+        "_calculate_metadata",
+        lambda self, main_tree, all_trees: {"prompt_telemetry": get_prompt_telemetry()},
+    )
+
+    record_prompt("response", 500)          # 之前在同一进程里的其他调用
+    for title in ("第一个故事", "第二个故事"):
+        synopsis = _make_dummy_synopsis()
+        synopsis.title = title
+        gen = sg.StoryGeneratorWithRetry(city="测试城", synopsis=synopsis, test_mode=True, multi_character=False)
+        gen.generate_full_story()
+        assert captured["db_metadata"]["prompt_telemetry"] == {
+            "choices": {
+                "calls": 1, "total_tokens": 100, "max_tokens": 100, "static_tokens": 0,
+                "truncated_sections": 0, "dropped_sections": 0, "avg_tokens": 100.0,
+            }
+        }
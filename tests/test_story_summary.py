@@ -0,0 +1,115 @@
+"""
+分层故事摘要测试
+
+目标：
+- 验证按标题构建「全篇 → 幕 → 场景」三级摘要，并按场景 ID / 序号 / 幕序号定位切片；
+- 验证摘要文件写在文档旁，源文本未变化时从文件复用、变化后重建；
+- 验证选择点 prompt 只附带当前节拍的摘要切片，而不是整篇主线；
+- 验证场景锚点使用 GDD / Lore 的摘要切片，定位不到场景或关闭摘要时回退到原文片段。
+"""
+
+import json
+
+from ghost_story_factory.engine.choices import ChoicePointsGenerator
+from ghost_story_factory.engine.response import RuntimeResponseGenerator
+from ghost_story_factory.engine.state import GameState
+from ghost_story_factory.utils.story_summary import (
+    build_story_summary,
+    clear_story_summaries,
+    load_or_build_summary,
+    summary_path_for,
+)
+
+
+STORY = "\n".join([
+    "# 雨夜缆车",
+    "今晚你要独自复核索道。别回头。",
+    "## 第一幕：上山",
+    "### S1 观景台",
+    "观景台只有一盏灯。钢索在黑暗里绷直。" + "雾气翻涌。" * 40,
+    "### S2 值班室",
+    "值班室亮得过分。六台监控屏排成一排。",
+    "## 第二幕：下潜",
+    "盖板红灯闪烁，节拍 1.6 秒。",
+    "### 数据中心",
+    "服务器的灰尘带着甜腻。",
+])
+
+
+def test_hierarchy_and_slices():
+    summary = build_story_summary(STORY, scene_chars=60)
+
+    assert summary.title == "雨夜缆车"
+    assert summary.summary == "今晚你要独自复核索道。别回头。"
+    assert [a.title for a in summary.acts] == ["第一幕：上山", "第二幕：下潜"]
+    assert [s.scene_id for s in summary.acts[0].scenes] == ["S1", "S2"]
+    assert len(summary.acts[0].scenes[0].summary) <= 60
+    # 幕没有导语时用场景首句拼接
+    assert summary.acts[0].summary.startswith("观景台只有一盏灯。")
+    assert summary.acts[1].summary == "盖板红灯闪烁，节拍 1.6 秒。"
+
+    assert summary.locate("S2") == (0, 1)
+    assert summary.locate("S3") == (1, 0)      # 按序号落到第 3 个场景
+    assert summary.locate("X", act_index=2) == (1, None)
+
+    piece = summary.slice_for("S2")
+    assert "【本幕·第一幕：上山】" in piece and "【本场·S2 值班室】值班室亮得过分。" in piece
+    assert "服务器" not in piece
+
+    outline = summary.render(80)
+    assert len(outline) <= 80 and outline.startswith("# 雨夜缆车")
+
+
+def test_summary_file_next_to_document(tmp_path):
+    doc = tmp_path / "杭州_story.md"
+    doc.write_text(STORY, encoding="utf-8")
+    path = summary_path_for(doc)
+    assert path.name == "杭州_story.summary.json"
+
+    first = load_or_build_summary(STORY, path)
+    data = json.loads(path.read_text(encoding="utf-8"))
+    assert data["source_sha256"] == first.source_sha256
+
+    # 源文本未变化：直接读文件（手工改动可见）
+    data["title"] = "来自文件"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    assert load_or_build_summary(STORY, path).title == "来自文件"
+
+    # 源文本变化：重建并覆盖
+    assert load_or_build_summary(STORY + "\n新增一行。", path).title == "雨夜缆车"
+    clear_story_summaries()
+
+
+def test_choice_prompt_uses_beat_slice(monkeypatch):
+    monkeypatch.setenv("STORY_SUMMARIES", "1")
+    clear_story_summaries()
+    gen = ChoicePointsGenerator(gdd_content="## S2 值班室\n监控", lore_content="规则", main_story=STORY)
+
+    prompt = gen._build_prompt("S2", GameState(current_scene="S2"), "进入值班室")
+    assert "## 主线摘要（当前节拍）" in prompt
+    assert "【本场·S2 值班室】" in prompt
+    assert "雾气翻涌。" * 5 not in prompt
+
+    monkeypatch.setenv("STORY_SUMMARIES", "0")
+    plain = ChoicePointsGenerator(gdd_content="", lore_content="", main_story=STORY)
+    assert "主线摘要" not in plain._build_prompt("S2", GameState(current_scene="S2"), None)
+    clear_story_summaries()
+
+
+def test_scene_memory_uses_gdd_and_lore_slices(monkeypatch):
+    monkeypatch.setenv("STORY_SUMMARIES", "1")
+    clear_story_summaries()
+    lore = "## 规则\n不要回头。\n### S2 值班室\n监控屏上的人影不能对视。"
+    choices = ChoicePointsGenerator(gdd_content=STORY, lore_content=lore, main_story="")
+    responses = RuntimeResponseGenerator(gdd_content=STORY, lore_content=lore)
+
+    for memory in (choices._get_scene_memory("S2"), responses._get_scene_memory("S2")):
+        assert "【本场·S2 值班室】值班室亮得过分。" in memory
+        assert "服务器" not in memory
+    assert "S2 值班室】监控屏上的人影不能对视。" in responses._get_scene_memory("S2")
+
+    # 关闭摘要：回退到原文片段
+    monkeypatch.setenv("STORY_SUMMARIES", "0")
+    plain = RuntimeResponseGenerator(gdd_content=STORY, lore_content=lore)
+    assert "【本场·" not in plain._get_scene_memory("S2")
+    clear_story_summaries()
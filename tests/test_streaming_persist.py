@@ -0,0 +1,107 @@
+"""
+逐角色流式落库测试
+
+目标：
+- 验证 begin_story 先建立 generating 状态的故事，角色树完成即可加载游玩；
+- 验证断点续传复用未完成的故事记录，finalize_story 后标记 complete；
+- 验证流水线中某个角色失败时，已完成的主角线仍在库中且故事标记为 failed。
+"""
+
+import sys
+
+import pytest
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.pregenerator import story_generator as sg
+from ghost_story_factory.pregenerator.synopsis_generator import StorySynopsis
+from ghost_story_factory.utils import logging_utils
+
+
+@pytest.fixture(autouse=True)
+def _isolated_run_logs(tmp_path, monkeypatch):
+    """运行日志写到临时目录，不落进仓库的 logs/"""
+    monkeypatch.setenv("LOG_DIR", str(tmp_path / "logs"))
+    monkeypatch.setattr(logging_utils, "_LOGGER", None)
+    monkeypatch.setattr(logging_utils, "_LOG_FILE_PATH", None)
+    monkeypatch.setattr(sys, "excepthook", sys.excepthook)
+
+
+CHARACTERS = [
+    {"name": "主角", "is_protagonist": True, "description": "夜班保安"},
+    {"name": "配角", "is_protagonist": False, "description": "值班护士"},
+]
+
+
+def _tree(n):
+    return {f"node_{i}" if i else "root": {"node_id": f"node_{i}" if i else "root"} for i in range(n)}
+
+
+def test_begin_save_finalize(tmp_path):
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = db.begin_story("测试城", "流式故事", "简介", CHARACTERS)
+
+    story = db.get_story_by_id(story_id)
+    assert story.status == "generating" and not story.is_complete
+    assert [c.has_tree for c in db.get_characters_by_story(story_id)] == [False, False]
+
+    db.save_character_tree(story_id, "主角", _tree(3))
+    chars = {c.name: c for c in db.get_characters_by_story(story_id)}
+    assert chars["主角"].has_tree and not chars["配角"].has_tree
+    assert db.load_dialogue_tree(story_id, chars["主角"].id)["root"]["node_id"] == "root"
+    assert db.get_story_by_id(story_id).total_nodes == 3
+
+    # 断点续传：同名未完成故事被复用，重复落库不重复计数
+    assert db.begin_story("测试城", "流式故事", "简介", CHARACTERS) == story_id
+    db.save_character_tree(story_id, "主角", _tree(3))
+    db.save_character_tree(story_id, "配角", _tree(2))
+    assert db.get_story_by_id(story_id).total_nodes == 5
+    with pytest.raises(ValueError):
+        db.save_character_tree(story_id, "路人", _tree(1))
+
+    db.finalize_story(story_id, {"total_nodes": 5, "estimated_duration": 12})
+    story = db.get_story_by_id(story_id)
+    assert story.is_complete and story.estimated_duration_minutes == 12
+
+    # 已完成的故事不再被复用
+    assert db.begin_story("测试城", "流式故事", "简介", CHARACTERS) != story_id
+    db.close()
+
+
+def test_pipeline_keeps_finished_characters_on_failure(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "stories.db")
+    monkeypatch.setenv("USE_PLOT_SKELETON", "0")
+    monkeypatch.setenv("CHARACTER_CONCURRENCY", "1")
+    monkeypatch.setattr(sg, "DatabaseManager", lambda: DatabaseManager(db_path))
+
+    cls = sg.StoryGeneratorWithRetry
+    monkeypatch.setattr(cls, "_prompt_continue", lambda self, msg: None)
+    monkeypatch.setattr(cls, "_generate_documents", lambda self, *a: ("GDD", "Lore", "Main"))
+    monkeypatch.setattr(cls, "_preflight_analyze_worldbook", lambda self, lore: None)
+    monkeypatch.setattr(cls, "_prepare_story_summaries", lambda self, *a: None)
+    monkeypatch.setattr(cls, "_extract_characters", lambda self, main: [dict(c) for c in CHARACTERS])
+    monkeypatch.setattr(cls, "_load_character_checkpoint", lambda self: None)
+    monkeypatch.setattr(cls, "_save_character_checkpoint", lambda self, *a, **k: None)
+    monkeypatch.setattr(cls, "_write_failure_log", lambda self, *a, **k: None)
+
+    class Builder:
+        def __init__(self, name):
+            self.name = name
+
+        def generate_tree(self, max_depth, min_main_path_depth, checkpoint_path):
+            if self.name == "配角":
+                raise RuntimeError("LLM 超时")
+            return _tree(4)
+
+    monkeypatch.setattr(cls, "_create_tree_builder", lambda self, char, *a: Builder(char["name"]))
+
+    synopsis = StorySynopsis(title="半成品", synopsis="简介", protagonist="主角", location="医院", estimated_duration=10)
+    with pytest.raises(RuntimeError):
+        cls(city="测试城", synopsis=synopsis, test_mode=True).generate_full_story()
+
+    db = DatabaseManager(db_path)
+    story = db.get_stories_by_city(db.get_city_by_name("测试城").id)[0]
+    assert story.status == "failed" and story.total_nodes == 4
+    chars = {c.name: c for c in db.get_characters_by_story(story.id)}
+    assert chars["主角"].has_tree and not chars["配角"].has_tree
+    assert len(db.load_dialogue_tree(story.id, chars["主角"].id)) == 4
+    db.close()
@@ -0,0 +1,112 @@
+"""
+内容寻址文本存储测试
+
+目标：
+- 验证多棵树中重复的叙事 / 选项集合只存一份（只出现一次的留在树里），加载后与原树一致；
+- 验证之后保存的树引用库中已有的文本块；
+- 验证同一文本在进程内只解码一次，多棵树共享同一字符串对象；
+- 验证 NARRATIVE_DEDUP=0 时回退为完整 JSON。
+"""
+
+import copy
+import sqlite3
+
+from ghost_story_factory.database import DatabaseManager
+from ghost_story_factory.database.text_store import BLOB_CACHE, encode_trees, hydrate_tree
+
+OPENING = "午夜的走廊灯一盏接一盏熄灭，你听见身后传来湿漉漉的脚步声。" * 3
+DEFAULT_CHOICES = [
+    {"choice_id": "A", "choice_text": "继续调查", "choice_type": "normal",
+     "consequences": {"GR": 5, "time": "+5min"}, "preconditions": {}},
+    {"choice_id": "B", "choice_text": "离开此地", "choice_type": "normal",
+     "consequences": {"PR": -5}, "preconditions": {}},
+]
+
+
+def _tree(suffix):
+    root_choices = copy.deepcopy(DEFAULT_CHOICES)
+    root_choices[0]["next_node_id"] = "node_0001"
+    return {
+        "root": {"node_id": "root", "narrative": OPENING, "choices": root_choices,
+                 "children": ["node_0001"], "depth": 0},
+        "node_0001": {"node_id": "node_0001", "narrative": f"{suffix}推开了门，门后是一面蒙着水汽的旧镜子。",
+                      "choices": copy.deepcopy(DEFAULT_CHOICES), "parent_id": "root",
+                      "parent_choice_id": "A", "children": [], "depth": 1},
+        "node_0002": {"node_id": "node_0002", "narrative": "短", "choices": [], "children": []},
+    }
+
+
+def test_encode_hydrate_round_trip():
+    trees = {"甲": _tree("甲"), "乙": _tree("乙")}
+    skeletons, blobs = encode_trees(trees, min_chars=4)
+    sk = skeletons["甲"]
+    assert "narrative" not in sk["root"] and "narrative_ref" in sk["root"]
+    assert "narrative_ref" not in sk["node_0001"]            # 只出现一次：留在树里
+    assert sk["node_0002"]["narrative"] == "短"
+    assert sk["root"]["choice_next"] == ["node_0001", None]
+    assert sk["root"]["choices_ref"] == sk["node_0001"]["choices_ref"]
+    assert len(blobs["甲"]) == 2                              # 开场 + 一份选项模板
+
+    values = {}
+    for h, (kind, data, compressed) in blobs["甲"].items():
+        values[h] = BLOB_CACHE.resolve([h], lambda missing: [(h, kind, data, compressed)])[h]
+    assert hydrate_tree(sk, values) == trees["甲"]
+
+    # 已入库的哈希即使只出现一次也抽出
+    single = {"丙": {"root": {"node_id": "root", "narrative": OPENING}}}
+    assert encode_trees(single)[0]["丙"]["root"].get("narrative") == OPENING
+    known = encode_trees(single, known=lambda hs: hs)[0]
+    assert "narrative_ref" in known["丙"]["root"]
+
+
+def test_dedup_across_characters_and_shared_strings(tmp_path):
+    db_path = str(tmp_path / "stories.db")
+    db = DatabaseManager(db_path)
+    story_id = db.save_story(
+        city_name="测试城", title="去重", synopsis="简介",
+        characters=[{"name": "甲", "is_protagonist": True}, {"name": "乙"}],
+        dialogue_trees={"甲": _tree("甲"), "乙": _tree("乙")}, metadata={},
+    )
+    chars = db.get_characters_by_story(story_id)
+    BLOB_CACHE.clear()
+    t1 = db.load_dialogue_tree(story_id, chars[0].id)
+    t2 = db.load_dialogue_tree(story_id, chars[1].id)
+    assert t1 == _tree("甲") and t2 == _tree("乙")
+    assert t1["root"]["narrative"] is t2["root"]["narrative"]
+    assert BLOB_CACHE.get_stats()["hits"] >= 2
+
+    # 运行时回填 next_node_id 不会污染共享模板
+    t1["node_0001"]["choices"][1]["next_node_id"] = "x"
+    assert "next_node_id" not in db.load_dialogue_tree(story_id, chars[1].id)["node_0001"]["choices"][1]
+
+    # 另一个故事只用到一次开场：引用库中已有的文本块
+    other = db.save_story(
+        city_name="测试城", title="续篇", synopsis="简介", characters=[{"name": "丙"}],
+        dialogue_trees={"丙": {"root": {"node_id": "root", "narrative": OPENING, "choices": []}}}, metadata={},
+    )
+    t3 = db.load_dialogue_tree(other, db.get_characters_by_story(other)[0].id)
+    assert t3["root"]["narrative"] is t1["root"]["narrative"]
+    db.close()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM text_blobs").fetchone()[0] == 2   # 开场 / 选项模板
+    assert {r[0] for r in conn.execute("SELECT encoding FROM dialogue_trees")} == {"cas"}
+    conn.close()
+
+
+def test_dedup_disabled_stores_plain_json(tmp_path, monkeypatch):
+    monkeypatch.setenv("NARRATIVE_DEDUP", "0")
+    db = DatabaseManager(str(tmp_path / "stories.db"))
+    story_id = db.save_story(
+        city_name="测试城", title="原文", synopsis="简介",
+        characters=[{"name": "甲"}], dialogue_trees={"甲": _tree("甲")}, metadata={},
+    )
+    char_id = db.get_characters_by_story(story_id)[0].id
+    assert db.load_dialogue_tree(story_id, char_id) == _tree("甲")
+
+    monkeypatch.setenv("NARRATIVE_DEDUP", "1")
+    tree = db.load_dialogue_tree(story_id, char_id)
+    tree["node_0002"]["narrative"] = "改写后的结局文本，足够长以进入文本块。"
+    db.replace_dialogue_tree(story_id, char_id, tree)
+    assert db.load_dialogue_tree(story_id, char_id) == tree
+    db.close()
@@ -0,0 +1,130 @@
+"""
+TreeBuilder 扩展前沿（Frontier）测试
+
+目标：
+- 验证 best-first 模式按优先级出队，并在超出 beam_width 时淘汰最差节点；
+- 验证检查点序列化/恢复后出队顺序不变，且兼容旧版纯列表队列；
+- 验证 BEAM_MODE 下 generate_tree 的检查点写出 frontier 结构。
+"""
+
+import json
+from typing import Dict, Any, List
+
+from ghost_story_factory.pregenerator.frontier import Frontier
+from ghost_story_factory.pregenerator.tree_builder import DialogueTreeBuilder
+
+
+def _node(nid: str) -> Dict[str, Any]:
+    return {"node_id": nid, "choices": []}
+
+
+def test_fifo_frontier_keeps_bfs_order():
+    frontier = Frontier()
+    for i in range(3):
+        frontier.push(_node(f"n{i}"), i)
+    assert [frontier.pop()[0]["node_id"] for _ in range(3)] == ["n0", "n1", "n2"]
+    assert not frontier
+
+
+def test_best_first_pops_highest_and_evicts_lowest():
+    frontier = Frontier(best_first=True, beam_width=3)
+    frontier.push(_node("low"), 1, (100, 1, 0))
+    frontier.push(_node("mid"), 2, (200, 2, 0))
+    frontier.push(_node("high"), 3, (300, 3, 0))
+    # 同分时按节拍优先级区分，超出容量后淘汰最差的 low
+    frontier.push(_node("mid_beat"), 2, (200, 2, 5))
+
+    assert len(frontier) == 3
+    order = [frontier.pop()[0]["node_id"] for _ in range(3)]
+    assert order == ["high", "mid_beat", "mid"]
+
+
+def test_best_first_checkpoint_roundtrip():
+    frontier = Frontier(best_first=True, beam_width=10)
+    for i, score in enumerate([50, 300, 120, 300]):
+        frontier.push(_node(f"n{i}"), i, (score, i, 0))
+
+    data = json.loads(json.dumps(frontier.to_checkpoint()))
+    restored = Frontier.from_checkpoint(data, best_first=True, beam_width=10)
+
+    expected = [n["node_id"] for n, _ in frontier.items()]
+    assert [restored.pop()[0]["node_id"] for _ in range(4)] == expected
+    assert expected[:2] == ["n3", "n1"]
+
+
+def test_legacy_queue_list_is_reprioritized():
+    legacy = [[_node("a"), 1], [_node("b"), 4]]
+    restored = Frontier.from_checkpoint(
+        legacy,
+        best_first=True,
+        beam_width=5,
+        priority_fn=lambda node, depth: (depth * 100, depth, 0),
+    )
+    assert restored.pop()[0]["node_id"] == "b"
+
+
+class DummyBeamTreeBuilder(DialogueTreeBuilder):
+    """测试用的简化版本：不调用真实 LLM。"""
+
+    def _init_generators(self):
+        return None
+
+    def _generate_opening(self) -> str:
+        return "测试开场"
+
+    def _generate_choices(self, node) -> List[Dict[str, Any]]:
+        return [
+            {
+                "choice_id": cid,
+                "choice_text": f"分支 {cid}",
+                "choice_type": "normal",
+                "consequences": {"GR": gr},
+                "preconditions": {},
+            }
+            for cid, gr in (("A", 5), ("B", 10), ("C", 15))
+        ]
+
+    def _generate_response(self, choice: Dict[str, Any], new_state: Dict[str, Any]) -> str:
+        return f"选择了: {choice.get('choice_id', '')}"
+
+    def _check_ending(self, state: Dict[str, Any]) -> bool:
+        return False
+
+
+def test_beam_mode_checkpoint_persists_frontier(tmp_path, monkeypatch):
+    monkeypatch.setenv("INCREMENTAL_LOG_PATH", str(tmp_path / "tree_incremental.jsonl"))
+    monkeypatch.setenv("BEAM_MODE", "1")
+    monkeypatch.setenv("BEAM_WIDTH", "2")
+
+    builder = DummyBeamTreeBuilder(
+        city="测试城",
+        synopsis="测试 synopsis",
+        gdd_content="GDD",
+        lore_content="LORE",
+        main_story="STORY",
+        test_mode=True,
+    )
+
+    saved: List[Dict[str, Any]] = []
+    original_save = builder._save_full_checkpoint
+
+    def _capture(tree, queue, node_counter, path):
+        original_save(tree, queue, node_counter, path)
+        saved.append(json.loads(open(path, encoding="utf-8").read()))
+        # 前沿大小不应超过 beam_width
+        assert len(queue) <= builder.beam_width
+
+    builder._save_full_checkpoint = _capture  # type: ignore[assignment]
+    builder.checkpoint_interval = 4
+
+    tree = builder.generate_tree(
+        max_depth=3,
+        min_main_path_depth=1,
+        checkpoint_path=str(tmp_path / "checkpoint.json"),
+    )
+
+    assert "root" in tree
+    assert saved, "应至少保存过一次检查点"
+    frontier = saved[0]["frontier"]
+    assert frontier["mode"] == "best_first"
+    assert "queue" not in saved[0]
@@ -0,0 +1,145 @@
+"""
+TreeBuilder spine-first 模式测试
+
+目标：
+- 验证 SPINE_FIRST=1 时先拉出一条直达结局的主干，主线深度满足要求；
+- 验证随后回填旁支时不会重复扩展主干已挂接的选择；
+- 验证候选全部过早结局时从最深的主干节点重新生成选择，主干仍达到主线深度。
+"""
+
+from typing import Dict, Any, List
+
+from ghost_story_factory.pregenerator.dialogue_node import DialogueNode
+from ghost_story_factory.pregenerator.tree_builder import DialogueTreeBuilder
+
+
+class DummySpineTreeBuilder(DialogueTreeBuilder):
+    """测试用的简化版本：GR 累积到阈值时结局，不调用真实 LLM。"""
+
+    def _init_generators(self):
+        return None
+
+    def _generate_opening(self) -> str:
+        return "测试开场"
+
+    def _generate_choices(self, node) -> List[Dict[str, Any]]:
+        return [
+            {
+                "choice_id": "A",
+                "choice_text": "前往下一处",
+                "choice_type": "normal",
+                "consequences": {"GR": 10, "time": "+5min"},
+                "preconditions": {},
+            },
+            {
+                "choice_id": "B",
+                "choice_text": "原地观察",
+                "choice_type": "normal",
+                "consequences": {"PR": 10},
+                "preconditions": {},
+            },
+        ]
+
+    def _generate_response(self, choice: Dict[str, Any], new_state: Dict[str, Any]) -> str:
+        return f"选择了: {choice.get('choice_id', '')}"
+
+    def _check_ending(self, state: Dict[str, Any]) -> bool:
+        return state.get("GR", 0) >= 50
+
+
+def _spine_depth(tree: Dict[str, Any]) -> int:
+    """沿选择 A 走到底的路径深度"""
+    node = tree["root"]
+    while not node.get("is_ending"):
+        nxt = next(c.get("next_node_id") for c in node["choices"] if c["choice_id"] == "A")
+        node = tree[nxt]
+    return int(node["depth"])
+
+
+def test_spine_first_reaches_ending_then_backfills(tmp_path, monkeypatch):
+    monkeypatch.setenv("INCREMENTAL_LOG_PATH", str(tmp_path / "tree_incremental.jsonl"))
+    monkeypatch.setenv("SPINE_FIRST", "1")
+    monkeypatch.setenv("SKELETON_MODE", "1")
+    monkeypatch.setenv("MAX_BRANCHES_PER_NODE", "2")
+    monkeypatch.setenv("MAX_TOTAL_NODES", "12")
+    # 关闭验证后的 legacy 扩展轮次，只观察主干 + 回填阶段
+    monkeypatch.setenv("EXTEND_ON_FAIL_ATTEMPTS", "0")
+
+    builder = DummySpineTreeBuilder(
+        city="测试城",
+        synopsis="测试 synopsis",
+        gdd_content="GDD",
+        lore_content="LORE",
+        main_story="STORY",
+        test_mode=True,
+    )
+    tree = builder.generate_tree(
+        max_depth=8,
+        min_main_path_depth=5,
+        checkpoint_path=str(tmp_path / "checkpoint.json"),
+    )
+
+    # 主干：GR 每步 +10，第 5 层到达结局
+    assert _spine_depth(tree) == 5
+
+    # 回填：root 的另一分支 B 也被扩展，且每个节点的子节点不重复
+    root_links = {c["choice_id"]: c.get("next_node_id") for c in tree["root"]["choices"]}
+    assert root_links["A"] and root_links["B"]
+    for node in tree.values():
+        children = node.get("children", [])
+        assert len(children) == len(set(children))
+        assert len(children) <= 2
+
+    assert len(tree) <= builder.max_total_nodes + 2
+
+
+class EarlyEndingSpineBuilder(DummySpineTreeBuilder):
+    """首批选择都会过早结局；在已有选择的节点上重新生成时才给出平缓推进的选择。"""
+
+    def _generate_choices(self, node) -> List[Dict[str, Any]]:
+        if node.choices:
+            return [{"choice_id": "A", "choice_text": "沿着墙根慢慢前进", "consequences": {"GR": 5}}]
+        return [
+            {"choice_id": "A", "choice_text": "冲向出口", "consequences": {"GR": 30}},
+            {"choice_id": "B", "choice_text": "砸开大门", "consequences": {"GR": 30}},
+        ]
+
+
+def _early_ending_builder() -> EarlyEndingSpineBuilder:
+    builder = EarlyEndingSpineBuilder(
+        city="测试城",
+        synopsis="测试 synopsis",
+        gdd_content="GDD",
+        lore_content="LORE",
+        main_story="STORY",
+        test_mode=True,
+    )
+    builder.min_main_path_depth = 5
+    return builder
+
+
+def _build_spine(builder):
+    root = DialogueNode(node_id="root", scene="S1", depth=0, game_state={"GR": 0, "current_scene": "S1"})
+    root.choices = builder._generate_choices(root)
+    tree = {"root": root.to_dict()}
+    spine_ids, _ = builder._build_spine(tree, 1, max_depth=8)
+    return spine_ids, tree
+
+
+def test_short_spine_is_extended_from_deepest_node(tmp_path, monkeypatch):
+    monkeypatch.setenv("INCREMENTAL_LOG_PATH", str(tmp_path / "tree_incremental.jsonl"))
+    monkeypatch.setenv("SPINE_RETRIES", "3")
+    spine_ids, tree = _build_spine(_early_ending_builder())
+
+    # GR：30 → 35 → 40 → 45 → 75（结局）；第 1~3 层各重试一次，主干在第 5 层才结局
+    assert len(spine_ids) - 1 == 5 and tree[spine_ids[-1]]["is_ending"]
+    for nid in spine_ids[1:4]:
+        ids = [c["choice_id"] for c in tree[nid]["choices"]]
+        assert ids == ["A", "B", "A_1"]
+    # 过早结局保留为旁支
+    assert any(n.get("is_ending") and n["depth"] < 5 for n in tree.values())
+
+    # 不重试：退回到以过早结局收尾
+    monkeypatch.setenv("SPINE_RETRIES", "0")
+    spine_ids, tree = _build_spine(_early_ending_builder())
+    assert len(spine_ids) - 1 == 2
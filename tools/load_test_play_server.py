@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+游玩服务本地压测脚本
+
+用途：
+- 模拟 N 名玩家并发游玩同一故事（随机选择直到结局或达到步数上限）
+- 统计请求延迟（p50 / p95 / max）与吞吐，以及服务端树缓存命中情况
+
+使用：
+    ghost-story-serve --db database/ghost_stories.db --port 8765 &
+    python3 tools/load_test_play_server.py --url http://127.0.0.1:8765 --story-id 1 --character-id 1 --players 50
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+
+def _request(url: str, method: str = "GET", body: Optional[Dict[str, Any]] = None) -> Any:
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=30) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _play(base: str, story_id: int, character_id: int, max_steps: int, seed: int,
+          latencies: List[float], errors: List[str], lock: threading.Lock) -> None:
+    rng = random.Random(seed)
+    try:
+        t0 = time.perf_counter()
+        view = _request(f"{base}/sessions", "POST", {"story_id": story_id, "character_id": character_id})
+        samples = [time.perf_counter() - t0]
+        for _ in range(max_steps):
+            if view.get("is_ending") or not view.get("choices"):
+                break
+            choice = rng.choice(view["choices"])
+            t0 = time.perf_counter()
+            view = _request(f"{base}/sessions/{view['session_id']}/choose", "POST", {"choice_id": choice["choice_id"]})
+            samples.append(time.perf_counter() - t0)
+        _request(f"{base}/sessions/{view['session_id']}", "DELETE")
+        with lock:
+            latencies.extend(samples)
+    except Exception as e:
+        with lock:
+            errors.append(str(e))
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="游玩服务并发压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8765", help="服务地址")
+    parser.add_argument("--story-id", type=int, required=True, help="故事 ID")
+    parser.add_argument("--character-id", type=int, required=True, help="角色 ID")
+    parser.add_argument("--players", type=int, default=50, help="并发玩家数")
+    parser.add_argument("--max-steps", type=int, default=30, help="每名玩家最多选择次数")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args(argv)
+
+    base = args.url.rstrip("/")
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(
+            target=_play,
+            args=(base, args.story_id, args.character_id, args.max_steps, args.seed + i, latencies, errors, lock),
+        )
+        for i in range(args.players)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(f"👥 玩家: {args.players}  请求: {len(latencies)}  失败玩家: {len(errors)}  耗时: {elapsed:.2f}s")
+    if latencies:
+        print(f"⏱️  延迟 p50={_percentile(latencies, 50) * 1000:.1f}ms  "
+              f"p95={_percentile(latencies, 95) * 1000:.1f}ms  max={max(latencies) * 1000:.1f}ms")
+        print(f"🚀 吞吐: {len(latencies) / elapsed:.1f} req/s")
+    for err in errors[:5]:
+        print(f"❌ {err}")
+    try:
+        print(f"📊 服务端统计: {json.dumps(_request(f'{base}/stats'), ensure_ascii=False)}")
+    except Exception:
+        pass
+
+
+if __name__ == "__main__":
+    main()
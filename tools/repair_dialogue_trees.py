@@ -7,37 +7,30 @@
 - 扫描数据库中的对话树
 - 回填缺失的 next_node_id（可唯一推断时）
 - 对无法推断的选项标记 hidden=true（运行时将自动隐藏）
-- 保留原有压缩方式
+- 通过 DatabaseManager 读写，兼容原文 JSON 与内容寻址（cas）两种树编码
+- 并行模式（--workers N）：按故事分配到进程池，每个进程游标流式读取、修复、
+  按批（--batch-size）在一个事务内写回，汇总打印进度与吞吐
 
 使用：
     python3 tools/repair_dialogue_trees.py --db database/ghost_stories.db --story-id 2 --dry-run
     python3 tools/repair_dialogue_trees.py --db database/ghost_stories.db --story-id 2 --apply
+    python3 tools/repair_dialogue_trees.py --db database/ghost_stories.db --apply --workers 0   # 全部核心
 
 默认 dry-run，仅打印修复报告，不写回。
 """
 
 import argparse
-import json
-import sqlite3
-import gzip
-from typing import Dict, Any, Tuple
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, Any, Iterable, Optional, Tuple
 
+# 添加 src 到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
 
-def _load_tree(row: sqlite3.Row) -> Tuple[Dict[str, Any], bool]:
-    data = row["tree_data"]
-    compressed = bool(row["compressed"]) if "compressed" in row.keys() else False
-    if compressed:
-        text = gzip.decompress(data).decode("utf-8")
-    else:
-        text = data
-    return json.loads(text), compressed
-
-
-def _dump_tree(tree: Dict[str, Any], compressed: bool):
-    text = json.dumps(tree, ensure_ascii=False, indent=2)
-    if compressed:
-        return gzip.compress(text.encode("utf-8")), 1
-    return text, 0
+from ghost_story_factory.database import DatabaseManager  # noqa: E402
 
 
 def _build_child_index(tree: Dict[str, Any]) -> Dict[Tuple[str, str], str]:
@@ -90,89 +83,130 @@ def repair_tree(tree: Dict[str, Any]) -> Dict[str, int]:
                 fixed += 1
                 new_choices.append(ch)
             else:
-                # 无法推断，标记隐藏（保留以便追溯）
-                ch["hidden"] = True
-                hidden += 1
+                # 无法推断，标记隐藏（保留以便追溯）；已隐藏的不重复计数，重复运行不会再写回
+                if not ch.get("hidden"):
+                    ch["hidden"] = True
+                    hidden += 1
                 new_choices.append(ch)
         node["choices"] = new_choices
 
     return {"fixed": fixed, "hidden": hidden, "nodes": visited_nodes}
 
 
+def repair_story_trees(db_path: str, story_id: int, apply: bool, batch_size: int = 50) -> Dict[str, Any]:
+    """修复一个故事的全部对话树（在工作进程中执行，使用自己的数据库连接）
+
+    Returns:
+        统计信息：story_id / trees / nodes / fixed / hidden / written
+    """
+    db = DatabaseManager(db_path, pool_size=1)
+    stats = {"story_id": story_id, "trees": 0, "nodes": 0, "fixed": 0, "hidden": 0, "written": 0}
+    # WAL 下遍历中即可写回；其他日志模式读游标会挡住写事务，遍历结束后统一写回
+    stream_writes = db.journal_mode == "wal"
+    batch: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    try:
+        for sid, cid, tree in db.iter_dialogue_trees(story_id):
+            st = repair_tree(tree)
+            stats["trees"] += 1
+            for key in ("nodes", "fixed", "hidden"):
+                stats[key] += st[key]
+            if apply and (st["fixed"] > 0 or st["hidden"] > 0):
+                batch[(sid, cid)] = tree
+                if stream_writes and len(batch) >= batch_size:
+                    stats["written"] += db.replace_dialogue_trees(batch)
+                    batch = {}
+        if batch:
+            stats["written"] += db.replace_dialogue_trees(batch)
+    finally:
+        db.close()
+    return stats
+
+
+def run_repair(
+    db_path: str,
+    story_id: Optional[int] = None,
+    apply: bool = False,
+    workers: int = 1,
+    batch_size: int = 50
+) -> Dict[str, Any]:
+    """按故事修复对话树；workers > 1 时使用进程池并行
+
+    Args:
+        db_path: SQLite 数据库路径
+        story_id: 仅修复指定故事（默认全部）
+        apply: 是否写回
+        workers: 进程数（1 = 当前进程顺序执行；0 = CPU 核数）
+        batch_size: 每个写事务最多写回的对话树数量
+
+    Returns:
+        汇总统计（含 by_story 与耗时 elapsed）
+    """
+    # 先在主进程完成建库 / 迁移，工作进程只做版本检查
+    db = DatabaseManager(db_path)
+    story_ids = sorted({sid for sid, _ in db.list_dialogue_trees(story_id)})
+    db.close()
+
+    workers = workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(story_ids) or 1))
+    batch_size = max(1, batch_size)
+
+    totals = {"trees": 0, "nodes": 0, "fixed": 0, "hidden": 0, "written": 0}
+    by_story: Dict[int, Dict[str, Any]] = {}
+    start = time.perf_counter()
+
+    def _collect(results: Iterable[Dict[str, Any]]) -> None:
+        for st in results:
+            by_story[st["story_id"]] = st
+            for key in totals:
+                totals[key] += st[key]
+            elapsed = max(time.perf_counter() - start, 1e-6)
+            print(
+                f"[{len(by_story)}/{len(story_ids)}] 故事 {st['story_id']}: 树={st['trees']} "
+                f"回填={st['fixed']} 隐藏={st['hidden']} 写回={st['written']} | "
+                f"{totals['trees'] / elapsed:.1f} 树/s, {totals['nodes'] / elapsed:.0f} 节点/s"
+            )
+
+    if workers == 1:
+        _collect(repair_story_trees(db_path, sid, apply, batch_size) for sid in story_ids)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(repair_story_trees, db_path, sid, apply, batch_size) for sid in story_ids]
+            _collect(f.result() for f in as_completed(futures))
+
+    totals["elapsed"] = time.perf_counter() - start
+    totals["workers"] = workers
+    totals["by_story"] = by_story
+    return totals
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--db", default="database/ghost_stories.db", help="SQLite 数据库路径")
     ap.add_argument("--story-id", type=int, default=None, help="仅修复指定故事ID（默认全部）")
     ap.add_argument("--apply", action="store_true", help="写回修复结果（默认仅dry-run）")
     ap.add_argument("--dry-run", action="store_true", help="仅打印报告，不写回（默认）")
+    ap.add_argument("--workers", type=int, default=1, help="并行进程数（默认 1 顺序执行；0 = CPU 核数）")
+    ap.add_argument("--batch-size", type=int, default=50, help="每个写事务最多写回的对话树数量")
     args = ap.parse_args()
 
     dry_run = not args.apply or args.dry_run
 
-    conn = sqlite3.connect(args.db)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-
-    # 选出目标 rows
-    if args.story_id:
-        cur.execute(
-            """
-            SELECT story_id, character_id, tree_data, compressed
-            FROM dialogue_trees
-            WHERE story_id = ?
-            ORDER BY character_id
-            """,
-            (args.story_id,),
-        )
-    else:
-        cur.execute(
-            """
-            SELECT story_id, character_id, tree_data, compressed
-            FROM dialogue_trees
-            ORDER BY story_id, character_id
-            """
-        )
-
-    rows = cur.fetchall()
-    total_fixed = total_hidden = total_nodes = 0
-    by_story: Dict[int, Dict[str, int]] = {}
-
-    for row in rows:
-        story_id = row["story_id"]
-        character_id = row["character_id"]
-        tree, compressed = _load_tree(row)
-        stats = repair_tree(tree)
-        total_fixed += stats["fixed"]
-        total_hidden += stats["hidden"]
-        total_nodes += stats["nodes"]
-        s = by_story.setdefault(story_id, {"fixed": 0, "hidden": 0, "trees": 0})
-        s["fixed"] += stats["fixed"]
-        s["hidden"] += stats["hidden"]
-        s["trees"] += 1
-
-        if not dry_run and (stats["fixed"] > 0 or stats["hidden"] > 0):
-            blob, comp_flag = _dump_tree(tree, compressed)
-            cur.execute(
-                """
-                UPDATE dialogue_trees
-                SET tree_data = ?, compressed = ?
-                WHERE story_id = ? AND character_id = ?
-                """,
-                (blob, comp_flag, story_id, character_id),
-            )
-
-    if not dry_run:
-        conn.commit()
+    result = run_repair(
+        args.db, story_id=args.story_id, apply=not dry_run,
+        workers=args.workers, batch_size=args.batch_size,
+    )
 
     print("\n=== 修复报告 ===")
-    print(f"总节点: {total_nodes} | 回填: {total_fixed} | 隐藏: {total_hidden}")
-    for sid, st in sorted(by_story.items()):
+    print(f"总节点: {result['nodes']} | 回填: {result['fixed']} | 隐藏: {result['hidden']} | 写回树: {result['written']}")
+    for sid, st in sorted(result["by_story"].items()):
         print(f"- 故事 {sid}: 树={st['trees']} 回填={st['fixed']} 隐藏={st['hidden']}")
+    elapsed = max(result["elapsed"], 1e-6)
+    print(
+        f"耗时: {result['elapsed']:.2f}s | 进程: {result['workers']} | "
+        f"吞吐: {result['trees'] / elapsed:.1f} 树/s, {result['nodes'] / elapsed:.0f} 节点/s"
+    )
     print("模式:", "dry-run" if dry_run else "APPLIED")
 
-    conn.close()
-
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+节点检索脚本
+
+用途：
+- 按叙事 / 选项文本、场景 ID 或标志位在所有故事中查找节点（走 node_search 全文索引，不解压对话树）
+- 修复 / QA 时定位问题节点，再交给 repair_dialogue_trees.py 或 eval_choice_quality.py 处理
+
+使用：
+    python3 tools/search_nodes.py --db database/ghost_stories.db "镜子"
+    python3 tools/search_nodes.py --scene S3 --flag 失魂者_已拍照 --story-id 2
+    python3 tools/search_nodes.py --rebuild            # 从已保存的对话树重建索引
+
+条件之间为 AND；文本至少 3 个字时按相关度排序。
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# 添加 src 到路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from ghost_story_factory.database import DatabaseManager  # noqa: E402
+from ghost_story_factory.database.models import NodeSearchHit  # noqa: E402
+
+
+def format_hits(hits: List[NodeSearchHit]) -> str:
+    """命中结果 → 文本表格（每个节点一行）"""
+    if not hits:
+        return "（无匹配节点）"
+    lines = []
+    for h in hits:
+        snippet = h.snippet.replace("\n", " / ")
+        lines.append(f"story={h.story_id} char={h.character_id} {h.node_id:<12} [{h.scene or '-'}] {snippet}")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="按文本 / 场景 / 标志位检索对话树节点")
+    ap.add_argument("text", nargs="?", default=None, help="叙事或选项文本中包含的子串")
+    ap.add_argument("--db", default="database/ghost_stories.db", help="SQLite 数据库路径")
+    ap.add_argument("--scene", default=None, help="场景 ID（精确匹配）")
+    ap.add_argument("--flag", default=None, help="为真的标志位名")
+    ap.add_argument("--story-id", type=int, default=None, help="仅检索指定故事ID")
+    ap.add_argument("--character-id", type=int, default=None, help="仅检索指定角色ID")
+    ap.add_argument("--limit", type=int, default=50, help="最多返回条数")
+    ap.add_argument("--rebuild", action="store_true", help="重建索引（可配合 --story-id）")
+    args = ap.parse_args()
+
+    db = DatabaseManager(args.db)
+    try:
+        if args.rebuild:
+            count = db.rebuild_search_index(args.story_id)
+            print(f"🔎 已重建 {count} 棵对话树的节点索引")
+            if not (args.text or args.scene or args.flag):
+                return
+
+        start = time.perf_counter()
+        hits = db.search_nodes(
+            text=args.text,
+            scene=args.scene,
+            flag=args.flag,
+            story_id=args.story_id,
+            character_id=args.character_id,
+            limit=args.limit,
+        )
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(format_hits(hits))
+        print(f"\n共 {len(hits)} 个节点（{elapsed_ms:.1f} ms）")
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()